@@ -0,0 +1,97 @@
+"""
+In-process copy of the allowed_emails list for WAITLIST_MODE.
+require_auth checks the allow-list on every protected request (each 500 ms status poll
+included), so the whole list is held in memory and the check is a set lookup. Emails
+not on the list are answered from the same set (negative caching), which is reloaded
+every ALLOWLIST_REFRESH_SECONDS; emails added through database.py are visible here
+immediately. With a live feed (a Firestore snapshot listener) the set is replaced on
+every change and never goes stale by age.
+"""
+import os
+import threading
+import time
+from typing import Callable, FrozenSet, Iterable, Optional
+
+ALLOWLIST_REFRESH_SECONDS = float(os.getenv('ALLOWLIST_REFRESH_SECONDS', '30'))
+
+
+class AllowListCache:
+    """The allow-list as a set, reloaded when older than refresh_seconds (0 disables caching)."""
+
+    def __init__(self, load: Callable[[], Iterable[str]], refresh_seconds: float = ALLOWLIST_REFRESH_SECONDS):
+        self._load = load
+        self._refresh = refresh_seconds
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._emails: Optional[FrozenSet[str]] = None
+        self._loaded_at = 0.0
+        self._live = False
+        # Emails add()ed while a reload is running, which the reload may have read too early to see
+        self._added = set()
+        # Bumped by clear() so a reload that started before it is not installed after it
+        self._generation = 0
+        self.loads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._refresh > 0
+
+    def contains(self, email: str) -> bool:
+        return email in self._current()
+
+    def _current(self) -> FrozenSet[str]:
+        with self._lock:
+            emails, loaded_at = self._emails, self._loaded_at
+            fresh = emails is not None and (self._live or time.monotonic() - self._loaded_at < self._refresh)
+        if fresh:
+            return emails
+        if emails is not None and not self._reload_lock.acquire(blocking=False):
+            return emails  # another thread is reloading; the previous set is still good enough
+        if emails is None:
+            self._reload_lock.acquire()
+        try:
+            with self._lock:
+                # Someone else may have finished a reload while we waited for the lock
+                if self._emails is not None and self._loaded_at != loaded_at:
+                    return self._emails
+                self._added.clear()
+                generation = self._generation
+            try:
+                loaded = frozenset(self._load())
+            except Exception as e:
+                if emails is None:
+                    raise
+                print(f"⚠️  Allow-list reload failed, keeping the previous list: {e}")
+                with self._lock:
+                    self._loaded_at = time.monotonic()  # retry after another interval, not on every request
+                return emails
+            self.loads += 1
+            with self._lock:
+                if generation != self._generation:
+                    return loaded
+                self._emails, self._loaded_at = loaded | self._added, time.monotonic()
+                return self._emails
+        finally:
+            self._reload_lock.release()
+
+    def add(self, email: str):
+        """Write-through for an email this process just allowed."""
+        with self._lock:
+            self._added.add(email)
+            if self._emails is not None:
+                self._emails = self._emails | {email}
+
+    def replace(self, emails: Iterable[str]):
+        """Install the complete list from a live feed; it stays fresh until set_live(False) or clear()."""
+        with self._lock:
+            self._emails, self._loaded_at, self._live = frozenset(emails), time.monotonic(), True
+
+    def set_live(self, live: bool):
+        with self._lock:
+            self._live = live
+
+    def clear(self):
+        """Forget the list (and any live feed); the next check reloads it."""
+        with self._lock:
+            self._emails, self._loaded_at, self._live = None, 0.0, False
+            self._generation += 1
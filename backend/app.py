@@ -1,14 +1,16 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
 import uuid
 import time
-import threading
 import json
 from datetime import datetime, timedelta
 import random
 import asyncio
+import math
+import threading
+from typing import List, Union
 
 # Load environment variables
 load_dotenv()
@@ -23,7 +25,13 @@ from services.elevenlabs_service import get_elevenlabs_service
 from services.twilio_service import get_twilio_service
 
 # Import database and auth
+import call_limiter
 import database as db
+import database_async as db_async
+import number_pool
+from dispatch import DispatchExecutor, DispatchFull
+from result_buffer import TERMINAL_CALL_STATUSES, ResultWriteBuffer
+from storage.base import find_call_result
 from auth_middleware import require_auth, get_user_id_from_request
 
 # Configuration
@@ -32,6 +40,54 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 # Initialize database on startup
 db.init_db()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+# Progressive per-provider results are buffered briefly so quick status changes share one write
+result_writes = ResultWriteBuffer(db.merge_booking_results)
+
+# Booking call runs share a bounded worker pool (full = 429)
+dispatcher = DispatchExecutor()
+
+# Real-call mode: how many of the mock Cambridge providers a booking calls (at most the 15 listed per
+# service). ElevenLabs calls to them are placed concurrently, up to SWARM_CONCURRENCY at a time.
+MOCK_PROVIDER_COUNT = int(os.getenv('MOCK_PROVIDER_COUNT', '2'))
+
+# Where booking call runs happen: 'inline' on the dispatcher in this process, or 'queue' as durable
+# jobs run by worker processes (python -m worker), which survive restarts and scale separately
+BOOKING_JOBS = os.getenv('BOOKING_JOBS', 'inline').strip().lower()
+BOOKING_CALLS_JOB = 'booking_calls'
+BOOKING_JOB_MAX_ATTEMPTS = int(os.getenv('BOOKING_JOB_MAX_ATTEMPTS', '3'))
+
+# Booking progress streams (/api/booking/<id>/events): comment line this often so proxies keep the
+# connection open, and end the stream after this long (EventSource clients reconnect)
+BOOKING_EVENTS_KEEPALIVE_SECONDS = float(os.getenv('BOOKING_EVENTS_KEEPALIVE_SECONDS', '15'))
+BOOKING_EVENTS_MAX_SECONDS = float(os.getenv('BOOKING_EVENTS_MAX_SECONDS', '300'))
+# Without a change feed from other processes (SQLite, memory), streams re-read the booking this often
+BOOKING_EVENTS_POLL_SECONDS = float(os.getenv('BOOKING_EVENTS_POLL_SECONDS', '5'))
+# Each open stream holds a server thread; past this many, clients get 503 and poll instead, so the
+# rest of the threads (GUNICORN_THREADS) stay free for webhooks and the API. 0 = no cap.
+BOOKING_EVENTS_MAX_STREAMS = int(os.getenv('BOOKING_EVENTS_MAX_STREAMS', '4'))
+_event_stream_slots = threading.BoundedSemaphore(BOOKING_EVENTS_MAX_STREAMS) if BOOKING_EVENTS_MAX_STREAMS > 0 else None
+
+
+def _page_params():
+    """Read ?limit= and ?cursor= for keyset-paginated listings. Raises ValueError on bad input."""
+    raw_limit = request.args.get('limit')
+    try:
+        limit = int(raw_limit) if raw_limit else DEFAULT_PAGE_SIZE
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE), request.args.get('cursor') or None
+
+
+def _expand_results():
+    """Booking listings return summaries (see db.list_bookings) unless the client asks for ?expand=results."""
+    return request.args.get('expand') == 'results'
+
+
 def get_mock_cambridge_providers(service_type):
     """Get mock providers for Cambridge, MA to avoid Google API costs"""
 
@@ -132,11 +188,11 @@ def get_mock_cambridge_providers(service_type):
     test_number_2 = os.getenv('TEST_CALL_NUMBER_2', '+16173884716')  # Second provider so both calls can connect
 
     providers = []
-    for i, name in enumerate(names[:2]):  # Testing with 2 providers
-        phone = test_number_2 if i == 1 else test_number
+    for i, name in enumerate(names[:max(1, MOCK_PROVIDER_COUNT)]):
+        phone = test_number_2 if i % 2 else test_number  # alternate so concurrent calls can both connect
         providers.append({
             'name': name,
-            'address': cambridge_addresses[i],
+            'address': cambridge_addresses[i % len(cambridge_addresses)],
             'rating': round(random.uniform(4.0, 5.0), 1),
             'phone': phone,
             'place_id': f'mock_place_{service_type}_{i}'
@@ -185,7 +241,8 @@ def make_real_calls(service_type, location, timeframe, booking_id=None, preferen
         #    ElevenLabs places the call via their own Twilio integration — we do not use our Twilio client).
         #    Fallback: if ElevenLabs agent/phone not set, use our Twilio client with scripted TwiML (no AI).
         use_elevenlabs_outbound = bool(
-            os.getenv('ELEVENLABS_AGENT_ID') and os.getenv('ELEVENLABS_AGENT_PHONE_NUMBER_ID')
+            os.getenv('ELEVENLABS_AGENT_ID')
+            and number_pool.numbers_from_env('ELEVENLABS_AGENT_PHONE_NUMBER_IDS', 'ELEVENLABS_AGENT_PHONE_NUMBER_ID')
         )
         if use_elevenlabs_outbound:
             elevenlabs_service = get_elevenlabs_service()
@@ -221,96 +278,75 @@ def make_real_calls(service_type, location, timeframe, booking_id=None, preferen
         else:
             print(f"\n🎯 Making Twilio calls to test number: {to_number}\n")
 
-        # ElevenLabs: initiate all outbound calls in parallel so the second isn't blocked by the first
+        # ElevenLabs: initiate all outbound calls concurrently so later ones aren't blocked by the first
         # (one Twilio number can block a second call if we wait for the first to "connect")
         if use_elevenlabs_outbound and len(providers) > 1:
-            call_results_lock = threading.Lock()
-            call_results_by_index = {}  # index -> call_info
+            results = [None] * len(providers)
 
-            def initiate_one(i_provider):
-                i, provider = i_provider
-                to_num = provider['phone']
-                ctx = {
-                    **booking_context,
-                    'business_name': provider.get('name', ''),
-                    'business_type': provider.get('business_type') or service_type,
-                }
-                try:
-                    info = elevenlabs_service.make_elevenlabs_outbound_call(
-                        to_number=to_num,
-                        provider_name=provider.get('name', ''),
-                        booking_context=ctx,
-                    )
-                    with call_results_lock:
-                        call_results_by_index[i] = info
-                except Exception as e:
-                    with call_results_lock:
-                        call_results_by_index[i] = {'status': 'failed', 'error': str(e)}
-
-            threads = [threading.Thread(target=initiate_one, args=((i, p),)) for i, p in enumerate(providers)]
-            for t in threads:
-                t.start()
-            for t in threads:
-                t.join()
-
-            # Build results in provider order — always one result per provider so the UI shows both
-            for i, provider in enumerate(providers):
-                call_info = call_results_by_index.get(i, {'status': 'failed', 'error': 'No response'})
+            def build_result(i, provider, call_info):
                 dist_data = distance_data.get(provider['address'], {})
-                distance_miles = dist_data.get('distance_miles', 1.5)
-                travel_minutes = dist_data.get('duration_minutes', 10)
                 base = {
                     'provider_id': provider.get('place_id', str(uuid.uuid4())),
                     'provider_name': provider['name'],
                     'phone': provider['phone'],
                     'address': provider['address'],
                     'rating': provider['rating'],
-                    'distance': distance_miles,
-                    'travel_time': travel_minutes,
+                    'distance': dist_data.get('distance_miles', 1.5),
+                    'travel_time': dist_data.get('duration_minutes', 10),
+                    'availability_date': '—',
+                    'availability_time': '—',
+                    'score': 0,
+                    'initiation_ms': call_info.get('initiation_ms'),
                 }
                 if call_info.get('status') not in ('failed', None):
-                    result = {
+                    print(f"   📞 [{i+1}] {provider['name']} — initiated (conversation_id: {call_info.get('conversation_id')})")
+                    return {
                         **base,
-                        'availability_date': '—',
-                        'availability_time': '—',
-                        'score': 0,
                         'call_sid': call_info.get('call_sid'),
                         'conversation_id': call_info.get('conversation_id'),
                         'call_status': 'in_progress',
                         'has_availability': None,
+                        'placed_at': time.time(),
                     }
-                    results.append(result)
-                    print(f"   📞 [{i+1}] {provider['name']} — initiated (conversation_id: {call_info.get('conversation_id')})")
-                else:
-                    results.append({
-                        **base,
-                        'availability_date': '—',
-                        'availability_time': '—',
-                        'score': 0,
-                        'call_status': 'failed',
-                    })
-                    print(f"   ❌ [{i+1}] {provider['name']} — failed: {call_info.get('error', 'unknown')}")
-            # Guarantee we have exactly len(providers) results (in case a thread didn't store)
-            while len(results) < len(providers):
-                i = len(results)
-                p = providers[i]
-                dist_data = distance_data.get(p['address'], {})
-                results.append({
-                    'provider_id': p.get('place_id', str(uuid.uuid4())),
-                    'provider_name': p['name'],
-                    'phone': p['phone'],
-                    'address': p['address'],
-                    'rating': p['rating'],
-                    'distance': dist_data.get('distance_miles', 1.5),
-                    'travel_time': dist_data.get('duration_minutes', 10),
-                    'availability_date': '—',
-                    'availability_time': '—',
-                    'score': 0,
-                    'call_status': 'failed',
-                })
-                print(f"   ❌ [{i+1}] {p['name']} — no response (missing from parallel call)")
-            if booking_id:
-                db.update_booking_results(booking_id, results)
+                print(f"   ❌ [{i+1}] {provider['name']} — failed: {call_info.get('error', 'unknown')}")
+                return {**base, 'call_status': 'failed'}
+
+            async def write_result(i, result):
+                try:
+                    await db_async.update_booking_result(booking_id, i, result)
+                except Exception as e:
+                    # The run's final write (_finish_booking_calls) stores it with the rest
+                    print(f"⚠️  Result {i} of booking {booking_id} not written yet: {e}")
+
+            async def swarm():
+                writes = []
+
+                def record(i, call_info):
+                    result = build_result(i, providers[i], call_info)
+                    # Each call records its own result (and conversation_id) as soon as it is placed,
+                    # written on the event loop so the other calls keep going meanwhile
+                    if booking_id:
+                        writes.append(asyncio.ensure_future(write_result(i, result)))
+                    results[i] = result
+
+                error = 'call was not placed'
+                try:
+                    await elevenlabs_service.parallel_calls(providers, booking_context, on_result=record)
+                except Exception as e:
+                    print(f"❌ Swarm failed: {type(e).__name__}: {e}")
+                    error = str(e) or type(e).__name__
+                # A call whose task died (or was cancelled) before recording its result counts as failed
+                for i, result in enumerate(results):
+                    if result is None:
+                        record(i, {'status': 'failed', 'error': error})
+                await asyncio.gather(*writes)
+                await db_async.close_db()
+
+            # Runs on a booking-run thread (dispatcher or worker), which has no event loop of its own
+            asyncio.run(swarm())
+            latencies = sorted(r['initiation_ms'] for r in results if r.get('initiation_ms') is not None)
+            if latencies:
+                print(f"⏱️  Call initiation: p50 {latencies[len(latencies) // 2]}ms, max {latencies[-1]}ms")
             print(f"\n✅ Initiated {len(results)} calls")
             return results
 
@@ -318,27 +354,9 @@ def make_real_calls(service_type, location, timeframe, booking_id=None, preferen
         for i, provider in enumerate(providers, 1):
             print(f"📞 [{i}/{len(providers)}] Processing {provider['name']}...")
 
-            # Update status to 'calling' for this provider (results so far + current as 'calling' + rest as 'pending')
+            # Update status to 'calling' for this provider (the rest are still 'pending')
             if booking_id:
-                current_results = list(results)
-                current_results.append({
-                    'provider_id': provider.get('place_id', str(uuid.uuid4())),
-                    'provider_name': provider['name'],
-                    'phone': provider['phone'],
-                    'address': provider['address'],
-                    'rating': provider['rating'],
-                    'call_status': 'calling'
-                })
-                for p in providers[i:]:
-                    current_results.append({
-                        'provider_id': p.get('place_id', str(uuid.uuid4())),
-                        'provider_name': p['name'],
-                        'phone': p['phone'],
-                        'address': p['address'],
-                        'rating': p['rating'],
-                        'call_status': 'pending'
-                    })
-                db.update_booking_results(booking_id, current_results)
+                result_writes.put(booking_id, i - 1, {**pending_results[i - 1], 'call_status': 'calling'})
 
             if use_elevenlabs_outbound:
                 print(f"🎯 Making ElevenLabs call to: {to_number}")
@@ -390,6 +408,7 @@ Be professional and concise."""
                         'conversation_id': call_info.get('conversation_id'),
                         'call_status': 'in_progress',
                         'has_availability': None,
+                        'placed_at': time.time(),
                     }
                     print(f"   📞 Call initiated (in progress) — conversation_id: {call_info.get('conversation_id')}")
                 else:
@@ -429,17 +448,7 @@ Be professional and concise."""
 
                 # Update results progressively
                 if booking_id:
-                    current_results = list(results)
-                    for p in providers[i:]:
-                        current_results.append({
-                            'provider_id': p.get('place_id', str(uuid.uuid4())),
-                            'provider_name': p['name'],
-                            'phone': p['phone'],
-                            'address': p['address'],
-                            'rating': p['rating'],
-                            'call_status': 'pending'
-                        })
-                    db.update_booking_results(booking_id, current_results)
+                    result_writes.put(booking_id, i - 1, result)
             else:
                 result = {
                     'provider_id': provider.get('place_id', str(uuid.uuid4())),
@@ -453,17 +462,7 @@ Be professional and concise."""
 
                 # Update results with failed status
                 if booking_id:
-                    current_results = list(results)
-                    for p in providers[i:]:
-                        current_results.append({
-                            'provider_id': p.get('place_id', str(uuid.uuid4())),
-                            'provider_name': p['name'],
-                            'phone': p['phone'],
-                            'address': p['address'],
-                            'rating': p['rating'],
-                            'call_status': 'pending'
-                        })
-                    db.update_booking_results(booking_id, current_results)
+                    result_writes.put(booking_id, i - 1, result)
 
                 print(f"   ❌ Call failed: {call_info.get('error')}")
 
@@ -478,6 +477,9 @@ Be professional and concise."""
         import traceback
         traceback.print_exc()
         return []
+    finally:
+        if booking_id:
+            result_writes.flush(booking_id)
 
 
 # Mock provider data generator
@@ -545,17 +547,7 @@ def generate_mock_results(service_type, location, booking_id=None):
 
         # Update status to calling
         if booking_id:
-            current_results = list(results)
-            for j in range(i, num_providers):
-                current_results.append({
-                    'provider_id': str(uuid.uuid4()) if j > i else pending_results[i]['provider_id'],
-                    'provider_name': providers[j],
-                    'phone': pending_results[j]['phone'],
-                    'address': pending_results[j]['address'],
-                    'rating': pending_results[j]['rating'],
-                    'call_status': 'calling' if j == i else 'pending'
-                })
-            db.update_booking_results(booking_id, current_results)
+            result_writes.put(booking_id, i, {**pending_results[i], 'call_status': 'calling'})
 
         # Generate realistic data
         days_out = random.randint(1, 14)
@@ -581,17 +573,10 @@ def generate_mock_results(service_type, location, booking_id=None):
 
         # Update with completed call
         if booking_id:
-            current_results = list(results)
-            for j in range(i + 1, num_providers):
-                current_results.append({
-                    'provider_id': pending_results[j]['provider_id'],
-                    'provider_name': providers[j],
-                    'phone': pending_results[j]['phone'],
-                    'address': pending_results[j]['address'],
-                    'rating': pending_results[j]['rating'],
-                    'call_status': 'pending'
-                })
-            db.update_booking_results(booking_id, current_results)
+            result_writes.put(booking_id, i, result)
+
+    if booking_id:
+        result_writes.flush(booking_id)
 
     # Don't sort by score - keep chronological order (order calls were made)
     # results.sort(key=lambda x: x['score'], reverse=True)
@@ -664,10 +649,10 @@ def _require_admin():
     """Check X-Admin-Key or Authorization Bearer matches ADMIN_SECRET."""
     admin_secret = os.getenv('ADMIN_SECRET', '').strip()
     if not admin_secret:
-        return None, jsonify({'error': 'Admin not configured'}), 503
+        return None, (jsonify({'error': 'Admin not configured'}), 503)
     key = request.headers.get('X-Admin-Key') or request.headers.get('Authorization', '').replace('Bearer ', '')
     if key != admin_secret:
-        return None, jsonify({'error': 'Forbidden'}), 403
+        return None, (jsonify({'error': 'Forbidden'}), 403)
     return admin_secret, None
 
 
@@ -714,6 +699,42 @@ def admin_list_allowed():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/admin/retention', methods=['POST'])
+def admin_run_retention():
+    """
+    Archive old completed bookings and expire abandoned tasks (see db.run_retention). Meant for a
+    scheduled job; optional JSON body overrides booking_days / task_days. Requires ADMIN_SECRET.
+    """
+    _, err = _require_admin()
+    if err:
+        return err
+    try:
+        data = request.get_json(silent=True) or {}
+        counts = db.run_retention(
+            booking_days=float(data.get('booking_days', db.BOOKING_RETENTION_DAYS)),
+            task_days=float(data.get('task_days', db.TASK_RETENTION_DAYS)),
+        )
+        return jsonify({'ok': True, **counts}), 200
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/admin/metrics', methods=['GET'])
+def admin_metrics():
+    """
+    Background call dispatch load (queue depth, busy workers, rejections, wait and run times),
+    per-number outbound call limits (calls in flight and waiting) and the outbound number pools
+    (live calls per number, numbers out of rotation). Requires ADMIN_SECRET.
+    """
+    _, err = _require_admin()
+    if err:
+        return err
+    return jsonify({'dispatch': dispatcher.stats(), 'outbound_numbers': call_limiter.stats(),
+                    'number_pools': number_pool.stats()}), 200
+
+
 def _twilio_voice_twiml(step, service_type, timeframe, provider_name, webhook_base_url, speech_result=None, client_name="Alberto Menendez"):
     """Build multi-turn TwiML: step 0 = greet + gather, step 1 = follow-up + gather, step 2 = thank + hangup."""
     from urllib.parse import urlencode
@@ -787,9 +808,36 @@ def twilio_voice_webhook():
     return Response(twiml, mimetype='application/xml')
 
 
+@app.route('/api/twilio/status', methods=['POST'])
+def twilio_status_webhook():
+    """
+    Twilio status callback for calls placed with TWILIO_WEBHOOK_BASE_URL: frees the caller number when a call ends.
+    Requests must carry a valid X-Twilio-Signature (signed with TWILIO_AUTH_TOKEN); anyone else could
+    otherwise free a number's slots while its calls are still live.
+    """
+    from twilio.request_validator import RequestValidator
+    auth_token = os.getenv('TWILIO_AUTH_TOKEN', '')
+    webhook_base = os.getenv('TWILIO_WEBHOOK_BASE_URL', '').rstrip('/')
+    # Twilio signs the URL it was given, which behind a proxy is not the one Flask sees
+    url = f"{webhook_base}/api/twilio/status" if webhook_base else request.url
+    signature = request.headers.get('X-Twilio-Signature', '')
+    if not auth_token or not RequestValidator(auth_token).validate(url, request.form.to_dict(), signature):
+        print('⚠️  Twilio status callback with an invalid X-Twilio-Signature ignored')
+        return jsonify({'error': 'Invalid signature'}), 403
+    call_sid = request.form.get('CallSid')
+    call_status = request.form.get('CallStatus') or ''
+    if call_status in ('completed', 'busy', 'no-answer', 'canceled', 'failed'):
+        number_pool.release_call(call_sid, ok=call_status != 'failed')
+        call_limiter.release_call(call_sid)
+    return '', 204
+
+
 # --- Task + GenAI Chat (inbound info gathering) ---
 from services.chat_service import chat as chat_service_chat
 
+# Most recent messages sent to the model per chat turn
+CHAT_HISTORY_LIMIT = int(os.getenv('CHAT_HISTORY_LIMIT', '40'))
+
 @app.route('/api/task', methods=['POST'])
 @require_auth
 def create_task(user_id):
@@ -820,23 +868,25 @@ def chat(user_id):
         if not message:
             return jsonify({'error': 'message required'}), 400
 
-        task = db.get_task(task_id, user_id)
+        # Only the tail of the conversation is loaded; extracted_data carries what was learned earlier
+        task = db.get_task(task_id, user_id, conversation_limit=CHAT_HISTORY_LIMIT)
         if not task:
             return jsonify({'error': 'Task not found'}), 404
         if task['status'] not in ('gathering_info', 'requires_user_attention'):
             return jsonify({'error': f'Task cannot accept messages in status {task["status"]}'}), 400
 
         # Append user message
+        user_message = {'role': 'user', 'content': message}
         conv = list(task['conversation'])
-        conv.append({'role': 'user', 'content': message})
+        conv.append(user_message)
         extracted = dict(task['extracted_data'])
 
         # Get AI reply and updated extraction
         reply, extracted, status = chat_service_chat(conv, extracted)
 
-        # Append assistant reply
-        conv.append({'role': 'assistant', 'content': reply})
-        db.update_task(task_id, status=status, extracted_data=extracted, conversation=conv, user_id=user_id)
+        # Append both new messages (the stored conversation is never rewritten)
+        db.append_task_messages(task_id, [user_message, {'role': 'assistant', 'content': reply}],
+                                status=status, extracted_data=extracted, user_id=user_id)
 
         return jsonify({
             'reply': reply,
@@ -864,6 +914,88 @@ def get_task(user_id, task_id):
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/tasks', methods=['GET'])
+@require_auth
+def list_tasks(user_id):
+    """List the user's tasks, most recently updated first. Accepts ?limit= and ?cursor=; returns next_cursor."""
+    try:
+        limit, cursor = _page_params()
+        tasks, next_cursor = db.list_tasks(user_id, limit=limit, cursor=cursor)
+        return jsonify({'tasks': tasks, 'next_cursor': next_cursor}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def run_booking_calls(booking_id: str, service_type: str, location: str, timeframe: str, preferences: dict,
+                      use_real_calls: bool, resume: bool = False):
+    """
+    Place a booking's calls and complete the booking once every call has finished; raises if
+    the calls could not be made. resume=True is a retry after the previous run died part way:
+    a booking that is no longer processing is left alone, and real calls already placed are
+    not dialed again - the booking is finished from its stored results instead.
+    """
+    if resume:
+        booking = db.get_booking(booking_id)
+        if booking is None or booking['status'] != 'processing':
+            return
+        if use_real_calls and any((r.get('call_status') or 'pending') != 'pending' for r in booking['results']):
+            # Calls still in progress are finished by their webhooks; any other unfinished call was lost with the run
+            _finish_booking_calls(booking_id, [
+                r if (r.get('call_status') or '') in TERMINAL_CALL_STATUSES + ('in_progress',) else {**r, 'call_status': 'failed'}
+                for r in booking['results']
+            ])
+            return
+    if use_real_calls:
+        results = make_real_calls(service_type, location, timeframe, booking_id, preferences)
+    else:
+        results = generate_mock_results(service_type, location, booking_id)
+    _finish_booking_calls(booking_id, results or [])
+
+
+def _finish_booking_calls(booking_id: str, results: List[dict]):
+    result_writes.flush(booking_id)
+
+    # Webhooks may already have finished some calls; their results win over this run's copy.
+    # Don't mark booking as 'completed' while any call is still in progress (e.g. ElevenLabs async calls).
+    def _finish(booking):
+        stored = booking['results']
+        for i, r in enumerate(results):
+            if i >= len(stored):
+                stored.append(r)
+            elif (stored[i].get('call_status') or '') not in TERMINAL_CALL_STATUSES:
+                stored[i] = r
+        if all((r.get('call_status') or '') in TERMINAL_CALL_STATUSES for r in stored):
+            booking['status'] = 'completed'
+
+    try:
+        booking = db.mutate_booking(booking_id, _finish)
+    except db.BookingConflict as e:
+        # Webhooks kept winning the race; they complete the booking with the calls' final results
+        print(f"⚠️  Booking {booking_id} left to webhooks: {e}")
+        return
+    if booking and booking['status'] == 'completed':
+        print(f"✅ Booking {booking_id} completed with {len(booking['results'])} results")
+    else:
+        print(f"⏳ Booking {booking_id} still in progress ({len(results)} calls initiated)")
+
+
+def fail_booking_calls(booking_id: str, error: Union[str, BaseException]):
+    """Give up on a booking's calls: it completes without results rather than staying 'processing'."""
+    print(f"❌ Background calls failed for {booking_id}: {error}")
+    db.update_booking_status(booking_id, 'completed', [])
+
+
+def _run_booking_calls_inline(*args):
+    try:
+        run_booking_calls(*args)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        fail_booking_calls(args[0], e)
+
+
 # Booking request endpoint
 @app.route('/api/booking/request', methods=['POST'])
 @require_auth
@@ -888,39 +1020,37 @@ def create_booking_request(user_id):
         # Generate unique booking ID
         booking_id = str(uuid.uuid4())
 
-        # Store booking in database (scoped to user)
-        db.create_booking(booking_id, service_type, location, timeframe, preferences, user_id)
-
-        print(f"📞 Created booking {booking_id} for {service_type} in {location}")
-
         # Start provider calls in background so they run immediately (don't wait for polling)
         use_real_calls = os.getenv('USE_REAL_CALLS', 'false').lower() == 'true'
 
-        def run_calls():
+        if BOOKING_JOBS == 'queue':
+            # Store booking in database (scoped to user), then hand its calls to a worker process
+            db.create_booking(booking_id, service_type, location, timeframe, preferences, user_id)
+            db.enqueue_job(booking_id, BOOKING_CALLS_JOB, {
+                'booking_id': booking_id, 'service_type': service_type, 'location': location,
+                'timeframe': timeframe, 'preferences': preferences, 'use_real_calls': use_real_calls,
+            }, max_attempts=BOOKING_JOB_MAX_ATTEMPTS)
+        else:
+            # Hold a worker slot before creating anything, so a saturated server creates no booking it can't run
             try:
-                if use_real_calls:
-                    results = make_real_calls(service_type, location, timeframe, booking_id, preferences)
-                else:
-                    results = generate_mock_results(service_type, location, booking_id)
-                # Don't mark booking as 'completed' while any call is still in progress (e.g. ElevenLabs async calls).
-                # Results are already saved progressively; only transition to completed when all are done or failed.
-                any_still_in_progress = any(
-                    (r.get('call_status') or '') in ('calling', 'in_progress', 'pending')
-                    for r in (results or [])
-                )
-                if not any_still_in_progress:
-                    db.update_booking_status(booking_id, 'completed', results)
-                    print(f"✅ Booking {booking_id} completed with {len(results)} results")
-                else:
-                    print(f"⏳ Booking {booking_id} still in progress ({len(results)} calls initiated)")
-            except Exception as e:
-                print(f"❌ Background calls failed for {booking_id}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                db.update_booking_status(booking_id, 'completed', [])
+                slot = dispatcher.reserve()
+            except DispatchFull as e:
+                print(f"⏳ Booking request rejected, dispatch queue full (retry after {e.retry_after}s)")
+                resp = jsonify({'error': 'Too many booking requests in progress, please retry shortly',
+                                'retry_after': e.retry_after})
+                resp.headers['Retry-After'] = str(e.retry_after)
+                return resp, 429
+
+            # Store booking in database (scoped to user)
+            try:
+                db.create_booking(booking_id, service_type, location, timeframe, preferences, user_id)
+            except Exception:
+                slot.close()
+                raise
+            slot.submit(_run_booking_calls_inline, booking_id, service_type, location, timeframe, preferences,
+                        use_real_calls)
 
-        thread = threading.Thread(target=run_calls, daemon=True)
-        thread.start()
+        print(f"📞 Created booking {booking_id} for {service_type} in {location}")
 
         return jsonify({
             'status': 'processing',
@@ -990,56 +1120,79 @@ def elevenlabs_webhook():
     conversation_id = (data.get('conversation_id') or '').strip()
     if not conversation_id:
         return jsonify({'status': 'received'}), 200
+    if event_type in ('call_initiation_failure', 'post_call_transcription'):
+        # The call is over: its agent number can take another one
+        number_pool.release_call(conversation_id, ok=event_type != 'call_initiation_failure')
+        call_limiter.release_call(conversation_id)
 
+    # A call placed moments ago may still have its conversation_id sitting in the write buffer
+    result_writes.flush_call(conversation_id)
     booking, idx = db.get_booking_by_conversation_id(conversation_id)
     if not booking or idx < 0:
         print(f"⚠️  ElevenLabs webhook: no processing booking found for conversation_id={conversation_id}")
         return jsonify({'status': 'received'}), 200
 
-    results = list(booking.get('results') or [])
-    if idx >= len(results):
-        return jsonify({'status': 'received'}), 200
-
     if event_type == 'call_initiation_failure':
-        results[idx] = {**results[idx], 'call_status': 'failed'}
-        db.update_booking_results(booking['booking_id'], results)
-        print(f"📞 Call failed (initiation) for conversation_id={conversation_id}")
+        update = {'call_status': 'failed'}
     elif event_type == 'post_call_transcription':
         availability_date, availability_time = _parse_availability_from_webhook_data(data)
         metadata = data.get('metadata') or {}
         call_duration = metadata.get('call_duration_secs') or 0
         analysis = data.get('analysis') or {}
         successful = (analysis.get('call_successful') or '') == 'success'
-        results[idx] = {
-            **results[idx],
+        update = {
             'call_status': 'completed',
             'availability_date': availability_date,
             'availability_time': availability_time,
             'has_availability': successful,
             'score': min(95, 50 + (20 if successful else 0) + min(25, call_duration // 10)),
         }
-        db.update_booking_results(booking['booking_id'], results)
-        print(f"✅ Call completed for conversation_id={conversation_id} (success={successful})")
     else:
         return jsonify({'status': 'received'}), 200
 
-    # Any result still in_progress will likely never get a webhook (e.g. second call to same number failed to connect).
-    # Mark them failed so the booking can complete.
-    for r in results:
-        if (r.get('call_status') or '') == 'in_progress':
-            r['call_status'] = 'failed'
-            r['availability_date'] = r.get('availability_date') or '—'
-            r['availability_time'] = r.get('availability_time') or 'No response'
-    db.update_booking_results(booking['booking_id'], results)
-
-    # Now all are completed or failed — mark booking as completed
-    if all((r.get('call_status') or '') in ('completed', 'failed') for r in results):
-        db.update_booking_status(booking['booking_id'], 'completed', results)
+    # Other providers' webhooks and the call runner write the same booking concurrently, so the
+    # change is applied with compare-and-set and recomputed from a fresh copy if one of them won
+    def _apply(draft):
+        found, i = find_call_result(draft, conversation_id, idx)
+        if found is None:
+            return False
+        draft['results'][i] = {**draft['results'][i], **update}
+        _fail_stale_calls(draft)
+
+    updated = db.mutate_booking(booking['booking_id'], _apply, booking)
+    if event_type == 'call_initiation_failure':
+        print(f"📞 Call failed (initiation) for conversation_id={conversation_id}")
+    else:
+        print(f"✅ Call completed for conversation_id={conversation_id} (success={successful})")
+    if updated and updated['status'] == 'completed':
         print(f"✅ Booking {booking['booking_id']} marked completed (all calls done)")
 
     return jsonify({'status': 'received'}), 200
 
 
+def _stale_calls(booking) -> List[dict]:
+    """
+    The booking's in-progress calls placed over CALL_LIVE_TTL_SECONDS ago: their webhook is not
+    coming (e.g. the call never connected). Calls from before placed_at was recorded date from the booking.
+    """
+    if booking.get('status') != 'processing':
+        return []
+    cutoff = time.time() - call_limiter.CALL_LIVE_TTL_SECONDS
+    return [r for r in booking.get('results') or []
+            if (r.get('call_status') or '') == 'in_progress'
+            and (r.get('placed_at') or booking.get('created_at') or 0) <= cutoff]
+
+
+def _fail_stale_calls(booking):
+    """Mark the booking's stale calls failed, and complete it once every call has an outcome."""
+    for r in _stale_calls(booking):
+        r['call_status'] = 'failed'
+        r['availability_date'] = r.get('availability_date') or '—'
+        r['availability_time'] = r.get('availability_time') or 'No response'
+    if all((r.get('call_status') or '') in TERMINAL_CALL_STATUSES for r in booking['results']):
+        booking['status'] = 'completed'
+
+
 # Get booking status endpoint
 @app.route('/api/booking/<booking_id>', methods=['GET'])
 @require_auth
@@ -1050,19 +1203,97 @@ def get_booking_status(user_id, booking_id):
 
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
+        if _stale_calls(booking):
+            try:
+                booking = db.mutate_booking(booking_id, _fail_stale_calls, booking) or booking
+            except db.BookingConflict:
+                pass  # webhooks are writing it; the next read tries again
 
-        message = 'AI agents are calling providers...' if booking['status'] == 'processing' else None
-        return jsonify({
-            'booking_id': booking_id,
-            'status': booking['status'],
-            'results': booking.get('results', []),
-            **({'message': message} if message else {})
-        }), 200
+        return jsonify(_booking_status(booking)), 200
 
     except Exception as e:
         print(f"❌ Error getting booking status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+def _booking_status(booking):
+    """Body of GET /api/booking/<id> (and of each progress event)."""
+    message = 'AI agents are calling providers...' if booking['status'] == 'processing' else None
+    return {
+        'booking_id': booking['booking_id'],
+        'status': booking['status'],
+        'results': booking.get('results', []),
+        **({'message': message} if message else {})
+    }
+
+
+@app.route('/api/booking/<booking_id>/events', methods=['GET'])
+@require_auth
+def booking_status_events(user_id, booking_id):
+    """
+    Server-sent events with the booking status (same body as GET /api/booking/<id>): one event now
+    and one per change until the booking leaves 'processing'. Changes are pushed by database.py's
+    change bus (and Firestore listeners); where those can't see other processes' writes (e.g.
+    worker.py's), the stream also re-reads the booking every BOOKING_EVENTS_POLL_SECONDS.
+    At most BOOKING_EVENTS_MAX_STREAMS are open at once; past that the answer is 503 with
+    Retry-After, and the client polls GET /api/booking/<id> instead.
+    """
+    slots = _event_stream_slots
+    if slots is not None and not slots.acquire(blocking=False):
+        retry_after = max(1, math.ceil(BOOKING_EVENTS_POLL_SECONDS))
+        resp = jsonify({'error': 'Too many progress streams open, poll the booking instead', 'retry_after': retry_after})
+        resp.headers['Retry-After'] = str(retry_after)
+        return resp, 503
+
+    # Subscribe before the first read so a change between the two is not missed
+    subscription = db.subscribe_booking(booking_id)
+    closed = []
+
+    def close():
+        if not closed:
+            closed.append(True)
+            subscription.close()
+            if slots is not None:
+                slots.release()
+
+    try:
+        booking = db.get_booking(booking_id, user_id)
+    except Exception:
+        close()
+        raise
+    if not booking:
+        close()
+        return jsonify({'error': 'Booking not found'}), 404
+
+    def stream(booking):
+        deadline = time.monotonic() + BOOKING_EVENTS_MAX_SECONDS
+        last = None
+        try:
+            yield 'retry: 1000\n\n'
+            while True:
+                body = _booking_status(booking)
+                if body != last:
+                    yield f'data: {json.dumps(body)}\n\n'
+                    last = body
+                if booking['status'] != 'processing' or time.monotonic() >= deadline:
+                    return
+                wait = BOOKING_EVENTS_KEEPALIVE_SECONDS if subscription.live else BOOKING_EVENTS_POLL_SECONDS
+                if not subscription.wait(min(wait, max(0.0, deadline - time.monotonic()))):
+                    yield ': keep-alive\n\n'
+                    if subscription.live:
+                        continue
+                booking = db.get_booking(booking_id, user_id)
+                if booking is None:
+                    return
+        finally:
+            close()
+
+    resp = Response(stream_with_context(stream(booking)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Also frees the slot if the client goes away before the stream starts
+    resp.call_on_close(close)
+    return resp
+
 # Confirm booking endpoint
 @app.route('/api/booking/<booking_id>/confirm', methods=['POST'])
 @require_auth
@@ -1110,27 +1341,20 @@ def confirm_booking(user_id, booking_id):
 def get_dashboard_stats(user_id):
     """Get dashboard statistics"""
     try:
-        bookings_list = db.get_all_bookings(user_id)
-        total_bookings = len(bookings_list)
-        completed = sum(1 for b in bookings_list if b['status'] == 'completed')
-        processing = sum(1 for b in bookings_list if b['status'] == 'processing')
-
-        # Calculate total calls made
-        total_calls = sum(len(b.get('results', [])) for b in bookings_list)
+        # Counters and the recent-bookings list are maintained incrementally by the database layer
+        stats = db.get_user_stats(user_id)
+        total_bookings = stats['total_bookings']
+        completed = stats['completed']
 
-        # Get recent bookings
-        recent_bookings = sorted(
-            bookings_list,
-            key=lambda x: x['created_at'],
-            reverse=True
-        )[:10]
+        # Get recent bookings (bounded list, newest first)
+        recent_bookings = db.get_bookings_by_ids(stats['recent_booking_ids'], summary=not _expand_results())
 
         return jsonify({
             'stats': {
                 'total_bookings': total_bookings,
                 'completed': completed,
-                'processing': processing,
-                'total_calls_made': total_calls,
+                'processing': stats['processing'],
+                'total_calls_made': stats['total_calls'],
                 'success_rate': (completed / total_bookings * 100) if total_bookings > 0 else 0
             },
             'recent_bookings': recent_bookings
@@ -1180,15 +1404,21 @@ def get_connections(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Get all bookings for dashboard
+# Get bookings for dashboard (paginated)
 @app.route('/api/dashboard/bookings', methods=['GET'])
 @require_auth
 def get_all_bookings_route(user_id):
-    """Get all bookings for dashboard view"""
+    """
+    Get one page of bookings for dashboard view (newest first). Pass next_cursor back as ?cursor= for the next page.
+    Bookings are summaries (result_count, completed_count, best_result); ?expand=results returns full results.
+    """
     try:
-        bookings_list = db.get_all_bookings(user_id)
-        return jsonify({'bookings': bookings_list}), 200
+        limit, cursor = _page_params()
+        bookings_list, next_cursor = db.list_bookings(user_id, limit=limit, cursor=cursor, summary=not _expand_results())
+        return jsonify({'bookings': bookings_list, 'next_cursor': next_cursor}), 200
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1234,11 +1464,14 @@ def admin_seed_demo(user_id):
     try:
         db.init_db()
         dentist_id = str(uuid.uuid4())
-        db.create_booking(dentist_id, "dentist", "Cambridge, MA", "this week", {"preferred_slots": "Tuesday or Wednesday morning"}, user_id)
-        db.update_booking_status(dentist_id, "completed", _DEMO_DENTIST_RESULTS)
         vet_id = str(uuid.uuid4())
-        db.create_booking(vet_id, "veterinarian", "Cambridge, MA", "this week", {}, user_id)
-        db.update_booking_status(vet_id, "completed", _DEMO_VET_RESULTS)
+        db.create_bookings_many([
+            {'booking_id': dentist_id, 'service_type': 'dentist', 'location': 'Cambridge, MA', 'timeframe': 'this week',
+             'preferences': {"preferred_slots": "Tuesday or Wednesday morning"}, 'user_id': user_id,
+             'status': 'completed', 'results': _DEMO_DENTIST_RESULTS},
+            {'booking_id': vet_id, 'service_type': 'veterinarian', 'location': 'Cambridge, MA', 'timeframe': 'this week',
+             'preferences': {}, 'user_id': user_id, 'status': 'completed', 'results': _DEMO_VET_RESULTS},
+        ])
         return jsonify({
             'ok': True,
             'message': 'Demo tasks seeded',
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compare the storage codec formats on realistic booking payloads.
+Run from the backend directory: python bench_codec.py [--bookings N]
+
+For each format (plain json.dumps text as earlier builds stored it, the codec's json and zlib
+formats) prints encode / decode time per booking, encoded bytes per booking, and the size of
+a SQLite database holding the bookings.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+# Run from backend directory so storage is importable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage import codec
+from storage.sqlite import SQLiteBackend
+
+SERVICES = ['dentist', 'doctor', 'veterinarian', 'hair salon', 'auto mechanic']
+STREETS = ['Massachusetts Ave', 'Broadway', 'Cambridge St', 'Main St', 'Hampshire St']
+
+
+def make_result(i: int) -> dict:
+    """A provider result shaped like the ones /api/start-booking writes."""
+    has_availability = random.random() > 0.3
+    return {
+        'provider_id': f'ChIJ{uuid.uuid4().hex[:23]}',
+        'provider_name': f'{random.choice(["Cambridge", "Harvard Square", "Central", "Kendall"])} Provider {i}',
+        'phone': f'+1 (617) 555-{random.randint(0, 9999):04d}',
+        'address': f'{random.randint(1, 999)} {random.choice(STREETS)}, Cambridge, MA 02139',
+        'rating': round(random.uniform(3.5, 5.0), 1),
+        'distance': round(random.uniform(0.2, 8.0), 2),
+        'travel_time': random.randint(3, 40),
+        'availability_date': 'Wednesday, February 12' if has_availability else 'No availability',
+        'availability_time': '10:30 AM' if has_availability else '-',
+        'score': random.randint(50, 98) if has_availability else 0,
+        'call_sid': f'CA{uuid.uuid4().hex}',
+        'conversation_id': f'conv_{uuid.uuid4().hex[:20]}',
+        'call_status': 'completed',
+        'has_availability': has_availability,
+    }
+
+
+def make_booking() -> dict:
+    return {
+        'booking_id': str(uuid.uuid4()),
+        'user_id': 'bench-user',
+        'service_type': random.choice(SERVICES),
+        'location': 'Cambridge, MA',
+        'timeframe': 'this week',
+        'preferences': {'max_distance': 10, 'min_rating': 4.0, 'time_of_day': 'morning',
+                        'notes': 'Prefers early appointments; new patient, no insurance yet.'},
+        'results': [make_result(i) for i in range(15)],
+    }
+
+
+def make_conversation(turns: int = 12) -> list:
+    return [{'role': 'user' if i % 2 == 0 else 'assistant',
+             'content': 'I need a dentist in Cambridge sometime this week, mornings if possible. ' * 2}
+            for i in range(turns)]
+
+
+FORMATS = {
+    'json text (legacy)': (lambda v: json.dumps(v), json.loads),
+    'codec json': (lambda v: codec.encode(v, 'json'), codec.decode),
+    'codec zlib': (lambda v: codec.encode(v, 'zlib'), codec.decode),
+}
+
+
+def time_per_item(fn, items) -> tuple:
+    """Mean microseconds per call, and the outputs."""
+    start = time.perf_counter()
+    out = [fn(item) for item in items]
+    return (time.perf_counter() - start) / len(items) * 1e6, out
+
+
+def sqlite_size(fmt: str, bookings: list, conversations: list) -> int:
+    """Size of a fresh SQLite database after writing every booking and conversation with fmt."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        previous, codec.STORAGE_CODEC = codec.STORAGE_CODEC, fmt
+        store = SQLiteBackend(path)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                store.init_db()
+            store.create_bookings_many(bookings)
+            for conversation in conversations:
+                task_id = str(uuid.uuid4())
+                store.create_task(task_id, user_id='bench-user')
+                store.append_task_messages(task_id, conversation)
+            store._conn().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            store.close()
+            codec.STORAGE_CODEC = previous
+        return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=500)
+    args = parser.parse_args()
+
+    random.seed(7)
+    bookings = [make_booking() for _ in range(args.bookings)]
+    conversations = [make_conversation() for _ in range(args.bookings)]
+
+    print(f'{args.bookings} bookings x 15 results; orjson: {"yes" if codec.orjson is not None else "no"}')
+    print(f'{"format":<20} {"encode us":>10} {"decode us":>10} {"bytes":>8}')
+    for label, (encode, decode) in FORMATS.items():
+        encode_us, encoded = time_per_item(encode, bookings)
+        decode_us, _ = time_per_item(decode, encoded)
+        size = sum(len(e) for e in encoded) / len(encoded)
+        print(f'{label:<20} {encode_us:>10.1f} {decode_us:>10.1f} {size:>8.0f}')
+
+    print()
+    print('SQLite database size (bookings, results and task messages):')
+    for fmt in codec.FORMATS:
+        print(f'  {fmt:<6} {sqlite_size(fmt, bookings, conversations) / 1024:>8.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
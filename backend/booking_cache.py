@@ -0,0 +1,104 @@
+"""
+Read-through cache for booking documents.
+The progress page polls each booking every 500 ms per open tab, so the same booking is
+read over and over while its calls run. Reads are served from a bounded LRU with a short
+TTL; concurrent misses for one booking share a single backend read (single-flight), and
+every write that goes through database.py invalidates the entry so this process never
+serves a booking older than its own last write. The TTL only bounds staleness against
+writes made by other instances.
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+BOOKING_CACHE_MAX_ENTRIES = int(os.getenv('BOOKING_CACHE_MAX_ENTRIES', '1024'))
+BOOKING_CACHE_TTL_SECONDS = float(os.getenv('BOOKING_CACHE_TTL_SECONDS', '5'))
+
+
+class _Flight:
+    """One in-progress backend read that concurrent misses wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+        # Set when the key is invalidated mid-read: waiters still get the value, the cache does not
+        self.stale = False
+
+
+class ReadThroughCache:
+    """Bounded LRU + TTL cache in front of a loader, with single-flight misses."""
+
+    def __init__(self, load: Callable[[Hashable], Optional[dict]], max_entries: int = BOOKING_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = BOOKING_CACHE_TTL_SECONDS):
+        self._load = load
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()  # key -> (expires_at, value)
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0 and self._ttl > 0
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        """Return a copy of the value for key, loading it at most once across concurrent callers."""
+        if not self.enabled:
+            return self._load(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            flight.value = self._load(key)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+                # Misses are not cached: a booking that does not exist yet may be created any moment
+                if flight.error is None and flight.value is not None and not flight.stale:
+                    self._entries[key] = (time.monotonic() + self._ttl, flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self._max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+        return copy.deepcopy(flight.value)
+
+    def invalidate(self, key: Hashable):
+        """Drop key; a read of it already in flight will not be cached."""
+        with self._lock:
+            self._entries.pop(key, None)
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.stale = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for flight in self._flights.values():
+                flight.stale = True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,129 @@
+"""
+In-process change notifications for bookings, so the API can push progress to clients
+instead of each client polling the database.
+
+Subscribers register per booking and are woken whenever it changes; they then re-read
+it through database.get_booking, whose cache and single-flight turn one change into one
+backend read however many clients are watching. Changes arrive from two sources:
+database.py's booking writes (every backend, this process only) and, where the backend
+has a change feed, a listener on the booking (Firestore on_snapshot) started with the
+first subscriber and stopped with the last, which also sees writes from other instances.
+"""
+import threading
+from typing import Callable, Dict, Hashable, Iterable, Optional, Set
+
+# watch(booking_id, on_change) -> a function that stops the listener, or None if the backend has no feed
+Watch = Callable[[Hashable, Callable[[], None]], Optional[Callable[[], None]]]
+
+
+class Subscription:
+    """One client's interest in one booking; changes coalesce until the next wait()."""
+
+    def __init__(self, bus: 'BookingChangeBus', booking_id: Hashable):
+        self.booking_id = booking_id
+        self._bus = bus
+        self._changed = threading.Event()
+        self.closed = False
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the booking changed since the last wait(); False on timeout."""
+        changed = self._changed.wait(timeout)
+        self._changed.clear()
+        return changed
+
+    def notify(self):
+        self._changed.set()
+
+    @property
+    def live(self) -> bool:
+        """Whether a backend listener also reports changes made by other processes."""
+        return self._bus.is_watched(self.booking_id)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._bus._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BookingChangeBus:
+    """Fan-out of booking change signals to subscriptions, with per-booking backend listeners."""
+
+    def __init__(self, watch: Optional[Watch] = None):
+        self._watch = watch
+        self._lock = threading.Lock()
+        self._subscribers: Dict[Hashable, Set[Subscription]] = {}
+        self._unwatch: Dict[Hashable, Callable[[], None]] = {}
+
+    def subscribe(self, booking_id: Hashable) -> Subscription:
+        sub = Subscription(self, booking_id)
+        with self._lock:
+            subs = self._subscribers.setdefault(booking_id, set())
+            first = not subs
+            subs.add(sub)
+        if first and self._watch is not None:
+            self._start_watch(booking_id)
+        return sub
+
+    def publish(self, booking_ids: Iterable[Hashable]):
+        """Wake the subscribers of each booking; cheap when nobody is subscribed."""
+        with self._lock:
+            subs = [sub for booking_id in booking_ids for sub in self._subscribers.get(booking_id, ())]
+        for sub in subs:
+            sub.notify()
+
+    def publish_all(self):
+        with self._lock:
+            subs = [sub for subs in self._subscribers.values() for sub in subs]
+        for sub in subs:
+            sub.notify()
+
+    def stop_watches(self):
+        """Stop every backend listener (backend closed); subscribers are woken to re-read and keep local updates."""
+        with self._lock:
+            unwatch, self._unwatch = list(self._unwatch.values()), {}
+        for stop in unwatch:
+            stop()
+        self.publish_all()
+
+    def is_watched(self, booking_id: Hashable) -> bool:
+        with self._lock:
+            return booking_id in self._unwatch
+
+    def subscriber_count(self, booking_id: Hashable) -> int:
+        with self._lock:
+            return len(self._subscribers.get(booking_id, ()))
+
+    def _start_watch(self, booking_id: Hashable):
+        try:
+            stop = self._watch(booking_id, lambda: self.publish([booking_id]))
+        except Exception as e:
+            print(f"⚠️  Booking listener for {booking_id} unavailable, using local updates only: {e}")
+            return
+        if stop is None:
+            return
+        with self._lock:
+            # The last subscriber may have left while the listener was starting
+            if self._subscribers.get(booking_id) and booking_id not in self._unwatch:
+                self._unwatch[booking_id] = stop
+                stop = None
+        if stop is not None:
+            stop()
+
+    def _unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.booking_id)
+            if subs is None:
+                return
+            subs.discard(sub)
+            if subs:
+                return
+            del self._subscribers[sub.booking_id]
+            stop = self._unwatch.pop(sub.booking_id, None)
+        if stop is not None:
+            stop()
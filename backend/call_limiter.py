@@ -0,0 +1,230 @@
+"""
+Per-number limits for outbound calls.
+One phone number (the ElevenLabs agent number or our Twilio number) can only start so many
+calls at once and so many per second; calls sent past that fail at the carrier, which showed
+up as 'No response' results when a swarm went out all at once. Each number gets a
+NumberLimiter: at most CALL_MAX_CONCURRENT_PER_NUMBER live calls at a time, paced by a token
+bucket refilled at CALLS_PER_SECOND_PER_NUMBER (bursts of CALL_BURST_PER_NUMBER). A placed call
+keeps its turn until its webhook reports the end (release_call by conversation_id / call_sid),
+or for CALL_LIVE_TTL_SECONDS if none arrives. Calls past either limit wait their turn instead
+of failing, for up to CALL_QUEUE_TIMEOUT_SECONDS. Limits are per process.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, List, Optional
+
+CALL_MAX_CONCURRENT_PER_NUMBER = int(os.getenv('CALL_MAX_CONCURRENT_PER_NUMBER', '2'))
+CALLS_PER_SECOND_PER_NUMBER = float(os.getenv('CALLS_PER_SECOND_PER_NUMBER', '1'))
+CALL_BURST_PER_NUMBER = int(os.getenv('CALL_BURST_PER_NUMBER', '1'))
+CALL_QUEUE_TIMEOUT_SECONDS = float(os.getenv('CALL_QUEUE_TIMEOUT_SECONDS', '120'))
+# A live call whose end was never reported gives its turn back after this long
+CALL_LIVE_TTL_SECONDS = float(os.getenv('CALL_LIVE_TTL_SECONDS', '1800'))
+
+# Async waiters held back by the concurrency cap (not the rate) check again this often
+CALL_LIMIT_POLL_SECONDS = 0.05
+
+
+class NumberBusy(RuntimeError):
+    """A call waited CALL_QUEUE_TIMEOUT_SECONDS for its number without getting a turn."""
+
+    def __init__(self, number: str, waited: float):
+        super().__init__(f'Outbound number {number} still busy after {waited:.0f}s')
+        self.number = number
+
+
+class _LiveCall:
+    __slots__ = ('keys', 'expires_at', 'released')
+
+    def __init__(self, keys: List[str], expires_at: float):
+        self.keys = keys
+        self.expires_at = expires_at
+        self.released = False
+
+
+class NumberLimiter:
+    """Concurrency cap on live calls plus token bucket for one outbound number (0 disables either limit)."""
+
+    def __init__(self, number: str, max_concurrent: int = CALL_MAX_CONCURRENT_PER_NUMBER,
+                 calls_per_second: float = CALLS_PER_SECOND_PER_NUMBER, burst: int = CALL_BURST_PER_NUMBER,
+                 live_ttl_seconds: float = CALL_LIVE_TTL_SECONDS):
+        self.number = number
+        self.max_concurrent = max_concurrent
+        self.calls_per_second = calls_per_second
+        self.burst = max(1, burst)
+        self.live_ttl_seconds = live_ttl_seconds
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self._waiting = 0
+        self._counts = {'placed': 0, 'queued': 0, 'timed_out': 0}
+        self._calls: Dict[str, _LiveCall] = {}
+        # Held calls in expiry order (the TTL is fixed, so that is also placement order)
+        self._live: Deque[_LiveCall] = deque()
+
+    @contextmanager
+    def slot(self, timeout: float = CALL_QUEUE_TIMEOUT_SECONDS):
+        """Hold a turn on this number for the block, waiting up to timeout (raises NumberBusy)."""
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slot_async(self, timeout: float = CALL_QUEUE_TIMEOUT_SECONDS):
+        await self.acquire_async(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, timeout: float = CALL_QUEUE_TIMEOUT_SECONDS):
+        started = time.monotonic()
+        with self._cond:
+            wait = self._take()
+            if wait == 0:
+                return
+            self._queued()
+            try:
+                while wait != 0:
+                    remaining = started + timeout - time.monotonic()
+                    if remaining <= 0:
+                        self._counts['timed_out'] += 1
+                        raise NumberBusy(self.number, timeout)
+                    # Waiting for a release also ends when the oldest held call times out
+                    self._cond.wait(min(self._until_expiry() if wait is None else wait, remaining))
+                    wait = self._take()
+            finally:
+                self._waiting -= 1
+
+    async def acquire_async(self, timeout: float = CALL_QUEUE_TIMEOUT_SECONDS):
+        """acquire() for coroutines: waits on the event loop, not a thread."""
+        started = time.monotonic()
+        with self._cond:
+            wait = self._take()
+            if wait == 0:
+                return
+            self._queued()
+        try:
+            while wait != 0:
+                remaining = started + timeout - time.monotonic()
+                if remaining <= 0:
+                    with self._cond:
+                        self._counts['timed_out'] += 1
+                    raise NumberBusy(self.number, timeout)
+                await asyncio.sleep(min(CALL_LIMIT_POLL_SECONDS if wait is None else wait, remaining))
+                with self._cond:
+                    wait = self._take()
+        finally:
+            with self._cond:
+                self._waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def hold(self, *call_keys: Optional[str]):
+        """
+        The call on an acquired turn went out: keep the turn until release_call() with one of
+        call_keys (its conversation_id / call_sid) or the live TTL. Without a key it is released now.
+        """
+        keys = [k for k in call_keys if k]
+        if not keys:
+            self.release()
+            return
+        with self._cond:
+            call = _LiveCall(keys, time.monotonic() + self.live_ttl_seconds)
+            for key in keys:
+                self._calls[key] = call
+            self._live.append(call)
+
+    def release_call(self, call_key: str) -> bool:
+        """The call with this conversation_id / call_sid ended: give its turn back. False if it isn't held here."""
+        with self._cond:
+            call = self._calls.get(call_key)
+            if call is None:
+                return False
+            self._end(call)
+        return True
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._expire(time.monotonic())
+            return {'in_flight': self._in_flight, 'waiting': self._waiting,
+                    'live': sum(not c.released for c in self._live), **self._counts}
+
+    def _end(self, call: _LiveCall):
+        if call.released:
+            return
+        call.released = True
+        for key in call.keys:
+            self._calls.pop(key, None)
+        self._in_flight -= 1
+        self._cond.notify()
+
+    def _until_expiry(self) -> float:
+        live = next((c for c in self._live if not c.released), None)
+        return float('inf') if live is None else max(live.expires_at - time.monotonic(), 0.001)
+
+    def _expire(self, now: float):
+        while self._live and (self._live[0].released or self._live[0].expires_at <= now):
+            call = self._live.popleft()
+            if not call.released:
+                print(f"⚠️  No end reported for call {call.keys[0]} on {self.number}; freeing its turn")
+            self._end(call)
+
+    def _queued(self):
+        self._waiting += 1
+        self._counts['queued'] += 1
+
+    def _take(self) -> Optional[float]:
+        """Take a turn if both limits allow: 0 when taken, else seconds until a token is due (None: wait for a release)."""
+        if self.calls_per_second > 0:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.calls_per_second)
+            self._refilled_at = now
+        self._expire(time.monotonic())
+        if 0 < self.max_concurrent <= self._in_flight:
+            return None
+        if self.calls_per_second > 0:
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.calls_per_second
+            self._tokens -= 1
+        self._in_flight += 1
+        self._counts['placed'] += 1
+        return 0
+
+
+_limiters: Dict[str, NumberLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(number: str) -> NumberLimiter:
+    """The shared limiter for an outbound number (created with the configured limits on first use)."""
+    with _limiters_lock:
+        limiter = _limiters.get(number)
+        if limiter is None:
+            limiter = _limiters[number] = NumberLimiter(number)
+        return limiter
+
+
+def release_call(call_key: Optional[str]) -> bool:
+    """Give back the turn held by the call with this conversation_id / call_sid, on whichever number placed it."""
+    if not call_key:
+        return False
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return any(limiter.release_call(call_key) for limiter in limiters)
+
+
+def stats() -> dict:
+    """{number: limiter stats} for every number used by this process."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.number: limiter.stats() for limiter in limiters}
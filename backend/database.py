@@ -2,19 +2,35 @@
 Firestore Database for CallPilot
 Stores bookings, tasks, waitlist, and allowed emails with persistence across deploys.
 Falls back to SQLite if GOOGLE_CLOUD_PROJECT is not set (local dev without GCP).
+
+The storage engine lives in the storage package; this module picks one backend
+(STORAGE_BACKEND=firestore|sqlite|memory, otherwise auto-detected) the first time
+it is used and exposes its operations as plain functions.
 """
 
-import json
 import os
-from datetime import datetime
-from typing import Optional, List
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, List, Tuple
 
-# ---------------------------------------------------------------------------
-# Firestore client (initialised lazily so import never fails)
-# ---------------------------------------------------------------------------
+from allowlist_cache import AllowListCache
+from booking_cache import ReadThroughCache
+from booking_events import BookingChangeBus, Subscription
+from storage import BACKENDS, BookingConflict, StorageBackend, create_backend
 
-_firestore_db = None
+_SQLITE_PATH = os.path.join(os.path.dirname(__file__), 'callpilot.db')
 _USE_FIRESTORE: Optional[bool] = None
+_BACKEND: Optional[StorageBackend] = None
+
+# Retention policy (run_retention): completed bookings move to the archive after this many days,
+# tasks abandoned while still gathering info are deleted after this many; 0 disables either.
+BOOKING_RETENTION_DAYS = float(os.getenv('BOOKING_RETENTION_DAYS', '90'))
+TASK_RETENTION_DAYS = float(os.getenv('TASK_RETENTION_DAYS', '14'))
+RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', '200'))
+
+# Keep the allow-list cache current from the backend's change feed (Firestore snapshot listener)
+ALLOWLIST_LIVE_UPDATES = os.getenv('ALLOWLIST_LIVE_UPDATES', '').lower() in ('1', 'true', 'yes')
 
 
 def _use_firestore() -> bool:
@@ -41,89 +57,97 @@ def _use_firestore() -> bool:
     return _USE_FIRESTORE
 
 
-def _get_fs():
-    """Return the Firestore client (lazy init)."""
-    global _firestore_db
-    if _firestore_db is None:
-        from google.cloud import firestore
-        _firestore_db = firestore.Client()
-    return _firestore_db
+def _backend() -> StorageBackend:
+    """Return the storage backend, choosing it on first use."""
+    global _BACKEND
+    if _BACKEND is None:
+        kind = os.getenv('STORAGE_BACKEND', '').strip().lower()
+        if kind not in BACKENDS:
+            kind = 'firestore' if _use_firestore() else 'sqlite'
+        _BACKEND = create_backend(kind, sqlite_path=_SQLITE_PATH)
+    return _BACKEND
 
 
-# ---------------------------------------------------------------------------
-# SQLite fallback (for local dev without GCP)
-# ---------------------------------------------------------------------------
-import sqlite3
+def close_db():
+    """Release the backend's connections and forget it; the next call selects it again (tests, shutdown)."""
+    global _BACKEND
+    _booking_cache.clear()
+    _booking_events.stop_watches()
+    _stop_allowlist_watch()
+    _allowed_emails.clear()
+    if _BACKEND is not None:
+        _BACKEND.close()
+        _BACKEND = None
 
-_SQLITE_PATH = os.path.join(os.path.dirname(__file__), 'callpilot.db')
 
+# Booking reads (status polling) go through this cache; every booking write below invalidates it
+_booking_cache = ReadThroughCache(
+    lambda booking_id: _backend().get_booking(booking_id) or _backend().get_archived_booking(booking_id))
 
-def _sqlite_conn():
-    return sqlite3.connect(_SQLITE_PATH)
 
+# WAITLIST_MODE checks every protected request against the allow-list; it is held in memory
+_allowed_emails = AllowListCache(lambda: [row['email'] for row in _backend().get_allowed_emails()])
+_allowlist_watch_lock = threading.Lock()
+_allowlist_unwatch: Optional[Callable[[], None]] = None
+_allowlist_watch_started = False
 
-def _add_column_if_missing(cursor, table: str, column: str, col_type: str):
-    cursor.execute(f"PRAGMA table_info({table})")
-    columns = [row[1] for row in cursor.fetchall()]
-    if column not in columns:
-        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
 
+def _start_allowlist_watch():
+    """Subscribe the allow-list cache to the backend's change feed once, if enabled and supported."""
+    global _allowlist_unwatch, _allowlist_watch_started
+    if not ALLOWLIST_LIVE_UPDATES or _allowlist_watch_started:
+        return
+    with _allowlist_watch_lock:
+        if _allowlist_watch_started:
+            return
+        _allowlist_watch_started = True
+        try:
+            _allowlist_unwatch = _backend().watch_allowed_emails(_allowed_emails.replace)
+        except Exception as e:
+            print(f"⚠️  Allow-list live updates unavailable, refreshing on an interval: {e}")
 
-# ---------------------------------------------------------------------------
-# init_db
-# ---------------------------------------------------------------------------
 
-def init_db():
-    if _use_firestore():
-        print("✅ Using Firestore for persistent storage")
-        return
+def _stop_allowlist_watch():
+    global _allowlist_unwatch, _allowlist_watch_started
+    with _allowlist_watch_lock:
+        if _allowlist_unwatch is not None:
+            _allowlist_unwatch()
+        _allowlist_unwatch, _allowlist_watch_started = None, False
 
-    # SQLite fallback
-    conn = _sqlite_conn()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
-            booking_id TEXT PRIMARY KEY,
-            user_id TEXT,
-            service_type TEXT NOT NULL,
-            location TEXT NOT NULL,
-            timeframe TEXT NOT NULL,
-            status TEXT NOT NULL,
-            created_at REAL NOT NULL,
-            preferences TEXT,
-            results TEXT
-        )
-    ''')
-    _add_column_if_missing(cursor, 'bookings', 'user_id', 'TEXT')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tasks (
-            task_id TEXT PRIMARY KEY,
-            user_id TEXT,
-            status TEXT NOT NULL,
-            extracted_data TEXT,
-            conversation TEXT,
-            created_at REAL NOT NULL,
-            updated_at REAL NOT NULL
-        )
-    ''')
-    _add_column_if_missing(cursor, 'tasks', 'user_id', 'TEXT')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS waitlist (
-            email TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            created_at REAL NOT NULL,
-            confirmation_sent_at REAL
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS allowed_emails (
-            email TEXT PRIMARY KEY,
-            added_at REAL NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    print(f"✅ Database initialized at {_SQLITE_PATH} (SQLite fallback)")
+
+def _watch_booking(booking_id: str, on_change):
+    def _changed():
+        # The change may come from another instance, so this process's cached copy is stale
+        _booking_cache.invalidate(booking_id)
+        on_change()
+    return _backend().watch_booking(booking_id, _changed)
+
+
+# Subscribers to a booking (the progress stream) are woken by the writes below and the backend's change feed
+_booking_events = BookingChangeBus(_watch_booking)
+
+
+@contextmanager
+def _writing_bookings(booking_ids: Optional[Iterable[str]] = None):
+    """
+    Invalidate cached bookings once the write in the block is done (or failed) and wake their
+    subscribers; None = all bookings.
+    """
+    try:
+        yield
+    finally:
+        if booking_ids is None:
+            _booking_cache.clear()
+            _booking_events.publish_all()
+        else:
+            booking_ids = list(booking_ids)
+            for booking_id in booking_ids:
+                _booking_cache.invalidate(booking_id)
+            _booking_events.publish(booking_ids)
+
+
+def init_db():
+    _backend().init_db()
 
 
 # ---------------------------------------------------------------------------
@@ -131,299 +155,289 @@ def init_db():
 # ---------------------------------------------------------------------------
 
 def create_booking(booking_id: str, service_type: str, location: str, timeframe: str, preferences: dict, user_id: Optional[str] = None) -> dict:
-    now = datetime.now().timestamp()
-    booking = {
-        'booking_id': booking_id,
-        'user_id': user_id,
-        'service_type': service_type,
-        'location': location,
-        'timeframe': timeframe,
-        'status': 'processing',
-        'created_at': now,
-        'preferences': preferences,
-        'results': [],
-    }
-
-    if _use_firestore():
-        _get_fs().collection('bookings').document(booking_id).set(booking)
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO bookings (booking_id, user_id, service_type, location, timeframe, status, created_at, preferences, results)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (booking_id, user_id, service_type, location, timeframe, 'processing', now, json.dumps(preferences), json.dumps([])))
-        conn.commit()
-        conn.close()
+    return _backend().create_booking(booking_id, service_type, location, timeframe, preferences, user_id)
+
 
+def get_booking(booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Booking with results, served from the read-through cache (see booking_cache).
+    Archived bookings are found too; they carry an 'archived_at' timestamp.
+    """
+    booking = _booking_cache.get(booking_id)
+    if booking is None or (user_id is not None and booking.get('user_id') != user_id):
+        return None
     return booking
 
 
-def get_booking(booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
-    if _use_firestore():
-        doc = _get_fs().collection('bookings').document(booking_id).get()
-        if not doc.exists:
-            return None
-        data = doc.to_dict()
-        if user_id is not None and data.get('user_id') != user_id:
-            return None
-        return data
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        if user_id is not None:
-            cursor.execute('SELECT * FROM bookings WHERE booking_id = ? AND user_id = ?', (booking_id, user_id))
-        else:
-            cursor.execute('SELECT * FROM bookings WHERE booking_id = ?', (booking_id,))
-        row = cursor.fetchone()
-        conn.close()
-        if not row:
-            return None
-        return _row_to_booking(row)
-
-
-def _row_to_booking(row) -> dict:
-    if len(row) >= 9:
-        return {
-            'booking_id': row[0], 'user_id': row[1], 'service_type': row[2], 'location': row[3],
-            'timeframe': row[4], 'status': row[5], 'created_at': row[6],
-            'preferences': json.loads(row[7]) if row[7] else {},
-            'results': json.loads(row[8]) if row[8] else [],
-        }
-    return {
-        'booking_id': row[0], 'user_id': None, 'service_type': row[1], 'location': row[2],
-        'timeframe': row[3], 'status': row[4], 'created_at': row[5],
-        'preferences': json.loads(row[6]) if row[6] else {},
-        'results': json.loads(row[7]) if row[7] else [],
-    }
+def subscribe_booking(booking_id: str) -> Subscription:
+    """
+    Get woken when a booking changes: sub.wait(timeout) returns True after a change (re-read it
+    with get_booking), False on timeout. Close the subscription (or use it as a context manager).
+    """
+    return _booking_events.subscribe(booking_id)
 
 
 def update_booking_status(booking_id: str, status: str, results: Optional[List[dict]] = None):
-    if _use_firestore():
-        update = {'status': status}
-        if results is not None:
-            update['results'] = results
-        _get_fs().collection('bookings').document(booking_id).update(update)
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        if results is not None:
-            cursor.execute('UPDATE bookings SET status = ?, results = ? WHERE booking_id = ?',
-                           (status, json.dumps(results), booking_id))
-        else:
-            cursor.execute('UPDATE bookings SET status = ? WHERE booking_id = ?', (status, booking_id))
-        conn.commit()
-        conn.close()
+    with _writing_bookings([booking_id]):
+        _backend().update_booking_status(booking_id, status, results)
 
 
 def update_booking_results(booking_id: str, results: List[dict]):
-    if _use_firestore():
-        _get_fs().collection('bookings').document(booking_id).update({'results': results})
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE bookings SET results = ? WHERE booking_id = ?', (json.dumps(results), booking_id))
-        conn.commit()
-        conn.close()
+    """Replace the whole results list. Prefer update_booking_result when only one provider changed."""
+    with _writing_bookings([booking_id]):
+        _backend().update_booking_results(booking_id, results)
 
 
-def get_booking_by_conversation_id(conversation_id: str) -> Optional[tuple]:
-    """Find a processing booking that has a result with this conversation_id. Used by webhooks (no user filter)."""
-    if _use_firestore():
-        docs = _get_fs().collection('bookings').where('status', '==', 'processing').order_by('created_at', direction='DESCENDING').stream()
-        for doc in docs:
-            booking = doc.to_dict()
-            results = booking.get('results') or []
-            for idx, r in enumerate(results):
-                if (r.get('conversation_id') or r.get('call_sid')) == conversation_id:
-                    return booking, idx
-        return None, -1
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM bookings WHERE status = ? ORDER BY created_at DESC', ('processing',))
-        rows = cursor.fetchall()
-        conn.close()
-        for row in rows:
-            booking = _row_to_booking(row)
-            results = booking.get('results') or []
-            for idx, r in enumerate(results):
-                if (r.get('conversation_id') or r.get('call_sid')) == conversation_id:
-                    return booking, idx
-        return None, -1
-
-
-def get_all_bookings(user_id: Optional[str] = None) -> List[dict]:
-    if _use_firestore():
-        coll = _get_fs().collection('bookings')
-        if user_id is not None:
-            query = coll.where('user_id', '==', user_id).order_by('created_at', direction='DESCENDING')
-        else:
-            query = coll.order_by('created_at', direction='DESCENDING')
-        return [doc.to_dict() for doc in query.stream()]
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        if user_id is not None:
-            cursor.execute('SELECT * FROM bookings WHERE user_id = ? ORDER BY created_at DESC', (user_id,))
-        else:
-            cursor.execute('SELECT * FROM bookings ORDER BY created_at DESC')
-        rows = cursor.fetchall()
-        conn.close()
-        return [_row_to_booking(row) for row in rows]
+def update_booking_result(booking_id: str, index: int, result: dict):
+    """Atomically write one provider's result; cost is constant however many providers the booking has."""
+    with _writing_bookings([booking_id]):
+        _backend().update_booking_result(booking_id, index, result)
+
+
+def merge_booking_results(booking_id: str, updates: Dict[int, dict]):
+    """Atomically write several providers' results (index -> result); other providers are left untouched."""
+    with _writing_bookings([booking_id]):
+        _backend().merge_booking_results(booking_id, updates)
+
+
+# mutate_booking: how many times a read-modify-write is retried after losing to another writer
+BOOKING_CAS_RETRIES = int(os.getenv('BOOKING_CAS_RETRIES', '5'))
+
+
+def mutate_booking(booking_id: str, mutate: Callable[[dict], Optional[bool]], booking: Optional[dict] = None) -> Optional[dict]:
+    """
+    Read-modify-write a booking safely against concurrent writers: mutate(draft) edits the
+    booking's status and results in place (or returns False to skip the write), and the change
+    is applied only if nobody else wrote the booking meanwhile, otherwise mutate runs again on a
+    fresh copy. Pass a booking you just read to save the first read. Returns the booking as
+    written (None if it does not exist); raises BookingConflict after BOOKING_CAS_RETRIES retries.
+    """
+    with _writing_bookings([booking_id]):
+        return _backend().mutate_booking(booking_id, mutate, booking, retries=BOOKING_CAS_RETRIES)
+
+
+def create_bookings_many(bookings: List[dict]) -> List[dict]:
+    """
+    Create many bookings at once (seeding, migrations). Each item takes create_booking's
+    arguments as keys, plus optional 'status', 'created_at' and 'results'. SQLite writes
+    them in one transaction; Firestore streams them through a throttled BulkWriter.
+    """
+    return _backend().create_bookings_many(bookings)
+
+
+def update_results_many(results_by_booking: Dict[str, List[dict]]):
+    """Replace the results of many bookings at once ({booking_id: results}); see create_bookings_many."""
+    with _writing_bookings(results_by_booking):
+        _backend().update_results_many(results_by_booking)
+
+
+# Listings take summary=True for compact bookings: the headline fields (booking_id, user_id,
+# service_type, location, timeframe, status, created_at) plus a digest kept up to date on every
+# results write (result_count, completed_count, best_result) - no results or preferences are read.
+
+def get_all_bookings(user_id: Optional[str] = None, summary: bool = False) -> List[dict]:
+    return _backend().get_all_bookings(user_id, summary)
+
+
+def list_bookings(user_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None,
+                  summary: bool = False) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of bookings, newest first, keyset-paginated on (created_at, booking_id).
+    Returns (bookings, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed cursor.
+    """
+    return _backend().list_bookings(user_id, limit, cursor, summary)
+
+
+def get_bookings_by_ids(booking_ids: List[str], summary: bool = False) -> List[dict]:
+    """Fetch bookings by id (with results, or summaries), preserving the order of booking_ids and skipping missing ones."""
+    return _backend().get_bookings_by_ids(booking_ids, summary)
 
 
 def clear_all_bookings():
-    if _use_firestore():
-        _delete_collection('bookings')
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM bookings')
-        conn.commit()
-        conn.close()
+    with _writing_bookings():
+        _backend().clear_all_bookings()
     print("🗑️  All bookings cleared")
 
 
 def clean_db():
-    if _use_firestore():
-        _delete_collection('bookings')
-        _delete_collection('tasks')
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM bookings')
-        cursor.execute('DELETE FROM tasks')
-        conn.commit()
-        conn.close()
+    with _writing_bookings():
+        _backend().clean_db()
     print("🗑️  Database cleaned (bookings and tasks)")
 
 
+def delete_collection(name: str) -> int:
+    """Delete every record of a top-level collection (and its per-record children); returns how many were deleted."""
+    if name == 'allowed_emails':
+        try:
+            return _backend().delete_collection(name)
+        finally:
+            _allowed_emails.clear()
+    with _writing_bookings(None if name in ('bookings', 'archived_bookings') else ()):
+        return _backend().delete_collection(name)
+
+
+# ---------------------------------------------------------------------------
+# Retention
+# ---------------------------------------------------------------------------
+
+def archive_bookings(older_than: float, limit: int = RETENTION_BATCH_SIZE) -> int:
+    """Move one batch of completed bookings created before older_than into the archive; returns how many moved."""
+    with _writing_bookings():
+        return _backend().archive_bookings(older_than, limit)
+
+
+def expire_tasks(older_than: float, limit: int = RETENTION_BATCH_SIZE) -> int:
+    """Delete one batch of tasks still gathering info that were last updated before older_than."""
+    return _backend().expire_tasks(older_than, limit)
+
+
+def run_retention(booking_days: float = BOOKING_RETENTION_DAYS, task_days: float = TASK_RETENTION_DAYS,
+                  batch_size: int = RETENTION_BATCH_SIZE) -> dict:
+    """Apply the retention policy in bounded batches until nothing is left to move; returns the counts."""
+    now = time.time()
+    counts = {'archived_bookings': 0, 'expired_tasks': 0}
+    for key, days, step in (('archived_bookings', booking_days, archive_bookings),
+                            ('expired_tasks', task_days, expire_tasks)):
+        if days <= 0:
+            continue
+        while True:
+            moved = step(now - days * 86400, batch_size)
+            counts[key] += moved
+            if moved < batch_size:
+                break
+    print(f"🧊 Retention: archived {counts['archived_bookings']} bookings, expired {counts['expired_tasks']} tasks")
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# Call index: conversation_id / call_sid -> (booking_id, result index)
+# ---------------------------------------------------------------------------
+# Written alongside every results write that carries a conversation_id or call_sid
+# (make_real_calls records them when a call is initiated), so webhooks resolve their
+# booking with one point lookup instead of scanning every processing booking.
+
+def register_call(call_key: str, booking_id: str, result_index: int):
+    """Map a conversation_id or call_sid to its booking result (results writes do this automatically)."""
+    _backend().register_call(call_key, booking_id, result_index)
+
+
+def lookup_call(call_key: str) -> Optional[Tuple[str, int]]:
+    return _backend().lookup_call(call_key)
+
+
+def get_booking_by_conversation_id(conversation_id: str) -> Optional[tuple]:
+    """Find a processing booking that has a result with this conversation_id. Used by webhooks (no user filter)."""
+    return _backend().get_booking_by_conversation_id(conversation_id)
+
+
+# ---------------------------------------------------------------------------
+# Per-user dashboard stats
+# ---------------------------------------------------------------------------
+# A user_stats row/document per user holds running counters and a bounded list
+# of the most recent booking ids. create_booking, update_booking_status and the
+# results writers adjust it in the same transaction as the booking change, so
+# the dashboard reads O(1) records however long the user's history is.
+
+def get_user_stats(user_id: str) -> dict:
+    """
+    Return {'total_bookings', 'completed', 'processing', 'total_calls', 'recent_booking_ids'}.
+    Users whose stats predate the counters are backfilled once from their bookings.
+    """
+    return _backend().get_user_stats(user_id)
+
+
+def rebuild_user_stats(user_id: str) -> dict:
+    """Recompute a user's stats from their bookings (backfill / repair). Scans the user's full history."""
+    return _backend().rebuild_user_stats(user_id)
+
+
 # ---------------------------------------------------------------------------
 # Tasks
 # ---------------------------------------------------------------------------
+# Conversation messages are append-only records with a per-task sequence number.
+# The task itself keeps only a message_count, so a chat turn writes its new
+# messages instead of rewriting the whole conversation.
 
 def create_task(task_id: str, user_id: Optional[str] = None) -> dict:
-    now = datetime.now().timestamp()
-    task = {
-        'task_id': task_id,
-        'user_id': user_id,
-        'status': 'gathering_info',
-        'extracted_data': {},
-        'conversation': [],
-        'created_at': now,
-        'updated_at': now,
-    }
-    if _use_firestore():
-        _get_fs().collection('tasks').document(task_id).set(task)
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO tasks (task_id, user_id, status, extracted_data, conversation, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (task_id, user_id, 'gathering_info', json.dumps({}), json.dumps([]), now, now))
-        conn.commit()
-        conn.close()
-    return task
-
-
-def _row_to_task(row) -> dict:
-    if len(row) >= 7:
-        return {
-            'task_id': row[0], 'user_id': row[1], 'status': row[2],
-            'extracted_data': json.loads(row[3]) if row[3] else {},
-            'conversation': json.loads(row[4]) if row[4] else [],
-            'created_at': row[5], 'updated_at': row[6],
-        }
-    return {
-        'task_id': row[0], 'user_id': None, 'status': row[1],
-        'extracted_data': json.loads(row[2]) if row[2] else {},
-        'conversation': json.loads(row[3]) if row[3] else [],
-        'created_at': row[4], 'updated_at': row[5],
-    }
-
-
-def get_task(task_id: str, user_id: Optional[str] = None) -> Optional[dict]:
-    if _use_firestore():
-        doc = _get_fs().collection('tasks').document(task_id).get()
-        if not doc.exists:
-            return None
-        data = doc.to_dict()
-        if user_id is not None and data.get('user_id') != user_id:
-            return None
-        return data
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        if user_id is not None:
-            cursor.execute('SELECT * FROM tasks WHERE task_id = ? AND user_id = ?', (task_id, user_id))
-        else:
-            cursor.execute('SELECT * FROM tasks WHERE task_id = ?', (task_id,))
-        row = cursor.fetchone()
-        conn.close()
-        if not row:
-            return None
-        return _row_to_task(row)
+    return _backend().create_task(task_id, user_id)
 
 
-def update_task(task_id: str, status: str = None, extracted_data: dict = None, conversation: list = None, user_id: Optional[str] = None):
-    now = datetime.now().timestamp()
+def get_task(task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+             conversation_limit: Optional[int] = None) -> Optional[dict]:
+    """
+    Return the task, or None if missing / not owned by user_id.
+    The conversation is read only when include_conversation is set; conversation_limit
+    keeps just the last N messages (message_count always reports the full length).
+    """
+    return _backend().get_task(task_id, user_id, include_conversation, conversation_limit)
+
+
+def get_task_messages(task_id: str, limit: Optional[int] = None) -> List[dict]:
+    """Return the task's conversation in order, or only its last `limit` messages."""
+    return _backend().get_task_messages(task_id, limit)
 
-    if _use_firestore():
-        doc_ref = _get_fs().collection('tasks').document(task_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            return
-        data = doc.to_dict()
-        if user_id is not None and data.get('user_id') != user_id:
-            return
-        update = {'updated_at': now}
-        if status is not None:
-            update['status'] = status
-        if extracted_data is not None:
-            update['extracted_data'] = extracted_data
-        if conversation is not None:
-            update['conversation'] = conversation
-        doc_ref.update(update)
-    else:
-        task = get_task(task_id, user_id)
-        if not task:
-            return
-        if status is not None:
-            task['status'] = status
-        if extracted_data is not None:
-            task['extracted_data'] = extracted_data
-        if conversation is not None:
-            task['conversation'] = conversation
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE tasks SET status = ?, extracted_data = ?, conversation = ?, updated_at = ?
-            WHERE task_id = ?
-        ''', (task['status'], json.dumps(task['extracted_data']), json.dumps(task['conversation']), now, task_id))
-        conn.commit()
-        conn.close()
+
+def append_task_messages(task_id: str, messages: List[dict], status: str = None, extracted_data: dict = None,
+                         user_id: Optional[str] = None) -> bool:
+    """
+    Append messages to a task's conversation and optionally update status / extracted_data,
+    all in one transaction. Cost is proportional to the new messages, not the conversation.
+    Returns False if the task does not exist or is not owned by user_id.
+    """
+    return _backend().append_task_messages(task_id, messages, status, extracted_data, user_id)
+
+
+def update_task(task_id: str, status: str = None, extracted_data: dict = None, conversation: list = None, user_id: Optional[str] = None):
+    """Update task fields. Passing conversation replaces the whole conversation; prefer append_task_messages."""
+    _backend().update_task(task_id, status, extracted_data, conversation, user_id)
 
 
 def get_all_tasks(user_id: Optional[str] = None) -> List[dict]:
-    if _use_firestore():
-        coll = _get_fs().collection('tasks')
-        if user_id is not None:
-            query = coll.where('user_id', '==', user_id).order_by('updated_at', direction='DESCENDING')
-        else:
-            query = coll.order_by('updated_at', direction='DESCENDING')
-        return [doc.to_dict() for doc in query.stream()]
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        if user_id is not None:
-            cursor.execute('SELECT * FROM tasks WHERE user_id = ? ORDER BY updated_at DESC', (user_id,))
-        else:
-            cursor.execute('SELECT * FROM tasks ORDER BY updated_at DESC')
-        rows = cursor.fetchall()
-        conn.close()
-        return [_row_to_task(row) for row in rows]
+    """All tasks (with conversations), most recently updated first. Use list_tasks for paged listings."""
+    return _backend().get_all_tasks(user_id)
+
+
+def list_tasks(user_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of tasks, most recently updated first, keyset-paginated on (updated_at, task_id).
+    Tasks are returned without their conversation (see message_count; fetch it with get_task).
+    Returns (tasks, next_cursor); next_cursor is None on the last page.
+    Raises ValueError for a malformed cursor.
+    """
+    return _backend().list_tasks(user_id, limit, cursor)
+
+
+# ---------------------------------------------------------------------------
+# Jobs
+# ---------------------------------------------------------------------------
+# Durable background work, run by worker processes (worker.py) rather than the web process.
+# A worker claims a job under a lease it keeps renewing; if the worker dies the lease runs
+# out and another worker claims the job again (attempts counts every claim).
+
+def enqueue_job(job_id: str, kind: str, payload: dict, max_attempts: int = 3, run_at: Optional[float] = None) -> dict:
+    return _backend().enqueue_job(job_id, kind, payload, max_attempts, run_at)
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    return _backend().get_job(job_id)
+
+
+def claim_job(worker_id: str, lease_seconds: float, kinds: Optional[List[str]] = None) -> Optional[dict]:
+    return _backend().claim_job(worker_id, lease_seconds, kinds)
+
+
+def renew_job_lease(job_id: str, worker_id: str, lease_seconds: float) -> bool:
+    return _backend().renew_job_lease(job_id, worker_id, lease_seconds)
+
+
+def complete_job(job_id: str, worker_id: str) -> bool:
+    return _backend().complete_job(job_id, worker_id)
+
+
+def fail_job(job_id: str, worker_id: str, error: str, retry_at: Optional[float] = None) -> bool:
+    """Record a failed attempt: retried from retry_at, or failed for good when retry_at is None."""
+    return _backend().fail_job(job_id, worker_id, error, retry_at)
 
 
 # ---------------------------------------------------------------------------
@@ -431,112 +445,37 @@ def get_all_tasks(user_id: Optional[str] = None) -> List[dict]:
 # ---------------------------------------------------------------------------
 
 def add_to_waitlist(email: str, name: str, confirmation_sent: bool = False) -> dict:
-    email_key = email.strip().lower()
-    name_clean = (name or '').strip()
-    now = datetime.now().timestamp()
-
-    if _use_firestore():
-        _get_fs().collection('waitlist').document(email_key).set({
-            'email': email_key,
-            'name': name_clean,
-            'created_at': now,
-            'confirmation_sent_at': now if confirmation_sent else None,
-        }, merge=True)
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO waitlist (email, name, created_at, confirmation_sent_at)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(email) DO UPDATE SET name = ?, confirmation_sent_at = ?
-        ''', (email_key, name_clean, now, now if confirmation_sent else None, name_clean, now if confirmation_sent else None))
-        conn.commit()
-        conn.close()
-
-    return {'email': email_key, 'name': name_clean, 'created_at': now}
+    return _backend().add_to_waitlist(email.strip().lower(), (name or '').strip(), confirmation_sent)
 
 
 def get_waitlist() -> List[dict]:
-    if _use_firestore():
-        docs = _get_fs().collection('waitlist').order_by('created_at', direction='DESCENDING').stream()
-        return [doc.to_dict() for doc in docs]
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('SELECT email, name, created_at, confirmation_sent_at FROM waitlist ORDER BY created_at DESC')
-        rows = cursor.fetchall()
-        conn.close()
-        return [{'email': r[0], 'name': r[1], 'created_at': r[2], 'confirmation_sent_at': r[3]} for r in rows]
+    return _backend().get_waitlist()
 
 
 def set_confirmation_sent(email: str):
-    email_key = email.strip().lower()
-    now = datetime.now().timestamp()
-    if _use_firestore():
-        _get_fs().collection('waitlist').document(email_key).update({'confirmation_sent_at': now})
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE waitlist SET confirmation_sent_at = ? WHERE email = ?', (now, email_key))
-        conn.commit()
-        conn.close()
+    _backend().set_confirmation_sent(email.strip().lower())
 
 
 def is_email_allowed(email: str) -> bool:
+    """
+    Answered from the in-memory allow-list (see allowlist_cache): reloaded every
+    ALLOWLIST_REFRESH_SECONDS, or kept live with ALLOWLIST_LIVE_UPDATES on Firestore.
+    """
     if not email:
         return False
-    email_key = email.strip().lower()
-    if _use_firestore():
-        doc = _get_fs().collection('allowed_emails').document(email_key).get()
-        return doc.exists
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('SELECT 1 FROM allowed_emails WHERE email = ?', (email_key,))
-        found = cursor.fetchone() is not None
-        conn.close()
-        return found
+    email = email.strip().lower()
+    if not _allowed_emails.enabled:
+        return _backend().is_email_allowed(email)
+    _start_allowlist_watch()
+    return _allowed_emails.contains(email)
 
 
 def add_allowed_email(email: str) -> dict:
-    email_key = email.strip().lower()
-    now = datetime.now().timestamp()
-    if _use_firestore():
-        _get_fs().collection('allowed_emails').document(email_key).set({'email': email_key, 'added_at': now})
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('INSERT OR IGNORE INTO allowed_emails (email, added_at) VALUES (?, ?)', (email_key, now))
-        conn.commit()
-        conn.close()
-    return {'email': email_key, 'added_at': now}
+    email = email.strip().lower()
+    row = _backend().add_allowed_email(email)
+    _allowed_emails.add(email)
+    return row
 
 
 def get_allowed_emails() -> List[dict]:
-    if _use_firestore():
-        docs = _get_fs().collection('allowed_emails').order_by('added_at', direction='DESCENDING').stream()
-        return [doc.to_dict() for doc in docs]
-    else:
-        conn = _sqlite_conn()
-        cursor = conn.cursor()
-        cursor.execute('SELECT email, added_at FROM allowed_emails ORDER BY added_at DESC')
-        rows = cursor.fetchall()
-        conn.close()
-        return [{'email': r[0], 'added_at': r[1]} for r in rows]
-
-
-# ---------------------------------------------------------------------------
-# Helpers
-# ---------------------------------------------------------------------------
-
-def _delete_collection(name: str, batch_size: int = 100):
-    """Delete all documents in a Firestore collection."""
-    coll = _get_fs().collection(name)
-    while True:
-        docs = list(coll.limit(batch_size).stream())
-        if not docs:
-            break
-        batch = _get_fs().batch()
-        for doc in docs:
-            batch.delete(doc.reference)
-        batch.commit()
+    return _backend().get_allowed_emails()
@@ -0,0 +1,119 @@
+"""
+Async variant of the database.py API for async handlers and the call dispatcher.
+
+Same store, same semantics, awaitable: on Firestore it uses AsyncClient, so independent
+reads and writes can be in flight together (see get_booking_with_stats); SQLite and the
+in-memory store run in worker threads. Only the request hot paths are covered; use
+database.py for everything else.
+
+Reads go to the backend rather than database.py's booking cache (whose single-flight
+waits would block the event loop), so they are always fresh. Writes invalidate that
+cache like their database.py counterparts.
+"""
+
+import asyncio
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+import database as db
+from storage import AsyncStorageBackend, create_async_backend
+
+# One backend per event loop: AsyncClient channels can't be shared across loops
+_BACKENDS: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncStorageBackend]' = weakref.WeakKeyDictionary()
+
+
+def _backend() -> AsyncStorageBackend:
+    """The async backend for the running loop, over database.py's current backend."""
+    sync = db._backend()
+    loop = asyncio.get_running_loop()
+    backend = _BACKENDS.get(loop)
+    if backend is None or backend.sync is not sync:
+        backend = _BACKENDS[loop] = create_async_backend(sync)
+    return backend
+
+
+async def close_db():
+    """Release the running loop's async backend (call before the loop closes)."""
+    backend = _BACKENDS.pop(asyncio.get_running_loop(), None)
+    if backend is not None:
+        await backend.close()
+
+
+# ---------------------------------------------------------------------------
+# Bookings
+# ---------------------------------------------------------------------------
+
+async def get_booking(booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+    """Booking with results; archived bookings are found too (with an 'archived_at' timestamp)."""
+    backend = _backend()
+    booking = await backend.get_booking(booking_id, user_id)
+    if booking is None:
+        booking = await backend.get_archived_booking(booking_id, user_id)
+    return booking
+
+
+async def get_booking_with_stats(booking_id: str, user_id: str) -> Tuple[Optional[dict], dict]:
+    """The user's booking and their dashboard stats, read concurrently."""
+    booking, stats = await asyncio.gather(get_booking(booking_id, user_id), get_user_stats(user_id))
+    return booking, stats
+
+
+async def update_booking_status(booking_id: str, status: str, results: Optional[List[dict]] = None):
+    with db._writing_bookings([booking_id]):
+        await _backend().update_booking_status(booking_id, status, results)
+
+
+async def update_booking_result(booking_id: str, index: int, result: dict):
+    """Atomically write one provider's result."""
+    with db._writing_bookings([booking_id]):
+        await _backend().update_booking_result(booking_id, index, result)
+
+
+async def merge_booking_results(booking_id: str, updates: Dict[int, dict]):
+    """Atomically write several providers' results (index -> result)."""
+    with db._writing_bookings([booking_id]):
+        await _backend().merge_booking_results(booking_id, updates)
+
+
+# ---------------------------------------------------------------------------
+# Call index
+# ---------------------------------------------------------------------------
+
+async def lookup_call(call_key: str) -> Optional[Tuple[str, int]]:
+    return await _backend().lookup_call(call_key)
+
+
+async def get_booking_by_conversation_id(conversation_id: str) -> Tuple[Optional[dict], int]:
+    """Find a processing booking that has a result with this conversation_id. Used by webhooks (no user filter)."""
+    return await _backend().get_booking_by_conversation_id(conversation_id)
+
+
+# ---------------------------------------------------------------------------
+# Per-user dashboard stats
+# ---------------------------------------------------------------------------
+
+async def get_user_stats(user_id: str) -> dict:
+    return await _backend().get_user_stats(user_id)
+
+
+# ---------------------------------------------------------------------------
+# Tasks
+# ---------------------------------------------------------------------------
+
+async def get_task(task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                   conversation_limit: Optional[int] = None) -> Optional[dict]:
+    return await _backend().get_task(task_id, user_id, include_conversation, conversation_limit)
+
+
+async def append_task_messages(task_id: str, messages: List[dict], status: str = None, extracted_data: dict = None,
+                               user_id: Optional[str] = None) -> bool:
+    return await _backend().append_task_messages(task_id, messages, status, extracted_data, user_id)
+
+
+# ---------------------------------------------------------------------------
+# Allowed emails
+# ---------------------------------------------------------------------------
+
+async def is_email_allowed(email: str) -> bool:
+    """Checked against database.py's in-memory allow-list (in a worker thread, as a reload can block)."""
+    return await asyncio.to_thread(db.is_email_allowed, email)
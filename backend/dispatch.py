@@ -0,0 +1,173 @@
+"""
+Bounded executor for background booking work (placing a booking's calls).
+Each booking request used to start its own thread, so a burst of requests meant hundreds
+of threads competing with the server's request threads. Work now runs on a fixed pool of
+DISPATCH_WORKERS threads; at most DISPATCH_QUEUE_SIZE more jobs wait for one, and past that
+the request is turned away (HTTP 429 with Retry-After) before anything is created for it.
+A slot is reserved first and the job submitted into it once the booking exists, so a
+booking is never created for work that was then rejected.
+"""
+import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque
+
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', '4'))
+DISPATCH_QUEUE_SIZE = int(os.getenv('DISPATCH_QUEUE_SIZE', '32'))
+
+# Retry-After bounds (seconds) for rejected work; the estimate in between comes from recent run times
+RETRY_AFTER_MIN_SECONDS = 1
+RETRY_AFTER_MAX_SECONDS = 60
+
+# How many recent jobs the wait/run time metrics cover
+METRICS_WINDOW = 512
+
+
+class DispatchFull(RuntimeError):
+    """Every worker is busy and the queue is full; retry_after is a suggested wait in seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'Dispatch queue full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class Reservation:
+    """A held slot in the executor: submit() one job into it, or close() to give it back."""
+
+    def __init__(self, executor: 'DispatchExecutor'):
+        self._executor = executor
+        self._open = True
+
+    def submit(self, fn: Callable, *args) -> Future:
+        if not self._open:
+            raise RuntimeError('Reservation already used')
+        self._open = False
+        return self._executor._enqueue(fn, args)
+
+    def close(self):
+        if self._open:
+            self._open = False
+            self._executor._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DispatchExecutor:
+    """Fixed worker pool with a bounded backlog that rejects instead of growing."""
+
+    def __init__(self, workers: int = DISPATCH_WORKERS, queue_size: int = DISPATCH_QUEUE_SIZE, name: str = 'dispatch'):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self._name = name
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._queue: 'queue.Queue' = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._busy = 0
+        self._counts = {'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self._waits: Deque[float] = deque(maxlen=METRICS_WINDOW)
+        self._runs: Deque[float] = deque(maxlen=METRICS_WINDOW)
+
+    def reserve(self) -> Reservation:
+        """Hold a slot for one job, or raise DispatchFull without waiting."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counts['rejected'] += 1
+            raise DispatchFull(self.retry_after())
+        return Reservation(self)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Run fn(*args) on a worker; raises DispatchFull when saturated."""
+        return self.reserve().submit(fn, *args)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: the backlog ahead, spread over the workers, at the recent run time."""
+        with self._lock:
+            runs = list(self._runs)
+        if not runs:
+            return RETRY_AFTER_MIN_SECONDS
+        backlog = self._queue.qsize() + 1
+        estimate = math.ceil(sum(runs) / len(runs) * backlog / self.workers)
+        return min(RETRY_AFTER_MAX_SECONDS, max(RETRY_AFTER_MIN_SECONDS, estimate))
+
+    def stats(self) -> dict:
+        """Queue depth, utilisation, counters and wait/run times (ms) over the recent window."""
+        with self._lock:
+            waits, runs = sorted(self._waits), list(self._runs)
+            return {
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'busy': self._busy,
+                'queued': self._queue.qsize(),
+                **self._counts,
+                'wait_ms': {
+                    'avg': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                    'p50': round(_percentile(waits, 0.50) * 1000, 1),
+                    'p95': round(_percentile(waits, 0.95) * 1000, 1),
+                    'max': round(waits[-1] * 1000, 1) if waits else 0.0,
+                },
+                'run_ms': {'avg': round(sum(runs) / len(runs) * 1000, 1) if runs else 0.0},
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once queued jobs have run."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def _enqueue(self, fn: Callable, args: tuple) -> Future:
+        future = Future()
+        with self._lock:
+            self._counts['submitted'] += 1
+            if not self._threads:
+                self._threads = [threading.Thread(target=self._work, name=f'{self._name}-{i}', daemon=True)
+                                 for i in range(self.workers)]
+                for t in self._threads:
+                    t.start()
+        self._queue.put((future, fn, args, time.monotonic()))
+        return future
+
+    def _release(self):
+        self._slots.release()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            future, fn, args, queued_at = job
+            started = time.monotonic()
+            with self._lock:
+                self._busy += 1
+                self._waits.append(started - queued_at)
+            ok = False
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(fn(*args))
+                ok = True
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                    self._runs.append(time.monotonic() - started)
+                    self._counts['completed' if ok else 'failed'] += 1
+                self._release()
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
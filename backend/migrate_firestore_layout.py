@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Copy Firestore bookings and tasks from the flat layout (bookings/{id}, tasks/{id}) to the
+per-user layout (users/{uid}/bookings/{id}, users/{uid}/tasks/{id}), with their results and
+messages subcollections.
+Run from the backend directory: python migrate_firestore_layout.py [--dry-run] [--delete-flat]
+
+A document is copied only when its target is missing or older (bookings by version, tasks by
+updated_at), so the script can be re-run safely and never overwrites what was written under the
+per-user layout after the deploy. Steps:
+  1. python migrate_firestore_layout.py
+  2. deploy with FIRESTORE_LAYOUT=per_user (create the indexes in scripts/create-firestore-indexes.sh first)
+  3. python migrate_firestore_layout.py --delete-flat   (copies flat documents written between
+     steps 1 and 2, then removes the flat collections)
+Collection-group queries match the flat collections too, so finish step 3 promptly: until then admin
+listings and retention jobs see both copies.
+Archives, the call index, user stats, the waitlist and allowed emails are shared by both layouts.
+"""
+
+import argparse
+import os
+import sys
+
+# Run from backend directory so storage is importable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage.firestore import FirestoreBackend, _version
+
+# Flat collection -> the subcollection each of its documents carries
+MIGRATED = {'bookings': 'results', 'tasks': 'messages'}
+
+# How recent a document is, from its data and its subcollection's documents: both only grow with writes
+FRESHNESS = {
+    'bookings': lambda data, children: _version(data, children),
+    'tasks': lambda data, children: data.get('updated_at') or 0,
+}
+
+
+def _children(ref, child: str) -> dict:
+    return {doc.id: doc.to_dict() for doc in ref.collection(child).stream()}
+
+
+def migrate_to_per_user(backend: FirestoreBackend, delete_flat: bool = False, dry_run: bool = False) -> dict:
+    """
+    Copy every flat booking and task under its user, unless the per-user copy is as recent;
+    returns {collection: documents copied}.
+    """
+    fs = backend.fs
+    counts = {}
+    for name, child in MIGRATED.items():
+        writer = None if dry_run else backend._bulk_writer()
+        freshness = FRESHNESS[name]
+        copied = 0
+        for doc in fs.collection(name).stream():
+            data = doc.to_dict()
+            target = backend.layout.collection(fs, name, data.get('user_id')).document(doc.id)
+            children = _children(doc.reference, child)
+            existing = {}
+            snapshot = target.get()
+            if snapshot.exists:
+                existing = _children(target, child)
+                if freshness(snapshot.to_dict(), list(existing.values())) >= freshness(data, list(children.values())):
+                    continue  # already copied, or written under the per-user layout since
+            copied += 1
+            if writer is None:
+                continue
+            writer.set(target, data)
+            for child_id, child_data in children.items():
+                writer.set(target.collection(child).document(child_id), child_data)
+            for child_id in existing.keys() - children.keys():
+                writer.delete(target.collection(child).document(child_id))
+        if writer is not None:
+            writer.close()
+        counts[name] = copied
+        if delete_flat and not dry_run:
+            fs.recursive_delete(fs.collection(name), bulk_writer=backend._bulk_writer())
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move Firestore bookings and tasks to the per-user layout.')
+    parser.add_argument('--dry-run', action='store_true', help='count what would be copied, write nothing')
+    parser.add_argument('--delete-flat', action='store_true',
+                        help='after copying, delete the flat bookings and tasks collections')
+    args = parser.parse_args()
+
+    counts = migrate_to_per_user(FirestoreBackend(layout='per_user'), delete_flat=args.delete_flat, dry_run=args.dry_run)
+    verb = 'Would copy' if args.dry_run else 'Copied'
+    print(f"✅ {verb} {counts['bookings']} bookings and {counts['tasks']} tasks to users/{{uid}}/...")
+    if args.delete_flat and not args.dry_run:
+        print("🗑️  Flat bookings and tasks collections deleted")
+
+
+if __name__ == '__main__':
+    main()
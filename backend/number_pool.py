@@ -0,0 +1,176 @@
+"""
+Pools of outbound phone numbers.
+A single caller number caps how many calls can be live at once, so ElevenLabs agent numbers
+(ELEVENLABS_AGENT_PHONE_NUMBER_IDS) and Twilio numbers (TWILIO_PHONE_NUMBERS) can be configured
+as comma-separated lists. Each call is assigned the healthy number with the fewest live calls and
+holds it until the call ends: the call's webhook releases it by conversation_id / call_sid (for
+calls placed by worker.py, the worker does once the webhook has recorded the end on the booking),
+or after NUMBER_POOL_CALL_TTL_SECONDS if no end is reported.
+A number whose calls fail NUMBER_POOL_MAX_FAILURES times in a row leaves the rotation for
+NUMBER_POOL_COOLDOWN_SECONDS, then gets another chance. Counts are per process; each number's
+call pacing is call_limiter's.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+NUMBER_POOL_MAX_FAILURES = int(os.getenv('NUMBER_POOL_MAX_FAILURES', '3'))
+NUMBER_POOL_COOLDOWN_SECONDS = float(os.getenv('NUMBER_POOL_COOLDOWN_SECONDS', '300'))
+NUMBER_POOL_CALL_TTL_SECONDS = float(os.getenv('NUMBER_POOL_CALL_TTL_SECONDS', '1800'))
+
+
+def numbers_from_env(list_var: str, single_var: str) -> List[str]:
+    """The numbers in list_var (comma-separated), else the one in single_var; blanks and repeats dropped."""
+    numbers = list(dict.fromkeys(n.strip() for n in os.getenv(list_var, '').split(',') if n.strip()))
+    if not numbers and os.getenv(single_var, '').strip():
+        numbers = [os.getenv(single_var).strip()]
+    return numbers
+
+
+class _Call:
+    __slots__ = ('number', 'keys', 'expires_at', 'released')
+
+    def __init__(self, number: str, keys: List[str], expires_at: float):
+        self.number = number
+        self.keys = keys
+        self.expires_at = expires_at
+        self.released = False
+
+
+class NumberPool:
+    """Least-loaded assignment over numbers, with live-call tracking and failure cooldown."""
+
+    def __init__(self, name: str, numbers: List[str], max_failures: int = NUMBER_POOL_MAX_FAILURES,
+                 cooldown_seconds: float = NUMBER_POOL_COOLDOWN_SECONDS,
+                 call_ttl_seconds: float = NUMBER_POOL_CALL_TTL_SECONDS):
+        if not numbers:
+            raise ValueError(f'Number pool {name!r} needs at least one number')
+        self.name = name
+        self.numbers = list(numbers)
+        self.max_failures = max_failures
+        self.cooldown_seconds = cooldown_seconds
+        self.call_ttl_seconds = call_ttl_seconds
+        self._lock = threading.Lock()
+        self._active = {n: 0 for n in self.numbers}
+        self._failures = {n: 0 for n in self.numbers}
+        self._out_until = {n: 0.0 for n in self.numbers}
+        self._last_assigned = {n: 0 for n in self.numbers}
+        self._assignments = 0
+        self._calls: Dict[str, _Call] = {}
+        # Live calls in expiry order (the TTL is fixed, so that is also placement order)
+        self._live: Deque[_Call] = deque()
+
+    def assign(self) -> str:
+        """
+        Take the least-loaded number in rotation (least recently assigned among equals) for one call;
+        report how the call went with placed(), failed() or abandon(). If every number is out of
+        rotation the least-loaded of all is used rather than refusing the call.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            healthy = [n for n in self.numbers if self._out_until[n] <= now] or self.numbers
+            number = min(healthy, key=lambda n: (self._active[n], self._last_assigned[n]))
+            self._assignments += 1
+            self._active[number] += 1
+            self._last_assigned[number] = self._assignments
+            return number
+
+    def placed(self, number: str, *call_keys: Optional[str]):
+        """The call went out: the number is healthy and stays held until release_call() with one of call_keys."""
+        keys = [k for k in call_keys if k]
+        with self._lock:
+            self._failures[number] = 0
+            if not keys:
+                self._active[number] -= 1  # nothing to release it by later
+                return
+            call = _Call(number, keys, time.monotonic() + self.call_ttl_seconds)
+            for key in keys:
+                self._calls[key] = call
+            self._live.append(call)
+
+    def failed(self, number: str):
+        """The call could not be placed from this number: count it towards taking the number out of rotation."""
+        with self._lock:
+            self._active[number] -= 1
+            self._count_failure(number)
+
+    def abandon(self, number: str):
+        """The call was never attempted (e.g. it gave up waiting its turn); says nothing about the number."""
+        with self._lock:
+            self._active[number] -= 1
+
+    def release_call(self, call_key: str, ok: bool = True) -> bool:
+        """
+        The call with this conversation_id / call_sid ended: free its number. ok=False (the call
+        failed to connect) counts as a failure of the number. False if this pool didn't place it.
+        """
+        with self._lock:
+            call = self._calls.get(call_key)
+            if call is None:
+                return False
+            self._release(call)
+            if not ok:
+                self._count_failure(call.number)
+        return True
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            return {
+                n: {'active': self._active[n], 'in_rotation': self._out_until[n] <= now,
+                    'consecutive_failures': self._failures[n]}
+                for n in self.numbers
+            }
+
+    def _count_failure(self, number: str):
+        self._failures[number] += 1
+        if self.max_failures > 0 and self._failures[number] >= self.max_failures:
+            self._out_until[number] = time.monotonic() + self.cooldown_seconds
+            self._failures[number] = 0
+            print(f"⚠️  Outbound number {number} ({self.name}) out of rotation for {self.cooldown_seconds:.0f}s "
+                  f"after {self.max_failures} failed calls")
+
+    def _release(self, call: _Call):
+        if call.released:
+            return
+        call.released = True
+        self._active[call.number] -= 1
+        for key in call.keys:
+            self._calls.pop(key, None)
+
+    def _expire(self, now: float):
+        while self._live and (self._live[0].released or self._live[0].expires_at <= now):
+            self._release(self._live.popleft())
+
+
+_pools: Dict[str, NumberPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(name: str, numbers: List[str]) -> NumberPool:
+    """The shared pool called name (created from numbers on first use)."""
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = NumberPool(name, numbers)
+        return pool
+
+
+def release_call(call_key: Optional[str], ok: bool = True) -> bool:
+    """Free the number held by the call with this conversation_id / call_sid, in whichever pool placed it."""
+    if not call_key:
+        return False
+    with _pools_lock:
+        pools = list(_pools.values())
+    return any(pool.release_call(call_key, ok) for pool in pools)
+
+
+def stats() -> dict:
+    """{pool name: {number: active calls, rotation and failure state}}."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
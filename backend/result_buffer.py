@@ -0,0 +1,127 @@
+"""
+Write-behind buffer for progressive booking result updates.
+While a booking is dialing, each provider's result moves through several short-lived
+states (pending -> calling -> in_progress/completed). Updates that arrive within a short
+window are merged per booking and written together with one database call; a call that
+reaches a terminal state is written immediately so the UI and stats never lag behind it.
+A batch whose write fails goes back into the buffer and is retried a window later, up to
+RESULT_WRITE_MAX_ATTEMPTS times.
+"""
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from storage.base import call_keys
+
+# How long an update may wait for others to the same booking before it is written
+RESULT_WRITE_WINDOW_MS = int(os.getenv('RESULT_WRITE_WINDOW_MS', '100'))
+# Failed writes of a booking's batch in a row before its updates are dropped
+RESULT_WRITE_MAX_ATTEMPTS = int(os.getenv('RESULT_WRITE_MAX_ATTEMPTS', '5'))
+
+# call_status values after which this process writes nothing more for that provider
+TERMINAL_CALL_STATUSES = ('completed', 'failed')
+
+
+class ResultWriteBuffer:
+    """Coalesces per-provider result writes into one write per booking per window."""
+
+    def __init__(self, write: Callable[[str, Dict[int, dict]], None], window_ms: int = RESULT_WRITE_WINDOW_MS,
+                 max_attempts: int = RESULT_WRITE_MAX_ATTEMPTS):
+        self._write = write
+        self._window = window_ms / 1000.0
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[int, dict]] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._failures: Dict[str, int] = {}
+        # Serializes writes per booking so an older batch never lands after a newer one
+        self._write_locks: Dict[str, threading.Lock] = {}
+
+    def put(self, booking_id: str, index: int, result: dict):
+        """Queue a provider's latest result; later results for the same index replace earlier ones."""
+        with self._lock:
+            self._pending.setdefault(booking_id, {})[index] = result
+            if booking_id not in self._write_locks:
+                self._write_locks[booking_id] = threading.Lock()
+            terminal = result.get('call_status') in TERMINAL_CALL_STATUSES
+            if not terminal:
+                self._schedule(booking_id)
+        if terminal or self._window <= 0:
+            self.flush(booking_id)
+
+    def flush(self, booking_id: Optional[str] = None):
+        """
+        Write everything pending for one booking (or all bookings) now. If the write raises, the
+        updates are put back (behind any newer ones) for a retry a window later and the error
+        is raised.
+        """
+        if booking_id is None:
+            with self._lock:
+                booking_ids = list(self._pending)
+            for bid in booking_ids:
+                self.flush(bid)
+            return
+        with self._lock:
+            write_lock = self._write_locks.get(booking_id)
+        if write_lock is None:
+            return
+        with write_lock:
+            with self._lock:
+                updates = self._pending.pop(booking_id, None)
+                timer = self._timers.pop(booking_id, None)
+                if not updates:
+                    self._write_locks.pop(booking_id, None)
+            if timer is not None:
+                timer.cancel()
+            if not updates:
+                return
+            try:
+                self._write(booking_id, updates)
+            except Exception as e:
+                self._requeue(booking_id, updates, e)
+                raise
+            with self._lock:
+                self._failures.pop(booking_id, None)
+
+    def flush_call(self, call_key: str):
+        """Write now whichever booking has a pending result for the call with this conversation_id / call_sid."""
+        with self._lock:
+            booking_ids = [bid for bid, updates in self._pending.items()
+                           if any(call_key in call_keys(r) for r in updates.values())]
+        for bid in booking_ids:
+            self.flush(bid)
+
+    def pending_count(self, booking_id: str) -> int:
+        """Number of provider results waiting to be written for a booking."""
+        with self._lock:
+            return len(self._pending.get(booking_id, {}))
+
+    def _requeue(self, booking_id: str, updates: Dict[int, dict], error: Exception):
+        with self._lock:
+            attempts = self._failures.get(booking_id, 0) + 1
+            if attempts >= self._max_attempts:
+                self._failures.pop(booking_id, None)
+                print(f"❌ Dropped {len(updates)} buffered results for booking {booking_id} "
+                      f"after {attempts} failed writes: {error}")
+                return
+            self._failures[booking_id] = attempts
+            # Anything put since the batch was taken is newer than it
+            self._pending[booking_id] = {**updates, **self._pending.get(booking_id, {})}
+            self._write_locks.setdefault(booking_id, threading.Lock())
+            self._schedule(booking_id)
+        print(f"❌ Failed to write buffered results for booking {booking_id} (attempt {attempts}), will retry: {error}")
+
+    def _schedule(self, booking_id: str):
+        """Start the window timer for a booking unless one is running (call with the lock held)."""
+        if booking_id in self._timers or self._window <= 0:
+            return
+        timer = threading.Timer(self._window, self._flush_quietly, args=(booking_id,))
+        timer.daemon = True
+        self._timers[booking_id] = timer
+        timer.start()
+
+    def _flush_quietly(self, booking_id: str):
+        try:
+            self.flush(booking_id)
+        except Exception:
+            pass  # flush logged it and put the updates back for another try
@@ -84,28 +84,30 @@ VET_RESULTS = [
 def main():
     db.init_db()
 
-    # 1. Dentist booking
+    # Both bookings are created (already completed, with results) in one bulk write
     dentist_id = str(uuid.uuid4())
-    db.create_booking(
-        booking_id=dentist_id,
-        service_type="dentist",
-        location="Cambridge, MA",
-        timeframe="this week",
-        preferences={"preferred_slots": "Tuesday or Wednesday morning"},
-    )
-    db.update_booking_status(dentist_id, "completed", DENTIST_RESULTS)
-    print(f"✅ Demo task 1: dentist in Cambridge, MA (completed) — {dentist_id[:8]}...")
-
-    # 2. Veterinarian booking
     vet_id = str(uuid.uuid4())
-    db.create_booking(
-        booking_id=vet_id,
-        service_type="veterinarian",
-        location="Cambridge, MA",
-        timeframe="this week",
-        preferences={},
-    )
-    db.update_booking_status(vet_id, "completed", VET_RESULTS)
+    db.create_bookings_many([
+        {
+            "booking_id": dentist_id,
+            "service_type": "dentist",
+            "location": "Cambridge, MA",
+            "timeframe": "this week",
+            "preferences": {"preferred_slots": "Tuesday or Wednesday morning"},
+            "status": "completed",
+            "results": DENTIST_RESULTS,
+        },
+        {
+            "booking_id": vet_id,
+            "service_type": "veterinarian",
+            "location": "Cambridge, MA",
+            "timeframe": "this week",
+            "preferences": {},
+            "status": "completed",
+            "results": VET_RESULTS,
+        },
+    ])
+    print(f"✅ Demo task 1: dentist in Cambridge, MA (completed) — {dentist_id[:8]}...")
     print(f"✅ Demo task 2: veterinarian in Cambridge, MA (completed) — {vet_id[:8]}...")
 
     print("\n🎬 Done. Open the dashboard Tasks page to see the two demo tasks.")
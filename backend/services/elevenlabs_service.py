@@ -6,10 +6,11 @@ conversation continues after the first message via prompt override (no first_mes
 """
 import os
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import requests
 import asyncio
 import time
+import httpx
 from elevenlabs import ElevenLabs
 
 # Use our booking agent prompts (first message + full system prompt)
@@ -22,6 +23,16 @@ except ImportError:
         sys.path.insert(0, _backend)
     from agent_prompts import get_first_message, get_agent_prompt
 
+from call_limiter import NumberBusy, limiter_for
+from number_pool import numbers_from_env, pool_for
+
+OUTBOUND_CALL_URL = "https://api.elevenlabs.io/v1/convai/twilio/outbound-call"
+OUTBOUND_CALL_TIMEOUT_SECONDS = 30
+
+# Swarm mode: how many outbound calls are being initiated at once. All of them share one
+# async HTTP client on one event loop, so a large fan-out costs no extra threads.
+SWARM_CONCURRENCY = int(os.getenv('SWARM_CONCURRENCY', '10'))
+
 
 class ElevenLabsService:
     """Service for managing ElevenLabs voice AI agents"""
@@ -33,7 +44,10 @@ class ElevenLabsService:
 
         self.client = ElevenLabs(api_key=self.api_key)
         self.agent_id = os.getenv('ELEVENLABS_AGENT_ID', '').strip()
-        self.agent_phone_number_id = os.getenv('ELEVENLABS_AGENT_PHONE_NUMBER_ID', '').strip()
+        # Outbound calls are spread over a pool of agent numbers (ELEVENLABS_AGENT_PHONE_NUMBER_IDS, comma-separated)
+        self.agent_phone_number_ids = numbers_from_env('ELEVENLABS_AGENT_PHONE_NUMBER_IDS', 'ELEVENLABS_AGENT_PHONE_NUMBER_ID')
+        self.agent_phone_number_id = self.agent_phone_number_ids[0] if self.agent_phone_number_ids else ''
+        self.number_pool = pool_for('elevenlabs', self.agent_phone_number_ids) if self.agent_phone_number_ids else None
         print(f"✅ ElevenLabs service initialized (agent_id={'set' if self.agent_id else 'not set'})")
 
     def create_booking_agent(self, provider_info: Dict, booking_context: Dict) -> str:
@@ -66,15 +80,101 @@ class ElevenLabsService:
         Uses get_first_message() and get_agent_prompt() as overrides so the agent
         says the right opening line and keeps the conversation going (multi-turn).
 
-        Requires ELEVENLABS_AGENT_ID and ELEVENLABS_AGENT_PHONE_NUMBER_ID to be set.
+        Requires ELEVENLABS_AGENT_ID and ELEVENLABS_AGENT_PHONE_NUMBER_ID (or _IDS) to be set.
         In dashboard, enable "System prompt" override for the agent (opening line is included in the prompt).
+        The call goes out from the least-loaded agent number (agent_phone_number_id in the result).
         """
-        if not self.agent_id or not self.agent_phone_number_id:
-            return {
-                'status': 'failed',
-                'error': 'ELEVENLABS_AGENT_ID and ELEVENLABS_AGENT_PHONE_NUMBER_ID must be set for ElevenLabs outbound calls',
-            }
+        if not self.agent_id or self.number_pool is None:
+            return self._not_configured()
+        number = self.number_pool.assign()
+        payload = self._outbound_call_payload(to_number, provider_name, booking_context, number)
+        limiter = limiter_for(number)
+        try:
+            # Calls from one agent number queue for their turn rather than failing at the carrier
+            limiter.acquire()
+        except NumberBusy as e:
+            self.number_pool.abandon(number)
+            print(f"❌ ElevenLabs outbound call to {to_number} not placed: {e}")
+            return {'status': 'failed', 'error': str(e)}
+        try:
+            resp = requests.post(OUTBOUND_CALL_URL, json=payload, headers=self._headers(),
+                                 timeout=OUTBOUND_CALL_TIMEOUT_SECONDS)
+            info = self._outbound_call_result(to_number, resp.status_code, resp.text, resp.json)
+        except Exception as e:
+            print(f"❌ ElevenLabs outbound call failed: {str(e)}")
+            info = {'status': 'failed', 'error': str(e)}
+        return self._report_placement(number, limiter, info)
 
+    async def make_elevenlabs_outbound_call_async(
+        self,
+        client: httpx.AsyncClient,
+        to_number: str,
+        provider_name: str,
+        booking_context: Dict,
+    ) -> Dict:
+        """
+        make_elevenlabs_outbound_call on an async HTTP client (same request, same result shape), plus
+        queued_ms (waiting for the agent number's turn) and initiation_ms (the API request itself).
+        """
+        if not self.agent_id or self.number_pool is None:
+            return self._not_configured()
+        number = self.number_pool.assign()
+        payload = self._outbound_call_payload(to_number, provider_name, booking_context, number)
+        limiter = limiter_for(number)
+        queued_at = time.perf_counter()
+        try:
+            await limiter.acquire_async()
+        except NumberBusy as e:
+            self.number_pool.abandon(number)
+            print(f"❌ ElevenLabs outbound call to {to_number} not placed: {e}")
+            return {'status': 'failed', 'error': str(e), 'queued_ms': round((time.perf_counter() - queued_at) * 1000, 1)}
+        started = time.perf_counter()
+        try:
+            resp = await client.post(OUTBOUND_CALL_URL, json=payload, headers=self._headers(),
+                                     timeout=OUTBOUND_CALL_TIMEOUT_SECONDS)
+            info = self._outbound_call_result(to_number, resp.status_code, resp.text, resp.json)
+        except asyncio.CancelledError:
+            # Nothing will report the end of a call cancelled mid-request
+            limiter.release()
+            self.number_pool.abandon(number)
+            raise
+        except Exception as e:
+            print(f"❌ ElevenLabs outbound call failed: {type(e).__name__}: {e}")
+            info = {'status': 'failed', 'error': str(e) or type(e).__name__}
+        info['queued_ms'] = round((started - queued_at) * 1000, 1)
+        info['initiation_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return self._report_placement(number, limiter, info)
+
+    def _report_placement(self, number: str, limiter, info: Dict) -> Dict:
+        """
+        A placed call holds the number's pool slot and limiter turn until its webhook; a failed one
+        gives the turn back and counts against the number.
+        """
+        info['agent_phone_number_id'] = number
+        if info.get('status') == 'initiated':
+            self.number_pool.placed(number, info.get('conversation_id'), info.get('call_sid'))
+            limiter.hold(info.get('conversation_id'), info.get('call_sid'))
+        else:
+            limiter.release()
+            self.number_pool.failed(number)
+        return info
+
+    @staticmethod
+    def _not_configured() -> Dict:
+        return {
+            'status': 'failed',
+            'error': 'ELEVENLABS_AGENT_ID and ELEVENLABS_AGENT_PHONE_NUMBER_ID (or _IDS) must be set for ElevenLabs outbound calls',
+        }
+
+    def _headers(self) -> Dict:
+        return {
+            "xi-api-key": self.api_key,
+            "Content-Type": "application/json",
+        }
+
+    def _outbound_call_payload(self, to_number: str, provider_name: str, booking_context: Dict,
+                               phone_number_id: str) -> Dict:
+        """Request body for an outbound call: agent prompt and dynamic variables built from booking_context."""
         service_type = booking_context.get('service_type', 'appointment')
         timeframe = booking_context.get('timeframe', 'this week')
         location = booking_context.get('location', '')
@@ -127,10 +227,9 @@ Then continue the conversation according to the rules below.
             "business_type": business_type or "",
         }
         # Use a direct HTTP request with a body that contains ONLY the prompt override (no first_message key).
-        url = "https://api.elevenlabs.io/v1/convai/twilio/outbound-call"
-        payload = {
+        return {
             "agent_id": self.agent_id,
-            "agent_phone_number_id": self.agent_phone_number_id,
+            "agent_phone_number_id": phone_number_id,
             "to_number": to_number,
             "conversation_initiation_client_data": {
                 "conversation_config_override": {
@@ -141,40 +240,34 @@ Then continue the conversation according to the rules below.
                 "dynamic_variables": dynamic_variables,
             },
         }
-        headers = {
-            "xi-api-key": self.api_key,
-            "Content-Type": "application/json",
-        }
 
-        try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=30)
-            if not resp.ok:
-                err = resp.text
-                try:
-                    body = resp.json()
-                    msg = body.get("message") or body.get("detail") or err
-                    err = msg if isinstance(msg, str) else str(body)
-                except Exception:
-                    pass
-                if resp.status_code == 404 and "document_not_found" in str(err).lower():
-                    print("❌ ElevenLabs outbound call failed: Phone number or agent not found. Check ELEVENLABS_AGENT_PHONE_NUMBER_ID and ELEVENLABS_AGENT_ID in .env — get the current IDs from the ElevenLabs dashboard (Phone Numbers and Agents).")
-                else:
-                    print(f"❌ ElevenLabs outbound call failed: {resp.status_code} {err}")
-                return {'status': 'failed', 'error': err if isinstance(err, str) else str(err)}
-            data = resp.json()
-            call_sid = data.get("call_sid") or data.get("callSid")
-            conversation_id = data.get("conversation_id")
-            print(f"✅ ElevenLabs outbound call started to {to_number} (conversation continues until hangup)")
-            return {
-                'call_sid': call_sid,
-                'conversation_id': conversation_id,
-                'status': 'initiated',
-                'to': to_number,
-                'from': 'elevenlabs',
-            }
-        except Exception as e:
-            print(f"❌ ElevenLabs outbound call failed: {str(e)}")
-            return {'status': 'failed', 'error': str(e)}
+    @staticmethod
+    def _outbound_call_result(to_number: str, status_code: int, text: str, read_json: Callable[[], Dict]) -> Dict:
+        """Call info from the outbound-call response (requests and httpx responses alike)."""
+        if status_code >= 400:
+            err = text
+            try:
+                body = read_json()
+                msg = body.get("message") or body.get("detail") or err
+                err = msg if isinstance(msg, str) else str(body)
+            except Exception:
+                pass
+            if status_code == 404 and "document_not_found" in str(err).lower():
+                print("❌ ElevenLabs outbound call failed: Phone number or agent not found. Check ELEVENLABS_AGENT_PHONE_NUMBER_ID and ELEVENLABS_AGENT_ID in .env — get the current IDs from the ElevenLabs dashboard (Phone Numbers and Agents).")
+            else:
+                print(f"❌ ElevenLabs outbound call failed: {status_code} {err}")
+            return {'status': 'failed', 'error': err if isinstance(err, str) else str(err)}
+        data = read_json()
+        call_sid = data.get("call_sid") or data.get("callSid")
+        conversation_id = data.get("conversation_id")
+        print(f"✅ ElevenLabs outbound call started to {to_number} (conversation continues until hangup)")
+        return {
+            'call_sid': call_sid,
+            'conversation_id': conversation_id,
+            'status': 'initiated',
+            'to': to_number,
+            'from': 'elevenlabs',
+        }
 
     async def initiate_call(self, agent_id: str, phone_number: str, context: Dict) -> Dict:
         """
@@ -256,46 +349,53 @@ Then continue the conversation according to the rules below.
                 'next_available': 'in 3 weeks'
             }
 
-    async def parallel_calls(self, providers: List[Dict], context: Dict) -> List[Dict]:
+    async def parallel_calls(
+        self,
+        providers: List[Dict],
+        context: Dict,
+        concurrency: int = SWARM_CONCURRENCY,
+        on_result: Optional[Callable[[int, Dict], None]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+    ) -> List[Dict]:
         """
-        Initiate parallel calls to multiple providers (Swarm Mode)
-        This is the KEY CallPilot feature - calling 15 providers simultaneously
+        Swarm mode: place real outbound calls to every provider, at most `concurrency` being
+        initiated at a time, over one async HTTP client.
 
-        Args:
-            providers: List of provider information dictionaries
-            context: Booking context (service type, timeframe, etc.)
-
-        Returns:
-            results: List of call results from all providers
+        Returns one call info per provider, in provider order (see make_elevenlabs_outbound_call_async,
+        including its queued_ms / initiation_ms timings). Calls also wait for the agent number's
+        limits (call_limiter). on_result(index, info) runs as each call is placed, so progress can be
+        recorded early.
         """
-        print(f"🚀 SWARM MODE: Calling {len(providers)} providers in parallel...")
-
-        # Create tasks for all calls
-        tasks = []
-        for provider in providers:
-            # Create agent for this provider
-            agent_id = self.create_booking_agent(provider, context)
-
-            # Create async task for the call
-            task = self.initiate_call(agent_id, provider['phone'], context)
-            tasks.append(task)
-
-        # Execute all calls in parallel
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Filter out exceptions and format results
-        successful_results = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                print(f"❌ Call to {providers[i]['name']} failed: {str(result)}")
-            else:
-                successful_results.append({
-                    'provider': providers[i],
-                    'call_result': result
-                })
+        print(f"🚀 SWARM MODE: Calling {len(providers)} providers, {concurrency} at a time...")
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+        async def _call(i: int, provider: Dict, http: httpx.AsyncClient) -> Dict:
+            ctx = {
+                **context,
+                'business_name': provider.get('name', ''),
+                'business_type': provider.get('business_type') or context.get('service_type', ''),
+            }
+            try:
+                async with slots:
+                    info = await self.make_elevenlabs_outbound_call_async(http, provider['phone'], provider.get('name', ''), ctx)
+            except Exception as e:
+                # Failures are reported per call; one call's bug must not cancel the rest of the swarm
+                print(f"❌ Swarm call to {provider.get('name', '')} raised {type(e).__name__}: {e}")
+                info = {'status': 'failed', 'error': str(e) or type(e).__name__}
+            if on_result is not None:
+                on_result(i, info)
+            return info
+
+        if client is not None:
+            results = await asyncio.gather(*(_call(i, p, client) for i, p in enumerate(providers)))
+        else:
+            limits = httpx.Limits(max_connections=max(1, concurrency), max_keepalive_connections=max(1, concurrency))
+            async with httpx.AsyncClient(limits=limits, timeout=OUTBOUND_CALL_TIMEOUT_SECONDS) as http:
+                results = await asyncio.gather(*(_call(i, p, http) for i, p in enumerate(providers)))
 
-        print(f"✅ Swarm complete: {len(successful_results)}/{len(providers)} calls successful")
-        return successful_results
+        placed = sum(1 for r in results if r.get('status') == 'initiated')
+        print(f"✅ Swarm complete: {placed}/{len(providers)} calls initiated")
+        return list(results)
 
 
 # Singleton instance
@@ -5,7 +5,10 @@ Handles phone call infrastructure
 import os
 from urllib.parse import urlencode
 from twilio.rest import Client
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+
+from call_limiter import NumberBusy, limiter_for
+from number_pool import numbers_from_env, pool_for
 
 class TwilioService:
     """Service for managing Twilio phone calls"""
@@ -13,21 +16,52 @@ class TwilioService:
     def __init__(self):
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-        self.phone_number = os.getenv('TWILIO_PHONE_NUMBER')
+        # Calls are spread over a pool of caller numbers (TWILIO_PHONE_NUMBERS, comma-separated)
+        self.phone_numbers = numbers_from_env('TWILIO_PHONE_NUMBERS', 'TWILIO_PHONE_NUMBER')
+        self.phone_number = self.phone_numbers[0] if self.phone_numbers else None
         self.test_number = os.getenv('TEST_CALL_NUMBER')  # Your cofounder's number
 
         if not all([self.account_sid, self.auth_token, self.phone_number]):
             raise ValueError("Twilio credentials not found in environment variables")
 
         self.client = Client(self.account_sid, self.auth_token)
-        print(f"✅ Twilio service initialized (From: {self.phone_number})")
+        self.number_pool = pool_for('twilio', self.phone_numbers)
+        print(f"✅ Twilio service initialized (From: {', '.join(self.phone_numbers)})")
 
     def make_call(self, to_number: str, agent_prompt: str, booking_context: Dict, provider_name: Optional[str] = None) -> Dict:
         """
         Initiate a phone call using Twilio.
         When TWILIO_WEBHOOK_BASE_URL is set, uses the voice webhook for multi-turn conversation.
         Otherwise uses inline TwiML (single message then record).
+        The call goes out from the least-loaded number in the pool, which waits for its turn
+        (call_limiter) instead of failing at the carrier and is held until the call ends.
         """
+        from_number = self.number_pool.assign()
+        limiter = limiter_for(from_number)
+        try:
+            limiter.acquire()
+        except NumberBusy as e:
+            self.number_pool.abandon(from_number)
+            print(f"❌ Call to {to_number} not placed: {e}")
+            return {
+                'error': str(e),
+                'status': 'failed'
+            }
+        info, end_reported = self._place_call(to_number, booking_context, provider_name, from_number)
+        if info.get('status') == 'failed':
+            limiter.release()
+            self.number_pool.failed(from_number)
+        else:
+            # Released by the status callback (/api/twilio/status) when the call ends; without
+            # one nothing would ever release it, so the number's pool slot and turn are given back now
+            call_key = info.get('call_sid') if end_reported else None
+            self.number_pool.placed(from_number, call_key)
+            limiter.hold(call_key)
+        return info
+
+    def _place_call(self, to_number: str, booking_context: Dict, provider_name: Optional[str],
+                    from_number: str) -> Tuple[Dict, bool]:
+        """The call info, and whether Twilio will report the call's end to our status callback."""
         try:
             # For testing, override with test number
             if os.getenv('USE_TEST_NUMBER', 'true').lower() == 'true':
@@ -53,7 +87,9 @@ class TwilioService:
                 call = self.client.calls.create(
                     url=url,
                     to=to_number,
-                    from_=self.phone_number
+                    from_=from_number,
+                    status_callback=f"{webhook_base}/api/twilio/status",
+                    status_callback_event=['completed'],
                 )
                 print(f"✅ Call initiated (multi-turn): {call.sid} to {to_number}")
             else:
@@ -77,7 +113,7 @@ class TwilioService:
                 call = self.client.calls.create(
                     twiml=twiml,
                     to=to_number,
-                    from_=self.phone_number
+                    from_=from_number
                 )
                 print(f"✅ Call initiated: {call.sid} to {to_number}")
 
@@ -85,16 +121,16 @@ class TwilioService:
                 'call_sid': call.sid,
                 'status': call.status,
                 'to': to_number,
-                'from': self.phone_number,
+                'from': from_number,
                 'start_time': call.date_created
-            }
+            }, bool(webhook_base)
 
         except Exception as e:
             print(f"❌ Error making call: {str(e)}")
             return {
                 'error': str(e),
                 'status': 'failed'
-            }
+            }, False
 
     def get_call_status(self, call_sid: str) -> Dict:
         """Get the status of a call"""
@@ -0,0 +1,31 @@
+"""
+Storage backends for CallPilot.
+database.py selects one of these once at startup and exposes it as the module-level API.
+"""
+
+from storage.aio import AsyncStorageBackend, ThreadedAsyncBackend
+from storage.base import BookingConflict, StorageBackend
+
+BACKENDS = ('firestore', 'sqlite', 'memory')
+
+
+def create_backend(kind: str, sqlite_path: str = None) -> StorageBackend:
+    """Instantiate a backend by name ('firestore', 'sqlite' or 'memory')."""
+    if kind == 'firestore':
+        from storage.firestore import FirestoreBackend
+        return FirestoreBackend()
+    if kind == 'sqlite':
+        from storage.sqlite import SQLiteBackend
+        return SQLiteBackend(sqlite_path)
+    if kind == 'memory':
+        from storage.memory import MemoryBackend
+        return MemoryBackend()
+    raise ValueError(f'Unknown storage backend {kind!r} (expected one of {", ".join(BACKENDS)})')
+
+
+def create_async_backend(backend: StorageBackend) -> AsyncStorageBackend:
+    """Async access to the same store as backend: native for Firestore, worker threads otherwise."""
+    if backend.name == 'firestore':
+        from storage.firestore_async import AsyncFirestoreBackend
+        return AsyncFirestoreBackend(backend)
+    return ThreadedAsyncBackend(backend)
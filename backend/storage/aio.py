@@ -0,0 +1,102 @@
+"""
+Async counterparts of the StorageBackend operations on the request hot paths (webhooks,
+call dispatch, status polling, task chat), so async callers can run independent reads
+and writes concurrently instead of one blocking round trip after another.
+
+Firestore has a native implementation on AsyncClient (storage.firestore_async); the other
+engines are local and fast, so ThreadedAsyncBackend runs their blocking methods in worker
+threads. Anything not listed here is only available on the blocking backend.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Protocol, Tuple
+
+from storage.base import StorageBackend, find_call_result
+
+
+class AsyncStorageBackend(Protocol):
+    """Async storage operations; `sync` is the blocking backend for the same store."""
+
+    name: str
+    sync: StorageBackend
+
+    async def close(self): ...
+
+    # --- Bookings -----------------------------------------------------------
+
+    async def get_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]: ...
+
+    async def get_archived_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]: ...
+
+    async def update_booking_status(self, booking_id: str, status: str, results: Optional[List[dict]] = None): ...
+
+    async def merge_booking_results(self, booking_id: str, updates: Dict[int, dict]): ...
+
+    async def update_booking_result(self, booking_id: str, index: int, result: dict):
+        await self.merge_booking_results(booking_id, {index: result})
+
+    # --- Call index -----------------------------------------------------------
+
+    async def lookup_call(self, call_key: str) -> Optional[Tuple[str, int]]: ...
+
+    async def get_booking_by_conversation_id(self, conversation_id: str) -> Tuple[Optional[dict], int]:
+        entry = await self.lookup_call(conversation_id)
+        if entry is None:
+            return None, -1
+        return find_call_result(await self.get_booking(entry[0]), conversation_id, entry[1])
+
+    # --- Dashboard stats --------------------------------------------------------
+
+    async def get_user_stats(self, user_id: str) -> dict: ...
+
+    # --- Tasks ----------------------------------------------------------------
+
+    async def get_task(self, task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                       conversation_limit: Optional[int] = None) -> Optional[dict]: ...
+
+    async def append_task_messages(self, task_id: str, messages: List[dict], status: str = None,
+                                   extracted_data: dict = None, user_id: Optional[str] = None) -> bool: ...
+
+    # --- Allowed emails -------------------------------------------------------
+
+    async def is_email_allowed(self, email: str) -> bool: ...
+
+
+class ThreadedAsyncBackend(AsyncStorageBackend):
+    """AsyncStorageBackend over a blocking backend: each call runs in the event loop's default executor."""
+
+    def __init__(self, backend: StorageBackend):
+        self.sync = backend
+        self.name = backend.name
+
+    async def close(self):
+        pass  # the blocking backend is owned (and closed) by database.py
+
+    async def get_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        return await asyncio.to_thread(self.sync.get_booking, booking_id, user_id)
+
+    async def get_archived_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        return await asyncio.to_thread(self.sync.get_archived_booking, booking_id, user_id)
+
+    async def update_booking_status(self, booking_id: str, status: str, results: Optional[List[dict]] = None):
+        await asyncio.to_thread(self.sync.update_booking_status, booking_id, status, results)
+
+    async def merge_booking_results(self, booking_id: str, updates: Dict[int, dict]):
+        await asyncio.to_thread(self.sync.merge_booking_results, booking_id, updates)
+
+    async def lookup_call(self, call_key: str) -> Optional[Tuple[str, int]]:
+        return await asyncio.to_thread(self.sync.lookup_call, call_key)
+
+    async def get_user_stats(self, user_id: str) -> dict:
+        return await asyncio.to_thread(self.sync.get_user_stats, user_id)
+
+    async def get_task(self, task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                       conversation_limit: Optional[int] = None) -> Optional[dict]:
+        return await asyncio.to_thread(self.sync.get_task, task_id, user_id, include_conversation, conversation_limit)
+
+    async def append_task_messages(self, task_id: str, messages: List[dict], status: str = None,
+                                   extracted_data: dict = None, user_id: Optional[str] = None) -> bool:
+        return await asyncio.to_thread(self.sync.append_task_messages, task_id, messages, status, extracted_data, user_id)
+
+    async def is_email_allowed(self, email: str) -> bool:
+        return await asyncio.to_thread(self.sync.is_email_allowed, email)
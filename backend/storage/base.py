@@ -0,0 +1,436 @@
+"""
+StorageBackend protocol and helpers shared by every backend.
+database.py picks one backend at startup and exposes its methods as the module-level API.
+"""
+
+import base64
+import copy
+import json
+import random
+import time
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+from storage import codec
+
+RECENT_BOOKINGS_LIMIT = 10
+STATS_COUNTERS = ('total_bookings', 'completed', 'processing', 'total_calls')
+
+# Top-level collections (tables) that delete_collection accepts
+COLLECTIONS = ('bookings', 'archived_bookings', 'tasks', 'call_index', 'user_stats', 'waitlist', 'allowed_emails', 'jobs')
+
+# Booking fields kept in summary reads; results and preferences are replaced by a digest
+SUMMARY_FIELDS = ('booking_id', 'user_id', 'service_type', 'location', 'timeframe', 'status', 'created_at')
+# Result fields the digest is computed from (and all a summary ever shows of a result)
+RESULT_HEAD_FIELDS = ('provider_id', 'provider_name', 'availability_date', 'availability_time', 'score',
+                      'call_status', 'has_availability')
+
+# mutate_booking: the base of the jittered backoff between compare-and-set attempts
+# (callers pass the number of retries, database.BOOKING_CAS_RETRIES)
+BOOKING_CAS_BACKOFF_SECONDS = 0.01
+
+# Job queue: a job is queued until a worker claims it, running while the worker holds its lease,
+# then done or failed; a running job whose lease expired (its worker died) can be claimed again
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED = 'queued', 'running', 'done', 'failed'
+
+# Retention: only bookings in this status are archived; tasks still in this status expire
+ARCHIVABLE_BOOKING_STATUS = 'completed'
+EXPIRABLE_TASK_STATUS = 'gathering_info'
+
+
+class BookingConflict(RuntimeError):
+    """mutate_booking lost the race for a booking on every attempt."""
+
+
+class StorageBackend(Protocol):
+    """
+    Storage operations used by the app. Implementations subclass this protocol
+    explicitly so they inherit the backend-independent methods defined here.
+    """
+
+    name: str
+
+    def init_db(self): ...
+
+    def close(self):
+        """Release connections / threads held by the backend."""
+
+    # --- Bookings -----------------------------------------------------------
+
+    def create_booking(self, booking_id: str, service_type: str, location: str, timeframe: str,
+                       preferences: dict, user_id: Optional[str] = None) -> dict: ...
+
+    def get_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]: ...
+
+    def update_booking_status(self, booking_id: str, status: str, results: Optional[List[dict]] = None): ...
+
+    def update_booking_results(self, booking_id: str, results: List[dict]): ...
+
+    def merge_booking_results(self, booking_id: str, updates: Dict[int, dict]): ...
+
+    def update_booking_result(self, booking_id: str, index: int, result: dict):
+        self.merge_booking_results(booking_id, {index: result})
+
+    # Every booking carries a version, 1 at creation and bumped by each write to it or its results.
+
+    def compare_and_set_booking(self, booking_id: str, version: int, status: Optional[str] = None,
+                                updates: Optional[Dict[int, dict]] = None) -> bool:
+        """
+        Set the status and/or merge results (index -> result) only if the booking is still at
+        version; returns False, writing nothing, if it has moved on or does not exist.
+        """
+
+    def mutate_booking(self, booking_id: str, mutate: Callable[[dict], Optional[bool]], booking: Optional[dict] = None,
+                       *, retries: int) -> Optional[dict]:
+        """
+        Read-modify-write without locks: mutate(draft) edits a copy of the booking in place
+        (status, results[i], appended results) or returns False to write nothing, and the edits
+        are written with compare_and_set_booking. When another writer got there first the
+        booking is re-read and mutate runs again, so it must derive everything from its draft.
+        booking is a copy the caller already read, used for the first attempt.
+        Returns the booking as written (or as read, if nothing changed), None if it does not
+        exist; raises BookingConflict when every attempt lost.
+        """
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(random.uniform(0, BOOKING_CAS_BACKOFF_SECONDS * 2 ** attempt))
+            if booking is None:
+                booking = self.get_booking(booking_id)
+                if booking is None:
+                    return None
+            draft = copy.deepcopy(booking)
+            if mutate(draft) is False:
+                return booking
+            status, updates = booking_changes(booking, draft)
+            if status is None and not updates:
+                return booking
+            version = booking.get('version', 0)
+            if self.compare_and_set_booking(booking_id, version, status, updates):
+                return {**draft, 'version': version + 1}
+            booking = None
+        raise BookingConflict(f'Booking {booking_id} changed during each of {retries + 1} update attempts')
+
+    def create_bookings_many(self, bookings: List[dict]) -> List[dict]: ...
+
+    def update_results_many(self, results_by_booking: Dict[str, List[dict]]): ...
+
+    # Listing reads take summary=True to return booking_summary() shapes: headline fields
+    # and the stored digest, without reading results or preferences.
+
+    def get_all_bookings(self, user_id: Optional[str] = None, summary: bool = False) -> List[dict]: ...
+
+    def list_bookings(self, user_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None,
+                      summary: bool = False) -> Tuple[List[dict], Optional[str]]: ...
+
+    def get_bookings_by_ids(self, booking_ids: List[str], summary: bool = False) -> List[dict]: ...
+
+    def clear_all_bookings(self): ...
+
+    def clean_db(self): ...
+
+    def delete_collection(self, name: str) -> int: ...
+
+    # --- Retention ------------------------------------------------------------
+
+    def archive_bookings(self, older_than: float, limit: int) -> int:
+        """
+        Move up to limit completed bookings created before older_than (a timestamp), with their
+        results, into compressed archive storage; returns how many were moved.
+        """
+
+    def get_archived_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]: ...
+
+    def expire_tasks(self, older_than: float, limit: int) -> int:
+        """Delete up to limit tasks still gathering info that were last updated before older_than."""
+
+    # --- Change feeds ---------------------------------------------------------
+
+    def watch_booking(self, booking_id: str, on_change: Callable[[], None]) -> Optional[Callable[[], None]]:
+        """
+        Call on_change whenever the booking (its status or any result) changes, from this or
+        any other process; returns a function that stops the feed, or None when the backend
+        has no change feed (database.py still signals this process's own writes).
+        """
+        return None
+
+    # --- Call index -----------------------------------------------------------
+
+    def register_call(self, call_key: str, booking_id: str, result_index: int): ...
+
+    def lookup_call(self, call_key: str) -> Optional[Tuple[str, int]]: ...
+
+    def get_booking_by_conversation_id(self, conversation_id: str) -> Tuple[Optional[dict], int]:
+        entry = self.lookup_call(conversation_id)
+        if entry is None:
+            return None, -1
+        booking = self.get_booking(entry[0])
+        return find_call_result(booking, conversation_id, entry[1])
+
+    # --- Dashboard stats --------------------------------------------------------
+
+    def get_user_stats(self, user_id: str) -> dict: ...
+
+    def rebuild_user_stats(self, user_id: str) -> dict: ...
+
+    # --- Tasks ----------------------------------------------------------------
+
+    def create_task(self, task_id: str, user_id: Optional[str] = None) -> dict: ...
+
+    def get_task(self, task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                 conversation_limit: Optional[int] = None) -> Optional[dict]: ...
+
+    def get_task_messages(self, task_id: str, limit: Optional[int] = None) -> List[dict]: ...
+
+    def append_task_messages(self, task_id: str, messages: List[dict], status: str = None,
+                             extracted_data: dict = None, user_id: Optional[str] = None) -> bool: ...
+
+    def update_task(self, task_id: str, status: str = None, extracted_data: dict = None,
+                    conversation: list = None, user_id: Optional[str] = None): ...
+
+    def get_all_tasks(self, user_id: Optional[str] = None) -> List[dict]: ...
+
+    def list_tasks(self, user_id: Optional[str] = None, limit: int = 50,
+                   cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]: ...
+
+    # --- Jobs -------------------------------------------------------------------
+    # Durable background work (booking call runs) claimed by worker processes under a lease.
+
+    def enqueue_job(self, job_id: str, kind: str, payload: dict, max_attempts: int = 3,
+                    run_at: Optional[float] = None) -> dict: ...
+
+    def get_job(self, job_id: str) -> Optional[dict]: ...
+
+    def claim_job(self, worker_id: str, lease_seconds: float, kinds: Optional[List[str]] = None) -> Optional[dict]:
+        """
+        Atomically take the oldest job that is due (queued with run_at passed, or running with an
+        expired lease): it becomes running, leased to worker_id for lease_seconds, with attempts
+        incremented. Returns the claimed job, or None when nothing is due.
+        """
+
+    def renew_job_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a running job's lease; False if worker_id no longer holds it."""
+
+    def complete_job(self, job_id: str, worker_id: str) -> bool: ...
+
+    def fail_job(self, job_id: str, worker_id: str, error: str, retry_at: Optional[float] = None) -> bool:
+        """Record a failed attempt: queued again from retry_at, or failed for good when retry_at is None."""
+
+    # --- Waitlist and allowed emails -----------------------------------------
+
+    def add_to_waitlist(self, email: str, name: str, confirmation_sent: bool = False) -> dict: ...
+
+    def get_waitlist(self) -> List[dict]: ...
+
+    def set_confirmation_sent(self, email: str): ...
+
+    def is_email_allowed(self, email: str) -> bool: ...
+
+    def add_allowed_email(self, email: str) -> dict: ...
+
+    def get_allowed_emails(self) -> List[dict]: ...
+
+    def watch_allowed_emails(self, callback: Callable[[List[str]], None]) -> Optional[Callable[[], None]]:
+        """
+        Call callback with the complete list of allowed emails now and after every change;
+        returns a function that stops the feed, or None when the backend has no change feed.
+        """
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Shared helpers
+# ---------------------------------------------------------------------------
+
+def new_job(job_id: str, kind: str, payload: dict, max_attempts: int, run_at: Optional[float], now: float) -> dict:
+    return {
+        'job_id': job_id,
+        'kind': kind,
+        'payload': payload,
+        'status': JOB_QUEUED,
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'run_at': now if run_at is None else run_at,
+        'lease_owner': None,
+        'lease_expires_at': None,
+        'last_error': None,
+        'created_at': now,
+        'updated_at': now,
+    }
+
+
+def failed_job_fields(error: str, retry_at: Optional[float]) -> dict:
+    """Job fields for a failed attempt (see StorageBackend.fail_job)."""
+    fields = {'last_error': error, 'lease_owner': None, 'lease_expires_at': None}
+    if retry_at is None:
+        return {**fields, 'status': JOB_FAILED}
+    return {**fields, 'status': JOB_QUEUED, 'run_at': retry_at}
+
+
+def job_is_due(job: dict, now: float) -> bool:
+    if job['status'] == JOB_QUEUED:
+        return job['run_at'] <= now
+    return job['status'] == JOB_RUNNING and (job.get('lease_expires_at') or 0) <= now
+
+
+def call_keys(result: dict) -> List[str]:
+    """The conversation_id / call_sid a result can be looked up by."""
+    return [k for k in (result.get('conversation_id'), result.get('call_sid')) if k]
+
+
+def find_call_result(booking: Optional[dict], call_key: str, indexed_at: int) -> Tuple[Optional[dict], int]:
+    """(booking, index of the result with call_key) if the booking is still processing, else (None, -1)."""
+    if not booking or booking.get('status') != 'processing':
+        return None, -1
+    results = booking.get('results') or []
+    if indexed_at < len(results) and call_key in call_keys(results[indexed_at]):
+        return booking, indexed_at
+    # Results were rewritten in a different order since the call was indexed
+    for i, r in enumerate(results):
+        if call_key in call_keys(r):
+            return booking, i
+    return None, -1
+
+
+def booking_changes(before: dict, after: dict) -> Tuple[Optional[str], Dict[int, dict]]:
+    """(new status or None, {index: result} for changed or added results) between two copies of a booking."""
+    status = after.get('status') if after.get('status') != before.get('status') else None
+    old = before.get('results') or []
+    updates = {i: r for i, r in enumerate(after.get('results') or []) if i >= len(old) or r != old[i]}
+    return status, updates
+
+
+def status_deltas(old_status: Optional[str], new_status: str) -> dict:
+    deltas = {'completed': 0, 'processing': 0}
+    if old_status in deltas:
+        deltas[old_status] -= 1
+    if new_status in deltas:
+        deltas[new_status] += 1
+    return deltas
+
+
+def push_recent(recent: List[str], *booking_ids: str) -> List[str]:
+    """Put booking ids (oldest first) at the front of a user's recent list."""
+    for booking_id in booking_ids:
+        recent = ([booking_id] + [b for b in recent if b != booking_id])[:RECENT_BOOKINGS_LIMIT]
+    return recent
+
+
+def new_booking(spec: dict, now: float) -> dict:
+    """Booking record for create_bookings_many from a spec with create_booking's arguments (plus optional status / created_at)."""
+    return {
+        'booking_id': spec['booking_id'],
+        'user_id': spec.get('user_id'),
+        'service_type': spec['service_type'],
+        'location': spec['location'],
+        'timeframe': spec['timeframe'],
+        'status': spec.get('status', 'processing'),
+        'created_at': spec.get('created_at', now),
+        'preferences': spec.get('preferences') or {},
+        'version': 1,
+    }
+
+
+def result_head(result: dict) -> dict:
+    return {k: result[k] for k in RESULT_HEAD_FIELDS if k in result}
+
+
+def results_digest(results: List[dict]) -> dict:
+    """
+    Headline figures for a booking's results (full results or result_head()s): how many calls,
+    how many completed, and the best-scoring completed call that found availability.
+    """
+    completed = [r for r in results if r.get('call_status') == 'completed']
+    available = [r for r in completed if r.get('has_availability') is not False and r.get('score')]
+    best = max(available, key=lambda r: r.get('score') or 0) if available else None
+    return {
+        'result_count': len(results),
+        'completed_count': len(completed),
+        'best_result': result_head(best) if best else None,
+    }
+
+
+def update_digest(digest: dict, replaced: List[dict], written: List[dict]) -> Optional[dict]:
+    """
+    results_digest() after a write, from the digest before it: written are the results
+    written, replaced the earlier versions of those that overwrote one. None when the best
+    result was overwritten by a worse one, which needs every result to recompute.
+    """
+    completed = [r for r in written if r.get('call_status') == 'completed']
+    available = [r for r in completed if r.get('has_availability') is not False and r.get('score')]
+    best = digest.get('best_result')
+    if best is not None and any(result_head(r) == best for r in replaced):
+        best = None
+        if not available or max(r.get('score') or 0 for r in available) < digest['best_result'].get('score'):
+            return None
+    candidates = available + ([best] if best else [])
+    best = max(candidates, key=lambda r: r.get('score') or 0) if candidates else None
+    return {
+        'result_count': digest['result_count'] + len(written) - len(replaced),
+        'completed_count': (digest['completed_count'] + len(completed)
+                            - sum(1 for r in replaced if r.get('call_status') == 'completed')),
+        'best_result': result_head(best) if best else None,
+    }
+
+
+def booking_summary(booking: dict, digest: Optional[dict] = None) -> dict:
+    """Compact booking for listings; the digest is computed from booking['results'] when not given."""
+    if digest is None:
+        digest = results_digest(booking.get('results') or [])
+    return {**{k: booking.get(k) for k in SUMMARY_FIELDS}, **digest}
+
+
+def bulk_stats_deltas(bookings: List[dict], results: Dict[str, List[dict]]) -> Dict[str, dict]:
+    """Per-user counter deltas and recent ids (oldest first) for a batch of new bookings."""
+    by_user = {}
+    for b in sorted(bookings, key=lambda b: (b['created_at'], b['booking_id'])):
+        if b['user_id'] is None:
+            continue
+        entry = by_user.setdefault(b['user_id'], {'deltas': dict.fromkeys(STATS_COUNTERS, 0), 'recent': []})
+        deltas = entry['deltas']
+        deltas['total_bookings'] += 1
+        deltas['total_calls'] += len(results.get(b['booking_id']) or [])
+        for name, delta in status_deltas(None, b['status']).items():
+            deltas[name] += delta
+        entry['recent'].append(b['booking_id'])
+    return by_user
+
+
+def pack_archived(booking: dict) -> bytes:
+    """Compress a booking (with its results) for archive storage."""
+    return codec.encode(booking, 'zlib')
+
+
+def unpack_archived(data: bytes, archived_at: float) -> dict:
+    return {**codec.decode(data), 'archived_at': archived_at}
+
+
+def stats_from_bookings(bookings: List[dict], archived: List[dict] = ()) -> dict:
+    """Compute a user's stats from their bookings (newest first); archived bookings count towards the totals only."""
+    counted = list(bookings) + list(archived)
+    return {
+        'total_bookings': len(counted),
+        'completed': sum(1 for b in counted if b['status'] == 'completed'),
+        'processing': sum(1 for b in counted if b['status'] == 'processing'),
+        'total_calls': sum(len(b.get('results') or []) for b in counted),
+        'recent_booking_ids': [b['booking_id'] for b in bookings[:RECENT_BOOKINGS_LIMIT]],
+    }
+
+
+def encode_cursor(sort_value: float, key: str) -> str:
+    raw = json.dumps([sort_value, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_value, key = json.loads(raw)
+        return float(sort_value), str(key)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def page_of(items: List[dict], limit: int, sort_field: str, key_field: str) -> Tuple[List[dict], Optional[str]]:
+    """Trim a limit+1 fetch to one page and build the cursor for the next one."""
+    page = items[:limit]
+    next_cursor = encode_cursor(page[-1][sort_field], page[-1][key_field]) if len(items) > limit else None
+    return page, next_cursor
@@ -0,0 +1,70 @@
+"""
+Serialization for the JSON-shaped columns the SQLite backend stores (preferences,
+extracted_data, per-provider results, task messages, result digests) and for archives.
+
+Values are written as bytes behind a one-byte format marker, so the format can change
+without rewriting old rows: anything without a known marker is read as the plain JSON
+text earlier builds wrote. orjson (pinned in requirements.txt) does the JSON work; if it
+can't be imported, e.g. on a platform without a wheel, the standard library json writes
+the same bytes.
+
+  FORMAT_JSON  compact JSON                       (STORAGE_CODEC=json, the default)
+  FORMAT_ZLIB  zlib-compressed compact JSON       (STORAGE_CODEC=zlib)
+
+backend/bench_codec.py compares the formats on realistic booking payloads.
+"""
+
+import json
+import os
+import zlib
+from typing import Any, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library
+    orjson = None
+
+FORMAT_JSON = 0x01
+FORMAT_ZLIB = 0x02
+FORMATS = {'json': FORMAT_JSON, 'zlib': FORMAT_ZLIB}
+
+STORAGE_CODEC = os.getenv('STORAGE_CODEC', 'json').strip().lower()
+ZLIB_LEVEL = int(os.getenv('STORAGE_CODEC_ZLIB_LEVEL', '6'))
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        # Non-str keys are stringified, as json.dumps does
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _loads(data: Union[bytes, memoryview, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data if isinstance(data, str) else bytes(data))
+
+
+def encode(value: Any, fmt: Optional[str] = None) -> bytes:
+    """Serialize value with a format marker byte (STORAGE_CODEC by default). Raises ValueError for an unknown format."""
+    fmt = fmt or STORAGE_CODEC
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown storage codec {fmt!r} (expected one of {", ".join(FORMATS)})')
+    payload = _dumps(value)
+    if fmt == 'zlib':
+        payload = zlib.compress(payload, ZLIB_LEVEL)
+    return bytes((FORMATS[fmt],)) + payload
+
+
+def decode(raw: Union[bytes, str, None], default: Any = None) -> Any:
+    """Deserialize a stored value in any format this module has ever written; empty values give default."""
+    if not raw:
+        return default
+    if isinstance(raw, str):
+        return _loads(raw)
+    marker = raw[0]
+    if marker == FORMAT_JSON:
+        return _loads(memoryview(raw)[1:])
+    if marker == FORMAT_ZLIB:
+        return _loads(zlib.decompress(memoryview(raw)[1:]))
+    return _loads(raw)
@@ -0,0 +1,941 @@
+"""
+Firestore storage backend (production on GCP).
+The google-cloud-firestore package is imported lazily so the app imports without it.
+
+Bookings and tasks live in one of two layouts (FIRESTORE_LAYOUT):
+  flat      top-level bookings/{id} and tasks/{id}, filtered by user_id
+  per_user  users/{uid}/bookings/{id} and users/{uid}/tasks/{id}, so a user's reads only
+            touch that user's subtree; cross-user (admin, retention) queries are
+            collection-group queries. migrate_firestore_layout.py moves flat data over.
+Archives, the call index, stats, the waitlist and allowed emails stay top-level in both.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from storage.base import (
+    ARCHIVABLE_BOOKING_STATUS,
+    COLLECTIONS,
+    EXPIRABLE_TASK_STATUS,
+    JOB_DONE,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    STATS_COUNTERS,
+    SUMMARY_FIELDS,
+    StorageBackend,
+    booking_summary,
+    bulk_stats_deltas,
+    call_keys,
+    decode_cursor,
+    failed_job_fields,
+    job_is_due,
+    new_booking,
+    new_job,
+    pack_archived,
+    page_of,
+    push_recent,
+    result_head,
+    results_digest,
+    stats_from_bookings,
+    status_deltas,
+    unpack_archived,
+)
+
+
+# BulkWriter throttle: starts at the initial rate and ramps up (500/50/5 rule) to the max
+BULK_INITIAL_OPS_PER_SECOND = int(os.getenv('FIRESTORE_BULK_INITIAL_OPS', '500'))
+BULK_MAX_OPS_PER_SECOND = int(os.getenv('FIRESTORE_BULK_MAX_OPS', '5000'))
+
+LAYOUTS = ('flat', 'per_user')
+FIRESTORE_LAYOUT = os.getenv('FIRESTORE_LAYOUT', 'flat').strip().lower()
+# per_user layout: parent for bookings and tasks created without a user
+NO_USER = '_no_user'
+# Record id -> owner, so writes addressed by id alone skip the owner lookup (owners never change)
+OWNER_CACHE_MAX_ENTRIES = int(os.getenv('FIRESTORE_OWNER_CACHE_MAX_ENTRIES', '10000'))
+
+# claim_job tries this many of the oldest due jobs, each in its own transaction, before giving up
+JOB_CLAIM_CANDIDATES = 10
+
+# Id field of the records in each per-user collection
+_ID_FIELDS = {'bookings': 'booking_id', 'tasks': 'task_id'}
+
+
+def _firestore():
+    """Return the google.cloud.firestore module (imported lazily, only needed in Firestore mode)."""
+    from google.cloud import firestore
+    return firestore
+
+
+def _result_id(index: int) -> str:
+    return f'{index:04d}'
+
+
+def _message_id(seq: int) -> str:
+    return f'{seq:06d}'
+
+
+def _head_key(index: int) -> str:
+    # Map keys must be valid field-path segments to be updated one at a time, so no leading digit
+    return f'r{index:04d}'
+
+
+def _version(data: dict, result_docs: Iterable[dict]) -> int:
+    # Result writes bump their own document's rev rather than the booking document, so
+    # providers reporting at once don't all contend on it; the booking's version is the sum
+    return data.get('version', 0) + sum(d.get('rev', 0) for d in result_docs)
+
+
+def _attach_results(data: dict, result_docs: List[dict]) -> dict:
+    """The booking document with its results (from their result documents, in order) and version."""
+    data = {k: v for k, v in data.items() if k != 'result_heads'}
+    # Bookings written before per-result storage keep their results inline on the document
+    if not result_docs and data.get('results'):
+        return data
+    return {**data, 'results': [d['result'] for d in result_docs], 'version': _version(data, result_docs)}
+
+
+def _heads(results: Dict[int, dict]) -> dict:
+    return {_head_key(idx): result_head(r) for idx, r in results.items()}
+
+
+# Summary reads fetch only these fields; result_heads holds result_head() of every result, keyed
+# by _head_key, as of the booking's last status change (see _summaries)
+_SUMMARY_FIELD_PATHS = list(SUMMARY_FIELDS) + ['result_heads']
+
+
+def _task(data: dict) -> dict:
+    task = {k: v for k, v in data.items() if k != 'conversation'}
+    task.setdefault('message_count', len(data.get('conversation') or []))
+    return task
+
+
+def _results_query(booking_ref):
+    return booking_ref.collection('results').order_by('result_index')
+
+
+def _read_results(booking_ref, transaction=None) -> List[dict]:
+    """A booking's result documents, in order."""
+    return [doc.to_dict() for doc in _results_query(booking_ref).stream(transaction=transaction)]
+
+
+def _read_messages(task_ref, limit: Optional[int] = None) -> List[dict]:
+    coll = task_ref.collection('messages')
+    if limit:
+        docs = list(coll.order_by('seq', direction='DESCENDING').limit(limit).stream())
+        docs.reverse()
+    else:
+        docs = coll.order_by('seq').stream()
+    return [doc.to_dict()['message'] for doc in docs]
+
+
+def _set_result(batch, booking_ref, index: int, result: dict, rev: int = 0):
+    batch.set(booking_ref.collection('results').document(_result_id(index)), {
+        'booking_id': booking_ref.id,
+        'result_index': index,
+        'result': result,
+        'rev': rev,
+    })
+
+
+def _index_calls(batch, fs, booking_id: str, indexed_results):
+    """Index call keys for an iterable of (result_index, result) pairs."""
+    coll = fs.collection('call_index')
+    for idx, r in indexed_results:
+        for key in call_keys(r):
+            batch.set(coll.document(key), {'booking_id': booking_id, 'result_index': idx})
+
+
+def _write_results(batch, fs, booking_ref, existing: List[dict], results: List[dict], fields: Optional[dict] = None) -> int:
+    """
+    Queue the writes replacing a booking's results (existing = its current result documents)
+    on a batch or transaction, with any other booking fields to set; returns the change in
+    result count. The version moves on by exactly one.
+    """
+    revs = {d['result_index']: d.get('rev', 0) for d in existing}
+    dropped = [idx for idx in revs if idx >= len(results)]
+    for idx in dropped:
+        batch.delete(booking_ref.collection('results').document(_result_id(idx)))
+    for idx, r in enumerate(results):
+        _set_result(batch, booking_ref, idx, r, revs.get(idx, 0))
+    # Drop any legacy inline array so reads use the subcollection
+    batch.update(booking_ref, {
+        **(fields or {}),
+        'results': _firestore().DELETE_FIELD,
+        'result_heads': _heads(dict(enumerate(results))),
+        'version': _firestore().Increment(1 + sum(revs[idx] for idx in dropped)),
+    })
+    _index_calls(batch, fs, booking_ref.id, enumerate(results))
+    return len(results) - len(existing)
+
+
+def _merge_results(batch, fs, booking_ref, indexed: List[Tuple[int, dict]], revs: Dict[int, int]):
+    """
+    Queue the writes for individual results ((index, result) pairs, each with its new rev) on
+    a batch or transaction. The booking document itself is left alone.
+    """
+    for i, result in indexed:
+        _set_result(batch, booking_ref, i, result, revs[i])
+    _index_calls(batch, fs, booking_ref.id, indexed)
+
+
+def _rev(snapshot) -> int:
+    return (snapshot.to_dict() or {}).get('rev', 0) if snapshot.exists else 0
+
+
+def _update_heads(batch, booking_ref, booking: dict, indexed: List[Tuple[int, dict]]):
+    """Keep result_heads current for result writes to a booking that has left processing."""
+    if booking and booking.get('status') != 'processing':
+        batch.update(booking_ref, {f'result_heads.{_head_key(i)}': result_head(r) for i, r in indexed})
+
+
+def _write_cas(batch, fs, booking_ref, booking: dict, docs: Dict[int, dict], status: Optional[str],
+               indexed: List[Tuple[int, dict]]):
+    """
+    Queue compare_and_set_booking's writes, given the booking document and its result documents
+    by index as read in the transaction. The version moves on by exactly one: a status change
+    bumps the booking document's (and records every result's head), result writes alone the
+    rev of the first result written.
+    """
+    revs = {i: docs[i].get('rev', 0) if i in docs else 0 for i, _ in indexed}
+    if status is not None or not indexed:
+        fields = {'version': _firestore().Increment(1)}
+        if status is not None:
+            fields['status'] = status
+            fields['result_heads'] = _heads({**{i: d['result'] for i, d in docs.items()}, **dict(indexed)})
+        batch.update(booking_ref, fields)
+    else:
+        revs[indexed[0][0]] += 1
+        _update_heads(batch, booking_ref, booking, indexed)
+    _merge_results(batch, fs, booking_ref, indexed, revs)
+
+
+def _append_messages(transaction, task_ref, data: dict, messages: List[dict], status: Optional[str],
+                     extracted_data: Optional[dict]):
+    """Queue an append to a task (data = its current document) on a transaction."""
+    update = {'updated_at': datetime.now().timestamp()}
+    # Tasks created before append-only storage keep their conversation inline; move it out first
+    pending = list(data.get('conversation') or []) + list(messages)
+    seq = data.get('message_count', 0) if 'conversation' not in data else 0
+    if 'conversation' in data:
+        update['conversation'] = _firestore().DELETE_FIELD
+    for m in pending:
+        transaction.set(task_ref.collection('messages').document(_message_id(seq)),
+                        {'task_id': task_ref.id, 'seq': seq, 'message': m})
+        seq += 1
+    update['message_count'] = seq
+    if status is not None:
+        update['status'] = status
+    if extracted_data is not None:
+        update['extracted_data'] = extracted_data
+    transaction.update(task_ref, update)
+
+
+def _bump_stats(batch, stats_ref, recent_booking_ids: Optional[List[str]] = None, **deltas):
+    if stats_ref is None or not (recent_booking_ids or any(deltas.values())):
+        return
+    update = {name: _firestore().Increment(delta) for name, delta in deltas.items() if delta}
+    if recent_booking_ids is not None:
+        update['recent_booking_ids'] = recent_booking_ids
+    batch.set(stats_ref, update, merge=True)
+
+
+class _Owners:
+    """Bounded LRU of (collection, record id) -> owning user_id, shared by the sync and async clients."""
+
+    def __init__(self, max_entries: int = OWNER_CACHE_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[str, str], Optional[str]]' = OrderedDict()
+
+    def get(self, name: str, record_id: str):
+        """The owner, or KeyError when unknown (None is a valid owner)."""
+        with self._lock:
+            owner = self._entries[(name, record_id)]
+            self._entries.move_to_end((name, record_id))
+            return owner
+
+    def put(self, name: str, record_id: str, owner: Optional[str]):
+        with self._lock:
+            self._entries[(name, record_id)] = owner
+            self._entries.move_to_end((name, record_id))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, name: str, record_ids: Iterable[str]):
+        with self._lock:
+            for record_id in record_ids:
+                self._entries.pop((name, record_id), None)
+
+
+class _Layout:
+    """Where bookings and tasks live for one layout; the reference helpers never do I/O."""
+
+    def __init__(self, layout: str):
+        if layout not in LAYOUTS:
+            raise ValueError(f'Unknown Firestore layout {layout!r} (expected one of {", ".join(LAYOUTS)})')
+        self.per_user = layout == 'per_user'
+
+    def collection(self, fs, name: str, user_id: Optional[str]):
+        """The collection holding user_id's records (the shared top-level one in the flat layout)."""
+        if not self.per_user:
+            return fs.collection(name)
+        return fs.collection('users').document(user_id if user_id is not None else NO_USER).collection(name)
+
+    def user_query(self, fs, name: str, user_id: Optional[str]):
+        """Base query over one user's records, or everyone's when user_id is None."""
+        if not self.per_user:
+            coll = fs.collection(name)
+            return coll.where('user_id', '==', user_id) if user_id is not None else coll
+        return self.collection(fs, name, user_id) if user_id is not None else fs.collection_group(name)
+
+    def group(self, fs, name: str):
+        """Query over every user's records (admin and retention jobs)."""
+        return fs.collection_group(name) if self.per_user else fs.collection(name)
+
+    def owner_query(self, fs, name: str, record_ids: List[str]):
+        """Collection-group query finding records by id (up to 30) when the owner is not known."""
+        field = _ID_FIELDS[name]
+        group = fs.collection_group(name)
+        return group.where(field, '==', record_ids[0]) if len(record_ids) == 1 else group.where(field, 'in', record_ids)
+
+
+class FirestoreBackend(StorageBackend):
+    name = 'firestore'
+
+    def __init__(self, client=None, layout: str = FIRESTORE_LAYOUT):
+        self._client = client
+        self.layout = _Layout(layout)
+        self.owners = _Owners()
+
+    @property
+    def fs(self):
+        """The Firestore client (lazy init)."""
+        if self._client is None:
+            self._client = _firestore().Client()
+        return self._client
+
+    def init_db(self):
+        print(f"✅ Using Firestore for persistent storage ({'per-user' if self.layout.per_user else 'flat'} layout)")
+
+    # --- Layout -----------------------------------------------------------------
+
+    def _ref(self, name: str, record_id: str, user_id: Optional[str] = None):
+        """
+        Reference to a booking or task. In the per-user layout an owner (user_id) puts it under
+        that user; without one the owner comes from the owner cache or a collection-group lookup.
+        """
+        if not self.layout.per_user:
+            return self.fs.collection(name).document(record_id)
+        if user_id is None:
+            self._resolve_owners(name, [record_id])
+            try:
+                user_id = self.owners.get(name, record_id)
+            except KeyError:
+                pass  # no such record: the reference reads as missing
+        return self.layout.collection(self.fs, name, user_id).document(record_id)
+
+    def _resolve_owners(self, name: str, record_ids: List[str]):
+        """Look up (and cache) the owners of records not in the owner cache; per-user layout only."""
+        unknown = []
+        for record_id in record_ids:
+            try:
+                self.owners.get(name, record_id)
+            except KeyError:
+                unknown.append(record_id)
+        for start in range(0, len(unknown), 30):
+            for doc in self.layout.owner_query(self.fs, name, unknown[start:start + 30]).stream():
+                self.owners.put(name, doc.id, doc.to_dict().get('user_id'))
+
+    def close(self):
+        pass
+
+    # --- Per-provider result storage --------------------------------------------
+    # Each provider's result is its own bookings/{id}/results/{index} document;
+    # reads reassemble the ordered list.
+
+    def _replace_results(self, batch, booking_ref, results: List[dict]) -> int:
+        """Replace a booking's results in a batch or transaction; returns the change in result count."""
+        return _write_results(batch, self.fs, booking_ref, _read_results(booking_ref), results)
+
+    def _read_results_many(self, booking_ids: List[str]) -> dict:
+        """Return {booking_id: [result document, ...]} using collection-group queries (30 ids per 'in' filter)."""
+        by_booking = {}
+        group = self.fs.collection_group('results')
+        for start in range(0, len(booking_ids), 30):
+            chunk = booking_ids[start:start + 30]
+            for doc in group.where('booking_id', 'in', chunk).stream():
+                data = doc.to_dict()
+                by_booking.setdefault(data['booking_id'], []).append(data)
+        return {bid: sorted(docs, key=lambda d: d['result_index']) for bid, docs in by_booking.items()}
+
+    def _attach_results_many(self, bookings: List[dict]) -> List[dict]:
+        results = self._read_results_many([b['booking_id'] for b in bookings])
+        return [_attach_results(b, results.get(b['booking_id'], [])) for b in bookings]
+
+    def _summaries(self, bookings: List[dict]) -> List[dict]:
+        """
+        Summaries from documents read with _SUMMARY_FIELD_PATHS. Result writes to a processing
+        booking don't touch its document, so its heads are only current once it has left
+        processing; processing bookings (and older documents without heads) read their results.
+        """
+        unsettled = [b['booking_id'] for b in bookings if b.get('result_heads') is None or b.get('status') == 'processing']
+        results = self._read_results_many(unsettled) if unsettled else {}
+        return [booking_summary(b, results_digest([d['result'] for d in results[b['booking_id']]] if b['booking_id'] in results
+                                                  else list((b.get('result_heads') or {}).values())))
+                for b in bookings]
+
+    def _stats_ref(self, user_id: Optional[str]):
+        return self.fs.collection('user_stats').document(user_id) if user_id is not None else None
+
+    def _booking_refs(self, booking_ids: List[str]) -> dict:
+        """{booking_id: reference}, resolving unknown owners together rather than one lookup per booking."""
+        if self.layout.per_user:
+            self._resolve_owners('bookings', booking_ids)
+        return {bid: self._ref('bookings', bid) for bid in booking_ids}
+
+    # --- Bookings -----------------------------------------------------------
+
+    def create_booking(self, booking_id: str, service_type: str, location: str, timeframe: str,
+                       preferences: dict, user_id: Optional[str] = None) -> dict:
+        booking = {
+            'booking_id': booking_id,
+            'user_id': user_id,
+            'service_type': service_type,
+            'location': location,
+            'timeframe': timeframe,
+            'status': 'processing',
+            'created_at': datetime.now().timestamp(),
+            'preferences': preferences,
+            'result_heads': {},
+            'version': 1,
+        }
+        stats_ref = self._stats_ref(user_id)
+        booking_ref = self.layout.collection(self.fs, 'bookings', user_id).document(booking_id)
+
+        @_firestore().transactional
+        def _create(transaction):
+            stats = stats_ref.get(transaction=transaction) if stats_ref else None
+            # Results live in the bookings/{id}/results subcollection, not on the booking document
+            transaction.set(booking_ref, booking)
+            if stats_ref:
+                recent = (stats.to_dict() or {}).get('recent_booking_ids', []) if stats.exists else []
+                _bump_stats(transaction, stats_ref, total_bookings=1, processing=1,
+                            recent_booking_ids=push_recent(recent, booking_id))
+
+        _create(self.fs.transaction())
+        self.owners.put('bookings', booking_id, user_id)
+        return _attach_results(booking, [])
+
+    def get_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        doc_ref = self._ref('bookings', booking_id, user_id)
+        doc = doc_ref.get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if user_id is not None and data.get('user_id') != user_id:
+            return None
+        return _attach_results(data, _read_results(doc_ref))
+
+    def update_booking_status(self, booking_id: str, status: str, results: Optional[List[dict]] = None):
+        booking_ref = self._ref('bookings', booking_id)
+
+        @_firestore().transactional
+        def _update(transaction):
+            old = booking_ref.get(transaction=transaction).to_dict() or {}
+            existing = _read_results(booking_ref, transaction)
+            if results is not None:
+                calls = _write_results(transaction, self.fs, booking_ref, existing, results, {'status': status})
+            else:
+                calls = 0
+                transaction.update(booking_ref, {'status': status, 'version': _firestore().Increment(1),
+                                                 'result_heads': _heads({d['result_index']: d['result'] for d in existing})})
+            _bump_stats(transaction, self._stats_ref(old.get('user_id')), total_calls=calls,
+                        **status_deltas(old.get('status'), status))
+
+        _update(self.fs.transaction())
+
+    def update_booking_results(self, booking_id: str, results: List[dict]):
+        booking_ref = self._ref('bookings', booking_id)
+
+        @_firestore().transactional
+        def _update(transaction):
+            old = booking_ref.get(transaction=transaction).to_dict() or {}
+            calls = self._replace_results(transaction, booking_ref, results)
+            _bump_stats(transaction, self._stats_ref(old.get('user_id')), total_calls=calls)
+
+        _update(self.fs.transaction())
+
+    def merge_booking_results(self, booking_id: str, updates: Dict[int, dict]):
+        if not updates:
+            return
+        indexed = sorted(updates.items())
+        booking_ref = self._ref('bookings', booking_id)
+        result_refs = [booking_ref.collection('results').document(_result_id(i)) for i, _ in indexed]
+
+        @_firestore().transactional
+        def _update(transaction):
+            snapshots = [ref.get(transaction=transaction) for ref in result_refs]
+            old = booking_ref.get(transaction=transaction).to_dict() or {}
+            _merge_results(transaction, self.fs, booking_ref, indexed,
+                           {i: _rev(snap) + 1 for (i, _), snap in zip(indexed, snapshots)})
+            _update_heads(transaction, booking_ref, old, indexed)
+            new_count = sum(1 for snap in snapshots if not snap.exists)
+            if new_count:
+                _bump_stats(transaction, self._stats_ref(old.get('user_id')), total_calls=new_count)
+
+        _update(self.fs.transaction())
+
+    def compare_and_set_booking(self, booking_id: str, version: int, status: Optional[str] = None,
+                                updates: Optional[Dict[int, dict]] = None) -> bool:
+        indexed = sorted((updates or {}).items())
+        booking_ref = self._ref('bookings', booking_id)
+
+        # The transaction reads the booking and its results, so a write landing before its commit
+        # makes it re-run and then see the new version
+        @_firestore().transactional
+        def _cas(transaction):
+            doc = booking_ref.get(transaction=transaction)
+            if not doc.exists:
+                return False
+            old = doc.to_dict()
+            docs = {d['result_index']: d for d in _read_results(booking_ref, transaction)}
+            if _version(old, docs.values()) != version:
+                return False
+            _write_cas(transaction, self.fs, booking_ref, old, docs, status, indexed)
+            new_count = sum(1 for i, _ in indexed if i not in docs)
+            deltas = status_deltas(old.get('status'), status) if status is not None else {}
+            _bump_stats(transaction, self._stats_ref(old.get('user_id')), total_calls=new_count, **deltas)
+            return True
+
+        return _cas(self.fs.transaction())
+
+    def create_bookings_many(self, bookings: List[dict]) -> List[dict]:
+        """
+        Create bookings (with optional results) through a BulkWriter. Writes are sent in
+        parallel batches rather than one transaction each, so this is for seeding and
+        migrations, not for concurrent request traffic.
+        """
+        now = datetime.now().timestamp()
+        records = [new_booking(spec, now) for spec in bookings]
+        results = {spec['booking_id']: spec.get('results') or [] for spec in bookings}
+        by_user = bulk_stats_deltas(records, results)
+        stats_refs = {user_id: self._stats_ref(user_id) for user_id in by_user}
+        recent = {doc.id: (doc.to_dict() or {}).get('recent_booking_ids', [])
+                  for doc in self.fs.get_all(list(stats_refs.values())) if doc.exists} if stats_refs else {}
+
+        writer = self._bulk_writer()
+        for b in records:
+            booking_ref = self.layout.collection(self.fs, 'bookings', b['user_id']).document(b['booking_id'])
+            self.owners.put('bookings', b['booking_id'], b['user_id'])
+            writer.set(booking_ref, {**b, 'result_heads': {
+                _head_key(idx): result_head(r) for idx, r in enumerate(results[b['booking_id']])}})
+            for idx, r in enumerate(results[b['booking_id']]):
+                _set_result(writer, booking_ref, idx, r)
+            _index_calls(writer, self.fs, b['booking_id'], enumerate(results[b['booking_id']]))
+        for user_id, entry in by_user.items():
+            _bump_stats(writer, stats_refs[user_id], recent_booking_ids=push_recent(recent.get(user_id, []), *entry['recent']),
+                        **entry['deltas'])
+        writer.close()
+        return [{**b, 'results': results[b['booking_id']]} for b in records]
+
+    def update_results_many(self, results_by_booking: Dict[str, List[dict]]):
+        """Replace the results of many bookings through a BulkWriter (see create_bookings_many)."""
+        refs = self._booking_refs(list(results_by_booking))
+        owners = {doc.id: (doc.to_dict() or {}).get('user_id') for doc in self.fs.get_all(list(refs.values())) if doc.exists}
+        calls = {}
+        writer = self._bulk_writer()
+        for bid, results in results_by_booking.items():
+            delta = self._replace_results(writer, refs[bid], results)
+            calls[owners.get(bid)] = calls.get(owners.get(bid), 0) + delta
+        for user_id, delta in calls.items():
+            _bump_stats(writer, self._stats_ref(user_id), total_calls=delta)
+        writer.close()
+
+    def get_all_bookings(self, user_id: Optional[str] = None, summary: bool = False) -> List[dict]:
+        query = self.layout.user_query(self.fs, 'bookings', user_id).order_by('created_at', direction='DESCENDING')
+        if summary:
+            return self._summaries([doc.to_dict() for doc in query.select(_SUMMARY_FIELD_PATHS).stream()])
+        return self._attach_results_many([doc.to_dict() for doc in query.stream()])
+
+    def list_bookings(self, user_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None,
+                      summary: bool = False) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        query = self.layout.user_query(self.fs, 'bookings', user_id)
+        query = query.order_by('created_at', direction='DESCENDING').order_by('booking_id', direction='DESCENDING')
+        if after:
+            query = query.start_after({'created_at': after[0], 'booking_id': after[1]})
+        if summary:
+            query = query.select(_SUMMARY_FIELD_PATHS)
+        bookings = [doc.to_dict() for doc in query.limit(limit + 1).stream()]
+        page, next_cursor = page_of(bookings, limit, 'created_at', 'booking_id')
+        return (self._summaries(page) if summary else self._attach_results_many(page)), next_cursor
+
+    def get_bookings_by_ids(self, booking_ids: List[str], summary: bool = False) -> List[dict]:
+        if not booking_ids:
+            return []
+        refs = list(self._booking_refs(booking_ids).values())
+        docs = self.fs.get_all(refs, field_paths=_SUMMARY_FIELD_PATHS) if summary else self.fs.get_all(refs)
+        bookings = [doc.to_dict() for doc in docs if doc.exists]
+        found = {b['booking_id']: b for b in (self._summaries(bookings) if summary else self._attach_results_many(bookings))}
+        return [found[bid] for bid in booking_ids if bid in found]
+
+    def clear_all_bookings(self):
+        for name in ('bookings', 'archived_bookings', 'call_index', 'user_stats', 'jobs'):
+            self.delete_collection(name)
+
+    def clean_db(self):
+        self.clear_all_bookings()
+        self.delete_collection('tasks')
+
+    def delete_collection(self, name: str) -> int:
+        """Delete a collection and every subcollection under it with a parallel BulkWriter; returns the document count."""
+        if name not in COLLECTIONS:
+            raise ValueError(f'Unknown collection {name!r}')
+        if name in _ID_FIELDS and self.layout.per_user:
+            # Listing users/ includes user documents that only exist as parents of subcollections
+            count = sum(self.fs.recursive_delete(user_ref.collection(name), bulk_writer=self._bulk_writer())
+                        for user_ref in self.fs.collection('users').list_documents())
+            self.owners = _Owners()
+            return count
+        return self.fs.recursive_delete(self.fs.collection(name), bulk_writer=self._bulk_writer())
+
+    # --- Retention ------------------------------------------------------------
+    # archived_bookings/{id} documents hold the whole booking (results included) as one
+    # zlib-compressed blob. Archive copies are written and flushed before anything is
+    # deleted, so an interrupted run leaves duplicates (retried safely), never losses.
+
+    def archive_bookings(self, older_than: float, limit: int) -> int:
+        query = (self.layout.group(self.fs, 'bookings')
+                 .where('status', '==', ARCHIVABLE_BOOKING_STATUS)
+                 .where('created_at', '<', older_than)
+                 .order_by('created_at')
+                 .limit(limit))
+        docs = list(query.stream())
+        refs = {doc.id: doc.reference for doc in docs}
+        bookings = self._attach_results_many([doc.to_dict() for doc in docs])
+        if not bookings:
+            return 0
+        archived_at = datetime.now().timestamp()
+        writer = self._bulk_writer()
+        for b in bookings:
+            writer.set(self.fs.collection('archived_bookings').document(b['booking_id']), {
+                'booking_id': b['booking_id'],
+                'user_id': b.get('user_id'),
+                'created_at': b['created_at'],
+                'archived_at': archived_at,
+                'data': pack_archived(b),
+            })
+        writer.close()
+
+        writer = self._bulk_writer()
+        for b in bookings:
+            booking_ref = refs[b['booking_id']]
+            for doc_ref in booking_ref.collection('results').list_documents():
+                writer.delete(doc_ref)
+            for r in b['results']:
+                for key in call_keys(r):
+                    writer.delete(self.fs.collection('call_index').document(key))
+            writer.delete(booking_ref)
+        # Archived bookings still count towards their users' stats; only the recent list drops them
+        for user_id in {b['user_id'] for b in bookings if b.get('user_id') is not None}:
+            gone = [b['booking_id'] for b in bookings if b.get('user_id') == user_id]
+            writer.set(self._stats_ref(user_id), {'recent_booking_ids': _firestore().ArrayRemove(gone)}, merge=True)
+        writer.close()
+        self.owners.forget('bookings', refs)
+        return len(bookings)
+
+    def get_archived_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        doc = self.fs.collection('archived_bookings').document(booking_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if user_id is not None and data.get('user_id') != user_id:
+            return None
+        return unpack_archived(data['data'], data['archived_at'])
+
+    def expire_tasks(self, older_than: float, limit: int) -> int:
+        query = (self.layout.group(self.fs, 'tasks')
+                 .where('status', '==', EXPIRABLE_TASK_STATUS)
+                 .where('updated_at', '<', older_than)
+                 .order_by('updated_at')
+                 .limit(limit))
+        refs = [doc.reference for doc in query.stream()]
+        writer = self._bulk_writer()
+        for ref in refs:
+            for msg_ref in ref.collection('messages').list_documents():
+                writer.delete(msg_ref)
+            writer.delete(ref)
+        writer.close()
+        self.owners.forget('tasks', [ref.id for ref in refs])
+        return len(refs)
+
+    # --- Change feeds ---------------------------------------------------------
+    # Result writes don't touch the booking document, so a booking is watched through two
+    # listeners: its document (status changes) and its results subcollection.
+
+    def watch_booking(self, booking_id: str, on_change: Callable[[], None]) -> Optional[Callable[[], None]]:
+        booking_ref = self._ref('bookings', booking_id)
+        watches = [target.on_snapshot(lambda docs, changes, read_time: on_change())
+                   for target in (booking_ref, booking_ref.collection('results'))]
+
+        def _unsubscribe():
+            for watch in watches:
+                watch.unsubscribe()
+
+        return _unsubscribe
+
+    # --- Call index -----------------------------------------------------------
+
+    def register_call(self, call_key: str, booking_id: str, result_index: int):
+        self.fs.collection('call_index').document(call_key).set({'booking_id': booking_id, 'result_index': result_index})
+
+    def lookup_call(self, call_key: str) -> Optional[Tuple[str, int]]:
+        doc = self.fs.collection('call_index').document(call_key).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        return data['booking_id'], data['result_index']
+
+    # --- Dashboard stats --------------------------------------------------------
+
+    def get_user_stats(self, user_id: str) -> dict:
+        doc = self.fs.collection('user_stats').document(user_id).get()
+        if not doc.exists:
+            return self.rebuild_user_stats(user_id)
+        data = doc.to_dict()
+        return {**{name: data.get(name, 0) for name in STATS_COUNTERS}, 'recent_booking_ids': data.get('recent_booking_ids') or []}
+
+    def rebuild_user_stats(self, user_id: str) -> dict:
+        archived = [unpack_archived(d['data'], d['archived_at']) for d in
+                    (doc.to_dict() for doc in self.fs.collection('archived_bookings').where('user_id', '==', user_id).stream())]
+        stats = stats_from_bookings(self.get_all_bookings(user_id), archived)
+        self.fs.collection('user_stats').document(user_id).set(stats)
+        return stats
+
+    # --- Tasks ----------------------------------------------------------------
+    # Messages are tasks/{id}/messages/{seq} documents; tasks created before that keep
+    # an inline conversation array until their next append.
+
+    def create_task(self, task_id: str, user_id: Optional[str] = None) -> dict:
+        now = datetime.now().timestamp()
+        task = {
+            'task_id': task_id,
+            'user_id': user_id,
+            'status': 'gathering_info',
+            'extracted_data': {},
+            'message_count': 0,
+            'created_at': now,
+            'updated_at': now,
+        }
+        self.layout.collection(self.fs, 'tasks', user_id).document(task_id).set(task)
+        self.owners.put('tasks', task_id, user_id)
+        return {**task, 'conversation': []}
+
+    def get_task(self, task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                 conversation_limit: Optional[int] = None) -> Optional[dict]:
+        doc_ref = self._ref('tasks', task_id, user_id)
+        doc = doc_ref.get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if user_id is not None and data.get('user_id') != user_id:
+            return None
+        task = _task(data)
+        if include_conversation:
+            legacy = data.get('conversation')
+            if legacy is not None:
+                task['conversation'] = legacy[-conversation_limit:] if conversation_limit else legacy
+            else:
+                task['conversation'] = _read_messages(doc_ref, conversation_limit)
+        return task
+
+    def get_task_messages(self, task_id: str, limit: Optional[int] = None) -> List[dict]:
+        doc_ref = self._ref('tasks', task_id)
+        legacy = (doc_ref.get().to_dict() or {}).get('conversation')
+        if legacy is not None:
+            return legacy[-limit:] if limit else legacy
+        return _read_messages(doc_ref, limit)
+
+    def append_task_messages(self, task_id: str, messages: List[dict], status: str = None,
+                             extracted_data: dict = None, user_id: Optional[str] = None) -> bool:
+        task_ref = self._ref('tasks', task_id, user_id)
+
+        @_firestore().transactional
+        def _append(transaction):
+            doc = task_ref.get(transaction=transaction)
+            if not doc.exists:
+                return False
+            data = doc.to_dict()
+            if user_id is not None and data.get('user_id') != user_id:
+                return False
+            _append_messages(transaction, task_ref, data, messages, status, extracted_data)
+            return True
+
+        return _append(self.fs.transaction())
+
+    def update_task(self, task_id: str, status: str = None, extracted_data: dict = None,
+                    conversation: list = None, user_id: Optional[str] = None):
+        doc_ref = self._ref('tasks', task_id, user_id)
+        doc = doc_ref.get()
+        if not doc.exists:
+            return
+        data = doc.to_dict()
+        if user_id is not None and data.get('user_id') != user_id:
+            return
+        update = {'updated_at': datetime.now().timestamp()}
+        if status is not None:
+            update['status'] = status
+        if extracted_data is not None:
+            update['extracted_data'] = extracted_data
+        if conversation is not None:
+            batch = self.fs.batch()
+            for ref in doc_ref.collection('messages').list_documents():
+                batch.delete(ref)
+            for seq, m in enumerate(conversation):
+                batch.set(doc_ref.collection('messages').document(_message_id(seq)),
+                          {'task_id': task_id, 'seq': seq, 'message': m})
+            update['message_count'] = len(conversation)
+            update['conversation'] = _firestore().DELETE_FIELD
+            batch.update(doc_ref, update)
+            batch.commit()
+        else:
+            doc_ref.update(update)
+
+    def get_all_tasks(self, user_id: Optional[str] = None) -> List[dict]:
+        query = self.layout.user_query(self.fs, 'tasks', user_id).order_by('updated_at', direction='DESCENDING')
+        tasks = []
+        for doc in query.stream():
+            data = doc.to_dict()
+            conversation = data.get('conversation')
+            tasks.append({**_task(data), 'conversation': conversation if conversation is not None
+                          else _read_messages(doc.reference)})
+        return tasks
+
+    def list_tasks(self, user_id: Optional[str] = None, limit: int = 50,
+                   cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        query = self.layout.user_query(self.fs, 'tasks', user_id)
+        query = query.order_by('updated_at', direction='DESCENDING').order_by('task_id', direction='DESCENDING')
+        if after:
+            query = query.start_after({'updated_at': after[0], 'task_id': after[1]})
+        tasks = [_task(doc.to_dict()) for doc in query.limit(limit + 1).stream()]
+        return page_of(tasks, limit, 'updated_at', 'task_id')
+
+    # --- Jobs -------------------------------------------------------------------
+    # jobs/{id}. Candidates are found with plain queries and each claim is a transaction that
+    # re-checks the job, so workers racing for the same job never both get it.
+
+    def enqueue_job(self, job_id: str, kind: str, payload: dict, max_attempts: int = 3,
+                    run_at: Optional[float] = None) -> dict:
+        job = new_job(job_id, kind, payload, max_attempts, run_at, datetime.now().timestamp())
+        self.fs.collection('jobs').document(job_id).set(job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        doc = self.fs.collection('jobs').document(job_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def claim_job(self, worker_id: str, lease_seconds: float, kinds: Optional[List[str]] = None) -> Optional[dict]:
+        jobs = self.fs.collection('jobs')
+        now = datetime.now().timestamp()
+        queries = (
+            jobs.where('status', '==', JOB_QUEUED).where('run_at', '<=', now).order_by('run_at'),
+            jobs.where('status', '==', JOB_RUNNING).where('lease_expires_at', '<=', now).order_by('lease_expires_at'),
+        )
+        for query in queries:
+            for doc in query.limit(JOB_CLAIM_CANDIDATES).stream():
+                if kinds and doc.to_dict().get('kind') not in kinds:
+                    continue
+                job = self._claim(doc.reference, worker_id, lease_seconds)
+                if job is not None:
+                    return job
+        return None
+
+    def _claim(self, job_ref, worker_id: str, lease_seconds: float) -> Optional[dict]:
+        @_firestore().transactional
+        def _claim_one(transaction):
+            doc = job_ref.get(transaction=transaction)
+            now = datetime.now().timestamp()
+            if not doc.exists or not job_is_due(doc.to_dict(), now):
+                return None  # another worker got it first
+            job = doc.to_dict()
+            job.update(status=JOB_RUNNING, attempts=job.get('attempts', 0) + 1, lease_owner=worker_id,
+                       lease_expires_at=now + lease_seconds, updated_at=now)
+            transaction.update(job_ref, {k: job[k] for k in ('status', 'attempts', 'lease_owner', 'lease_expires_at',
+                                                             'updated_at')})
+            return job
+
+        return _claim_one(self.fs.transaction())
+
+    def _update_leased_job(self, job_id: str, worker_id: str, **fields) -> bool:
+        """Set fields on a running job only while worker_id holds its lease."""
+        job_ref = self.fs.collection('jobs').document(job_id)
+
+        @_firestore().transactional
+        def _update(transaction):
+            doc = job_ref.get(transaction=transaction)
+            data = doc.to_dict() if doc.exists else {}
+            if data.get('status') != JOB_RUNNING or data.get('lease_owner') != worker_id:
+                return False
+            transaction.update(job_ref, {**fields, 'updated_at': datetime.now().timestamp()})
+            return True
+
+        return _update(self.fs.transaction())
+
+    def renew_job_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        return self._update_leased_job(job_id, worker_id, lease_expires_at=datetime.now().timestamp() + lease_seconds)
+
+    def complete_job(self, job_id: str, worker_id: str) -> bool:
+        return self._update_leased_job(job_id, worker_id, status=JOB_DONE, lease_owner=None, lease_expires_at=None)
+
+    def fail_job(self, job_id: str, worker_id: str, error: str, retry_at: Optional[float] = None) -> bool:
+        return self._update_leased_job(job_id, worker_id, **failed_job_fields(error, retry_at))
+
+    # --- Waitlist and allowed emails -----------------------------------------
+
+    def add_to_waitlist(self, email: str, name: str, confirmation_sent: bool = False) -> dict:
+        now = datetime.now().timestamp()
+        self.fs.collection('waitlist').document(email).set({
+            'email': email,
+            'name': name,
+            'created_at': now,
+            'confirmation_sent_at': now if confirmation_sent else None,
+        }, merge=True)
+        return {'email': email, 'name': name, 'created_at': now}
+
+    def get_waitlist(self) -> List[dict]:
+        docs = self.fs.collection('waitlist').order_by('created_at', direction='DESCENDING').stream()
+        return [doc.to_dict() for doc in docs]
+
+    def set_confirmation_sent(self, email: str):
+        self.fs.collection('waitlist').document(email).update({'confirmation_sent_at': datetime.now().timestamp()})
+
+    def is_email_allowed(self, email: str) -> bool:
+        return self.fs.collection('allowed_emails').document(email).get().exists
+
+    def add_allowed_email(self, email: str) -> dict:
+        now = datetime.now().timestamp()
+        self.fs.collection('allowed_emails').document(email).set({'email': email, 'added_at': now})
+        return {'email': email, 'added_at': now}
+
+    def get_allowed_emails(self) -> List[dict]:
+        docs = self.fs.collection('allowed_emails').order_by('added_at', direction='DESCENDING').stream()
+        return [doc.to_dict() for doc in docs]
+
+    def watch_allowed_emails(self, callback: Callable[[List[str]], None]) -> Optional[Callable[[], None]]:
+        # Every snapshot carries the whole (small) collection; document ids are the emails
+        watch = self.fs.collection('allowed_emails').on_snapshot(lambda docs, changes, read_time: callback([doc.id for doc in docs]))
+        return watch.unsubscribe
+
+    # --- Helpers --------------------------------------------------------------
+
+    def _bulk_writer(self):
+        from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions, SendMode
+        return self.fs.bulk_writer(options=BulkWriterOptions(
+            initial_ops_per_second=BULK_INITIAL_OPS_PER_SECOND,
+            max_ops_per_second=BULK_MAX_OPS_PER_SECOND,
+            mode=SendMode.parallel,
+        ))
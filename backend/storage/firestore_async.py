@@ -0,0 +1,207 @@
+"""
+Firestore on AsyncClient: the hot-path operations of storage.aio over the same documents
+storage.firestore writes. Reads that don't depend on each other are issued together, e.g.
+a booking document and its results subcollection.
+
+AsyncClient channels belong to the event loop they were created on, so use one instance
+per loop (database_async does). The layout (flat or per-user) and the owner cache come
+from the blocking backend; rare paths such as the stats backfill run it in a worker thread.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+from storage.aio import AsyncStorageBackend
+from storage.base import STATS_COUNTERS, StorageBackend, status_deltas, unpack_archived
+from storage.firestore import (
+    _append_messages,
+    _attach_results,
+    _bump_stats,
+    _firestore,
+    _heads,
+    _merge_results,
+    _result_id,
+    _results_query,
+    _rev,
+    _task,
+    _update_heads,
+    _write_results,
+)
+
+
+async def _read_results(booking_ref, transaction=None) -> List[dict]:
+    """A booking's result documents, in order."""
+    return [doc.to_dict() async for doc in _results_query(booking_ref).stream(transaction=transaction)]
+
+
+async def _read_messages(task_ref, limit: Optional[int] = None) -> List[dict]:
+    coll = task_ref.collection('messages')
+    if limit:
+        docs = [doc async for doc in coll.order_by('seq', direction='DESCENDING').limit(limit).stream()]
+        docs.reverse()
+    else:
+        docs = [doc async for doc in coll.order_by('seq').stream()]
+    return [doc.to_dict()['message'] for doc in docs]
+
+
+class AsyncFirestoreBackend(AsyncStorageBackend):
+    name = 'firestore'
+
+    def __init__(self, sync: StorageBackend, client=None):
+        self.sync = sync
+        self._client = client
+
+    @property
+    def fs(self):
+        """The AsyncClient (lazy init, on the running loop)."""
+        if self._client is None:
+            self._client = _firestore().AsyncClient()
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    # --- Bookings -----------------------------------------------------------
+
+    async def get_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        doc_ref = await self._ref('bookings', booking_id, user_id)
+        # The results read is wasted only for a missing or foreign booking, so don't wait on the document first
+        doc, results = await asyncio.gather(doc_ref.get(), _read_results(doc_ref))
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if user_id is not None and data.get('user_id') != user_id:
+            return None
+        return _attach_results(data, results)
+
+    async def get_archived_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        doc = await self.fs.collection('archived_bookings').document(booking_id).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if user_id is not None and data.get('user_id') != user_id:
+            return None
+        return unpack_archived(data['data'], data['archived_at'])
+
+    async def update_booking_status(self, booking_id: str, status: str, results: Optional[List[dict]] = None):
+        booking_ref = await self._ref('bookings', booking_id)
+
+        @_firestore().async_transactional
+        async def _update(transaction):
+            doc, existing = await asyncio.gather(booking_ref.get(transaction=transaction),
+                                                 _read_results(booking_ref, transaction))
+            old = doc.to_dict() or {}
+            if results is not None:
+                calls = _write_results(transaction, self.fs, booking_ref, existing, results, {'status': status})
+            else:
+                calls = 0
+                transaction.update(booking_ref, {'status': status, 'version': _firestore().Increment(1),
+                                                 'result_heads': _heads({d['result_index']: d['result'] for d in existing})})
+            _bump_stats(transaction, self._stats_ref(old.get('user_id')), total_calls=calls,
+                        **status_deltas(old.get('status'), status))
+
+        await _update(self.fs.transaction())
+
+    async def merge_booking_results(self, booking_id: str, updates: Dict[int, dict]):
+        if not updates:
+            return
+        indexed = sorted(updates.items())
+        booking_ref = await self._ref('bookings', booking_id)
+        result_refs = [booking_ref.collection('results').document(_result_id(i)) for i, _ in indexed]
+
+        @_firestore().async_transactional
+        async def _update(transaction):
+            # The booking's status decides whether its result_heads need the update too
+            booking, *snapshots = await asyncio.gather(booking_ref.get(transaction=transaction),
+                                                       *(ref.get(transaction=transaction) for ref in result_refs))
+            old = booking.to_dict() or {}
+            _merge_results(transaction, self.fs, booking_ref, indexed,
+                           {i: _rev(snap) + 1 for (i, _), snap in zip(indexed, snapshots)})
+            _update_heads(transaction, booking_ref, old, indexed)
+            new_count = sum(1 for snap in snapshots if not snap.exists)
+            if new_count:
+                _bump_stats(transaction, self._stats_ref(old.get('user_id')), total_calls=new_count)
+
+        await _update(self.fs.transaction())
+
+    # --- Call index -----------------------------------------------------------
+
+    async def lookup_call(self, call_key: str) -> Optional[Tuple[str, int]]:
+        doc = await self.fs.collection('call_index').document(call_key).get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        return data['booking_id'], data['result_index']
+
+    # --- Dashboard stats --------------------------------------------------------
+
+    async def get_user_stats(self, user_id: str) -> dict:
+        doc = await self.fs.collection('user_stats').document(user_id).get()
+        if not doc.exists:
+            return await asyncio.to_thread(self.sync.rebuild_user_stats, user_id)
+        data = doc.to_dict()
+        return {**{name: data.get(name, 0) for name in STATS_COUNTERS}, 'recent_booking_ids': data.get('recent_booking_ids') or []}
+
+    # --- Tasks ----------------------------------------------------------------
+
+    async def get_task(self, task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                       conversation_limit: Optional[int] = None) -> Optional[dict]:
+        doc_ref = await self._ref('tasks', task_id, user_id)
+        if include_conversation:
+            doc, messages = await asyncio.gather(doc_ref.get(), _read_messages(doc_ref, conversation_limit))
+        else:
+            doc, messages = await doc_ref.get(), None
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        if user_id is not None and data.get('user_id') != user_id:
+            return None
+        task = _task(data)
+        if include_conversation:
+            legacy = data.get('conversation')
+            if legacy is not None:
+                task['conversation'] = legacy[-conversation_limit:] if conversation_limit else legacy
+            else:
+                task['conversation'] = messages
+        return task
+
+    async def append_task_messages(self, task_id: str, messages: List[dict], status: str = None,
+                                   extracted_data: dict = None, user_id: Optional[str] = None) -> bool:
+        task_ref = await self._ref('tasks', task_id, user_id)
+
+        @_firestore().async_transactional
+        async def _append(transaction):
+            doc = await task_ref.get(transaction=transaction)
+            if not doc.exists:
+                return False
+            data = doc.to_dict()
+            if user_id is not None and data.get('user_id') != user_id:
+                return False
+            _append_messages(transaction, task_ref, data, messages, status, extracted_data)
+            return True
+
+        return await _append(self.fs.transaction())
+
+    # --- Allowed emails -------------------------------------------------------
+
+    async def is_email_allowed(self, email: str) -> bool:
+        return (await self.fs.collection('allowed_emails').document(email).get()).exists
+
+    # --- Helpers --------------------------------------------------------------
+
+    async def _ref(self, name: str, record_id: str, user_id: Optional[str] = None):
+        """Reference to a booking or task in the blocking backend's layout (see FirestoreBackend._ref)."""
+        layout = self.sync.layout
+        if layout.per_user and user_id is None:
+            try:
+                user_id = self.sync.owners.get(name, record_id)
+            except KeyError:
+                async for doc in layout.owner_query(self.fs, name, [record_id]).stream():
+                    user_id = doc.to_dict().get('user_id')
+                    self.sync.owners.put(name, record_id, user_id)
+        return layout.collection(self.fs, name, user_id).document(record_id)
+
+    def _stats_ref(self, user_id: Optional[str]):
+        return self.fs.collection('user_stats').document(user_id) if user_id is not None else None
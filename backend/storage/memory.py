@@ -0,0 +1,484 @@
+"""
+In-memory storage backend for load tests and benchmarks (STORAGE_BACKEND=memory).
+Nothing is persisted. Records are guarded by a fixed set of striped locks chosen by
+key hash, so writers to different bookings / tasks / users rarely contend; an
+operation that touches several keys takes their stripes in a fixed order.
+"""
+
+import copy
+import os
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from storage.base import (
+    ARCHIVABLE_BOOKING_STATUS,
+    COLLECTIONS,
+    EXPIRABLE_TASK_STATUS,
+    JOB_DONE,
+    JOB_RUNNING,
+    STATS_COUNTERS,
+    StorageBackend,
+    booking_summary,
+    bulk_stats_deltas,
+    call_keys,
+    decode_cursor,
+    failed_job_fields,
+    job_is_due,
+    new_booking,
+    new_job,
+    pack_archived,
+    page_of,
+    push_recent,
+    stats_from_bookings,
+    status_deltas,
+    unpack_archived,
+)
+
+LOCK_STRIPES = int(os.getenv('MEMORY_STORE_STRIPES', '64'))
+
+
+def _after(item: dict, sort_field: str, key_field: str, after: Optional[Tuple[float, str]]) -> bool:
+    if after is None:
+        return True
+    return (item[sort_field], item[key_field]) < after
+
+
+class MemoryBackend(StorageBackend):
+    name = 'memory'
+
+    def __init__(self, stripes: int = LOCK_STRIPES):
+        self._locks = [threading.RLock() for _ in range(max(1, stripes))]
+        self._bookings: Dict[str, dict] = {}
+        self._results: Dict[str, Dict[int, dict]] = {}
+        self._archived: Dict[str, dict] = {}  # booking_id -> {'user_id', 'archived_at', 'data': compressed booking}
+        self._call_index: Dict[str, Tuple[str, int]] = {}
+        self._stats: Dict[str, dict] = {}
+        self._tasks: Dict[str, dict] = {}
+        self._messages: Dict[str, List[dict]] = {}
+        self._waitlist: Dict[str, dict] = {}
+        self._allowed: Dict[str, dict] = {}
+        self._jobs: Dict[str, dict] = {}
+        # Claims scan every job, so the queue has one lock of its own rather than a stripe per job
+        self._jobs_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, *keys):
+        """Hold the stripes for the given keys (None is ignored), always acquired in index order."""
+        stripes = sorted({hash(k) % len(self._locks) for k in keys if k is not None})
+        with ExitStack() as stack:
+            for i in stripes:
+                stack.enter_context(self._locks[i])
+            yield
+
+    def init_db(self):
+        print("✅ Using in-memory storage (nothing is persisted)")
+
+    def close(self):
+        pass
+
+    # --- Helpers (callers hold the relevant stripes) ---------------------------
+
+    def _booking_copy(self, booking_id: str) -> dict:
+        booking = copy.deepcopy(self._bookings[booking_id])
+        results = self._results.get(booking_id, {})
+        booking['results'] = [copy.deepcopy(results[i]) for i in sorted(results)]
+        return booking
+
+    def _bump_stats(self, user_id: Optional[str], recent_booking_ids: List[str] = (), **deltas):
+        if user_id is None or not (recent_booking_ids or any(deltas.values())):
+            return
+        stats = self._stats.setdefault(user_id, {**{name: 0 for name in STATS_COUNTERS}, 'recent_booking_ids': []})
+        for name, delta in deltas.items():
+            stats[name] += delta
+        if recent_booking_ids:
+            stats['recent_booking_ids'] = push_recent(stats['recent_booking_ids'], *recent_booking_ids)
+
+    def _index_calls(self, booking_id: str, indexed_results):
+        for idx, r in indexed_results:
+            for key in call_keys(r):
+                self._call_index[key] = (booking_id, idx)
+
+    def _owner(self, booking_id: str) -> Optional[str]:
+        booking = self._bookings.get(booking_id)
+        return booking.get('user_id') if booking else None
+
+    # --- Bookings -----------------------------------------------------------
+
+    def create_booking(self, booking_id: str, service_type: str, location: str, timeframe: str,
+                       preferences: dict, user_id: Optional[str] = None) -> dict:
+        booking = {
+            'booking_id': booking_id,
+            'user_id': user_id,
+            'service_type': service_type,
+            'location': location,
+            'timeframe': timeframe,
+            'status': 'processing',
+            'created_at': datetime.now().timestamp(),
+            'preferences': copy.deepcopy(preferences),
+            'version': 1,
+        }
+        with self._locked(booking_id, user_id):
+            self._bookings[booking_id] = booking
+            self._results[booking_id] = {}
+            self._bump_stats(user_id, total_bookings=1, processing=1, recent_booking_ids=[booking_id])
+        return {**copy.deepcopy(booking), 'results': []}
+
+    def get_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        with self._locked(booking_id):
+            booking = self._bookings.get(booking_id)
+            if booking is None or (user_id is not None and booking.get('user_id') != user_id):
+                return None
+            return self._booking_copy(booking_id)
+
+    def _write_results(self, booking_id: str, fn):
+        # The owner is fixed at creation, so it can be read before taking the stripes
+        user_id = self._owner(booking_id)
+        with self._locked(booking_id, user_id):
+            booking = self._bookings.get(booking_id)
+            if booking is not None:
+                booking['version'] = booking.get('version', 0) + 1
+            return fn(user_id)
+
+    def update_booking_status(self, booking_id: str, status: str, results: Optional[List[dict]] = None):
+        def _update(user_id):
+            booking = self._bookings.get(booking_id)
+            if booking is None:
+                return
+            old_status, booking['status'] = booking['status'], status
+            calls = self._replace_results(booking_id, results) if results is not None else 0
+            self._bump_stats(user_id, total_calls=calls, **status_deltas(old_status, status))
+
+        self._write_results(booking_id, _update)
+
+    def _merge_results(self, booking_id: str, updates: Dict[int, dict]) -> int:
+        stored = self._results.setdefault(booking_id, {})
+        new_count = sum(1 for i in updates if i not in stored)
+        for i, result in updates.items():
+            stored[i] = copy.deepcopy(result)
+        self._index_calls(booking_id, updates.items())
+        return new_count
+
+    def _replace_results(self, booking_id: str, results: List[dict]) -> int:
+        before = len(self._results.get(booking_id, {}))
+        self._results[booking_id] = {i: copy.deepcopy(r) for i, r in enumerate(results)}
+        self._index_calls(booking_id, enumerate(results))
+        return len(results) - before
+
+    def update_booking_results(self, booking_id: str, results: List[dict]):
+        self._write_results(booking_id, lambda user_id: self._bump_stats(
+            user_id, total_calls=self._replace_results(booking_id, results)))
+
+    def merge_booking_results(self, booking_id: str, updates: Dict[int, dict]):
+        if not updates:
+            return
+
+        self._write_results(booking_id, lambda user_id: self._bump_stats(
+            user_id, total_calls=self._merge_results(booking_id, updates)))
+
+    def compare_and_set_booking(self, booking_id: str, version: int, status: Optional[str] = None,
+                                updates: Optional[Dict[int, dict]] = None) -> bool:
+        user_id = self._owner(booking_id)
+        with self._locked(booking_id, user_id):
+            booking = self._bookings.get(booking_id)
+            if booking is None or booking.get('version', 0) != version:
+                return False
+            booking['version'] = version + 1
+            deltas = {}
+            if status is not None:
+                old_status, booking['status'] = booking['status'], status
+                deltas = status_deltas(old_status, status)
+            calls = self._merge_results(booking_id, updates) if updates else 0
+            self._bump_stats(user_id, total_calls=calls, **deltas)
+            return True
+
+    def create_bookings_many(self, bookings: List[dict]) -> List[dict]:
+        now = datetime.now().timestamp()
+        records = [new_booking(copy.deepcopy(spec), now) for spec in bookings]
+        results = {spec['booking_id']: copy.deepcopy(spec.get('results') or []) for spec in bookings}
+        by_user = bulk_stats_deltas(records, results)
+        with self._locked(*(b['booking_id'] for b in records), *by_user):
+            for b in records:
+                self._bookings[b['booking_id']] = b
+                self._results[b['booking_id']] = dict(enumerate(results[b['booking_id']]))
+                self._index_calls(b['booking_id'], enumerate(results[b['booking_id']]))
+            for user_id, entry in by_user.items():
+                self._bump_stats(user_id, recent_booking_ids=entry['recent'], **entry['deltas'])
+        return [{**copy.deepcopy(b), 'results': copy.deepcopy(results[b['booking_id']])} for b in records]
+
+    def update_results_many(self, results_by_booking: Dict[str, List[dict]]):
+        for booking_id, results in results_by_booking.items():
+            self.update_booking_results(booking_id, results)
+
+    def _snapshot_bookings(self, user_id: Optional[str] = None, summary: bool = False) -> List[dict]:
+        bookings = []
+        for booking_id in list(self._bookings):
+            booking = self.get_booking(booking_id, user_id)
+            if booking is not None:
+                bookings.append(booking_summary(booking) if summary else booking)
+        bookings.sort(key=lambda b: (b['created_at'], b['booking_id']), reverse=True)
+        return bookings
+
+    def get_all_bookings(self, user_id: Optional[str] = None, summary: bool = False) -> List[dict]:
+        return self._snapshot_bookings(user_id, summary)
+
+    def list_bookings(self, user_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None,
+                      summary: bool = False) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        bookings = [b for b in self._snapshot_bookings(user_id, summary) if _after(b, 'created_at', 'booking_id', after)]
+        return page_of(bookings[:limit + 1], limit, 'created_at', 'booking_id')
+
+    def get_bookings_by_ids(self, booking_ids: List[str], summary: bool = False) -> List[dict]:
+        bookings = (self.get_booking(bid) for bid in booking_ids)
+        return [booking_summary(b) if summary else b for b in bookings if b is not None]
+
+    def clear_all_bookings(self):
+        for name in ('bookings', 'archived_bookings', 'call_index', 'user_stats', 'jobs'):
+            self.delete_collection(name)
+
+    def clean_db(self):
+        self.clear_all_bookings()
+        self.delete_collection('tasks')
+
+    def delete_collection(self, name: str) -> int:
+        if name not in COLLECTIONS:
+            raise ValueError(f'Unknown collection {name!r}')
+        stores = {
+            'bookings': (self._bookings, self._results),
+            'archived_bookings': (self._archived,),
+            'tasks': (self._tasks, self._messages),
+            'call_index': (self._call_index,),
+            'user_stats': (self._stats,),
+            'waitlist': (self._waitlist,),
+            'allowed_emails': (self._allowed,),
+            'jobs': (self._jobs,),
+        }[name]
+        with self._locked(*range(len(self._locks))):
+            count = len(stores[0])
+            for store in stores:
+                store.clear()
+        return count
+
+    # --- Retention ------------------------------------------------------------
+    # Rare, batch operations: they hold every stripe rather than work out which ones they need.
+
+    def archive_bookings(self, older_than: float, limit: int) -> int:
+        archived_at = datetime.now().timestamp()
+        with self._locked(*range(len(self._locks))):
+            cold = sorted((b for b in self._bookings.values()
+                           if b['status'] == ARCHIVABLE_BOOKING_STATUS and b['created_at'] < older_than),
+                          key=lambda b: b['created_at'])[:limit]
+            bookings = [self._booking_copy(b['booking_id']) for b in cold]
+            for b in bookings:
+                self._archived[b['booking_id']] = {'user_id': b['user_id'], 'archived_at': archived_at,
+                                                   'data': pack_archived(b)}
+                for r in b['results']:
+                    for key in call_keys(r):
+                        if self._call_index.get(key, (None,))[0] == b['booking_id']:
+                            del self._call_index[key]
+                del self._bookings[b['booking_id']]
+                self._results.pop(b['booking_id'], None)
+            gone = {b['booking_id'] for b in bookings}
+            # Archived bookings still count towards their users' stats; only the recent list drops them
+            for user_id in {b['user_id'] for b in bookings if b['user_id'] in self._stats}:
+                stats = self._stats[user_id]
+                stats['recent_booking_ids'] = [bid for bid in stats['recent_booking_ids'] if bid not in gone]
+        return len(bookings)
+
+    def get_archived_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        entry = self._archived.get(booking_id)
+        if entry is None or (user_id is not None and entry['user_id'] != user_id):
+            return None
+        return unpack_archived(entry['data'], entry['archived_at'])
+
+    def expire_tasks(self, older_than: float, limit: int) -> int:
+        with self._locked(*range(len(self._locks))):
+            stale = sorted((t for t in self._tasks.values()
+                            if t['status'] == EXPIRABLE_TASK_STATUS and t['updated_at'] < older_than),
+                           key=lambda t: t['updated_at'])[:limit]
+            for t in stale:
+                del self._tasks[t['task_id']]
+                self._messages.pop(t['task_id'], None)
+        return len(stale)
+
+    # --- Call index -----------------------------------------------------------
+
+    def register_call(self, call_key: str, booking_id: str, result_index: int):
+        self._call_index[call_key] = (booking_id, result_index)
+
+    def lookup_call(self, call_key: str) -> Optional[Tuple[str, int]]:
+        return self._call_index.get(call_key)
+
+    # --- Dashboard stats --------------------------------------------------------
+
+    def get_user_stats(self, user_id: str) -> dict:
+        with self._locked(user_id):
+            stats = self._stats.get(user_id)
+            if stats is not None:
+                return copy.deepcopy(stats)
+        return self.rebuild_user_stats(user_id)
+
+    def rebuild_user_stats(self, user_id: str) -> dict:
+        archived = [unpack_archived(e['data'], e['archived_at']) for e in list(self._archived.values())
+                    if e['user_id'] == user_id]
+        stats = stats_from_bookings(self.get_all_bookings(user_id), archived)
+        with self._locked(user_id):
+            self._stats[user_id] = copy.deepcopy(stats)
+        return stats
+
+    # --- Tasks ----------------------------------------------------------------
+
+    def create_task(self, task_id: str, user_id: Optional[str] = None) -> dict:
+        now = datetime.now().timestamp()
+        task = {
+            'task_id': task_id,
+            'user_id': user_id,
+            'status': 'gathering_info',
+            'extracted_data': {},
+            'message_count': 0,
+            'created_at': now,
+            'updated_at': now,
+        }
+        with self._locked(task_id):
+            self._tasks[task_id] = task
+            self._messages[task_id] = []
+        return {**copy.deepcopy(task), 'conversation': []}
+
+    def get_task(self, task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                 conversation_limit: Optional[int] = None) -> Optional[dict]:
+        with self._locked(task_id):
+            task = self._tasks.get(task_id)
+            if task is None or (user_id is not None and task.get('user_id') != user_id):
+                return None
+            task = copy.deepcopy(task)
+            if include_conversation:
+                task['conversation'] = self.get_task_messages(task_id, conversation_limit)
+            return task
+
+    def get_task_messages(self, task_id: str, limit: Optional[int] = None) -> List[dict]:
+        with self._locked(task_id):
+            messages = self._messages.get(task_id, [])
+            return copy.deepcopy(messages[-limit:] if limit else messages)
+
+    def append_task_messages(self, task_id: str, messages: List[dict], status: str = None,
+                             extracted_data: dict = None, user_id: Optional[str] = None) -> bool:
+        with self._locked(task_id):
+            task = self._tasks.get(task_id)
+            if task is None or (user_id is not None and task.get('user_id') != user_id):
+                return False
+            stored = self._messages.setdefault(task_id, [])
+            stored.extend(copy.deepcopy(messages))
+            task['message_count'] = len(stored)
+            task['updated_at'] = datetime.now().timestamp()
+            if status is not None:
+                task['status'] = status
+            if extracted_data is not None:
+                task['extracted_data'] = copy.deepcopy(extracted_data)
+            return True
+
+    def update_task(self, task_id: str, status: str = None, extracted_data: dict = None,
+                    conversation: list = None, user_id: Optional[str] = None):
+        with self._locked(task_id):
+            task = self._tasks.get(task_id)
+            if task is None or (user_id is not None and task.get('user_id') != user_id):
+                return
+            task['updated_at'] = datetime.now().timestamp()
+            if status is not None:
+                task['status'] = status
+            if extracted_data is not None:
+                task['extracted_data'] = copy.deepcopy(extracted_data)
+            if conversation is not None:
+                self._messages[task_id] = copy.deepcopy(conversation)
+                task['message_count'] = len(conversation)
+
+    def _snapshot_tasks(self, user_id: Optional[str], include_conversation: bool) -> List[dict]:
+        tasks = []
+        for task_id in list(self._tasks):
+            task = self.get_task(task_id, user_id, include_conversation=include_conversation)
+            if task is not None:
+                tasks.append(task)
+        tasks.sort(key=lambda t: (t['updated_at'], t['task_id']), reverse=True)
+        return tasks
+
+    def get_all_tasks(self, user_id: Optional[str] = None) -> List[dict]:
+        return self._snapshot_tasks(user_id, include_conversation=True)
+
+    def list_tasks(self, user_id: Optional[str] = None, limit: int = 50,
+                   cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        tasks = [t for t in self._snapshot_tasks(user_id, include_conversation=False)
+                 if _after(t, 'updated_at', 'task_id', after)]
+        return page_of(tasks[:limit + 1], limit, 'updated_at', 'task_id')
+
+    # --- Jobs -------------------------------------------------------------------
+
+    def enqueue_job(self, job_id: str, kind: str, payload: dict, max_attempts: int = 3,
+                    run_at: Optional[float] = None) -> dict:
+        job = new_job(job_id, kind, copy.deepcopy(payload), max_attempts, run_at, datetime.now().timestamp())
+        with self._jobs_lock:
+            self._jobs[job_id] = job
+            return copy.deepcopy(job)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def claim_job(self, worker_id: str, lease_seconds: float, kinds: Optional[List[str]] = None) -> Optional[dict]:
+        now = datetime.now().timestamp()
+        with self._jobs_lock:
+            due = [j for j in self._jobs.values() if job_is_due(j, now) and (not kinds or j['kind'] in kinds)]
+            if not due:
+                return None
+            job = min(due, key=lambda j: j['run_at'])
+            job.update(status=JOB_RUNNING, attempts=job['attempts'] + 1, lease_owner=worker_id,
+                       lease_expires_at=now + lease_seconds, updated_at=now)
+            return copy.deepcopy(job)
+
+    def _update_leased_job(self, job_id: str, worker_id: str, **fields) -> bool:
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != JOB_RUNNING or job['lease_owner'] != worker_id:
+                return False
+            job.update(fields, updated_at=datetime.now().timestamp())
+            return True
+
+    def renew_job_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        return self._update_leased_job(job_id, worker_id, lease_expires_at=datetime.now().timestamp() + lease_seconds)
+
+    def complete_job(self, job_id: str, worker_id: str) -> bool:
+        return self._update_leased_job(job_id, worker_id, status=JOB_DONE, lease_owner=None, lease_expires_at=None)
+
+    def fail_job(self, job_id: str, worker_id: str, error: str, retry_at: Optional[float] = None) -> bool:
+        return self._update_leased_job(job_id, worker_id, **failed_job_fields(error, retry_at))
+
+    # --- Waitlist and allowed emails -----------------------------------------
+
+    def add_to_waitlist(self, email: str, name: str, confirmation_sent: bool = False) -> dict:
+        now = datetime.now().timestamp()
+        with self._locked(email):
+            entry = self._waitlist.setdefault(email, {'email': email, 'created_at': now})
+            entry['name'] = name
+            entry['confirmation_sent_at'] = now if confirmation_sent else None
+        return {'email': email, 'name': name, 'created_at': now}
+
+    def get_waitlist(self) -> List[dict]:
+        entries = [copy.deepcopy(e) for e in list(self._waitlist.values())]
+        return sorted(entries, key=lambda e: e['created_at'], reverse=True)
+
+    def set_confirmation_sent(self, email: str):
+        with self._locked(email):
+            if email in self._waitlist:
+                self._waitlist[email]['confirmation_sent_at'] = datetime.now().timestamp()
+
+    def is_email_allowed(self, email: str) -> bool:
+        return email in self._allowed
+
+    def add_allowed_email(self, email: str) -> dict:
+        with self._locked(email):
+            entry = self._allowed.setdefault(email, {'email': email, 'added_at': datetime.now().timestamp()})
+        return dict(entry)
+
+    def get_allowed_emails(self) -> List[dict]:
+        return sorted((dict(e) for e in list(self._allowed.values())), key=lambda e: e['added_at'], reverse=True)
@@ -0,0 +1,1077 @@
+"""
+SQLite storage backend (local dev without GCP).
+Reads use a per-thread pool of WAL-mode connections; writes are funnelled through one
+writer thread that group-commits them.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import weakref
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from storage.base import (
+    ARCHIVABLE_BOOKING_STATUS,
+    EXPIRABLE_TASK_STATUS,
+    JOB_DONE,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    SUMMARY_FIELDS,
+    booking_summary,
+    STATS_COUNTERS,
+    StorageBackend,
+    bulk_stats_deltas,
+    call_keys,
+    decode_cursor,
+    failed_job_fields,
+    new_booking,
+    new_job,
+    pack_archived,
+    page_of,
+    push_recent,
+    results_digest,
+    stats_from_bookings,
+    status_deltas,
+    unpack_archived,
+    update_digest,
+)
+from storage.codec import decode, encode
+
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))
+GROUP_COMMIT_MAX = int(os.getenv('SQLITE_GROUP_COMMIT_MAX', '64'))
+
+
+# ---------------------------------------------------------------------------
+# Connection pool
+# ---------------------------------------------------------------------------
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection subclass so the pool can hold weak references to it."""
+
+
+class _SQLitePool:
+    """
+    Thread-safe pool of SQLite connections, one per (thread, database path).
+    Connections are opened once, tuned for concurrent access (WAL, NORMAL sync,
+    busy timeout, mmap) and reused for the life of the thread instead of being
+    reopened on every call. A connection is closed when its thread exits.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open_conns = weakref.WeakSet()
+        self._generation = 0
+
+    def connection(self, path: str) -> sqlite3.Connection:
+        conns = getattr(self._local, 'conns', None)
+        if conns is None or self._local.generation != self._generation:
+            conns = self._local.conns = {}
+            self._local.generation = self._generation
+        conn = conns.get(path)
+        if conn is None:
+            conn = self._open(path)
+            conns[path] = conn
+            with self._lock:
+                self._open_conns.add(conn)
+        return conn
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves (see _SQLiteWriter) so
+        # reads never hold a transaction open on a long-lived connection.
+        conn = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            factory=_PooledConnection,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+        return conn
+
+    def close_all(self):
+        """Close every pooled connection; threads transparently reopen on next use."""
+        with self._lock:
+            self._generation += 1
+            conns = list(self._open_conns)
+            self._open_conns = weakref.WeakSet()
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_pool = _SQLitePool()
+_STOP = object()
+
+
+class _SQLiteWriter:
+    """
+    Single writer thread for one SQLite database. Write operations are queued as
+    fn(conn) callables and committed in batches (group commit): the writer takes
+    everything waiting, up to GROUP_COMMIT_MAX operations, and runs them in one
+    IMMEDIATE transaction, each inside its own SAVEPOINT so a failing operation rolls
+    back alone. Callers get a Future that resolves once the batch has committed.
+    Reads keep using the per-thread pool and never wait on the writer.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread = None
+
+    def submit(self, fn) -> Future:
+        future = Future()
+        if getattr(self._local, 'is_writer', False):
+            # Nested write from inside an operation: it is already in the open transaction
+            try:
+                future.set_result(fn(_pool.connection(self._path)))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((fn, future))
+        return future
+
+    def stop(self):
+        """Commit everything already queued and stop the thread; the next submit restarts it."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        self._local.is_writer = True
+        while True:
+            op = self._queue.get()
+            if op is _STOP:
+                return
+            batch = [op]
+            stop = False
+            while len(batch) < GROUP_COMMIT_MAX:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        conn = _pool.connection(self._path)
+        outcomes = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute('SAVEPOINT op')
+                try:
+                    outcomes.append((future, fn(conn), None))
+                except BaseException as e:
+                    conn.execute('ROLLBACK TO op')
+                    outcomes.append((future, None, e))
+                conn.execute('RELEASE op')
+            conn.execute('COMMIT')
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+# ---------------------------------------------------------------------------
+# Schema
+# ---------------------------------------------------------------------------
+
+def _add_column_if_missing(cursor, table: str, column: str, col_type: str):
+    cursor.execute(f"PRAGMA table_info({table})")
+    columns = [row[1] for row in cursor.fetchall()]
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+
+
+def _migrate_results_column(cursor):
+    """Move results still stored as a JSON array on bookings rows into call_results rows."""
+    cursor.execute("SELECT booking_id, results FROM bookings WHERE results IS NOT NULL AND results != '[]'")
+    legacy = cursor.fetchall()
+    for booking_id, raw in legacy:
+        results = decode(raw, [])
+        cursor.executemany(
+            'INSERT OR REPLACE INTO call_results (booking_id, result_index, data) VALUES (?, ?, ?)',
+            [(booking_id, idx, encode(r)) for idx, r in enumerate(results)])
+    if legacy:
+        cursor.execute("UPDATE bookings SET results = NULL WHERE results IS NOT NULL")
+
+
+def _migrate_conversation_column(cursor):
+    """Move conversations still stored as a JSON array on tasks rows into task_messages rows."""
+    cursor.execute("SELECT task_id, conversation FROM tasks WHERE conversation IS NOT NULL AND conversation != '[]'")
+    legacy = cursor.fetchall()
+    for task_id, raw in legacy:
+        messages = decode(raw, [])
+        cursor.executemany('INSERT OR REPLACE INTO task_messages (task_id, seq, data) VALUES (?, ?, ?)',
+                           [(task_id, seq, encode(m)) for seq, m in enumerate(messages)])
+        cursor.execute('UPDATE tasks SET message_count = ? WHERE task_id = ?', (len(messages), task_id))
+    if legacy:
+        cursor.execute("UPDATE tasks SET conversation = NULL WHERE conversation IS NOT NULL")
+
+
+def _migration_1_base_schema(cursor):
+    """Tables as they were before versioning; also upgrades databases created by older builds."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bookings (
+            booking_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            service_type TEXT NOT NULL,
+            location TEXT NOT NULL,
+            timeframe TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            preferences TEXT,
+            results TEXT
+        )
+    ''')
+    _add_column_if_missing(cursor, 'bookings', 'user_id', 'TEXT')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            status TEXT NOT NULL,
+            extracted_data TEXT,
+            conversation TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    _add_column_if_missing(cursor, 'tasks', 'user_id', 'TEXT')
+    _add_column_if_missing(cursor, 'tasks', 'message_count', 'INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS task_messages (
+            task_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (task_id, seq)
+        )
+    ''')
+    _migrate_conversation_column(cursor)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS call_results (
+            booking_id TEXT NOT NULL,
+            result_index INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (booking_id, result_index)
+        )
+    ''')
+    _migrate_results_column(cursor)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id TEXT PRIMARY KEY,
+            total_bookings INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            processing INTEGER NOT NULL DEFAULT 0,
+            total_calls INTEGER NOT NULL DEFAULT 0,
+            recent_booking_ids TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS call_index (
+            call_key TEXT PRIMARY KEY,
+            booking_id TEXT NOT NULL,
+            result_index INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS waitlist (
+            email TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            confirmation_sent_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS allowed_emails (
+            email TEXT PRIMARY KEY,
+            added_at REAL NOT NULL
+        )
+    ''')
+
+
+def _migration_2_listing_indexes(cursor):
+    """Indexes for the per-user listings (newest first) and for finding bookings by status."""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_user_created ON bookings (user_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status_created ON bookings (status, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_user_updated ON tasks (user_id, updated_at)')
+
+
+def _migration_3_retention(cursor):
+    """Archive table for cold bookings (zlib-compressed JSON) and the index stale-task expiry scans."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_bookings (
+            booking_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            created_at REAL NOT NULL,
+            archived_at REAL NOT NULL,
+            data BLOB NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status_updated ON tasks (status, updated_at)')
+
+
+def _migration_4_result_digests(cursor):
+    """Store each booking's results digest on its row so summary listings never read call_results."""
+    _add_column_if_missing(cursor, 'bookings', 'digest', 'TEXT')
+    booking_ids = [row[0] for row in cursor.execute('SELECT booking_id FROM bookings').fetchall()]
+    for booking_id, results in _read_results(cursor, booking_ids).items():
+        cursor.execute('UPDATE bookings SET digest = ? WHERE booking_id = ?', (encode(results_digest(results)), booking_id))
+
+
+def _migration_5_booking_versions(cursor):
+    """Version counter for compare-and-set booking updates (existing bookings start at 1)."""
+    _add_column_if_missing(cursor, 'bookings', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+
+def _migration_6_jobs(cursor):
+    """Durable job queue; the indexes serve claim_job's two cases (due queued jobs, expired leases)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON jobs (status, run_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_lease ON jobs (status, lease_expires_at)')
+
+
+# Ordered schema steps; each runs once, inside the init_db transaction, and is recorded in schema_version.
+# Append new steps with the next version number - never edit or reorder a released one.
+_MIGRATIONS = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_listing_indexes),
+    (3, _migration_3_retention),
+    (4, _migration_4_result_digests),
+    (5, _migration_5_booking_versions),
+    (6, _migration_6_jobs),
+]
+SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+
+def _schema_version(cursor) -> int:
+    cursor.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at REAL NOT NULL)')
+    return cursor.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def _create_schema(conn) -> List[int]:
+    """Apply the migration steps newer than the database's schema version; returns the versions applied."""
+    cursor = conn.cursor()
+    current = _schema_version(cursor)
+    applied = []
+    for version, step in _MIGRATIONS:
+        if version <= current:
+            continue
+        step(cursor)
+        cursor.execute('INSERT INTO schema_version (version, applied_at) VALUES (?, ?)',
+                       (version, datetime.now().timestamp()))
+        applied.append(version)
+    return applied
+
+
+# ---------------------------------------------------------------------------
+# Row helpers
+# ---------------------------------------------------------------------------
+
+_TASK_COLUMNS = 'task_id, user_id, status, extracted_data, created_at, updated_at, message_count'
+
+# Collection name -> its table, then tables whose rows belong to it
+_COLLECTION_TABLES = {
+    'bookings': ('bookings', 'call_results'),
+    'archived_bookings': ('archived_bookings',),
+    'tasks': ('tasks', 'task_messages'),
+    'call_index': ('call_index',),
+    'user_stats': ('user_stats',),
+    'waitlist': ('waitlist',),
+    'allowed_emails': ('allowed_emails',),
+    'jobs': ('jobs',),
+}
+
+
+def _row_to_booking(row) -> dict:
+    if len(row) >= 9:
+        return {
+            'booking_id': row[0], 'user_id': row[1], 'service_type': row[2], 'location': row[3],
+            'timeframe': row[4], 'status': row[5], 'created_at': row[6],
+            'preferences': decode(row[7], {}),
+            'results': decode(row[8], []),
+            'version': row[10] if len(row) > 10 else 1,
+        }
+    return {
+        'booking_id': row[0], 'user_id': None, 'service_type': row[1], 'location': row[2],
+        'timeframe': row[3], 'status': row[4], 'created_at': row[5],
+        'preferences': decode(row[6], {}),
+        'results': decode(row[7], []),
+    }
+
+
+_SUMMARY_COLUMNS = ', '.join(SUMMARY_FIELDS) + ', digest'
+
+
+def _row_to_summary(row) -> dict:
+    """Summary from a row selected with _SUMMARY_COLUMNS."""
+    return booking_summary(dict(zip(SUMMARY_FIELDS, row)), decode(row[-1], results_digest([])))
+
+
+_JOB_COLUMNS = ('job_id, kind, payload, status, attempts, max_attempts, run_at, lease_owner, lease_expires_at, '
+                'last_error, created_at, updated_at')
+
+
+def _row_to_job(row) -> dict:
+    return {
+        'job_id': row[0], 'kind': row[1], 'payload': decode(row[2], {}), 'status': row[3],
+        'attempts': row[4], 'max_attempts': row[5], 'run_at': row[6], 'lease_owner': row[7],
+        'lease_expires_at': row[8], 'last_error': row[9], 'created_at': row[10], 'updated_at': row[11],
+    }
+
+
+def _row_to_task(row) -> dict:
+    return {
+        'task_id': row[0], 'user_id': row[1], 'status': row[2],
+        'extracted_data': decode(row[3], {}),
+        'created_at': row[4], 'updated_at': row[5], 'message_count': row[6] or 0,
+    }
+
+
+# Each provider's result is its own call_results row keyed by (booking_id, result_index);
+# reads reassemble the ordered list.
+
+def _read_results(conn, booking_ids: List[str]) -> dict:
+    """Return {booking_id: [result, ...]} for the given bookings."""
+    by_booking = {}
+    for start in range(0, len(booking_ids), 500):
+        chunk = booking_ids[start:start + 500]
+        placeholders = ', '.join('?' * len(chunk))
+        rows = conn.execute(
+            f'SELECT booking_id, data FROM call_results WHERE booking_id IN ({placeholders}) ORDER BY booking_id, result_index',
+            chunk).fetchall()
+        for booking_id, data in rows:
+            by_booking.setdefault(booking_id, []).append(decode(data))
+    return by_booking
+
+
+def _attach_results(conn, bookings: List[dict]) -> List[dict]:
+    results = _read_results(conn, [b['booking_id'] for b in bookings])
+    for b in bookings:
+        b['results'] = results.get(b['booking_id'], [])
+    return bookings
+
+
+def _replace_results(conn, booking_id: str, results: List[dict]) -> int:
+    """Replace a booking's results; returns the change in result count."""
+    before = conn.execute('SELECT COUNT(*) FROM call_results WHERE booking_id = ?', (booking_id,)).fetchone()[0]
+    conn.execute('DELETE FROM call_results WHERE booking_id = ? AND result_index >= ?', (booking_id, len(results)))
+    conn.executemany('INSERT OR REPLACE INTO call_results (booking_id, result_index, data) VALUES (?, ?, ?)',
+                     [(booking_id, idx, encode(r)) for idx, r in enumerate(results)])
+    _index_calls(conn, booking_id, enumerate(results))
+    conn.execute('UPDATE bookings SET digest = ?, version = version + 1 WHERE booking_id = ?',
+                 (encode(results_digest(results)), booking_id))
+    return len(results) - before
+
+
+def _merge_results(conn, booking_id: str, indexed: List[Tuple[int, dict]]) -> int:
+    """Write individual results ((index, result) pairs), leaving the version to the caller; returns how many are new."""
+    placeholders = ','.join('?' * len(indexed))
+    replaced = [decode(row[0]) for row in conn.execute(
+        f'SELECT data FROM call_results WHERE booking_id = ? AND result_index IN ({placeholders})',
+        [booking_id] + [i for i, _ in indexed])]
+    conn.executemany('INSERT OR REPLACE INTO call_results (booking_id, result_index, data) VALUES (?, ?, ?)',
+                     [(booking_id, i, encode(result)) for i, result in indexed])
+    _index_calls(conn, booking_id, indexed)
+    row = conn.execute('SELECT digest FROM bookings WHERE booking_id = ?', (booking_id,)).fetchone()
+    if row:
+        # Only the written rows are read back, unless the best result got worse
+        digest = update_digest(decode(row[0], results_digest([])), replaced, [r for _, r in indexed])
+        if digest is None:
+            digest = results_digest(_read_results(conn, [booking_id]).get(booking_id, []))
+        conn.execute('UPDATE bookings SET digest = ? WHERE booking_id = ?', (encode(digest), booking_id))
+    return len(indexed) - len(replaced)
+
+
+def _index_calls(conn, booking_id: str, indexed_results):
+    """Index call keys for an iterable of (result_index, result) pairs."""
+    rows = [(key, booking_id, idx) for idx, r in indexed_results for key in call_keys(r)]
+    if rows:
+        conn.executemany('INSERT OR REPLACE INTO call_index (call_key, booking_id, result_index) VALUES (?, ?, ?)', rows)
+
+
+def _bump_stats(conn, user_id: Optional[str], recent_booking_ids: List[str] = (), **deltas):
+    if user_id is None or not (recent_booking_ids or any(deltas.values())):
+        return
+    conn.execute('INSERT OR IGNORE INTO user_stats (user_id) VALUES (?)', (user_id,))
+    sets = [f'{name} = {name} + ?' for name in deltas]
+    params = list(deltas.values())
+    if recent_booking_ids:
+        row = conn.execute('SELECT recent_booking_ids FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+        sets.append('recent_booking_ids = ?')
+        params.append(json.dumps(push_recent(json.loads(row[0]) if row[0] else [], *recent_booking_ids)))
+    conn.execute(f'UPDATE user_stats SET {", ".join(sets)} WHERE user_id = ?', params + [user_id])
+
+
+def _drop_recent(conn, user_id: Optional[str], booking_ids: List[str]):
+    """Remove booking ids from a user's recent list."""
+    row = conn.execute('SELECT recent_booking_ids FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+    if not row or not row[0]:
+        return
+    gone = set(booking_ids)
+    recent = json.loads(row[0])
+    if gone.intersection(recent):
+        conn.execute('UPDATE user_stats SET recent_booking_ids = ? WHERE user_id = ?',
+                     (json.dumps([b for b in recent if b not in gone]), user_id))
+
+
+def _read_messages(conn, task_id: str, limit: Optional[int] = None) -> List[dict]:
+    if limit:
+        rows = conn.execute('SELECT data FROM task_messages WHERE task_id = ? ORDER BY seq DESC LIMIT ?', (task_id, limit)).fetchall()
+        rows.reverse()
+    else:
+        rows = conn.execute('SELECT data FROM task_messages WHERE task_id = ? ORDER BY seq', (task_id,)).fetchall()
+    return [decode(r[0]) for r in rows]
+
+
+# ---------------------------------------------------------------------------
+# Backend
+# ---------------------------------------------------------------------------
+
+class SQLiteBackend(StorageBackend):
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writer = _SQLiteWriter(path)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's pooled connection to the database (do not close it)."""
+        return _pool.connection(self.path)
+
+    def _submit(self, fn) -> Future:
+        """Queue fn(conn) for the writer thread; the Future resolves to fn's result after commit."""
+        return self._writer.submit(fn)
+
+    def _write(self, fn):
+        """Run fn(conn) in a committed transaction on the writer thread and return its result."""
+        return self._submit(fn).result()
+
+    def init_db(self):
+        applied = self._write(_create_schema)
+        if applied:
+            print(f"✅ Database migrated to schema v{applied[-1]} at {self.path} (SQLite fallback)")
+        else:
+            print(f"✅ Database initialized at {self.path} (SQLite fallback)")
+
+    def close(self):
+        """Commit queued writes, stop the writer and close all pooled connections."""
+        self._writer.stop()
+        _pool.close_all()
+
+    # --- Bookings -----------------------------------------------------------
+
+    def create_booking(self, booking_id: str, service_type: str, location: str, timeframe: str,
+                       preferences: dict, user_id: Optional[str] = None) -> dict:
+        now = datetime.now().timestamp()
+
+        def _create(conn):
+            conn.execute('''
+                INSERT INTO bookings (booking_id, user_id, service_type, location, timeframe, status, created_at, preferences)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (booking_id, user_id, service_type, location, timeframe, 'processing', now, encode(preferences)))
+            _bump_stats(conn, user_id, total_bookings=1, processing=1, recent_booking_ids=[booking_id])
+
+        self._write(_create)
+        return {
+            'booking_id': booking_id, 'user_id': user_id, 'service_type': service_type, 'location': location,
+            'timeframe': timeframe, 'status': 'processing', 'created_at': now, 'preferences': preferences,
+            'results': [], 'version': 1,
+        }
+
+    def get_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        conn = self._conn()
+        if user_id is not None:
+            row = conn.execute('SELECT * FROM bookings WHERE booking_id = ? AND user_id = ?', (booking_id, user_id)).fetchone()
+        else:
+            row = conn.execute('SELECT * FROM bookings WHERE booking_id = ?', (booking_id,)).fetchone()
+        if not row:
+            return None
+        return _attach_results(conn, [_row_to_booking(row)])[0]
+
+    def update_booking_status(self, booking_id: str, status: str, results: Optional[List[dict]] = None):
+        def _update(conn):
+            row = conn.execute('SELECT user_id, status FROM bookings WHERE booking_id = ?', (booking_id,)).fetchone()
+            if not row:
+                return
+            conn.execute('UPDATE bookings SET status = ?, version = version + 1 WHERE booking_id = ?', (status, booking_id))
+            calls = _replace_results(conn, booking_id, results) if results is not None else 0
+            _bump_stats(conn, row[0], total_calls=calls, **status_deltas(row[1], status))
+
+        self._write(_update)
+
+    def update_booking_results(self, booking_id: str, results: List[dict]):
+        def _update(conn):
+            row = conn.execute('SELECT user_id FROM bookings WHERE booking_id = ?', (booking_id,)).fetchone()
+            calls = _replace_results(conn, booking_id, results)
+            _bump_stats(conn, row[0] if row else None, total_calls=calls)
+
+        self._write(_update)
+
+    def merge_booking_results(self, booking_id: str, updates: Dict[int, dict]):
+        if not updates:
+            return
+        indexed = sorted(updates.items())
+
+        def _update(conn):
+            conn.execute('UPDATE bookings SET version = version + 1 WHERE booking_id = ?', (booking_id,))
+            new_count = _merge_results(conn, booking_id, indexed)
+            if new_count:
+                row = conn.execute('SELECT user_id FROM bookings WHERE booking_id = ?', (booking_id,)).fetchone()
+                _bump_stats(conn, row[0] if row else None, total_calls=new_count)
+
+        self._write(_update)
+
+    def compare_and_set_booking(self, booking_id: str, version: int, status: Optional[str] = None,
+                                updates: Optional[Dict[int, dict]] = None) -> bool:
+        indexed = sorted((updates or {}).items())
+
+        def _cas(conn):
+            row = conn.execute('SELECT user_id, status FROM bookings WHERE booking_id = ?', (booking_id,)).fetchone()
+            swapped = conn.execute('UPDATE bookings SET status = COALESCE(?, status), version = version + 1 '
+                                   'WHERE booking_id = ? AND version = ?', (status, booking_id, version)).rowcount
+            if not swapped:
+                return False
+            calls = _merge_results(conn, booking_id, indexed) if indexed else 0
+            deltas = status_deltas(row[1], status) if status is not None else {}
+            _bump_stats(conn, row[0], total_calls=calls, **deltas)
+            return True
+
+        return self._write(_cas)
+
+    def create_bookings_many(self, bookings: List[dict]) -> List[dict]:
+        now = datetime.now().timestamp()
+        records = [new_booking(spec, now) for spec in bookings]
+        results = {spec['booking_id']: spec.get('results') or [] for spec in bookings}
+
+        def _create(conn):
+            conn.executemany('''
+                INSERT INTO bookings (booking_id, user_id, service_type, location, timeframe, status, created_at, preferences, digest)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(b['booking_id'], b['user_id'], b['service_type'], b['location'], b['timeframe'], b['status'],
+                   b['created_at'], encode(b['preferences']), encode(results_digest(results[b['booking_id']])))
+                  for b in records])
+            conn.executemany('INSERT INTO call_results (booking_id, result_index, data) VALUES (?, ?, ?)',
+                             [(bid, idx, encode(r)) for bid, rs in results.items() for idx, r in enumerate(rs)])
+            for bid, rs in results.items():
+                _index_calls(conn, bid, enumerate(rs))
+            for user_id, entry in bulk_stats_deltas(records, results).items():
+                _bump_stats(conn, user_id, recent_booking_ids=entry['recent'], **entry['deltas'])
+
+        self._write(_create)
+        return [{**b, 'results': results[b['booking_id']]} for b in records]
+
+    def update_results_many(self, results_by_booking: Dict[str, List[dict]]):
+        def _update(conn):
+            owners = {}
+            booking_ids = list(results_by_booking)
+            for start in range(0, len(booking_ids), 500):
+                chunk = booking_ids[start:start + 500]
+                placeholders = ', '.join('?' * len(chunk))
+                owners.update(conn.execute(
+                    f'SELECT booking_id, user_id FROM bookings WHERE booking_id IN ({placeholders})', chunk).fetchall())
+            calls = {}
+            for bid, results in results_by_booking.items():
+                user_id = owners.get(bid)
+                calls[user_id] = calls.get(user_id, 0) + _replace_results(conn, bid, results)
+            for user_id, delta in calls.items():
+                _bump_stats(conn, user_id, total_calls=delta)
+
+        self._write(_update)
+
+    def get_all_bookings(self, user_id: Optional[str] = None, summary: bool = False) -> List[dict]:
+        conn = self._conn()
+        columns = _SUMMARY_COLUMNS if summary else '*'
+        if user_id is not None:
+            rows = conn.execute(f'SELECT {columns} FROM bookings WHERE user_id = ? ORDER BY created_at DESC', (user_id,)).fetchall()
+        else:
+            rows = conn.execute(f'SELECT {columns} FROM bookings ORDER BY created_at DESC').fetchall()
+        if summary:
+            return [_row_to_summary(row) for row in rows]
+        return _attach_results(conn, [_row_to_booking(row) for row in rows])
+
+    def list_bookings(self, user_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None,
+                      summary: bool = False) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        conn = self._conn()
+        where, params = [], []
+        if user_id is not None:
+            where.append('user_id = ?')
+            params.append(user_id)
+        if after:
+            where.append('(created_at < ? OR (created_at = ? AND booking_id < ?))')
+            params.extend([after[0], after[0], after[1]])
+        sql = f'SELECT {_SUMMARY_COLUMNS if summary else "*"} FROM bookings'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY created_at DESC, booking_id DESC LIMIT ?'
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+        if summary:
+            return page_of([_row_to_summary(row) for row in rows], limit, 'created_at', 'booking_id')
+        page, next_cursor = page_of([_row_to_booking(row) for row in rows], limit, 'created_at', 'booking_id')
+        return _attach_results(conn, page), next_cursor
+
+    def get_bookings_by_ids(self, booking_ids: List[str], summary: bool = False) -> List[dict]:
+        if not booking_ids:
+            return []
+        conn = self._conn()
+        placeholders = ', '.join('?' * len(booking_ids))
+        if summary:
+            rows = conn.execute(f'SELECT {_SUMMARY_COLUMNS} FROM bookings WHERE booking_id IN ({placeholders})', booking_ids)
+            found = {b['booking_id']: b for b in map(_row_to_summary, rows.fetchall())}
+        else:
+            rows = conn.execute(f'SELECT * FROM bookings WHERE booking_id IN ({placeholders})', booking_ids).fetchall()
+            found = {b['booking_id']: b for b in _attach_results(conn, [_row_to_booking(row) for row in rows])}
+        return [found[bid] for bid in booking_ids if bid in found]
+
+    def clear_all_bookings(self):
+        for name in ('bookings', 'archived_bookings', 'call_index', 'user_stats', 'jobs'):
+            self.delete_collection(name)
+
+    def clean_db(self):
+        self.clear_all_bookings()
+        self.delete_collection('tasks')
+
+    def delete_collection(self, name: str) -> int:
+        """Delete every row of a collection's table (and its child table) in one transaction."""
+        if name not in _COLLECTION_TABLES:
+            raise ValueError(f'Unknown collection {name!r}')
+        table, *children = _COLLECTION_TABLES[name]
+
+        def _delete(conn):
+            for child in children:
+                conn.execute(f'DELETE FROM {child}')
+            return conn.execute(f'DELETE FROM {table}').rowcount
+
+        return self._write(_delete)
+
+    # --- Retention ------------------------------------------------------------
+
+    def archive_bookings(self, older_than: float, limit: int) -> int:
+        archived_at = datetime.now().timestamp()
+
+        def _archive(conn):
+            rows = conn.execute('SELECT * FROM bookings WHERE status = ? AND created_at < ? ORDER BY created_at LIMIT ?',
+                                (ARCHIVABLE_BOOKING_STATUS, older_than, limit)).fetchall()
+            bookings = _attach_results(conn, [_row_to_booking(row) for row in rows])
+            if not bookings:
+                return 0
+            conn.executemany('''
+                INSERT OR REPLACE INTO archived_bookings (booking_id, user_id, created_at, archived_at, data)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(b['booking_id'], b['user_id'], b['created_at'], archived_at, pack_archived(b)) for b in bookings])
+            ids = [(b['booking_id'],) for b in bookings]
+            conn.executemany('DELETE FROM call_index WHERE call_key = ? AND booking_id = ?',
+                             [(key, b['booking_id']) for b in bookings for r in b['results'] for key in call_keys(r)])
+            conn.executemany('DELETE FROM call_results WHERE booking_id = ?', ids)
+            conn.executemany('DELETE FROM bookings WHERE booking_id = ?', ids)
+            # Archived bookings still count towards their users' stats; only the recent list drops them
+            for user_id in {b['user_id'] for b in bookings if b['user_id'] is not None}:
+                _drop_recent(conn, user_id, [b['booking_id'] for b in bookings if b['user_id'] == user_id])
+            return len(bookings)
+
+        return self._write(_archive)
+
+    def get_archived_booking(self, booking_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        row = self._conn().execute('SELECT user_id, archived_at, data FROM archived_bookings WHERE booking_id = ?',
+                                   (booking_id,)).fetchone()
+        if not row or (user_id is not None and row[0] != user_id):
+            return None
+        return unpack_archived(row[2], row[1])
+
+    def expire_tasks(self, older_than: float, limit: int) -> int:
+        def _expire(conn):
+            ids = conn.execute('SELECT task_id FROM tasks WHERE status = ? AND updated_at < ? ORDER BY updated_at LIMIT ?',
+                               (EXPIRABLE_TASK_STATUS, older_than, limit)).fetchall()
+            conn.executemany('DELETE FROM task_messages WHERE task_id = ?', ids)
+            conn.executemany('DELETE FROM tasks WHERE task_id = ?', ids)
+            return len(ids)
+
+        return self._write(_expire)
+
+    # --- Call index -----------------------------------------------------------
+
+    def register_call(self, call_key: str, booking_id: str, result_index: int):
+        self._write(lambda conn: conn.execute(
+            'INSERT OR REPLACE INTO call_index (call_key, booking_id, result_index) VALUES (?, ?, ?)',
+            (call_key, booking_id, result_index)))
+
+    def lookup_call(self, call_key: str) -> Optional[Tuple[str, int]]:
+        row = self._conn().execute('SELECT booking_id, result_index FROM call_index WHERE call_key = ?', (call_key,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    # --- Dashboard stats --------------------------------------------------------
+
+    def get_user_stats(self, user_id: str) -> dict:
+        row = self._conn().execute(
+            'SELECT total_bookings, completed, processing, total_calls, recent_booking_ids FROM user_stats WHERE user_id = ?',
+            (user_id,)).fetchone()
+        if row is None:
+            return self.rebuild_user_stats(user_id)
+        return {**dict(zip(STATS_COUNTERS, row[:4])), 'recent_booking_ids': json.loads(row[4]) if row[4] else []}
+
+    def rebuild_user_stats(self, user_id: str) -> dict:
+        archived = [unpack_archived(data, archived_at) for archived_at, data in self._conn().execute(
+            'SELECT archived_at, data FROM archived_bookings WHERE user_id = ?', (user_id,))]
+        stats = stats_from_bookings(self.get_all_bookings(user_id), archived)
+        self._write(lambda conn: conn.execute('''
+            INSERT OR REPLACE INTO user_stats (user_id, total_bookings, completed, processing, total_calls, recent_booking_ids)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, *(stats[name] for name in STATS_COUNTERS), json.dumps(stats['recent_booking_ids']))))
+        return stats
+
+    # --- Tasks ----------------------------------------------------------------
+
+    def create_task(self, task_id: str, user_id: Optional[str] = None) -> dict:
+        now = datetime.now().timestamp()
+        self._write(lambda conn: conn.execute('''
+            INSERT INTO tasks (task_id, user_id, status, extracted_data, created_at, updated_at, message_count)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+        ''', (task_id, user_id, 'gathering_info', encode({}), now, now)))
+        return {
+            'task_id': task_id, 'user_id': user_id, 'status': 'gathering_info', 'extracted_data': {},
+            'message_count': 0, 'created_at': now, 'updated_at': now, 'conversation': [],
+        }
+
+    def get_task(self, task_id: str, user_id: Optional[str] = None, include_conversation: bool = True,
+                 conversation_limit: Optional[int] = None) -> Optional[dict]:
+        conn = self._conn()
+        if user_id is not None:
+            row = conn.execute(f'SELECT {_TASK_COLUMNS} FROM tasks WHERE task_id = ? AND user_id = ?', (task_id, user_id)).fetchone()
+        else:
+            row = conn.execute(f'SELECT {_TASK_COLUMNS} FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        if not row:
+            return None
+        task = _row_to_task(row)
+        if include_conversation:
+            task['conversation'] = _read_messages(conn, task_id, conversation_limit)
+        return task
+
+    def get_task_messages(self, task_id: str, limit: Optional[int] = None) -> List[dict]:
+        return _read_messages(self._conn(), task_id, limit)
+
+    def append_task_messages(self, task_id: str, messages: List[dict], status: str = None,
+                             extracted_data: dict = None, user_id: Optional[str] = None) -> bool:
+        now = datetime.now().timestamp()
+
+        def _append(conn):
+            sql, params = 'SELECT message_count FROM tasks WHERE task_id = ?', [task_id]
+            if user_id is not None:
+                sql += ' AND user_id = ?'
+                params.append(user_id)
+            row = conn.execute(sql, params).fetchone()
+            if not row:
+                return False
+            start = row[0] or 0
+            conn.executemany('INSERT INTO task_messages (task_id, seq, data) VALUES (?, ?, ?)',
+                             [(task_id, start + i, encode(m)) for i, m in enumerate(messages)])
+            sets, params = ['updated_at = ?', 'message_count = ?'], [now, start + len(messages)]
+            if status is not None:
+                sets.append('status = ?')
+                params.append(status)
+            if extracted_data is not None:
+                sets.append('extracted_data = ?')
+                params.append(encode(extracted_data))
+            conn.execute(f'UPDATE tasks SET {", ".join(sets)} WHERE task_id = ?', params + [task_id])
+            return True
+
+        return self._write(_append)
+
+    def update_task(self, task_id: str, status: str = None, extracted_data: dict = None,
+                    conversation: list = None, user_id: Optional[str] = None):
+        now = datetime.now().timestamp()
+        # Only the columns being changed are written; the owner check is part of the WHERE clause.
+        sets, params = ['updated_at = ?'], [now]
+        if status is not None:
+            sets.append('status = ?')
+            params.append(status)
+        if extracted_data is not None:
+            sets.append('extracted_data = ?')
+            params.append(encode(extracted_data))
+        if conversation is not None:
+            sets.append('message_count = ?')
+            params.append(len(conversation))
+        where, params = 'task_id = ?', params + [task_id]
+        if user_id is not None:
+            where += ' AND user_id = ?'
+            params.append(user_id)
+
+        def _update(conn):
+            if conn.execute(f'UPDATE tasks SET {", ".join(sets)} WHERE {where}', params).rowcount and conversation is not None:
+                conn.execute('DELETE FROM task_messages WHERE task_id = ?', (task_id,))
+                conn.executemany('INSERT INTO task_messages (task_id, seq, data) VALUES (?, ?, ?)',
+                                 [(task_id, seq, encode(m)) for seq, m in enumerate(conversation)])
+
+        self._write(_update)
+
+    def get_all_tasks(self, user_id: Optional[str] = None) -> List[dict]:
+        conn = self._conn()
+        if user_id is not None:
+            rows = conn.execute(f'SELECT {_TASK_COLUMNS} FROM tasks WHERE user_id = ? ORDER BY updated_at DESC', (user_id,)).fetchall()
+        else:
+            rows = conn.execute(f'SELECT {_TASK_COLUMNS} FROM tasks ORDER BY updated_at DESC').fetchall()
+        tasks = [_row_to_task(row) for row in rows]
+        conversations = {}
+        for task_id, data in conn.execute(
+                'SELECT m.task_id, m.data FROM task_messages m JOIN tasks t ON t.task_id = m.task_id'
+                + (' WHERE t.user_id = ?' if user_id is not None else '') + ' ORDER BY m.task_id, m.seq',
+                (user_id,) if user_id is not None else ()):
+            conversations.setdefault(task_id, []).append(decode(data))
+        for t in tasks:
+            t['conversation'] = conversations.get(t['task_id'], [])
+        return tasks
+
+    def list_tasks(self, user_id: Optional[str] = None, limit: int = 50,
+                   cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        after = decode_cursor(cursor) if cursor else None
+        where, params = [], []
+        if user_id is not None:
+            where.append('user_id = ?')
+            params.append(user_id)
+        if after:
+            where.append('(updated_at < ? OR (updated_at = ? AND task_id < ?))')
+            params.extend([after[0], after[0], after[1]])
+        sql = f'SELECT {_TASK_COLUMNS} FROM tasks'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY updated_at DESC, task_id DESC LIMIT ?'
+        rows = self._conn().execute(sql, params + [limit + 1]).fetchall()
+        return page_of([_row_to_task(row) for row in rows], limit, 'updated_at', 'task_id')
+
+    # --- Jobs -------------------------------------------------------------------
+    # Claims and lease changes run on the writer thread, one transaction at a time, so a
+    # job's state read inside them cannot change before the update lands.
+
+    def enqueue_job(self, job_id: str, kind: str, payload: dict, max_attempts: int = 3,
+                    run_at: Optional[float] = None) -> dict:
+        job = new_job(job_id, kind, payload, max_attempts, run_at, datetime.now().timestamp())
+        self._write(lambda conn: conn.execute(
+            f'INSERT INTO jobs ({_JOB_COLUMNS}) VALUES ({", ".join("?" * 12)})',
+            (job['job_id'], kind, encode(payload), job['status'], 0, max_attempts, job['run_at'], None, None, None,
+             job['created_at'], job['updated_at'])))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute(f'SELECT {_JOB_COLUMNS} FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def claim_job(self, worker_id: str, lease_seconds: float, kinds: Optional[List[str]] = None) -> Optional[dict]:
+        def _claim(conn):
+            now = datetime.now().timestamp()
+            sql = (f'SELECT {_JOB_COLUMNS} FROM jobs WHERE ((status = ? AND run_at <= ?) '
+                   'OR (status = ? AND lease_expires_at <= ?))')
+            params = [JOB_QUEUED, now, JOB_RUNNING, now]
+            if kinds:
+                sql += f' AND kind IN ({", ".join("?" * len(kinds))})'
+                params += list(kinds)
+            row = conn.execute(sql + ' ORDER BY run_at LIMIT 1', params).fetchone()
+            if not row:
+                return None
+            job = _row_to_job(row)
+            job.update(status=JOB_RUNNING, attempts=job['attempts'] + 1, lease_owner=worker_id,
+                       lease_expires_at=now + lease_seconds, updated_at=now)
+            conn.execute('UPDATE jobs SET status = ?, attempts = ?, lease_owner = ?, lease_expires_at = ?, updated_at = ? '
+                         'WHERE job_id = ?', (job['status'], job['attempts'], worker_id, job['lease_expires_at'], now,
+                                              job['job_id']))
+            return job
+
+        return self._write(_claim)
+
+    def _update_leased_job(self, job_id: str, worker_id: str, **fields) -> bool:
+        """Set fields on a running job only while worker_id holds its lease."""
+        fields['updated_at'] = datetime.now().timestamp()
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        return self._write(lambda conn: conn.execute(
+            f'UPDATE jobs SET {assignments} WHERE job_id = ? AND status = ? AND lease_owner = ?',
+            [*fields.values(), job_id, JOB_RUNNING, worker_id]).rowcount > 0)
+
+    def renew_job_lease(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        return self._update_leased_job(job_id, worker_id, lease_expires_at=datetime.now().timestamp() + lease_seconds)
+
+    def complete_job(self, job_id: str, worker_id: str) -> bool:
+        return self._update_leased_job(job_id, worker_id, status=JOB_DONE, lease_owner=None, lease_expires_at=None)
+
+    def fail_job(self, job_id: str, worker_id: str, error: str, retry_at: Optional[float] = None) -> bool:
+        return self._update_leased_job(job_id, worker_id, **failed_job_fields(error, retry_at))
+
+    # --- Waitlist and allowed emails -----------------------------------------
+
+    def add_to_waitlist(self, email: str, name: str, confirmation_sent: bool = False) -> dict:
+        now = datetime.now().timestamp()
+        sent_at = now if confirmation_sent else None
+        self._write(lambda conn: conn.execute('''
+            INSERT INTO waitlist (email, name, created_at, confirmation_sent_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(email) DO UPDATE SET name = ?, confirmation_sent_at = ?
+        ''', (email, name, now, sent_at, name, sent_at)))
+        return {'email': email, 'name': name, 'created_at': now}
+
+    def get_waitlist(self) -> List[dict]:
+        rows = self._conn().execute('SELECT email, name, created_at, confirmation_sent_at FROM waitlist ORDER BY created_at DESC').fetchall()
+        return [{'email': r[0], 'name': r[1], 'created_at': r[2], 'confirmation_sent_at': r[3]} for r in rows]
+
+    def set_confirmation_sent(self, email: str):
+        now = datetime.now().timestamp()
+        self._write(lambda conn: conn.execute('UPDATE waitlist SET confirmation_sent_at = ? WHERE email = ?', (now, email)))
+
+    def is_email_allowed(self, email: str) -> bool:
+        return self._conn().execute('SELECT 1 FROM allowed_emails WHERE email = ?', (email,)).fetchone() is not None
+
+    def add_allowed_email(self, email: str) -> dict:
+        now = datetime.now().timestamp()
+        self._write(lambda conn: conn.execute('INSERT OR IGNORE INTO allowed_emails (email, added_at) VALUES (?, ?)', (email, now)))
+        return {'email': email, 'added_at': now}
+
+    def get_allowed_emails(self) -> List[dict]:
+        rows = self._conn().execute('SELECT email, added_at FROM allowed_emails ORDER BY added_at DESC').fetchall()
+        return [{'email': r[0], 'added_at': r[1]} for r in rows]
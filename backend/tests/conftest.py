@@ -48,7 +48,7 @@ def _set_test_env(tmp_db_path: str):
 def isolated_sqlite_db(tmp_path, monkeypatch):
     """
     Each test gets a fresh, empty SQLite database in a temp directory.
-    Resets the module-level Firestore cache so _use_firestore() re-evaluates.
+    Resets the module-level Firestore and backend caches so the backend is re-selected.
     """
     db_path = str(tmp_path / "test_callpilot.db")
     _set_test_env(db_path)
@@ -58,9 +58,11 @@ def isolated_sqlite_db(tmp_path, monkeypatch):
 
     monkeypatch.setattr(db_module, "_SQLITE_PATH", db_path)
     monkeypatch.setattr(db_module, "_USE_FIRESTORE", None)
+    monkeypatch.setattr(db_module, "_BACKEND", None)
 
     db_module.init_db()
     yield db_module
+    db_module.close_db()
 
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,169 @@
+"""
+Tests for backend/allowlist_cache.py and its use in database.is_email_allowed
+
+Covers:
+  - One load serves positive and negative checks until the refresh interval
+  - Write-through adds, including during a reload
+  - Reload failures, clearing, and a live feed replacing the list
+  - The database.py wiring (add_allowed_email, delete_collection, change feed)
+"""
+
+import threading
+import time
+
+import database as db
+from allowlist_cache import AllowListCache
+
+
+class CountingLoader:
+    """Loader over a mutable list that records calls and can be held open or made to fail."""
+
+    def __init__(self, emails=()):
+        self.emails = list(emails)
+        self.calls = 0
+        self.fail = False
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("backend down")
+        return list(self.emails)
+
+
+class TestAllowListCache:
+    def test_one_load_answers_positive_and_negative_checks(self):
+        loader = CountingLoader(["a@example.com"])
+        cache = AllowListCache(loader, refresh_seconds=60)
+        assert cache.contains("a@example.com")
+        assert not cache.contains("b@example.com")
+        assert not cache.contains("b@example.com")
+        assert loader.calls == 1
+
+    def test_reloads_after_refresh_interval(self):
+        loader = CountingLoader()
+        cache = AllowListCache(loader, refresh_seconds=0.05)
+        assert not cache.contains("a@example.com")
+        loader.emails.append("a@example.com")
+        time.sleep(0.08)
+        assert cache.contains("a@example.com")
+        assert loader.calls == 2
+
+    def test_add_is_visible_without_reload(self):
+        loader = CountingLoader()
+        cache = AllowListCache(loader, refresh_seconds=60)
+        assert not cache.contains("a@example.com")
+        cache.add("a@example.com")
+        assert cache.contains("a@example.com")
+        assert loader.calls == 1
+
+    def test_add_during_reload_is_kept(self):
+        loader = CountingLoader()
+        cache = AllowListCache(loader, refresh_seconds=60)
+        loader.release.clear()
+        reader = threading.Thread(target=cache.contains, args=("x@example.com",))
+        reader.start()
+        assert loader.started.wait(5)
+        cache.add("a@example.com")  # the reload already read the list without it
+        loader.release.set()
+        reader.join()
+        assert cache.contains("a@example.com")
+
+    def test_stale_list_served_while_another_thread_reloads(self):
+        loader = CountingLoader(["a@example.com"])
+        cache = AllowListCache(loader, refresh_seconds=0.01)
+        cache.contains("a@example.com")
+        time.sleep(0.02)
+        loader.started.clear()
+        loader.release.clear()
+        reloader = threading.Thread(target=cache.contains, args=("a@example.com",))
+        reloader.start()
+        assert loader.started.wait(5)
+        assert cache.contains("a@example.com")  # does not wait for the reload
+        loader.release.set()
+        reloader.join()
+        assert loader.calls == 2
+
+    def test_failed_reload_keeps_previous_list(self):
+        loader = CountingLoader(["a@example.com"])
+        cache = AllowListCache(loader, refresh_seconds=0.01)
+        cache.contains("a@example.com")
+        time.sleep(0.02)
+        loader.fail = True
+        assert cache.contains("a@example.com")
+        assert cache.contains("a@example.com")
+        assert loader.calls == 2  # the failure is retried after another interval, not per check
+
+    def test_live_feed_replaces_list_and_never_expires(self):
+        loader = CountingLoader()
+        cache = AllowListCache(loader, refresh_seconds=0.01)
+        cache.replace(["a@example.com"])
+        time.sleep(0.02)
+        assert cache.contains("a@example.com")
+        cache.replace([])
+        assert not cache.contains("a@example.com")
+        assert loader.calls == 0
+
+    def test_clear_forces_reload(self):
+        loader = CountingLoader(["a@example.com"])
+        cache = AllowListCache(loader, refresh_seconds=60)
+        cache.replace([])
+        cache.clear()
+        assert cache.contains("a@example.com")
+        assert loader.calls == 1
+
+    def test_zero_refresh_disables(self):
+        assert not AllowListCache(CountingLoader(), refresh_seconds=0).enabled
+
+
+class TestDatabaseAllowList:
+    def test_checks_served_from_memory(self, mocker):
+        db.add_allowed_email("vip@example.com")
+        load = mocker.spy(db._backend(), "get_allowed_emails")
+        point = mocker.spy(db._backend(), "is_email_allowed")
+        for _ in range(5):
+            assert db.is_email_allowed("VIP@example.com")
+            assert not db.is_email_allowed("nobody@example.com")
+        assert load.call_count == 1
+        point.assert_not_called()
+
+    def test_added_email_allowed_immediately(self):
+        assert not db.is_email_allowed("new@example.com")
+        db.add_allowed_email(" New@Example.com ")
+        assert db.is_email_allowed("new@example.com")
+
+    def test_delete_collection_clears_cache(self):
+        db.add_allowed_email("vip@example.com")
+        assert db.is_email_allowed("vip@example.com")
+        db.delete_collection("allowed_emails")
+        assert not db.is_email_allowed("vip@example.com")
+
+    def test_change_feed_keeps_cache_live(self, mocker, monkeypatch):
+        feed = {}
+        unwatch = mocker.Mock()
+
+        def watch(callback):
+            feed["push"] = callback
+            callback(["a@example.com"])
+            return unwatch
+
+        monkeypatch.setattr(db, "ALLOWLIST_LIVE_UPDATES", True)
+        monkeypatch.setattr(db._backend(), "watch_allowed_emails", watch, raising=False)
+        load = mocker.spy(db._backend(), "get_allowed_emails")
+        assert db.is_email_allowed("a@example.com")
+        feed["push"](["b@example.com"])
+        assert not db.is_email_allowed("a@example.com")
+        assert db.is_email_allowed("b@example.com")
+        load.assert_not_called()
+        db.close_db()
+        unwatch.assert_called_once()
+
+    def test_backends_without_feed_fall_back_to_refresh(self, monkeypatch):
+        monkeypatch.setattr(db, "ALLOWLIST_LIVE_UPDATES", True)
+        db.add_allowed_email("vip@example.com")
+        assert db.is_email_allowed("vip@example.com")
+        assert db._allowlist_unwatch is None
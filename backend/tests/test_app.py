@@ -7,6 +7,7 @@ provides a fresh in-memory SQLite DB for each test.
 """
 
 import json
+import time
 import uuid
 from unittest.mock import MagicMock, patch
 
@@ -203,6 +204,20 @@ class TestChat:
         assert "task_status" in body
         assert body["task_id"] == tid
 
+    def test_chat_appends_both_messages(self, client, bearer, isolated_sqlite_db, mocker):
+        import database as db
+        tid = str(uuid.uuid4())
+        db.create_task(tid, user_id="user-test")
+        mocker.patch("app.chat_service_chat", return_value=("Which city?", {"service_type": "dentist"}, "gathering_info"))
+
+        client.post("/api/chat", json={"task_id": tid, "message": "I need a dentist"}, headers=bearer)
+        client.post("/api/chat", json={"task_id": tid, "message": "Boston"}, headers=bearer)
+
+        task = db.get_task(tid)
+        assert [m["role"] for m in task["conversation"]] == ["user", "assistant", "user", "assistant"]
+        assert task["conversation"][2]["content"] == "Boston"
+        assert task["extracted_data"] == {"service_type": "dentist"}
+
 
 # ---------------------------------------------------------------------------
 # Booking request
@@ -217,8 +232,8 @@ class TestBookingRequest:
         assert resp.status_code == 401
 
     def test_creates_booking_returns_processing(self, client, bearer, mocker):
-        # Prevent background thread from actually calling external APIs
-        mocker.patch("threading.Thread")
+        # Prevent the background job from actually calling external APIs
+        mocker.patch("app.dispatcher")
 
         resp = client.post(
             "/api/booking/request",
@@ -231,7 +246,7 @@ class TestBookingRequest:
         assert "booking_id" in body
 
     def test_created_booking_stored_in_db(self, client, bearer, isolated_sqlite_db, mocker):
-        mocker.patch("threading.Thread")
+        mocker.patch("app.dispatcher")
 
         resp = client.post(
             "/api/booking/request",
@@ -243,6 +258,188 @@ class TestBookingRequest:
         assert stored is not None
         assert stored["service_type"] == "doctor"
 
+    def test_saturated_dispatch_returns_429_without_creating_booking(self, client, bearer, isolated_sqlite_db, mocker):
+        from dispatch import DispatchExecutor
+        dispatcher = DispatchExecutor(workers=1, queue_size=0)
+        mocker.patch("app.dispatcher", dispatcher)
+        held = dispatcher.reserve()
+        try:
+            resp = client.post(
+                "/api/booking/request",
+                json={"service_type": "dentist", "location": "Boston", "timeframe": "this week"},
+                headers=bearer,
+            )
+        finally:
+            held.close()
+        assert resp.status_code == 429
+        assert int(resp.headers["Retry-After"]) >= 1
+        assert resp.get_json()["retry_after"] == int(resp.headers["Retry-After"])
+        assert isolated_sqlite_db.get_all_bookings("user-test") == []
+        assert dispatcher.stats()["rejected"] == 1
+
+    def test_booking_calls_run_on_dispatcher(self, client, bearer, isolated_sqlite_db, mocker):
+        from dispatch import DispatchExecutor
+        dispatcher = DispatchExecutor(workers=1, queue_size=1)
+        mocker.patch("app.dispatcher", dispatcher)
+        mocker.patch("app.time.sleep")
+
+        resp = client.post(
+            "/api/booking/request",
+            json={"service_type": "dentist", "location": "Boston", "timeframe": "this week"},
+            headers=bearer,
+        )
+        dispatcher.shutdown()
+        booking = isolated_sqlite_db.get_booking(resp.get_json()["booking_id"])
+        assert booking["status"] == "completed"
+        assert booking["results"]
+        assert dispatcher.stats()["completed"] == 1
+
+    def test_queue_mode_enqueues_job(self, client, bearer, isolated_sqlite_db, mocker):
+        mocker.patch("app.BOOKING_JOBS", "queue")
+        dispatcher = mocker.patch("app.dispatcher")
+
+        resp = client.post(
+            "/api/booking/request",
+            json={"service_type": "dentist", "location": "Boston", "timeframe": "this week"},
+            headers=bearer,
+        )
+        assert resp.status_code == 200
+        booking_id = resp.get_json()["booking_id"]
+        job = isolated_sqlite_db.get_job(booking_id)
+        assert (job["kind"], job["status"]) == ("booking_calls", "queued")
+        assert job["payload"]["service_type"] == "dentist"
+        assert isolated_sqlite_db.get_booking(booking_id)["status"] == "processing"
+        dispatcher.reserve.assert_not_called()
+
+    def test_mock_results_write_once_per_provider(self, isolated_sqlite_db, mocker):
+        import app as app_module
+        from result_buffer import ResultWriteBuffer
+        mocker.patch("app.time.sleep")
+        bid = str(uuid.uuid4())
+        isolated_sqlite_db.create_booking(bid, "dentist", "Boston", "today", {})
+        merge = mocker.Mock(wraps=isolated_sqlite_db.merge_booking_results)
+        mocker.patch.object(app_module, "result_writes", ResultWriteBuffer(merge, window_ms=10_000))
+
+        results = app_module.generate_mock_results("dentist", "Boston", booking_id=bid)
+
+        # 'calling' and 'completed' for the same provider coalesce into one write
+        assert merge.call_count == len(results)
+        stored = isolated_sqlite_db.get_booking(bid)["results"]
+        assert [r["call_status"] for r in stored] == ["completed"] * len(results)
+
+    def test_real_calls_swarm_every_provider(self, isolated_sqlite_db, mocker, monkeypatch):
+        import app as app_module
+        monkeypatch.setenv("ELEVENLABS_AGENT_ID", "agent-1")
+        monkeypatch.setenv("ELEVENLABS_AGENT_PHONE_NUMBER_ID", "phone-1")
+        mocker.patch.object(app_module, "MOCK_PROVIDER_COUNT", 15)
+        calls = []
+
+        async def parallel_calls(providers, context, on_result=None):
+            calls.append(len(providers))
+            infos = []
+            for i, _ in enumerate(providers):
+                info = {"status": "failed", "error": "busy"} if i == 3 else \
+                    {"status": "initiated", "conversation_id": f"conv-{i}", "initiation_ms": 12.5}
+                on_result(i, info)
+                infos.append(info)
+            return infos
+
+        app_module.get_elevenlabs_service.return_value.parallel_calls = parallel_calls
+        bid = str(uuid.uuid4())
+        isolated_sqlite_db.create_booking(bid, "dentist", "Cambridge", "today", {})
+
+        results = app_module.make_real_calls("dentist", "Cambridge", "today", booking_id=bid)
+
+        assert calls == [15]
+        assert len(results) == 15
+        assert results[0]["conversation_id"] == "conv-0" and results[0]["initiation_ms"] == 12.5
+        assert results[3]["call_status"] == "failed"
+        stored = isolated_sqlite_db.get_booking(bid)["results"]
+        assert sum(r["call_status"] == "in_progress" for r in stored) == 14
+
+    def test_swarm_failure_fills_missing_results(self, isolated_sqlite_db, mocker, monkeypatch):
+        import app as app_module
+        monkeypatch.setenv("ELEVENLABS_AGENT_ID", "agent-1")
+        monkeypatch.setenv("ELEVENLABS_AGENT_PHONE_NUMBER_ID", "phone-1")
+        mocker.patch.object(app_module, "MOCK_PROVIDER_COUNT", 3)
+
+        async def parallel_calls(providers, context, on_result=None):
+            on_result(0, {"status": "initiated", "conversation_id": "conv-0"})
+            raise RuntimeError("provider 1 blew up")
+
+        app_module.get_elevenlabs_service.return_value.parallel_calls = parallel_calls
+        bid = str(uuid.uuid4())
+        isolated_sqlite_db.create_booking(bid, "dentist", "Cambridge", "today", {})
+
+        results = app_module.make_real_calls("dentist", "Cambridge", "today", booking_id=bid)
+
+        assert [r["call_status"] for r in results] == ["in_progress", "failed", "failed"]
+        stored = isolated_sqlite_db.get_booking(bid)["results"]
+        assert [r["call_status"] for r in stored] == ["in_progress", "failed", "failed"]
+
+    def test_swarm_writes_results_while_calls_are_in_flight(self, isolated_sqlite_db, mocker, monkeypatch):
+        import asyncio
+
+        import app as app_module
+        monkeypatch.setenv("ELEVENLABS_AGENT_ID", "agent-1")
+        monkeypatch.setenv("ELEVENLABS_AGENT_PHONE_NUMBER_ID", "phone-1")
+        mocker.patch.object(app_module, "MOCK_PROVIDER_COUNT", 2)
+        bid = str(uuid.uuid4())
+        isolated_sqlite_db.create_booking(bid, "dentist", "Cambridge", "today", {})
+        seen_mid_swarm = []
+
+        async def parallel_calls(providers, context, on_result=None):
+            on_result(0, {"status": "initiated", "conversation_id": "conv-0"})
+            # The second call is still being placed; the first one's result lands meanwhile
+            for _ in range(200):
+                await asyncio.sleep(0.005)
+                stored = isolated_sqlite_db.get_booking(bid)["results"]
+                if stored:
+                    seen_mid_swarm.extend(r.get("conversation_id") for r in stored)
+                    break
+            on_result(1, {"status": "initiated", "conversation_id": "conv-1"})
+
+        app_module.get_elevenlabs_service.return_value.parallel_calls = parallel_calls
+        app_module.make_real_calls("dentist", "Cambridge", "today", booking_id=bid)
+
+        assert seen_mid_swarm[0] == "conv-0" and "conv-1" not in seen_mid_swarm
+        stored = isolated_sqlite_db.get_booking(bid)["results"]
+        assert [r["conversation_id"] for r in stored] == ["conv-0", "conv-1"]
+
+    def test_swarm_survives_failed_result_write(self, isolated_sqlite_db, mocker, monkeypatch):
+        import app as app_module
+        monkeypatch.setenv("ELEVENLABS_AGENT_ID", "agent-1")
+        monkeypatch.setenv("ELEVENLABS_AGENT_PHONE_NUMBER_ID", "phone-1")
+        mocker.patch.object(app_module, "MOCK_PROVIDER_COUNT", 2)
+        mocker.patch.object(app_module.db_async, "update_booking_result", side_effect=RuntimeError("db down"))
+
+        async def parallel_calls(providers, context, on_result=None):
+            for i in range(len(providers)):
+                on_result(i, {"status": "initiated", "conversation_id": f"conv-{i}"})
+
+        app_module.get_elevenlabs_service.return_value.parallel_calls = parallel_calls
+        results = app_module.make_real_calls("dentist", "Cambridge", "today", booking_id=str(uuid.uuid4()))
+        assert [r["call_status"] for r in results] == ["in_progress", "in_progress"]
+
+
+# ---------------------------------------------------------------------------
+# Admin metrics
+# ---------------------------------------------------------------------------
+
+class TestAdminMetrics:
+    def test_requires_admin_key(self, client, monkeypatch):
+        monkeypatch.setenv("ADMIN_SECRET", "admin-key")
+        assert client.get("/api/admin/metrics", headers={"X-Admin-Key": "wrong"}).status_code == 403
+
+    def test_reports_dispatch_load(self, client, monkeypatch):
+        monkeypatch.setenv("ADMIN_SECRET", "admin-key")
+        resp = client.get("/api/admin/metrics", headers={"X-Admin-Key": "admin-key"})
+        assert resp.status_code == 200
+        dispatch = resp.get_json()["dispatch"]
+        assert {"workers", "capacity", "busy", "queued", "rejected", "wait_ms"} <= set(dispatch)
+        assert isinstance(resp.get_json()["outbound_numbers"], dict)
+        assert isinstance(resp.get_json()["number_pools"], dict)
+
 
 # ---------------------------------------------------------------------------
 # Get booking status
@@ -289,6 +486,118 @@ class TestGetBookingStatus:
         body = resp.get_json()
         assert "message" in body
 
+    def test_call_without_webhook_fails_once_stale(self, client, bearer, isolated_sqlite_db, monkeypatch):
+        import call_limiter
+        import database as db
+        monkeypatch.setattr(call_limiter, "CALL_LIVE_TTL_SECONDS", 60)
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="user-test")
+        db.update_booking_status(bid, "processing", [
+            {"provider_name": "A", "conversation_id": "conv-a", "call_status": "in_progress",
+             "placed_at": time.time() - 120},
+        ])
+
+        body = client.get(f"/api/booking/{bid}", headers=bearer).get_json()
+        assert body["status"] == "completed"
+        assert body["results"][0]["call_status"] == "failed"
+        assert db.get_booking(bid)["status"] == "completed"
+
+
+def _sse_events(resp):
+    """Decode the data events of a text/event-stream response."""
+    events = []
+    for chunk in resp.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith("data: "):
+            events.append(json.loads(text[len("data: "):]))
+    return events
+
+
+class TestBookingStatusEvents:
+    def test_no_auth_returns_401(self, client):
+        assert client.get("/api/booking/some-id/events").status_code == 401
+
+    def test_not_found_returns_404(self, client, bearer):
+        assert client.get(f"/api/booking/{uuid.uuid4()}/events", headers=bearer).status_code == 404
+
+    def test_finished_booking_sends_one_event(self, client, bearer, isolated_sqlite_db):
+        import database as db
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="user-test")
+        db.update_booking_status(bid, "completed", [{"provider_name": "A"}])
+
+        resp = client.get(f"/api/booking/{bid}/events", headers=bearer)
+        assert resp.mimetype == "text/event-stream"
+        events = _sse_events(resp)
+        assert [e["status"] for e in events] == ["completed"]
+        assert events[0]["results"] == [{"provider_name": "A"}]
+
+    def test_pushes_changes_until_completed(self, client, bearer, isolated_sqlite_db):
+        import threading
+        import time
+        import database as db
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="user-test")
+
+        def calls():
+            while not db._booking_events.subscriber_count(bid):
+                time.sleep(0.01)
+            db.update_booking_result(bid, 0, {"provider_name": "A", "call_status": "completed"})
+            db.update_booking_status(bid, "completed")
+
+        writer = threading.Thread(target=calls)
+        writer.start()
+        resp = client.get(f"/api/booking/{bid}/events", headers=bearer, buffered=False)
+        events = _sse_events(resp)
+        writer.join()
+        assert events[0]["status"] == "processing"
+        assert events[-1]["status"] == "completed"
+        assert events[-1]["results"] == [{"provider_name": "A", "call_status": "completed"}]
+        assert db._booking_events.subscriber_count(bid) == 0
+
+    def test_rereads_booking_without_change_feed(self, client, bearer, isolated_sqlite_db, monkeypatch):
+        import threading
+        import time
+        import database as db
+        monkeypatch.setattr("app.BOOKING_EVENTS_POLL_SECONDS", 0.05)
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="user-test")
+
+        def other_process():
+            while not db._booking_events.subscriber_count(bid):
+                time.sleep(0.01)
+            # A write from another process (worker.py) reaches neither this process's change bus nor its
+            # cache, until the cache entry expires
+            db._backend().update_booking_status(bid, "completed", [{"provider_name": "A"}])
+            db._booking_cache.invalidate(bid)
+
+        writer = threading.Thread(target=other_process)
+        writer.start()
+        resp = client.get(f"/api/booking/{bid}/events", headers=bearer, buffered=False)
+        events = _sse_events(resp)
+        writer.join()
+        assert [e["status"] for e in events] == ["processing", "completed"]
+
+    def test_caps_open_streams(self, client, bearer, isolated_sqlite_db, monkeypatch):
+        import threading
+        import database as db
+        slots = threading.BoundedSemaphore(1)
+        monkeypatch.setattr("app._event_stream_slots", slots)
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="user-test")
+        db.update_booking_status(bid, "completed")
+
+        slots.acquire()  # another stream is open
+        resp = client.get(f"/api/booking/{bid}/events", headers=bearer)
+        assert resp.status_code == 503
+        assert int(resp.headers["Retry-After"]) >= 1
+        slots.release()
+
+        assert [e["status"] for e in _sse_events(client.get(f"/api/booking/{bid}/events", headers=bearer))] == ["completed"]
+        assert client.get(f"/api/booking/{uuid.uuid4()}/events", headers=bearer).status_code == 404
+        # Both the finished stream and the 404 gave their slot back
+        assert slots.acquire(blocking=False)
+
 
 # ---------------------------------------------------------------------------
 # Dashboard stats
@@ -314,6 +623,33 @@ class TestDashboardStats:
         body = resp.get_json()
         assert body["stats"]["total_bookings"] == 0
 
+    def test_counts_own_bookings(self, client, bearer, isolated_sqlite_db):
+        import database as db
+        done = str(uuid.uuid4())
+        db.create_booking(done, "dentist", "Boston", "today", {}, user_id="user-test")
+        db.update_booking_status(done, "completed", [{"call_status": "completed"}, {"call_status": "failed"}])
+        db.create_booking(str(uuid.uuid4()), "doctor", "NYC", "today", {}, user_id="user-test")
+        db.create_booking(str(uuid.uuid4()), "doctor", "NYC", "today", {}, user_id="other-user")
+
+        body = client.get("/api/dashboard/stats", headers=bearer).get_json()
+        assert body["stats"]["total_bookings"] == 2
+        assert body["stats"]["completed"] == 1
+        assert body["stats"]["processing"] == 1
+        assert body["stats"]["total_calls_made"] == 2
+        assert body["stats"]["success_rate"] == 50
+        assert len(body["recent_bookings"]) == 2
+        recent = {b["booking_id"]: b for b in body["recent_bookings"]}
+        assert "results" not in recent[done]
+        assert (recent[done]["result_count"], recent[done]["completed_count"]) == (2, 1)
+
+    def test_expand_returns_full_recent_bookings(self, client, bearer, isolated_sqlite_db):
+        import database as db
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="user-test")
+        db.update_booking_results(bid, [{"call_status": "pending"}])
+        body = client.get("/api/dashboard/stats?expand=results", headers=bearer).get_json()
+        assert body["recent_bookings"][0]["results"] == [{"call_status": "pending"}]
+
 
 # ---------------------------------------------------------------------------
 # Dashboard bookings
@@ -339,6 +675,55 @@ class TestDashboardBookings:
         assert len(bookings) == 1
         assert bookings[0]["user_id"] == "user-test"
 
+    def test_returns_summaries_unless_expanded(self, client, bearer, isolated_sqlite_db):
+        import database as db
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {"notes": "x"}, user_id="user-test")
+        db.update_booking_results(bid, [{"provider_name": "A", "call_status": "completed", "score": 80}])
+
+        summary = client.get("/api/dashboard/bookings", headers=bearer).get_json()["bookings"][0]
+        assert "results" not in summary and "preferences" not in summary
+        assert summary["best_result"]["provider_name"] == "A"
+        full = client.get("/api/dashboard/bookings?expand=results", headers=bearer).get_json()["bookings"][0]
+        assert full["results"][0]["provider_name"] == "A"
+        assert full["preferences"] == {"notes": "x"}
+
+    def test_paginates_with_cursor(self, client, bearer, isolated_sqlite_db):
+        import database as db
+        for _ in range(3):
+            db.create_booking(str(uuid.uuid4()), "dentist", "Boston", "today", {}, user_id="user-test")
+
+        first = client.get("/api/dashboard/bookings?limit=2", headers=bearer).get_json()
+        assert len(first["bookings"]) == 2
+        assert first["next_cursor"]
+        second = client.get(
+            f"/api/dashboard/bookings?limit=2&cursor={first['next_cursor']}", headers=bearer
+        ).get_json()
+        assert len(second["bookings"]) == 1
+        assert second["next_cursor"] is None
+
+    def test_invalid_limit_returns_400(self, client, bearer):
+        resp = client.get("/api/dashboard/bookings?limit=zero", headers=bearer)
+        assert resp.status_code == 400
+
+    def test_invalid_cursor_returns_400(self, client, bearer):
+        resp = client.get("/api/dashboard/bookings?cursor=%%%", headers=bearer)
+        assert resp.status_code == 400
+
+
+class TestListTasks:
+    def test_no_auth_returns_401(self, client):
+        resp = client.get("/api/tasks")
+        assert resp.status_code == 401
+
+    def test_lists_only_own_tasks(self, client, bearer, isolated_sqlite_db):
+        import database as db
+        db.create_task(str(uuid.uuid4()), user_id="user-test")
+        db.create_task(str(uuid.uuid4()), user_id="other-user")
+        body = client.get("/api/tasks", headers=bearer).get_json()
+        assert len(body["tasks"]) == 1
+        assert body["next_cursor"] is None
+
 
 # ---------------------------------------------------------------------------
 # Twilio voice webhook
@@ -371,6 +756,50 @@ class TestTwilioVoiceWebhook:
         assert b"<Hangup" in resp.data
 
 
+class TestTwilioStatusWebhook:
+    URL = "https://example.test/api/twilio/status"
+
+    @pytest.fixture(autouse=True)
+    def _twilio_env(self, monkeypatch):
+        monkeypatch.setenv("TWILIO_AUTH_TOKEN", "twilio-token")
+        monkeypatch.setenv("TWILIO_WEBHOOK_BASE_URL", "https://example.test")
+
+    def _post(self, client, data, token="twilio-token"):
+        from twilio.request_validator import RequestValidator
+        signature = RequestValidator(token).compute_signature(self.URL, data)
+        return client.post("/api/twilio/status", data=data, headers={"X-Twilio-Signature": signature})
+
+    def test_unsigned_callback_frees_nothing(self, client, monkeypatch):
+        import number_pool
+        monkeypatch.setattr(number_pool, "_pools", {})
+        pool = number_pool.pool_for("twilio", ["+15550000001"])
+        pool.placed(pool.assign(), "CA123")
+
+        data = {"CallSid": "CA123", "CallStatus": "completed"}
+        assert client.post("/api/twilio/status", data=data).status_code == 403
+        assert self._post(client, data, token="someone-else").status_code == 403
+        assert pool.stats()["+15550000001"]["active"] == 1
+
+    def test_call_end_frees_caller_number(self, client, monkeypatch):
+        import call_limiter
+        import number_pool
+        monkeypatch.setattr(number_pool, "_pools", {})
+        monkeypatch.setattr(call_limiter, "_limiters", {})
+        pool = number_pool.pool_for("twilio", ["+15550000001"])
+        pool.placed(pool.assign(), "CA123")
+        limiter = call_limiter.limiter_for("+15550000001")
+        limiter.acquire()
+        limiter.hold("CA123")
+
+        resp = self._post(client, {"CallSid": "CA123", "CallStatus": "ringing"})
+        assert resp.status_code == 204
+        assert pool.stats()["+15550000001"]["active"] == 1
+        assert limiter.stats()["live"] == 1
+        assert self._post(client, {"CallSid": "CA123", "CallStatus": "completed"}).status_code == 204
+        assert pool.stats()["+15550000001"]["active"] == 0
+        assert (limiter.stats()["live"], limiter.stats()["in_flight"]) == (0, 0)
+
+
 # ---------------------------------------------------------------------------
 # ElevenLabs webhook
 # ---------------------------------------------------------------------------
@@ -391,6 +820,25 @@ class TestElevenLabsWebhook:
         )
         assert resp.status_code == 200
 
+    def test_call_end_frees_agent_number(self, client, monkeypatch):
+        import call_limiter
+        import number_pool
+        monkeypatch.setattr(number_pool, "_pools", {})
+        monkeypatch.setattr(call_limiter, "_limiters", {})
+        pool = number_pool.pool_for("elevenlabs", ["phone-1"])
+        pool.placed(pool.assign(), "conv-pooled")
+        limiter = call_limiter.limiter_for("phone-1")
+        limiter.acquire()
+        limiter.hold("conv-pooled")
+
+        resp = client.post(
+            "/api/webhooks/elevenlabs",
+            json={"type": "call_initiation_failure", "data": {"conversation_id": "conv-pooled"}},
+        )
+        assert resp.status_code == 200
+        assert pool.stats()["phone-1"] == {"active": 0, "in_rotation": True, "consecutive_failures": 1}
+        assert limiter.stats()["in_flight"] == 0
+
     def test_unknown_conversation_id_still_returns_200(self, client):
         resp = client.post(
             "/api/webhooks/elevenlabs",
@@ -423,3 +871,94 @@ class TestElevenLabsWebhook:
 
         booking = db.get_booking(bid)
         assert booking["status"] == "completed"
+
+    def test_webhook_updates_only_matching_result(self, client, isolated_sqlite_db):
+        import database as db
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_results(bid, [
+            {"provider_name": "A", "conversation_id": "conv-a", "call_status": "in_progress"},
+            {"provider_name": "B", "conversation_id": "conv-b", "call_status": "completed"},
+        ])
+
+        resp = client.post(
+            "/api/webhooks/elevenlabs",
+            json={"type": "call_initiation_failure", "data": {"conversation_id": "conv-a"}},
+        )
+        assert resp.status_code == 200
+
+        booking = db.get_booking(bid)
+        assert [r["call_status"] for r in booking["results"]] == ["failed", "completed"]
+        assert booking["results"][1]["provider_name"] == "B"
+        assert booking["status"] == "completed"
+
+    def test_call_end_leaves_other_live_calls_alone(self, client, isolated_sqlite_db):
+        import database as db
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_status(bid, "processing", [
+            {"provider_name": p, "conversation_id": f"conv-{p}", "call_status": "in_progress", "placed_at": time.time()}
+            for p in "abc"
+        ])
+
+        def _end(conv_id):
+            client.post("/api/webhooks/elevenlabs", json={
+                "type": "post_call_transcription", "data": {"conversation_id": conv_id, "analysis": {}},
+            })
+
+        _end("conv-a")
+        booking = db.get_booking(bid)
+        assert [r["call_status"] for r in booking["results"]] == ["completed", "in_progress", "in_progress"]
+        assert booking["status"] == "processing"
+        _end("conv-c")
+        _end("conv-b")
+        booking = db.get_booking(bid)
+        assert [r["call_status"] for r in booking["results"]] == ["completed"] * 3
+        assert booking["status"] == "completed"
+
+    def test_stale_calls_fail_by_age(self, client, isolated_sqlite_db, monkeypatch):
+        import call_limiter
+        import database as db
+        monkeypatch.setattr(call_limiter, "CALL_LIVE_TTL_SECONDS", 60)
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_status(bid, "processing", [
+            {"provider_name": "A", "conversation_id": "conv-a", "call_status": "in_progress", "placed_at": time.time()},
+            {"provider_name": "B", "conversation_id": "conv-b", "call_status": "in_progress",
+             "placed_at": time.time() - 120},
+        ])
+
+        client.post("/api/webhooks/elevenlabs", json={
+            "type": "post_call_transcription", "data": {"conversation_id": "conv-a", "analysis": {}},
+        })
+        booking = db.get_booking(bid)
+        assert [r["call_status"] for r in booking["results"]] == ["completed", "failed"]
+        assert booking["results"][1]["availability_time"] == "No response"
+        assert booking["status"] == "completed"
+
+    def test_webhook_recomputes_after_concurrent_write(self, client, mocker, isolated_sqlite_db):
+        import database as db
+        bid = str(uuid.uuid4())
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_results(bid, [
+            {"provider_name": "A", "conversation_id": "conv-a", "call_status": "in_progress"},
+            {"provider_name": "B", "conversation_id": "conv-b", "call_status": "calling"},
+        ])
+        lookup = db.get_booking_by_conversation_id
+
+        def _lookup_then_lose_race(conversation_id):
+            found = lookup(conversation_id)
+            # B's webhook lands after this one read the booking
+            db.update_booking_result(bid, 1, {"provider_name": "B", "conversation_id": "conv-b", "call_status": "completed"})
+            return found
+
+        mocker.patch.object(db, "get_booking_by_conversation_id", side_effect=_lookup_then_lose_race)
+        resp = client.post(
+            "/api/webhooks/elevenlabs",
+            json={"type": "call_initiation_failure", "data": {"conversation_id": "conv-a"}},
+        )
+        assert resp.status_code == 200
+
+        booking = db.get_booking(bid)
+        assert [r["call_status"] for r in booking["results"]] == ["failed", "completed"]
+        assert booking["status"] == "completed"
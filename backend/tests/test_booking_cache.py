@@ -0,0 +1,156 @@
+"""
+Tests for backend/booking_cache.py and its use in database.get_booking
+
+Covers:
+  - Hits, TTL expiry and LRU eviction
+  - Single-flight: concurrent misses share one backend read
+  - Invalidation, including of a read already in flight
+  - Write-through invalidation from the database.py booking writes
+"""
+
+import threading
+import time
+import uuid
+
+import pytest
+
+import database as db
+from booking_cache import ReadThroughCache
+
+
+class CountingLoader:
+    """Loader that records calls and can be held open to simulate a slow read."""
+
+    def __init__(self):
+        self.calls = 0
+        self.version = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.started = threading.Event()
+
+    def __call__(self, key):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return {"key": key, "version": self.version}
+
+
+class TestReadThroughCache:
+    def test_hit_does_not_reload(self):
+        loader = CountingLoader()
+        cache = ReadThroughCache(loader, max_entries=10, ttl_seconds=60)
+        assert cache.get("b1") == cache.get("b1")
+        assert loader.calls == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_returns_copies(self):
+        cache = ReadThroughCache(CountingLoader(), max_entries=10, ttl_seconds=60)
+        cache.get("b1")["version"] = 99
+        assert cache.get("b1")["version"] == 0
+
+    def test_entries_expire(self):
+        loader = CountingLoader()
+        cache = ReadThroughCache(loader, max_entries=10, ttl_seconds=0.01)
+        cache.get("b1")
+        time.sleep(0.02)
+        cache.get("b1")
+        assert loader.calls == 2
+
+    def test_least_recently_used_is_evicted(self):
+        loader = CountingLoader()
+        cache = ReadThroughCache(loader, max_entries=2, ttl_seconds=60)
+        cache.get("a")
+        cache.get("b")
+        cache.get("a")
+        cache.get("c")
+        assert len(cache) == 2
+        cache.get("a")
+        assert loader.calls == 3
+        cache.get("b")
+        assert loader.calls == 4
+
+    def test_misses_are_not_cached(self):
+        calls = []
+        cache = ReadThroughCache(lambda key: calls.append(key), max_entries=10, ttl_seconds=60)
+        assert cache.get("missing") is None
+        assert cache.get("missing") is None
+        assert len(calls) == 2
+
+    def test_concurrent_misses_share_one_read(self):
+        loader = CountingLoader()
+        loader.release.clear()
+        cache = ReadThroughCache(loader, max_entries=10, ttl_seconds=60)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("b1"))) for _ in range(8)]
+        for t in threads:
+            t.start()
+        loader.started.wait(5)
+        time.sleep(0.05)
+        loader.release.set()
+        for t in threads:
+            t.join()
+        assert loader.calls == 1
+        assert len(results) == 8
+
+    def test_loader_error_reaches_every_waiter_and_is_not_cached(self):
+        def boom(key):
+            raise RuntimeError("backend down")
+
+        cache = ReadThroughCache(boom, max_entries=10, ttl_seconds=60)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                cache.get("b1")
+        assert len(cache) == 0
+
+    def test_invalidate_during_read_skips_caching(self):
+        loader = CountingLoader()
+        loader.release.clear()
+        cache = ReadThroughCache(loader, max_entries=10, ttl_seconds=60)
+        t = threading.Thread(target=cache.get, args=("b1",))
+        t.start()
+        loader.started.wait(5)
+        cache.invalidate("b1")
+        loader.release.set()
+        t.join()
+        loader.version = 1
+        assert cache.get("b1")["version"] == 1
+
+    def test_disabled_cache_always_loads(self):
+        loader = CountingLoader()
+        cache = ReadThroughCache(loader, max_entries=10, ttl_seconds=0)
+        cache.get("b1")
+        cache.get("b1")
+        assert loader.calls == 2
+
+
+class TestDatabaseBookingCache:
+    def _booking(self, user_id="alice"):
+        booking_id = str(uuid.uuid4())
+        db.create_booking(booking_id, "dentist", "Boston", "today", {}, user_id)
+        return booking_id
+
+    def test_polling_reads_backend_once(self, mocker):
+        booking_id = self._booking()
+        spy = mocker.spy(db._backend(), "get_booking")
+        for _ in range(5):
+            assert db.get_booking(booking_id, "alice")["status"] == "processing"
+        assert spy.call_count == 1
+
+    def test_owner_check_applies_to_cached_booking(self):
+        booking_id = self._booking()
+        assert db.get_booking(booking_id, "alice") is not None
+        assert db.get_booking(booking_id, "mallory") is None
+
+    def test_writes_invalidate(self):
+        booking_id = self._booking()
+        db.get_booking(booking_id)
+        db.merge_booking_results(booking_id, {0: {"call_status": "calling"}})
+        assert db.get_booking(booking_id)["results"] == [{"call_status": "calling"}]
+        db.update_booking_status(booking_id, "completed")
+        assert db.get_booking(booking_id)["status"] == "completed"
+
+    def test_clear_all_bookings_empties_cache(self):
+        booking_id = self._booking()
+        db.get_booking(booking_id)
+        db.clear_all_bookings()
+        assert db.get_booking(booking_id) is None
@@ -0,0 +1,138 @@
+"""
+Tests for backend/booking_events.py and its use in database.py
+
+Covers:
+  - Fan-out to every subscriber of a booking, coalescing, and unsubscribe
+  - Backend listeners started with the first subscriber and stopped with the last, and whether
+    a subscription is live (sees other processes' changes)
+  - database.py writes waking subscribers, and listener changes invalidating the cache
+"""
+
+import threading
+import uuid
+
+import database as db
+from booking_events import BookingChangeBus
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+class FakeFeed:
+    """watch() stand-in that records listeners and lets tests fire them."""
+
+    def __init__(self, supported=True):
+        self.supported = supported
+        self.listeners = {}
+        self.stopped = []
+
+    def __call__(self, booking_id, on_change):
+        if not self.supported:
+            return None
+        self.listeners[booking_id] = on_change
+        return lambda: self.stopped.append(booking_id)
+
+    def fire(self, booking_id):
+        self.listeners[booking_id]()
+
+
+class TestBookingChangeBus:
+    def test_publish_wakes_every_subscriber_of_the_booking(self):
+        bus = BookingChangeBus()
+        a, b, other = bus.subscribe("b1"), bus.subscribe("b1"), bus.subscribe("b2")
+        bus.publish(["b1"])
+        assert a.wait(0) and b.wait(0)
+        assert not other.wait(0)
+
+    def test_changes_coalesce_until_next_wait(self):
+        bus = BookingChangeBus()
+        sub = bus.subscribe("b1")
+        bus.publish(["b1"])
+        bus.publish(["b1"])
+        assert sub.wait(0)
+        assert not sub.wait(0)
+
+    def test_wait_blocks_until_publish(self):
+        bus = BookingChangeBus()
+        sub = bus.subscribe("b1")
+        timer = threading.Timer(0.05, bus.publish, args=(["b1"],))
+        timer.start()
+        assert sub.wait(5)
+        timer.join()
+
+    def test_closed_subscription_is_forgotten(self):
+        bus = BookingChangeBus()
+        with bus.subscribe("b1"):
+            assert bus.subscriber_count("b1") == 1
+        assert bus.subscriber_count("b1") == 0
+        bus.publish(["b1"])  # no subscribers: nothing to do
+
+    def test_listener_follows_first_and_last_subscriber(self):
+        feed = FakeFeed()
+        bus = BookingChangeBus(feed)
+        first, second = bus.subscribe("b1"), bus.subscribe("b1")
+        assert list(feed.listeners) == ["b1"]
+        assert first.live
+        feed.fire("b1")
+        assert first.wait(0) and second.wait(0)
+        first.close()
+        assert feed.stopped == []
+        second.close()
+        assert feed.stopped == ["b1"]
+
+    def test_backend_without_feed(self):
+        bus = BookingChangeBus(FakeFeed(supported=False))
+        sub = bus.subscribe("b1")
+        assert not sub.live
+        bus.publish(["b1"])
+        assert sub.wait(0)
+
+    def test_failing_listener_falls_back_to_local_changes(self):
+        def broken(booking_id, on_change):
+            raise RuntimeError("no feed")
+        bus = BookingChangeBus(broken)
+        sub = bus.subscribe("b1")
+        bus.publish(["b1"])
+        assert sub.wait(0)
+
+    def test_stop_watches_wakes_subscribers(self):
+        feed = FakeFeed()
+        bus = BookingChangeBus(feed)
+        sub = bus.subscribe("b1")
+        bus.stop_watches()
+        assert feed.stopped == ["b1"]
+        assert sub.wait(0)
+        sub.close()
+        assert feed.stopped == ["b1"]
+
+
+class TestDatabaseBookingEvents:
+    def test_writes_wake_subscribers(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        with db.subscribe_booking(bid) as sub:
+            db.update_booking_result(bid, 0, {"provider_name": "A"})
+            assert sub.wait(0)
+            db.update_booking_status(bid, "completed")
+            assert sub.wait(0)
+            assert db.get_booking(bid)["status"] == "completed"
+
+    def test_clearing_wakes_all_subscribers(self):
+        with db.subscribe_booking(new_id()) as sub:
+            db.clear_all_bookings()
+            assert sub.wait(0)
+
+    def test_backend_change_invalidates_cache_and_wakes(self, monkeypatch):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        feed = FakeFeed()
+        monkeypatch.setattr(db._backend(), "watch_booking", feed, raising=False)
+        with db.subscribe_booking(bid) as sub:
+            assert db.get_booking(bid)["status"] == "processing"  # now cached
+            # Another instance completes the booking behind this process's back
+            db._backend().update_booking_status(bid, "completed")
+            feed.fire(bid)
+            assert sub.wait(0)
+            assert db.get_booking(bid)["status"] == "completed"
+        assert feed.stopped == [bid]
@@ -0,0 +1,150 @@
+"""
+Tests for backend/call_limiter.py (per-number limits for outbound calls).
+
+Covers:
+  - The concurrency cap: callers past it wait for a release instead of failing
+  - Token-bucket pacing of calls per second
+  - Timing out with NumberBusy, from threads and coroutines
+  - Placed calls keep their turn until their end is reported, or the live TTL passes
+  - One shared limiter per number
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import call_limiter
+from call_limiter import NumberBusy, NumberLimiter
+
+
+class TestNumberLimiter:
+    def test_concurrency_cap_queues_callers(self):
+        limiter = NumberLimiter("+1555", max_concurrent=2, calls_per_second=0)
+        in_flight, peak, lock = 0, 0, threading.Lock()
+
+        def _call():
+            nonlocal in_flight, peak
+            with limiter.slot(timeout=5):
+                with lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                time.sleep(0.02)
+                with lock:
+                    in_flight -= 1
+
+        threads = [threading.Thread(target=_call) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert peak == 2
+        stats = limiter.stats()
+        assert (stats["placed"], stats["in_flight"], stats["waiting"]) == (6, 0, 0)
+        assert stats["queued"] >= 4
+
+    def test_paces_calls_per_second(self):
+        limiter = NumberLimiter("+1555", max_concurrent=0, calls_per_second=50, burst=1)
+        started = time.monotonic()
+        for _ in range(6):
+            with limiter.slot(timeout=5):
+                pass
+        # The first call uses the initial token; the other five wait 1/50 s each
+        assert time.monotonic() - started >= 5 / 50 * 0.9
+
+    def test_burst_allows_calls_back_to_back(self):
+        limiter = NumberLimiter("+1555", max_concurrent=0, calls_per_second=0.01, burst=3)
+        for _ in range(3):
+            limiter.acquire(timeout=0)
+        with pytest.raises(NumberBusy):
+            limiter.acquire(timeout=0.05)
+        assert limiter.stats()["timed_out"] == 1
+
+    def test_times_out_when_number_stays_busy(self):
+        limiter = NumberLimiter("+1555", max_concurrent=1, calls_per_second=0)
+        limiter.acquire()
+        with pytest.raises(NumberBusy):
+            limiter.acquire(timeout=0.05)
+        limiter.release()
+        limiter.acquire(timeout=0)
+        assert limiter.stats()["in_flight"] == 1
+
+    def test_async_waiters_share_the_limit(self):
+        limiter = NumberLimiter("+1555", max_concurrent=1, calls_per_second=0)
+        order = []
+
+        async def _call(i):
+            async with limiter.slot_async(timeout=5):
+                order.append(("start", i))
+                await asyncio.sleep(0.01)
+                order.append(("end", i))
+
+        async def _run():
+            await asyncio.gather(*(_call(i) for i in range(3)))
+
+        asyncio.run(_run())
+        # Never two calls in flight: every start is followed by its own end
+        assert [kind for kind, _ in order] == ["start", "end"] * 3
+
+    def test_async_timeout(self):
+        limiter = NumberLimiter("+1555", max_concurrent=1, calls_per_second=0)
+        limiter.acquire()
+        with pytest.raises(NumberBusy):
+            asyncio.run(limiter.acquire_async(timeout=0.05))
+        assert limiter.stats()["waiting"] == 0
+
+
+class TestLiveCalls:
+    def test_held_call_keeps_turn_until_released(self):
+        limiter = NumberLimiter("+1555", max_concurrent=1, calls_per_second=0)
+        limiter.acquire()
+        limiter.hold("conv-1", "CA1")
+        with pytest.raises(NumberBusy):
+            limiter.acquire(timeout=0.05)
+        # Either key ends the call, once
+        assert limiter.release_call("CA1")
+        assert not limiter.release_call("conv-1")
+        limiter.acquire(timeout=0)
+        assert limiter.stats()["in_flight"] == 1
+
+    def test_waiter_gets_turn_when_call_ends(self):
+        limiter = NumberLimiter("+1555", max_concurrent=1, calls_per_second=0)
+        limiter.acquire()
+        limiter.hold("conv-1")
+        threading.Timer(0.05, limiter.release_call, args=("conv-1",)).start()
+        started = time.monotonic()
+        limiter.acquire(timeout=5)
+        assert 0.04 <= time.monotonic() - started < 1
+
+    def test_unreported_call_expires(self):
+        limiter = NumberLimiter("+1555", max_concurrent=1, calls_per_second=0, live_ttl_seconds=0.05)
+        limiter.acquire()
+        limiter.hold("conv-1")
+        assert limiter.stats()["live"] == 1
+        limiter.acquire(timeout=1)
+        assert not limiter.release_call("conv-1")
+        assert (limiter.stats()["live"], limiter.stats()["in_flight"]) == (0, 1)
+
+    def test_call_without_key_releases_now(self):
+        limiter = NumberLimiter("+1555", max_concurrent=1, calls_per_second=0)
+        limiter.acquire()
+        limiter.hold(None)
+        limiter.acquire(timeout=0)
+
+
+class TestRegistry:
+    def test_one_limiter_per_number(self, monkeypatch):
+        monkeypatch.setattr(call_limiter, "_limiters", {})
+        assert call_limiter.limiter_for("+1555") is call_limiter.limiter_for("+1555")
+        assert call_limiter.limiter_for("+1666") is not call_limiter.limiter_for("+1555")
+        assert set(call_limiter.stats()) == {"+1555", "+1666"}
+
+    def test_release_call_finds_the_number(self, monkeypatch):
+        monkeypatch.setattr(call_limiter, "_limiters", {})
+        limiter = call_limiter.limiter_for("+1666")
+        limiter.acquire()
+        limiter.hold("conv-1")
+        assert call_limiter.release_call("conv-1")
+        assert not call_limiter.release_call("conv-1") and not call_limiter.release_call(None)
+        assert call_limiter.stats()["+1666"]["in_flight"] == 0
@@ -0,0 +1,102 @@
+"""
+Tests for backend/storage/codec.py and the SQLite columns stored through it.
+
+Covers:
+  - Round trips and marker bytes for each format
+  - Reading the plain JSON text earlier builds wrote
+  - The standard library fallback writing the same bytes as orjson
+  - STORAGE_CODEC selecting the format new rows are written in
+"""
+
+import json
+import uuid
+
+import pytest
+
+import database as db
+from storage import codec
+
+BOOKING = {
+    "booking_id": "b1",
+    "preferences": {"max_distance": 10, "notes": "Café near the T"},
+    "results": [{"provider_name": "Cambridge Dental", "score": 92, "has_availability": True, "rating": 4.8}],
+}
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+class TestCodec:
+    @pytest.mark.parametrize("fmt", sorted(codec.FORMATS))
+    def test_round_trip(self, fmt):
+        raw = codec.encode(BOOKING, fmt)
+        assert raw[0] == codec.FORMATS[fmt]
+        assert codec.decode(raw) == BOOKING
+
+    def test_zlib_is_smaller_for_repetitive_payloads(self):
+        results = BOOKING["results"] * 20
+        assert len(codec.encode(results, "zlib")) < len(codec.encode(results, "json"))
+
+    def test_reads_legacy_json_text(self):
+        assert codec.decode(json.dumps(BOOKING)) == BOOKING
+        assert codec.decode(json.dumps(BOOKING).encode()) == BOOKING
+
+    @pytest.mark.parametrize("fmt", sorted(codec.FORMATS))
+    def test_stdlib_fallback_matches_orjson(self, fmt, monkeypatch):
+        pytest.importorskip("orjson")
+        value = {**BOOKING, 1: "int key"}
+        raw = codec.encode(value, fmt)
+        monkeypatch.setattr(codec, "orjson", None)
+        assert codec.encode(value, fmt) == raw
+        assert codec.decode(raw) == codec.decode(codec.encode(value, fmt))
+
+    def test_empty_values_give_default(self):
+        assert codec.decode(None, []) == []
+        assert codec.decode(b"", {}) == {}
+
+    def test_int_keys_are_stringified(self):
+        assert codec.decode(codec.encode({1: "a"})) == {"1": "a"}
+
+    def test_unknown_format_raises(self):
+        with pytest.raises(ValueError):
+            codec.encode(BOOKING, "msgpack")
+
+
+class TestSQLiteColumns:
+    def _stored_results(self, booking_id):
+        return db._backend()._conn().execute(
+            "SELECT data FROM call_results WHERE booking_id = ?", (booking_id,)).fetchall()
+
+    def test_rows_written_in_configured_format(self, monkeypatch):
+        monkeypatch.setattr(codec, "STORAGE_CODEC", "zlib")
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {"min_rating": 4})
+        db.update_booking_results(bid, BOOKING["results"])
+        ((data,),) = self._stored_results(bid)
+        assert data[0] == codec.FORMAT_ZLIB
+        assert db.get_booking(bid)["results"] == BOOKING["results"]
+
+    def test_mixed_formats_read_together(self, monkeypatch):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {"min_rating": 4})
+        db.update_booking_results(bid, [{"provider_name": "A"}, {"provider_name": "B"}])
+        db._backend()._write(lambda conn: conn.execute(
+            "UPDATE call_results SET data = ? WHERE booking_id = ? AND result_index = 0",
+            ('{"provider_name": "A"}', bid)))
+        monkeypatch.setattr(codec, "STORAGE_CODEC", "zlib")
+        db.update_booking_result(bid, 1, {"provider_name": "C"})
+        db._backend()._write(lambda conn: conn.execute(
+            "UPDATE bookings SET preferences = '{\"min_rating\": 4}' WHERE booking_id = ?", (bid,)))
+        db.close_db()
+        booking = db.get_booking(bid)
+        assert booking["results"] == [{"provider_name": "A"}, {"provider_name": "C"}]
+        assert booking["preferences"] == {"min_rating": 4}
+
+    def test_task_messages_round_trip(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        db.append_task_messages(tid, [{"role": "user", "content": "Hi"}], extracted_data={"service": "dentist"})
+        task = db.get_task(tid)
+        assert task["conversation"] == [{"role": "user", "content": "Hi"}]
+        assert task["extracted_data"] == {"service": "dentist"}
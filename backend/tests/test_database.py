@@ -5,11 +5,18 @@ The autouse `isolated_sqlite_db` fixture in conftest.py forces USE_SQLITE=true
 and gives each test a fresh temp database, so tests are fully isolated.
 """
 
+import sqlite3
+import threading
+import time
 import uuid
+import zlib
 
 import pytest
 
 import database as db
+import storage.sqlite as sqlite_storage
+from storage import codec
+from storage.base import RECENT_BOOKINGS_LIMIT
 
 
 # ---------------------------------------------------------------------------
@@ -20,6 +27,236 @@ def new_id() -> str:
     return str(uuid.uuid4())
 
 
+# ---------------------------------------------------------------------------
+# Schema migrations
+# ---------------------------------------------------------------------------
+
+class TestSchemaMigrations:
+    def _query_plan(self, sql, params=()):
+        rows = db._backend()._conn().execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        return " ".join(row[-1] for row in rows)
+
+    def test_init_db_records_schema_version(self):
+        db.init_db()
+        versions = [row[0] for row in db._backend()._conn().execute("SELECT version FROM schema_version ORDER BY version")]
+        assert versions == list(range(1, sqlite_storage.SCHEMA_VERSION + 1))
+
+    def test_steps_run_once(self, mocker):
+        db.init_db()
+        step = mocker.Mock()
+        mocker.patch.object(sqlite_storage, "_MIGRATIONS", [(1, step)])
+        assert db._backend()._write(sqlite_storage._create_schema) == []
+        step.assert_not_called()
+
+    def test_new_step_runs_on_next_init(self, mocker):
+        db.init_db()
+        step = mocker.Mock()
+        next_version = sqlite_storage.SCHEMA_VERSION + 1
+        mocker.patch.object(sqlite_storage, "_MIGRATIONS", sqlite_storage._MIGRATIONS + [(next_version, step)])
+        assert db._backend()._write(sqlite_storage._create_schema) == [next_version]
+        step.assert_called_once()
+
+    def test_upgrades_database_from_before_versioning(self, tmp_path):
+        path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE bookings (booking_id TEXT PRIMARY KEY, service_type TEXT NOT NULL, location TEXT NOT NULL, "
+                     "timeframe TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, preferences TEXT, results TEXT)")
+        conn.execute("INSERT INTO bookings VALUES ('b1', 'dentist', 'Boston', 'today', 'completed', 1.0, '{}', '[{\"provider_name\": \"Old\"}]')")
+        conn.commit()
+        conn.close()
+        store = sqlite_storage.SQLiteBackend(path)
+        try:
+            store.init_db()
+            assert store.get_booking("b1")["results"] == [{"provider_name": "Old"}]
+            assert store.get_booking("b1")["version"] == 1
+            assert store._conn().execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == sqlite_storage.SCHEMA_VERSION
+        finally:
+            store.close()
+
+    def test_digest_backfilled_for_existing_bookings(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_results(bid, [{"call_status": "completed", "score": 70}])
+        db._backend()._write(lambda conn: conn.execute("UPDATE bookings SET digest = NULL"))
+        db._backend()._write(lambda conn: conn.execute("DELETE FROM schema_version WHERE version >= 4"))
+        db.init_db()
+        assert db.get_bookings_by_ids([bid], summary=True)[0]["best_result"]["score"] == 70
+
+    def test_listings_use_indexes(self):
+        db.init_db()
+        assert "idx_bookings_user_created" in self._query_plan(
+            "SELECT * FROM bookings WHERE user_id = ? ORDER BY created_at DESC", ("alice",))
+        assert "idx_bookings_status_created" in self._query_plan(
+            "SELECT booking_id FROM bookings WHERE status = 'processing' ORDER BY created_at")
+        assert "idx_tasks_user_updated" in self._query_plan(
+            "SELECT task_id FROM tasks WHERE user_id = ? ORDER BY updated_at DESC", ("alice",))
+
+
+# ---------------------------------------------------------------------------
+# Retention
+# ---------------------------------------------------------------------------
+
+class TestRetention:
+    def _old_bookings(self, n, days=100):
+        ids = [new_id() for _ in range(n)]
+        db.create_bookings_many([
+            {"booking_id": bid, "service_type": "dentist", "location": "Boston", "timeframe": "today",
+             "user_id": "alice", "status": "completed", "created_at": time.time() - days * 86400,
+             "results": [{"provider_name": "A"}]}
+            for bid in ids
+        ])
+        return ids
+
+    def test_archived_booking_still_fetchable(self):
+        (bid,) = self._old_bookings(1)
+        assert db.get_booking(bid, "alice")["status"] == "completed"  # cached while live
+        db.run_retention(booking_days=90, task_days=0)
+        booking = db.get_booking(bid, "alice")
+        assert booking["results"] == [{"provider_name": "A"}]
+        assert booking["archived_at"] is not None
+        assert db.get_booking(bid, "bob") is None
+        assert db.list_bookings("alice")[0] == []
+
+    def test_run_retention_works_in_batches(self, mocker):
+        self._old_bookings(5)
+        spy = mocker.spy(db._backend(), "archive_bookings")
+        counts = db.run_retention(booking_days=90, task_days=0, batch_size=2)
+        assert counts == {"archived_bookings": 5, "expired_tasks": 0}
+        assert [c.args[1] for c in spy.call_args_list] == [2, 2, 2]
+
+    def test_recent_bookings_are_kept(self):
+        self._old_bookings(1, days=10)
+        assert db.run_retention(booking_days=90, task_days=0)["archived_bookings"] == 0
+
+    def test_archive_is_compressed(self):
+        (bid,) = self._old_bookings(1)
+        db.run_retention(booking_days=90, task_days=0)
+        data = db._backend()._conn().execute("SELECT data FROM archived_bookings WHERE booking_id = ?", (bid,)).fetchone()[0]
+        assert data[0] == codec.FORMAT_ZLIB
+        assert zlib.decompress(data[1:]).startswith(b"{")
+
+    def test_stale_tasks_expire(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        db._backend()._write(lambda conn: conn.execute(
+            "UPDATE tasks SET updated_at = ? WHERE task_id = ?", (time.time() - 30 * 86400, tid)))
+        assert db.run_retention(booking_days=0, task_days=14) == {"archived_bookings": 0, "expired_tasks": 1}
+        assert db.get_task(tid) is None
+
+
+# ---------------------------------------------------------------------------
+# Connection pool
+# ---------------------------------------------------------------------------
+
+class TestSQLitePool:
+    def test_connection_reused_within_thread(self):
+        assert db._backend()._conn() is db._backend()._conn()
+
+    def test_each_thread_gets_its_own_connection(self):
+        seen = []
+        t = threading.Thread(target=lambda: seen.append(db._backend()._conn()))
+        t.start()
+        t.join()
+        assert seen[0] is not db._backend()._conn()
+
+    def test_connection_uses_wal_and_normal_sync(self):
+        conn = db._backend()._conn()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        # synchronous: 1 == NORMAL
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == sqlite_storage.BUSY_TIMEOUT_MS
+
+    def test_close_db_reopens_on_next_use(self):
+        before = db._backend()._conn()
+        db.close_db()
+        after = db._backend()._conn()
+        assert after is not before
+        assert after.execute("SELECT 1").fetchone()[0] == 1
+
+    def test_failed_write_rolls_back(self):
+        bid = new_id()
+
+        def _boom(conn):
+            conn.execute(
+                "INSERT INTO bookings (booking_id, service_type, location, timeframe, status, created_at) "
+                "VALUES (?, 'dentist', 'Boston', 'today', 'processing', 0)",
+                (bid,),
+            )
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            db._backend()._write(_boom)
+        assert db.get_booking(bid) is None
+
+    def test_concurrent_writers_from_many_threads(self):
+        ids = [new_id() for _ in range(16)]
+        threads = [
+            threading.Thread(target=db.create_booking, args=(bid, "dentist", "Boston", "today", {}))
+            for bid in ids
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(db.get_booking(bid) is not None for bid in ids)
+
+
+class TestSQLiteWriter:
+    def _insert(self, bid):
+        def _op(conn):
+            conn.execute(
+                "INSERT INTO bookings (booking_id, service_type, location, timeframe, status, created_at) "
+                "VALUES (?, 'dentist', 'Boston', 'today', 'processing', 0)",
+                (bid,),
+            )
+            return bid
+        return _op
+
+    def test_submit_returns_future_with_result(self):
+        bid = new_id()
+        future = db._backend()._submit(self._insert(bid))
+        assert future.result(timeout=5) == bid
+        assert db.get_booking(bid) is not None
+
+    def test_writes_run_on_one_writer_thread(self):
+        names = [db._backend()._write(lambda conn: threading.current_thread().name) for _ in range(3)]
+        assert set(names) == {"sqlite-writer"}
+        assert threading.current_thread().name != "sqlite-writer"
+
+    def test_failed_op_in_batch_rolls_back_alone(self):
+        release = threading.Event()
+        blocker = db._backend()._submit(lambda conn: release.wait(5))
+        ok1, bad, ok2 = new_id(), new_id(), new_id()
+
+        def _boom(conn):
+            self._insert(bad)(conn)
+            raise RuntimeError("boom")
+
+        # Queued while the writer is busy, so these three commit together as one batch
+        futures = [db._backend()._submit(self._insert(ok1)), db._backend()._submit(_boom), db._backend()._submit(self._insert(ok2))]
+        release.set()
+        blocker.result(timeout=5)
+        assert futures[0].result(timeout=5) == ok1
+        with pytest.raises(RuntimeError):
+            futures[1].result(timeout=5)
+        assert futures[2].result(timeout=5) == ok2
+        assert db.get_booking(ok1) is not None
+        assert db.get_booking(bad) is None
+        assert db.get_booking(ok2) is not None
+
+    def test_nested_write_runs_in_enclosing_transaction(self):
+        bid = new_id()
+        assert db._backend()._write(lambda conn: db._backend()._write(self._insert(bid))) == bid
+        assert db.get_booking(bid) is not None
+
+    def test_close_commits_queued_writes(self):
+        bid = new_id()
+        future = db._backend()._submit(self._insert(bid))
+        db.close_db()
+        assert future.result(timeout=5) == bid
+        assert db.get_booking(bid) is not None
+
+
 # ---------------------------------------------------------------------------
 # Bookings
 # ---------------------------------------------------------------------------
@@ -108,6 +345,137 @@ class TestBookings:
         assert booking is None
         assert idx == -1
 
+    def test_get_booking_by_call_sid(self):
+        bid = new_id()
+        db.create_booking(bid, "doctor", "Boston", "today", {})
+        db.update_booking_results(bid, [{"call_status": "pending"}, {"call_sid": "CA123", "call_status": "completed"}])
+        booking, idx = db.get_booking_by_conversation_id("CA123")
+        assert booking["booking_id"] == bid
+        assert idx == 1
+
+    def test_get_booking_by_conversation_id_ignores_completed_bookings(self):
+        bid = new_id()
+        db.create_booking(bid, "doctor", "Boston", "today", {})
+        db.update_booking_status(bid, "completed", results=[{"conversation_id": "conv-done"}])
+        booking, idx = db.get_booking_by_conversation_id("conv-done")
+        assert booking is None
+        assert idx == -1
+
+    def test_get_booking_by_conversation_id_follows_reordered_results(self):
+        bid = new_id()
+        db.create_booking(bid, "doctor", "Boston", "today", {})
+        db.register_call("conv-moved", bid, 0)
+        db.update_booking_results(bid, [{"call_status": "failed"}])
+        db._backend()._write(lambda conn: conn.execute(
+            "INSERT INTO call_results (booking_id, result_index, data) VALUES (?, 1, ?)",
+            (bid, '{"conversation_id": "conv-moved"}')))
+        booking, idx = db.get_booking_by_conversation_id("conv-moved")
+        assert booking["booking_id"] == bid
+        assert idx == 1
+
+    def test_results_write_indexes_conversation_ids(self):
+        bid = new_id()
+        db.create_booking(bid, "doctor", "Boston", "today", {})
+        db.update_booking_results(bid, [{"conversation_id": "conv-a"}, {"conversation_id": "conv-b"}])
+        assert db.lookup_call("conv-a") == (bid, 0)
+        assert db.lookup_call("conv-b") == (bid, 1)
+
+    def test_update_booking_result_writes_single_provider(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_results(bid, [{"provider_name": "A", "call_status": "pending"},
+                                        {"provider_name": "B", "call_status": "pending"}])
+        db.update_booking_result(bid, 1, {"provider_name": "B", "call_status": "completed"})
+        results = db.get_booking(bid)["results"]
+        assert [r["call_status"] for r in results] == ["pending", "completed"]
+
+    def test_update_booking_result_indexes_conversation_id(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_result(bid, 0, {"conversation_id": "conv-single", "call_status": "in_progress"})
+        booking, idx = db.get_booking_by_conversation_id("conv-single")
+        assert booking["booking_id"] == bid
+        assert idx == 0
+
+    def test_merge_booking_results_writes_several_providers(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        db.update_booking_results(bid, [{"provider_name": n, "call_status": "pending"} for n in "ABC"])
+        db.merge_booking_results(bid, {0: {"provider_name": "A", "call_status": "completed"},
+                                       2: {"provider_name": "C", "conversation_id": "conv-c", "call_status": "in_progress"},
+                                       3: {"provider_name": "D", "call_status": "failed"}})
+        results = db.get_booking(bid)["results"]
+        assert [r["call_status"] for r in results] == ["completed", "pending", "in_progress", "failed"]
+        assert db.lookup_call("conv-c") == (bid, 2)
+        assert db.get_user_stats("alice")["total_calls"] == 4
+
+    def test_update_booking_results_shrinks_list(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_results(bid, [{"provider_name": "A"}, {"provider_name": "B"}, {"provider_name": "C"}])
+        db.update_booking_results(bid, [{"provider_name": "A"}])
+        assert [r["provider_name"] for r in db.get_booking(bid)["results"]] == ["A"]
+
+    def test_parallel_result_updates_do_not_clobber_each_other(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db.update_booking_results(bid, [{"call_status": "pending"} for _ in range(8)])
+        threads = [
+            threading.Thread(target=db.update_booking_result, args=(bid, i, {"call_status": "completed", "i": i}))
+            for i in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results = db.get_booking(bid)["results"]
+        assert [r["i"] for r in results] == list(range(8))
+
+    def test_get_all_bookings_reassembles_results(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        db.update_booking_results(bid, [{"provider_name": "A"}, {"provider_name": "B"}])
+        bookings = db.get_all_bookings(user_id="alice")
+        assert [r["provider_name"] for r in bookings[0]["results"]] == ["A", "B"]
+
+    def test_init_db_migrates_inline_results(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {})
+        db._backend()._write(lambda conn: conn.execute(
+            "UPDATE bookings SET results = ? WHERE booking_id = ?", ('[{"provider_name": "Legacy"}]', bid)))
+        db._backend()._write(lambda conn: conn.execute("DROP TABLE schema_version"))  # database from before versioning
+        db.init_db()
+        assert db.get_booking(bid)["results"] == [{"provider_name": "Legacy"}]
+
+    def test_list_bookings_pages_newest_first(self):
+        ids = []
+        for i in range(5):
+            bid = new_id()
+            db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+            db._backend()._write(lambda conn, bid=bid, i=i: conn.execute(
+                "UPDATE bookings SET created_at = ? WHERE booking_id = ?", (1000 + i, bid)))
+            ids.append(bid)
+        page1, cursor = db.list_bookings(user_id="alice", limit=2)
+        page2, cursor2 = db.list_bookings(user_id="alice", limit=2, cursor=cursor)
+        page3, cursor3 = db.list_bookings(user_id="alice", limit=2, cursor=cursor2)
+        seen = [b["booking_id"] for b in page1 + page2 + page3]
+        assert seen == list(reversed(ids))
+        assert cursor3 is None
+
+    def test_list_bookings_breaks_created_at_ties_by_id(self):
+        ids = sorted(new_id() for _ in range(3))
+        for bid in ids:
+            db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+            db._backend()._write(lambda conn, bid=bid: conn.execute(
+                "UPDATE bookings SET created_at = 5 WHERE booking_id = ?", (bid,)))
+        page1, cursor = db.list_bookings(user_id="alice", limit=2)
+        page2, _ = db.list_bookings(user_id="alice", limit=2, cursor=cursor)
+        assert [b["booking_id"] for b in page1 + page2] == list(reversed(ids))
+
+    def test_list_bookings_invalid_cursor_raises(self):
+        with pytest.raises(ValueError):
+            db.list_bookings(user_id="alice", cursor="not-a-cursor")
+
     def test_clear_all_bookings(self):
         db.create_booking(new_id(), "dentist", "Boston", "today", {})
         db.clear_all_bookings()
@@ -122,6 +490,69 @@ class TestBookings:
         assert fetched["preferences"]["rating_weight"] == 0.5
 
 
+# ---------------------------------------------------------------------------
+# Dashboard stats
+# ---------------------------------------------------------------------------
+
+class TestUserStats:
+    def test_new_user_has_zero_stats(self):
+        stats = db.get_user_stats("nobody")
+        assert stats["total_bookings"] == 0
+        assert stats["recent_booking_ids"] == []
+
+    def test_create_booking_counts_as_processing(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        stats = db.get_user_stats("alice")
+        assert stats["total_bookings"] == 1
+        assert stats["processing"] == 1
+        assert stats["recent_booking_ids"] == [bid]
+
+    def test_status_transition_moves_counter(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        db.update_booking_status(bid, "completed")
+        db.update_booking_status(bid, "completed")
+        stats = db.get_user_stats("alice")
+        assert stats["processing"] == 0
+        assert stats["completed"] == 1
+
+    def test_results_writes_track_total_calls(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        db.update_booking_results(bid, [{"call_status": "pending"}, {"call_status": "pending"}])
+        db.update_booking_result(bid, 1, {"call_status": "completed"})
+        db.update_booking_result(bid, 2, {"call_status": "completed"})
+        assert db.get_user_stats("alice")["total_calls"] == 3
+        db.update_booking_status(bid, "completed", results=[{"call_status": "completed"}])
+        assert db.get_user_stats("alice")["total_calls"] == 1
+
+    def test_recent_bookings_bounded_newest_first(self):
+        ids = [new_id() for _ in range(RECENT_BOOKINGS_LIMIT + 3)]
+        for bid in ids:
+            db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        recent = db.get_user_stats("alice")["recent_booking_ids"]
+        assert recent == list(reversed(ids))[:RECENT_BOOKINGS_LIMIT]
+
+    def test_stats_backfilled_for_existing_bookings(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        db.update_booking_status(bid, "completed", results=[{"call_status": "completed"}])
+        db._backend()._write(lambda conn: conn.execute("DELETE FROM user_stats"))
+        stats = db.get_user_stats("alice")
+        assert stats["total_bookings"] == 1
+        assert stats["completed"] == 1
+        assert stats["total_calls"] == 1
+        assert stats["recent_booking_ids"] == [bid]
+
+    def test_get_bookings_by_ids_preserves_order(self):
+        a, b = new_id(), new_id()
+        db.create_booking(a, "dentist", "Boston", "today", {})
+        db.create_booking(b, "doctor", "Boston", "today", {})
+        fetched = db.get_bookings_by_ids([b, "missing", a])
+        assert [x["booking_id"] for x in fetched] == [b, a]
+
+
 # ---------------------------------------------------------------------------
 # Tasks
 # ---------------------------------------------------------------------------
@@ -171,6 +602,59 @@ class TestTasks:
         fetched = db.get_task(tid)
         assert fetched["conversation"][0]["content"] == "I need a dentist"
 
+    def test_append_task_messages_extends_conversation(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        db.append_task_messages(tid, [{"role": "user", "content": "hi"}], user_id="alice")
+        db.append_task_messages(tid, [{"role": "assistant", "content": "hello"},
+                                      {"role": "user", "content": "dentist"}],
+                                status="ready_to_call", extracted_data={"service_type": "dentist"}, user_id="alice")
+        task = db.get_task(tid)
+        assert [m["content"] for m in task["conversation"]] == ["hi", "hello", "dentist"]
+        assert task["message_count"] == 3
+        assert task["status"] == "ready_to_call"
+        assert task["extracted_data"] == {"service_type": "dentist"}
+
+    def test_append_task_messages_wrong_user_is_rejected(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        assert db.append_task_messages(tid, [{"role": "user", "content": "hi"}], user_id="bob") is False
+        assert db.get_task(tid)["conversation"] == []
+
+    def test_get_task_conversation_tail(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        db.append_task_messages(tid, [{"role": "user", "content": str(i)} for i in range(10)])
+        task = db.get_task(tid, conversation_limit=3)
+        assert [m["content"] for m in task["conversation"]] == ["7", "8", "9"]
+        assert task["message_count"] == 10
+        assert [m["content"] for m in db.get_task_messages(tid, limit=2)] == ["8", "9"]
+
+    def test_get_task_without_conversation(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        db.append_task_messages(tid, [{"role": "user", "content": "hi"}])
+        assert "conversation" not in db.get_task(tid, include_conversation=False)
+
+    def test_update_task_conversation_replaces_messages(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        db.append_task_messages(tid, [{"role": "user", "content": "old"}])
+        db.update_task(tid, conversation=[{"role": "user", "content": "new"}], user_id="alice")
+        db.append_task_messages(tid, [{"role": "assistant", "content": "next"}])
+        assert [m["content"] for m in db.get_task(tid)["conversation"]] == ["new", "next"]
+
+    def test_init_db_migrates_inline_conversation(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+        db._backend()._write(lambda conn: conn.execute(
+            "UPDATE tasks SET conversation = ? WHERE task_id = ?", ('[{"role": "user", "content": "legacy"}]', tid)))
+        db._backend()._write(lambda conn: conn.execute("DROP TABLE schema_version"))  # database from before versioning
+        db.init_db()
+        task = db.get_task(tid)
+        assert task["conversation"] == [{"role": "user", "content": "legacy"}]
+        assert task["message_count"] == 1
+
     def test_update_task_wrong_user_does_nothing(self):
         tid = new_id()
         db.create_task(tid, user_id="alice")
@@ -179,6 +663,16 @@ class TestTasks:
         # Status should remain unchanged
         assert fetched["status"] == "gathering_info"
 
+    def test_list_tasks_paginates(self):
+        for _ in range(3):
+            db.create_task(new_id(), user_id="alice")
+        page1, cursor = db.list_tasks(user_id="alice", limit=2)
+        page2, cursor2 = db.list_tasks(user_id="alice", limit=2, cursor=cursor)
+        assert len(page1) == 2
+        assert len(page2) == 1
+        assert cursor2 is None
+        assert {t["task_id"] for t in page1}.isdisjoint({t["task_id"] for t in page2})
+
     def test_get_all_tasks_user_scoped(self):
         db.create_task(new_id(), user_id="alice")
         db.create_task(new_id(), user_id="bob")
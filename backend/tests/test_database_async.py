@@ -0,0 +1,227 @@
+"""
+Tests for backend/database_async.py and the async storage backends.
+
+Covers:
+  - The async facade over SQLite (worker threads): reads, writes, webhook lookup, tasks
+  - Booking-cache invalidation shared with database.py
+  - AsyncFirestoreBackend against the Firestore emulator (skipped unless
+    FIRESTORE_EMULATOR_HOST is set, e.g. `gcloud emulators firestore start --host-port=localhost:8181`)
+"""
+
+import asyncio
+import os
+import uuid
+
+import pytest
+
+import database as db
+import database_async as adb
+from storage.aio import ThreadedAsyncBackend
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+def run(coro_fn, *args):
+    """Run an async test body on a fresh loop, releasing the loop's backend afterwards."""
+    async def _main():
+        try:
+            return await coro_fn(*args)
+        finally:
+            await adb.close_db()
+    return asyncio.run(_main())
+
+
+def _processing_booking(user_id="alice", conversation_id="conv-1"):
+    bid = new_id()
+    db.create_booking(bid, "dentist", "Boston", "today", {}, user_id=user_id)
+    db.update_booking_results(bid, [
+        {"provider_name": "A", "call_status": "in_progress", "conversation_id": conversation_id},
+        {"provider_name": "B", "call_status": "completed", "score": 80},
+    ])
+    return bid
+
+
+# ---------------------------------------------------------------------------
+# Facade (SQLite in worker threads)
+# ---------------------------------------------------------------------------
+
+class TestAsyncFacade:
+    def test_threaded_backend_wraps_current_backend(self):
+        async def body():
+            backend = adb._backend()
+            assert isinstance(backend, ThreadedAsyncBackend)
+            assert backend.sync is db._backend()
+            assert adb._backend() is backend
+        run(body)
+
+    def test_backend_follows_reselection(self):
+        async def body():
+            first = adb._backend()
+            db.close_db()
+            assert adb._backend().sync is db._backend()
+            assert adb._backend() is not first
+        run(body)
+
+    def test_get_booking_with_stats(self):
+        bid = _processing_booking()
+
+        async def body():
+            return await adb.get_booking_with_stats(bid, "alice")
+
+        booking, stats = run(body)
+        assert booking["booking_id"] == bid
+        assert len(booking["results"]) == 2
+        assert stats["total_bookings"] == 1
+        assert stats["recent_booking_ids"] == [bid]
+
+    def test_get_booking_checks_owner_and_archive(self):
+        bid = new_id()
+        db.create_bookings_many([{"booking_id": bid, "service_type": "dentist", "location": "Boston", "timeframe": "today",
+                                  "user_id": "alice", "status": "completed", "created_at": 1.0}])
+        db.archive_bookings(older_than=2.0)
+
+        async def body():
+            return await adb.get_booking(bid, "alice"), await adb.get_booking(bid, "bob")
+
+        archived, foreign = run(body)
+        assert archived["archived_at"] is not None
+        assert foreign is None
+
+    def test_webhook_flow(self):
+        bid = _processing_booking()
+
+        async def body():
+            booking, idx = await adb.get_booking_by_conversation_id("conv-1")
+            assert (booking["booking_id"], idx) == (bid, 0)
+            await adb.update_booking_result(bid, idx, {**booking["results"][idx], "call_status": "completed"})
+            await adb.update_booking_status(bid, "completed")
+            return await adb.get_booking_by_conversation_id("conv-1")
+
+        assert run(body) == (None, -1)
+        booking = db.get_booking(bid)
+        assert booking["status"] == "completed"
+        assert booking["results"][0]["call_status"] == "completed"
+        assert db.get_user_stats("alice")["completed"] == 1
+
+    def test_writes_invalidate_sync_cache(self):
+        bid = _processing_booking()
+        assert db.get_booking(bid)["results"][1]["provider_name"] == "B"
+
+        async def body():
+            await adb.merge_booking_results(bid, {1: {"provider_name": "C"}})
+
+        run(body)
+        assert db.get_booking(bid)["results"][1]["provider_name"] == "C"
+
+    def test_concurrent_result_writes(self):
+        bid = new_id()
+        db.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+
+        async def body():
+            await asyncio.gather(*(adb.update_booking_result(bid, i, {"provider_name": f"P{i}"}) for i in range(8)))
+
+        run(body)
+        assert [r["provider_name"] for r in db.get_booking(bid)["results"]] == [f"P{i}" for i in range(8)]
+        assert db.get_user_stats("alice")["total_calls"] == 8
+
+    def test_task_messages(self):
+        tid = new_id()
+        db.create_task(tid, user_id="alice")
+
+        async def body():
+            assert await adb.append_task_messages(tid, [{"role": "user", "content": "Hi"}], user_id="alice")
+            assert not await adb.append_task_messages(tid, [{"role": "user", "content": "Hi"}], user_id="bob")
+            return await adb.get_task(tid, "alice")
+
+        task = run(body)
+        assert task["conversation"] == [{"role": "user", "content": "Hi"}]
+        assert task["message_count"] == 1
+
+    def test_is_email_allowed(self):
+        db.add_allowed_email("ok@example.com")
+
+        async def body():
+            return await adb.is_email_allowed(" OK@example.com "), await adb.is_email_allowed("")
+
+        assert run(body) == (True, False)
+
+
+# ---------------------------------------------------------------------------
+# Firestore emulator
+# ---------------------------------------------------------------------------
+
+@pytest.mark.skipif(not os.getenv("FIRESTORE_EMULATOR_HOST"), reason="needs the Firestore emulator (FIRESTORE_EMULATOR_HOST)")
+class TestAsyncFirestore:
+    PROJECT = "callpilot-test"
+
+    @pytest.fixture
+    def stores(self):
+        from google.cloud import firestore
+
+        from storage.firestore import FirestoreBackend
+        from storage.firestore_async import AsyncFirestoreBackend
+
+        sync = FirestoreBackend(firestore.Client(project=self.PROJECT))
+        yield sync, lambda: AsyncFirestoreBackend(sync, firestore.AsyncClient(project=self.PROJECT))
+        sync.clean_db()
+
+    def _run(self, make_async, body):
+        async def _main():
+            store = make_async()
+            try:
+                return await body(store)
+            finally:
+                await store.close()
+        return asyncio.run(_main())
+
+    def test_reads_match_sync_backend(self, stores):
+        sync, make_async = stores
+        bid = new_id()
+        sync.create_booking(bid, "dentist", "Boston", "today", {"x": 1}, user_id="alice")
+        sync.update_booking_results(bid, [{"provider_name": "A", "conversation_id": "c-" + bid}])
+
+        async def body(store):
+            return await asyncio.gather(store.get_booking(bid, "alice"), store.get_booking(bid, "bob"),
+                                        store.get_user_stats("alice"), store.get_booking_by_conversation_id("c-" + bid))
+
+        booking, foreign, stats, (found, idx) = self._run(make_async, body)
+        assert booking == sync.get_booking(bid)
+        assert foreign is None
+        assert stats == sync.get_user_stats("alice")
+        assert (found["booking_id"], idx) == (bid, 0)
+
+    def test_writes_keep_stats_and_call_index(self, stores):
+        sync, make_async = stores
+        bid = new_id()
+        sync.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+
+        async def body(store):
+            await asyncio.gather(*(store.update_booking_result(bid, i, {"provider_name": f"P{i}", "call_sid": f"CA{i}-{bid}"})
+                                   for i in range(3)))
+            await store.update_booking_status(bid, "completed", [{"provider_name": "Only", "score": 90,
+                                                                   "call_status": "completed"}])
+
+        self._run(make_async, body)
+        booking = sync.get_booking(bid)
+        assert booking["status"] == "completed"
+        assert booking["results"] == [{"provider_name": "Only", "score": 90, "call_status": "completed"}]
+        assert sync.get_bookings_by_ids([bid], summary=True)[0]["best_result"]["score"] == 90
+        assert sync.lookup_call(f"CA0-{bid}") == (bid, 0)
+        stats = sync.get_user_stats("alice")
+        assert (stats["total_calls"], stats["completed"], stats["processing"]) == (1, 1, 0)
+
+    def test_task_append(self, stores):
+        sync, make_async = stores
+        tid = new_id()
+        sync.create_task(tid, user_id="alice")
+
+        async def body(store):
+            assert await store.append_task_messages(tid, [{"role": "user", "content": "Hi"}], status="ready")
+            return await store.get_task(tid, "alice", conversation_limit=1)
+
+        task = self._run(make_async, body)
+        assert task["status"] == "ready"
+        assert task["conversation"] == [{"role": "user", "content": "Hi"}]
+        assert sync.get_task_messages(tid) == [{"role": "user", "content": "Hi"}]
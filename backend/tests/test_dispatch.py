@@ -0,0 +1,87 @@
+"""
+Tests for backend/dispatch.py (bounded executor for background booking work).
+
+Covers:
+  - Jobs run on the fixed pool and resolve their futures
+  - Rejection with a Retry-After hint once workers and queue are full
+  - Reservations: held slots count against capacity and are given back when unused
+  - Queue depth and wait-time metrics
+"""
+
+import threading
+
+import pytest
+
+from dispatch import RETRY_AFTER_MAX_SECONDS, DispatchExecutor, DispatchFull
+
+
+@pytest.fixture
+def executor():
+    pool = DispatchExecutor(workers=2, queue_size=1)
+    yield pool
+    pool.shutdown()
+
+
+def _blocker():
+    """A job that runs until released, and an event set once it has started."""
+    started, release = threading.Event(), threading.Event()
+
+    def _job():
+        started.set()
+        release.wait(5)
+        return "done"
+    return _job, started, release
+
+
+class TestDispatchExecutor:
+    def test_runs_jobs(self, executor):
+        assert executor.submit(lambda a, b: a + b, 2, 3).result(timeout=5) == 5
+        with pytest.raises(ZeroDivisionError):
+            executor.submit(lambda: 1 / 0).result(timeout=5)
+        stats = executor.stats()
+        assert (stats["submitted"], stats["completed"], stats["failed"]) == (2, 1, 1)
+
+    def test_rejects_when_workers_and_queue_full(self, executor):
+        jobs = [_blocker() for _ in range(3)]
+        futures = [executor.submit(job) for job, _, _ in jobs]
+        for _, started, _ in jobs[:2]:
+            assert started.wait(5)
+        assert executor.stats()["busy"] == 2 and executor.stats()["queued"] == 1
+
+        with pytest.raises(DispatchFull) as exc:
+            executor.submit(lambda: None)
+        assert 1 <= exc.value.retry_after <= RETRY_AFTER_MAX_SECONDS
+        assert executor.stats()["rejected"] == 1
+
+        for _, _, release in jobs:
+            release.set()
+        assert [f.result(timeout=5) for f in futures] == ["done"] * 3
+        assert executor.submit(lambda: "again").result(timeout=5) == "again"
+
+    def test_unused_reservation_frees_its_slot(self):
+        pool = DispatchExecutor(workers=1, queue_size=0)
+        with pool.reserve():
+            with pytest.raises(DispatchFull):
+                pool.reserve()
+        assert pool.submit(lambda: 1).result(timeout=5) == 1
+        pool.shutdown()
+
+    def test_reservation_submits_once(self, executor):
+        slot = executor.reserve()
+        assert slot.submit(lambda: 1).result(timeout=5) == 1
+        with pytest.raises(RuntimeError):
+            slot.submit(lambda: 2)
+        slot.close()  # no-op after submit: the job gave its slot back
+
+    def test_wait_time_measured(self):
+        pool = DispatchExecutor(workers=1, queue_size=1)
+        job, started, release = _blocker()
+        pool.submit(job)
+        assert started.wait(5)
+        queued = pool.submit(lambda: None)
+        threading.Timer(0.05, release.set).start()
+        queued.result(timeout=5)
+        wait = pool.stats()["wait_ms"]
+        assert wait["max"] >= 40 and wait["p95"] <= wait["max"]
+        assert pool.retry_after() >= 1
+        pool.shutdown()
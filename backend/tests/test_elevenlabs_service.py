@@ -0,0 +1,177 @@
+"""
+Tests for backend/services/elevenlabs_service.py (outbound calls).
+
+The ElevenLabs API is replaced by an httpx MockTransport, so no API key or network is needed.
+
+Covers:
+  - Swarm mode: one call per provider, in provider order, with initiation latency
+  - The concurrency limit on calls being initiated at once, and queueing on the agent number's limiter
+  - Spreading calls over a pool of agent numbers, held until the call's webhook
+  - API errors and transport failures become failed call infos instead of raising
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import call_limiter
+import number_pool
+from services.elevenlabs_service import OUTBOUND_CALL_URL, ElevenLabsService
+
+CONTEXT = {"service_type": "dentist", "timeframe": "this week", "location": "Cambridge", "client_name": "Test Client"}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(number_pool, "_pools", {})
+    monkeypatch.setenv("ELEVENLABS_API_KEY", "test-key")
+    monkeypatch.setenv("ELEVENLABS_AGENT_ID", "agent-1")
+    monkeypatch.setenv("ELEVENLABS_AGENT_PHONE_NUMBER_ID", "phone-1")
+    return ElevenLabsService()
+
+
+@pytest.fixture(autouse=True)
+def number_limiter(monkeypatch):
+    """The agent numbers' limiters, unlimited unless a test tightens them; returns phone-1's."""
+    for number in ("phone-1", "phone-2"):
+        monkeypatch.setitem(call_limiter._limiters, number,
+                            call_limiter.NumberLimiter(number, max_concurrent=0, calls_per_second=0))
+    return call_limiter._limiters["phone-1"]
+
+
+def _providers(n: int):
+    return [{"name": f"Provider {i}", "phone": f"+1555000{i:04d}"} for i in range(n)]
+
+
+def _swarm(service, providers, handler, **kwargs):
+    async def _run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await service.parallel_calls(providers, CONTEXT, client=client, **kwargs)
+    return asyncio.run(_run())
+
+
+class TestParallelCalls:
+    def test_places_one_call_per_provider_in_order(self, service):
+        requests = []
+
+        async def handler(request):
+            body = json.loads(request.content)
+            requests.append(body)
+            assert str(request.url) == OUTBOUND_CALL_URL
+            assert request.headers["xi-api-key"] == "test-key"
+            # Later providers answer first; results still come back in provider order
+            await asyncio.sleep(0.001 * (30 - len(requests)))
+            return httpx.Response(200, json={"conversation_id": f"conv-{body['to_number']}", "callSid": "CA1"})
+
+        providers = _providers(30)
+        placed = []
+        results = _swarm(service, providers, handler, on_result=lambda i, info: placed.append(i))
+
+        assert len(requests) == 30 and sorted(placed) == list(range(30))
+        assert [r["conversation_id"] for r in results] == [f"conv-{p['phone']}" for p in providers]
+        assert all(r["status"] == "initiated" and r["call_sid"] == "CA1" for r in results)
+        assert all(r["initiation_ms"] >= 0 for r in results)
+        first = requests[0]
+        assert first["agent_id"] == "agent-1" and first["agent_phone_number_id"] == "phone-1"
+        assert first["conversation_initiation_client_data"]["dynamic_variables"]["business_name"] == "Provider 0"
+
+    def test_respects_concurrency_limit(self, service):
+        in_flight, peak = 0, 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json={"conversation_id": "c"})
+
+        results = _swarm(service, _providers(20), handler, concurrency=4)
+        assert len(results) == 20
+        assert peak == 4
+
+    def test_calls_queue_for_the_agent_number(self, service, number_limiter):
+        number_limiter.max_concurrent = 1
+        placed = []
+
+        def handler(request):
+            placed.append(f"conv-{json.loads(request.content)['to_number']}")
+            return httpx.Response(200, json={"conversation_id": placed[-1]})
+
+        async def _run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                swarm = asyncio.ensure_future(service.parallel_calls(_providers(2), CONTEXT, client=client))
+                await asyncio.sleep(0.2)
+                # The first call is still live, so the second waits for the agent number
+                assert len(placed) == 1 and number_limiter.stats()["waiting"] == 1
+                # The first call's post-call webhook gives the number's turn to the second
+                assert call_limiter.release_call(placed[0])
+                return await swarm
+
+        results = asyncio.run(_run())
+        assert [r["status"] for r in results] == ["initiated"] * 2
+        assert max(r["queued_ms"] for r in results) >= 200
+        assert number_limiter.stats() == {"in_flight": 1, "waiting": 0, "live": 1, "placed": 2, "queued": 1,
+                                          "timed_out": 0}
+
+    def test_spreads_calls_over_number_pool(self, monkeypatch):
+        monkeypatch.setenv("ELEVENLABS_AGENT_PHONE_NUMBER_IDS", "phone-1,phone-2")
+        monkeypatch.setattr(number_pool, "_pools", {})
+        monkeypatch.setenv("ELEVENLABS_API_KEY", "test-key")
+        monkeypatch.setenv("ELEVENLABS_AGENT_ID", "agent-1")
+        service = ElevenLabsService()
+        used = []
+
+        def handler(request):
+            body = json.loads(request.content)
+            used.append(body["agent_phone_number_id"])
+            return httpx.Response(200, json={"conversation_id": f"conv-{body['to_number']}"})
+
+        results = _swarm(service, _providers(4), handler)
+        assert sorted(used) == ["phone-1", "phone-1", "phone-2", "phone-2"]
+        assert sorted(r["agent_phone_number_id"] for r in results) == sorted(used)
+        assert {n: s["active"] for n, s in service.number_pool.stats().items()} == {"phone-1": 2, "phone-2": 2}
+        # The post-call webhook frees the number
+        assert number_pool.release_call(results[0]["conversation_id"])
+        assert sum(s["active"] for s in service.number_pool.stats().values()) == 3
+
+    def test_failures_are_reported_per_call(self, service):
+        def handler(request):
+            to_number = json.loads(request.content)["to_number"]
+            if to_number.endswith("1"):
+                return httpx.Response(422, json={"detail": "invalid number"})
+            if to_number.endswith("2"):
+                raise httpx.ConnectTimeout("timed out")
+            return httpx.Response(200, json={"conversation_id": "c"})
+
+        results = _swarm(service, _providers(3), handler)
+        assert [r["status"] for r in results] == ["initiated", "failed", "failed"]
+        assert results[1]["error"] == "invalid number"
+        assert results[2]["error"] == "timed out"
+        assert all("initiation_ms" in r for r in results)
+
+    def test_raising_call_fails_alone(self, service, monkeypatch):
+        original = service.make_elevenlabs_outbound_call_async
+
+        async def flaky(client, to_number, *args, **kwargs):
+            if to_number.endswith("1"):
+                raise KeyError("conversation_id")
+            return await original(client, to_number, *args, **kwargs)
+
+        monkeypatch.setattr(service, "make_elevenlabs_outbound_call_async", flaky)
+        placed = []
+        results = _swarm(service, _providers(3), lambda request: httpx.Response(200, json={"conversation_id": "c"}),
+                         on_result=lambda i, info: placed.append(i))
+        assert [r["status"] for r in results] == ["initiated", "failed", "initiated"]
+        assert sorted(placed) == [0, 1, 2]
+
+    def test_not_configured_fails_without_requests(self, service):
+        service.agent_id = ""
+
+        def handler(request):
+            raise AssertionError("no request expected")
+
+        results = _swarm(service, _providers(2), handler)
+        assert [r["status"] for r in results] == ["failed", "failed"]
@@ -0,0 +1,160 @@
+"""
+Tests for the Firestore document layouts (backend/storage/firestore.py) and
+backend/migrate_firestore_layout.py.
+
+Covers:
+  - Where bookings and tasks live in the flat and per-user layouts (offline: references only)
+  - The owner cache used to place records looked up by id alone
+  - The storage contract and the flat -> per-user migration against the Firestore emulator
+    (skipped unless FIRESTORE_EMULATOR_HOST is set)
+"""
+
+import os
+import uuid
+
+import pytest
+
+firestore = pytest.importorskip("google.cloud.firestore")
+
+from google.auth.credentials import AnonymousCredentials  # noqa: E402
+
+from storage.firestore import NO_USER, FirestoreBackend, _Layout, _Owners  # noqa: E402
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+def offline_backend(layout: str) -> FirestoreBackend:
+    return FirestoreBackend(firestore.Client(project="p", credentials=AnonymousCredentials()), layout=layout)
+
+
+# ---------------------------------------------------------------------------
+# References (no I/O)
+# ---------------------------------------------------------------------------
+
+class TestLayout:
+    def test_flat_layout_uses_top_level_collections(self):
+        store = offline_backend("flat")
+        assert store._ref("bookings", "b1", "alice").path == "bookings/b1"
+        assert store._ref("tasks", "t1").path == "tasks/t1"
+
+    def test_per_user_layout_nests_under_the_owner(self):
+        store = offline_backend("per_user")
+        assert store._ref("bookings", "b1", "alice").path == "users/alice/bookings/b1"
+        assert store._ref("tasks", "t1", "alice").path == "users/alice/tasks/t1"
+
+    def test_per_user_layout_uses_cached_owner(self):
+        store = offline_backend("per_user")
+        store.owners.put("bookings", "b1", "bob")
+        assert store._ref("bookings", "b1").path == "users/bob/bookings/b1"
+
+    def test_records_without_owner_share_a_placeholder_user(self):
+        store = offline_backend("per_user")
+        store.owners.put("tasks", "t1", None)
+        assert store._ref("tasks", "t1").path == f"users/{NO_USER}/tasks/t1"
+
+    def test_admin_queries_span_every_user(self):
+        fs = firestore.Client(project="p", credentials=AnonymousCredentials())
+        layout = _Layout("per_user")
+        assert isinstance(layout.user_query(fs, "bookings", None), firestore.CollectionGroup)
+        assert isinstance(layout.group(fs, "tasks"), firestore.CollectionGroup)
+        assert not isinstance(_Layout("flat").group(fs, "tasks"), firestore.CollectionGroup)
+
+    def test_unknown_layout_rejected(self):
+        with pytest.raises(ValueError, match="sharded"):
+            _Layout("sharded")
+
+
+class TestOwners:
+    def test_unknown_record_raises(self):
+        with pytest.raises(KeyError):
+            _Owners().get("bookings", "b1")
+
+    def test_least_recently_used_owner_evicted(self):
+        owners = _Owners(max_entries=2)
+        owners.put("bookings", "b1", "alice")
+        owners.put("bookings", "b2", "bob")
+        owners.get("bookings", "b1")
+        owners.put("bookings", "b3", "carol")
+        assert owners.get("bookings", "b1") == "alice"
+        with pytest.raises(KeyError):
+            owners.get("bookings", "b2")
+
+    def test_forget(self):
+        owners = _Owners()
+        owners.put("tasks", "t1", "alice")
+        owners.forget("tasks", ["t1", "missing"])
+        with pytest.raises(KeyError):
+            owners.get("tasks", "t1")
+
+
+# ---------------------------------------------------------------------------
+# Firestore emulator
+# ---------------------------------------------------------------------------
+
+@pytest.mark.skipif(not os.getenv("FIRESTORE_EMULATOR_HOST"), reason="needs the Firestore emulator (FIRESTORE_EMULATOR_HOST)")
+class TestPerUserEmulator:
+    PROJECT = "callpilot-test"
+
+    @pytest.fixture
+    def client(self):
+        client = firestore.Client(project=self.PROJECT)
+        yield client
+        for name in ("bookings", "tasks", "users", "call_index", "user_stats"):
+            client.recursive_delete(client.collection(name))
+
+    def test_booking_round_trip_without_owner(self, client):
+        store = FirestoreBackend(client, layout="per_user")
+        booking_id = new_id()
+        store.create_booking(booking_id, "dentist", "Berlin", "this week", {}, user_id="alice")
+        store.update_booking_status(booking_id, "completed", [{"provider": "A"}])
+
+        fresh = FirestoreBackend(client, layout="per_user")  # empty owner cache: found by collection group
+        booking = fresh.get_booking(booking_id)
+        assert booking["status"] == "completed"
+        assert booking["results"] == [{"provider": "A"}]
+        assert fresh.get_booking(booking_id, user_id="bob") is None
+        assert client.document(f"users/alice/bookings/{booking_id}").get().exists
+        assert [b["booking_id"] for b in fresh.get_all_bookings("alice")] == [booking_id]
+
+    def test_migration_copies_flat_documents(self, client):
+        from migrate_firestore_layout import migrate_to_per_user
+
+        flat = FirestoreBackend(client, layout="flat")
+        booking_id, task_id = new_id(), new_id()
+        flat.create_booking(booking_id, "dentist", "Berlin", "this week", {}, user_id="alice")
+        flat.update_booking_status(booking_id, "completed", [{"provider": "A"}])
+        flat.create_task(task_id, user_id="alice")
+        flat.append_task_messages(task_id, [{"role": "user", "content": "hi"}])
+
+        per_user = FirestoreBackend(client, layout="per_user")
+        assert migrate_to_per_user(per_user, dry_run=True) == {"bookings": 1, "tasks": 1}
+        assert per_user.get_booking(booking_id) is None
+
+        assert migrate_to_per_user(per_user, delete_flat=True) == {"bookings": 1, "tasks": 1}
+        assert per_user.get_booking(booking_id, user_id="alice")["results"] == [{"provider": "A"}]
+        assert per_user.get_task(task_id, user_id="alice")["conversation"] == [{"role": "user", "content": "hi"}]
+        assert flat.get_booking(booking_id) is None
+
+    def test_migration_keeps_writes_made_after_the_deploy(self, client):
+        from migrate_firestore_layout import migrate_to_per_user
+
+        flat = FirestoreBackend(client, layout="flat")
+        per_user = FirestoreBackend(client, layout="per_user")
+        kept_id, stale_id = new_id(), new_id()
+        for booking_id in (kept_id, stale_id):
+            flat.create_booking(booking_id, "dentist", "Berlin", "this week", {}, user_id="alice")
+            flat.update_booking_status(booking_id, "processing", [{"provider": "A"}, {"provider": "B"}])
+        assert migrate_to_per_user(per_user) == {"bookings": 2, "tasks": 0}
+
+        # Written between step 1 and the deploy: still only in the flat layout
+        flat.update_booking_results(stale_id, [{"provider": "A", "call_status": "completed"}])
+        # Written after the deploy: the per-user copy is the live one
+        per_user.update_booking_status(kept_id, "completed", [{"provider": "A", "call_status": "completed"}])
+        kept = per_user.get_booking(kept_id, user_id="alice")
+
+        assert migrate_to_per_user(per_user, delete_flat=True) == {"bookings": 1, "tasks": 0}
+        after = per_user.get_booking(kept_id, user_id="alice")
+        assert (after["status"], after["results"], after["version"]) == ("completed", kept["results"], kept["version"])
+        assert per_user.get_booking(stale_id, user_id="alice")["results"] == [{"provider": "A", "call_status": "completed"}]
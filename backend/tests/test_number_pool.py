@@ -0,0 +1,125 @@
+"""
+Tests for backend/number_pool.py (outbound phone-number pools).
+
+Covers:
+  - Least-loaded assignment, with live calls held until their webhook releases them
+  - Calls never released by a webhook expire after the TTL
+  - Numbers that keep failing leave the rotation and come back after the cooldown
+  - Pool configuration from the environment and release by call key across pools
+"""
+
+import time
+
+import pytest
+
+import number_pool
+from number_pool import NumberPool
+
+
+class TestNumberPool:
+    def test_assigns_least_loaded_number(self):
+        pool = NumberPool("test", ["a", "b", "c"])
+        first = [pool.assign() for _ in range(3)]
+        assert sorted(first) == ["a", "b", "c"]
+        for i, number in enumerate(first):
+            pool.placed(number, f"conv-{i}")
+        # Every number has one live call; ending b's call makes it the least loaded
+        assert pool.release_call("conv-1")
+        assert pool.assign() == "b"
+        assert pool.stats()["b"]["active"] == 1
+
+    def test_equal_load_rotates(self):
+        pool = NumberPool("test", ["a", "b"])
+        numbers = []
+        for _ in range(4):
+            number = pool.assign()
+            numbers.append(number)
+            pool.placed(number)  # no call key: released straight away
+        assert numbers == ["a", "b", "a", "b"]
+        assert {n: s["active"] for n, s in pool.stats().items()} == {"a": 0, "b": 0}
+
+    def test_release_by_either_key_once(self):
+        pool = NumberPool("test", ["a"])
+        pool.placed(pool.assign(), "conv-1", "CA1")
+        assert pool.release_call("CA1")
+        assert not pool.release_call("conv-1")
+        assert not pool.release_call("unknown")
+        assert pool.stats()["a"]["active"] == 0
+
+    def test_unreleased_calls_expire(self):
+        pool = NumberPool("test", ["a"], call_ttl_seconds=0.05)
+        pool.placed(pool.assign(), "conv-1")
+        assert pool.stats()["a"]["active"] == 1
+        time.sleep(0.1)
+        assert pool.stats()["a"]["active"] == 0
+        assert not pool.release_call("conv-1")
+
+    def test_failing_number_leaves_rotation(self):
+        pool = NumberPool("test", ["a", "b"], max_failures=2, cooldown_seconds=0.1)
+        assert pool.assign() == "a"
+        pool.failed("a")
+        assert pool.assign() == "b"
+        pool.placed("b", "conv-b")
+        assert pool.assign() == "a"
+        pool.failed("a")
+        assert pool.stats()["a"]["in_rotation"] is False
+        # b takes every call while a sits out, however loaded b gets
+        assert [pool.assign() for _ in range(3)] == ["b", "b", "b"]
+        time.sleep(0.15)
+        assert pool.stats()["a"]["in_rotation"] is True
+        assert pool.assign() == "a"
+
+    def test_success_resets_failures(self):
+        pool = NumberPool("test", ["a"], max_failures=2)
+        pool.failed(pool.assign())
+        pool.placed(pool.assign(), "conv-1")
+        pool.failed(pool.assign())
+        assert pool.stats()["a"] == {"active": 1, "in_rotation": True, "consecutive_failures": 1}
+
+    def test_failed_connection_counts_against_number(self):
+        pool = NumberPool("test", ["a", "b"], max_failures=1, cooldown_seconds=60)
+        pool.placed(pool.assign(), "conv-1")
+        assert pool.release_call("conv-1", ok=False)
+        assert pool.stats()["a"]["in_rotation"] is False
+
+    def test_uses_all_numbers_when_none_in_rotation(self):
+        pool = NumberPool("test", ["a"], max_failures=1, cooldown_seconds=60)
+        pool.failed(pool.assign())
+        assert pool.assign() == "a"
+
+    def test_abandon_frees_number_without_failure(self):
+        pool = NumberPool("test", ["a"], max_failures=1)
+        pool.abandon(pool.assign())
+        assert pool.stats()["a"] == {"active": 0, "in_rotation": True, "consecutive_failures": 0}
+
+    def test_needs_numbers(self):
+        with pytest.raises(ValueError):
+            NumberPool("test", [])
+
+
+class TestConfiguration:
+    def test_numbers_from_list(self, monkeypatch):
+        monkeypatch.setenv("TEST_NUMBERS", " +1555, +1666 ,,+1555")
+        monkeypatch.setenv("TEST_NUMBER", "+1999")
+        assert number_pool.numbers_from_env("TEST_NUMBERS", "TEST_NUMBER") == ["+1555", "+1666"]
+
+    def test_falls_back_to_single_number(self, monkeypatch):
+        monkeypatch.delenv("TEST_NUMBERS", raising=False)
+        monkeypatch.setenv("TEST_NUMBER", "+1999")
+        assert number_pool.numbers_from_env("TEST_NUMBERS", "TEST_NUMBER") == ["+1999"]
+        monkeypatch.delenv("TEST_NUMBER")
+        assert number_pool.numbers_from_env("TEST_NUMBERS", "TEST_NUMBER") == []
+
+    def test_release_call_finds_the_pool(self, monkeypatch):
+        monkeypatch.setattr(number_pool, "_pools", {})
+        eleven = number_pool.pool_for("elevenlabs", ["phone-1"])
+        twilio = number_pool.pool_for("twilio", ["+1555"])
+        assert number_pool.pool_for("twilio", ["ignored"]) is twilio
+        twilio.placed(twilio.assign(), "CA1")
+        eleven.placed(eleven.assign(), "conv-1")
+        assert number_pool.release_call("CA1")
+        assert not number_pool.release_call(None)
+        assert number_pool.stats() == {
+            "elevenlabs": {"phone-1": {"active": 1, "in_rotation": True, "consecutive_failures": 0}},
+            "twilio": {"+1555": {"active": 0, "in_rotation": True, "consecutive_failures": 0}},
+        }
@@ -0,0 +1,162 @@
+"""
+Tests for backend/result_buffer.py
+
+Covers:
+  - Coalescing of quick successive updates into one write per booking
+  - Immediate flush on terminal call states
+  - Timer-driven flush after the window
+  - Explicit flush of one or all bookings, or of the booking holding a call
+  - Failed writes are put back and retried, not lost
+"""
+
+import threading
+
+import pytest
+
+from result_buffer import ResultWriteBuffer
+
+
+class RecordingWriter:
+    """Collects (booking_id, updates) writes made by the buffer."""
+
+    def __init__(self):
+        self.writes = []
+        self.written = threading.Event()
+
+    def __call__(self, booking_id, updates):
+        self.writes.append((booking_id, dict(updates)))
+        self.written.set()
+
+
+class TestResultWriteBuffer:
+    def test_non_terminal_updates_wait_for_window(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        buf.put("b1", 0, {"call_status": "calling"})
+        buf.put("b1", 1, {"call_status": "calling"})
+        assert writer.writes == []
+        assert buf.pending_count("b1") == 2
+        buf.flush("b1")
+
+    def test_later_update_replaces_earlier_one_for_same_index(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        buf.put("b1", 0, {"call_status": "pending"})
+        buf.put("b1", 0, {"call_status": "calling"})
+        buf.flush("b1")
+        assert writer.writes == [("b1", {0: {"call_status": "calling"}})]
+
+    def test_terminal_status_flushes_everything_pending(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        buf.put("b1", 0, {"call_status": "calling"})
+        buf.put("b1", 1, {"call_status": "in_progress"})
+        buf.put("b1", 0, {"call_status": "completed"})
+        assert writer.writes == [("b1", {0: {"call_status": "completed"}, 1: {"call_status": "in_progress"}})]
+        assert buf.pending_count("b1") == 0
+
+    def test_failed_is_terminal(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        buf.put("b1", 0, {"call_status": "failed"})
+        assert writer.writes == [("b1", {0: {"call_status": "failed"}})]
+
+    def test_window_expiry_flushes(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=20)
+        buf.put("b1", 0, {"call_status": "calling"})
+        buf.put("b1", 1, {"call_status": "calling"})
+        assert writer.written.wait(2)
+        assert writer.writes == [("b1", {0: {"call_status": "calling"}, 1: {"call_status": "calling"}})]
+
+    def test_bookings_are_buffered_separately(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        buf.put("b1", 0, {"call_status": "calling"})
+        buf.put("b2", 0, {"call_status": "completed"})
+        assert writer.writes == [("b2", {0: {"call_status": "completed"}})]
+        assert buf.pending_count("b1") == 1
+        buf.flush()
+        assert writer.writes[-1] == ("b1", {0: {"call_status": "calling"}})
+
+    def test_zero_window_writes_through(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=0)
+        buf.put("b1", 0, {"call_status": "calling"})
+        assert writer.writes == [("b1", {0: {"call_status": "calling"}})]
+
+    def test_flush_without_pending_is_noop(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        buf.flush("missing")
+        buf.flush()
+        assert writer.writes == []
+
+    def test_flush_call_writes_only_that_booking(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        buf.put("b1", 0, {"call_status": "calling", "conversation_id": "conv-1"})
+        buf.put("b2", 0, {"call_status": "calling", "conversation_id": "conv-2"})
+        buf.flush_call("conv-2")
+        assert writer.writes == [("b2", {0: {"call_status": "calling", "conversation_id": "conv-2"}})]
+        assert buf.pending_count("b1") == 1
+        buf.flush()
+
+    def test_failed_write_is_requeued_and_retried(self):
+        writer = RecordingWriter()
+        fail = [True]
+
+        def flaky(booking_id, updates):
+            if fail.pop(0) if fail else False:
+                raise RuntimeError("database unavailable")
+            writer(booking_id, updates)
+
+        buf = ResultWriteBuffer(flaky, window_ms=20)
+        buf.put("b1", 0, {"call_status": "calling"})
+        with pytest.raises(RuntimeError):
+            buf.put("b1", 1, {"call_status": "completed"})
+        # Nothing is lost; the retry after the window writes the batch
+        assert buf.pending_count("b1") == 2
+        assert writer.written.wait(2)
+        assert writer.writes == [("b1", {0: {"call_status": "calling"}, 1: {"call_status": "completed"}})]
+
+    def test_newer_update_wins_over_requeued_one(self):
+        writer = RecordingWriter()
+        fail = [True]
+
+        def flaky(booking_id, updates):
+            if fail.pop(0) if fail else False:
+                buf.put("b1", 0, {"call_status": "in_progress"})
+                raise RuntimeError("database unavailable")
+            writer(booking_id, updates)
+
+        buf = ResultWriteBuffer(flaky, window_ms=10_000)
+        buf.put("b1", 0, {"call_status": "calling"})
+        with pytest.raises(RuntimeError):
+            buf.flush("b1")
+        buf.flush("b1")
+        assert writer.writes == [("b1", {0: {"call_status": "in_progress"}})]
+
+    def test_gives_up_after_max_attempts(self):
+        def broken(booking_id, updates):
+            raise RuntimeError("database unavailable")
+
+        buf = ResultWriteBuffer(broken, window_ms=10_000, max_attempts=2)
+        buf.put("b1", 0, {"call_status": "calling"})
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                buf.flush("b1")
+        assert buf.pending_count("b1") == 0
+
+    def test_concurrent_puts_coalesce(self):
+        writer = RecordingWriter()
+        buf = ResultWriteBuffer(writer, window_ms=10_000)
+        threads = [threading.Thread(target=buf.put, args=("b1", i, {"call_status": "in_progress", "i": i}))
+                   for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        buf.flush("b1")
+        assert len(writer.writes) == 1
+        assert sorted(writer.writes[0][1]) == list(range(8))
@@ -0,0 +1,466 @@
+"""
+Tests for backend/storage (backend-independent behaviour).
+
+Covers:
+  - Backend selection in database.py (STORAGE_BACKEND, USE_SQLITE)
+  - The StorageBackend contract, run against the SQLite and in-memory engines
+    (including retention: archiving and task expiry, and the job queue)
+  - Retention takes the oldest records first on every engine, Firestore included (against the emulator)
+  - Concurrent writers on the lock-striped in-memory engine
+"""
+
+import os
+import threading
+import time
+import uuid
+
+import pytest
+
+import database as db
+from storage import BookingConflict, create_backend
+from storage.memory import MemoryBackend
+from storage.sqlite import SQLiteBackend
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def backend(request, tmp_path):
+    store = create_backend(request.param, sqlite_path=str(tmp_path / "contract.db"))
+    store.init_db()
+    yield store
+    store.close()
+
+
+# ---------------------------------------------------------------------------
+# Selection
+# ---------------------------------------------------------------------------
+
+class TestBackendSelection:
+    def test_use_sqlite_selects_sqlite(self):
+        assert isinstance(db._backend(), SQLiteBackend)
+
+    def test_storage_backend_env_overrides_detection(self, monkeypatch):
+        db.close_db()
+        monkeypatch.setenv("STORAGE_BACKEND", "memory")
+        assert isinstance(db._backend(), MemoryBackend)
+
+    def test_backend_selected_once(self):
+        assert db._backend() is db._backend()
+
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError):
+            create_backend("cassandra")
+
+
+# ---------------------------------------------------------------------------
+# Contract
+# ---------------------------------------------------------------------------
+
+class TestBackendContract:
+    def test_booking_round_trip(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {"party_size": 2}, user_id="alice")
+        booking = backend.get_booking(bid)
+        assert booking["status"] == "processing"
+        assert booking["preferences"] == {"party_size": 2}
+        assert booking["results"] == []
+        assert backend.get_booking(bid, user_id="bob") is None
+
+    def test_results_merge_and_replace(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        backend.update_booking_results(bid, [{"call_status": "pending"}, {"call_status": "pending"}])
+        backend.merge_booking_results(bid, {1: {"call_status": "in_progress", "conversation_id": "conv-1"}})
+        assert [r["call_status"] for r in backend.get_booking(bid)["results"]] == ["pending", "in_progress"]
+        booking, idx = backend.get_booking_by_conversation_id("conv-1")
+        assert booking["booking_id"] == bid and idx == 1
+        backend.update_booking_status(bid, "completed", results=[{"call_status": "completed"}])
+        assert backend.get_booking(bid)["results"] == [{"call_status": "completed"}]
+        assert backend.get_booking_by_conversation_id("conv-1") == (None, -1)
+
+    def test_writes_bump_version(self, backend):
+        bid = new_id()
+        assert backend.create_booking(bid, "dentist", "Boston", "today", {})["version"] == 1
+        backend.update_booking_results(bid, [{"call_status": "pending"}])
+        backend.update_booking_result(bid, 0, {"call_status": "calling"})
+        backend.update_booking_status(bid, "completed")
+        assert backend.get_booking(bid)["version"] > 3
+
+    def test_compare_and_set_requires_current_version(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        assert not backend.compare_and_set_booking(bid, 7, status="completed")
+        assert not backend.compare_and_set_booking(new_id(), 1, status="completed")
+        assert backend.compare_and_set_booking(bid, 1, status="completed", updates={0: {"call_status": "completed"}})
+        booking = backend.get_booking(bid)
+        assert (booking["status"], booking["version"], booking["results"]) == ("completed", 2, [{"call_status": "completed"}])
+        stats = backend.get_user_stats("alice")
+        assert (stats["completed"], stats["processing"], stats["total_calls"]) == (1, 0, 1)
+
+    def test_mutate_booking_retries_after_losing_race(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {})
+        backend.update_booking_results(bid, [{"call_status": "in_progress"}, {"call_status": "in_progress"}])
+        seen = []
+
+        def _complete_first(draft):
+            seen.append(draft["results"][1]["call_status"])
+            if len(seen) == 1:
+                backend.update_booking_result(bid, 1, {"call_status": "completed"})  # another writer wins
+            draft["results"][0]["call_status"] = "completed"
+            if all(r["call_status"] == "completed" for r in draft["results"]):
+                draft["status"] = "completed"
+
+        booking = backend.mutate_booking(bid, _complete_first, retries=db.BOOKING_CAS_RETRIES)
+        assert seen == ["in_progress", "completed"]
+        assert booking == backend.get_booking(bid)
+        assert booking["status"] == "completed"
+        assert [r["call_status"] for r in booking["results"]] == ["completed", "completed"]
+
+    def test_mutate_booking_gives_up_and_skips(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {})
+
+        def _always_loses(draft):
+            backend.update_booking_status(bid, "processing")
+            draft["status"] = "completed"
+
+        with pytest.raises(BookingConflict):
+            backend.mutate_booking(bid, _always_loses, retries=2)
+        version = backend.get_booking(bid)["version"]
+        assert backend.mutate_booking(bid, lambda draft: False, retries=1)["version"] == version
+        assert backend.mutate_booking(new_id(), lambda draft: None, retries=1) is None
+
+    def test_concurrent_mutations_are_not_lost(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {})
+        backend.update_booking_results(bid, [{"count": 0}])
+
+        def _increment(draft):
+            draft["results"][0]["count"] += 1
+
+        def _worker():
+            for _ in range(10):
+                backend.mutate_booking(bid, _increment, retries=100)
+
+        threads = [threading.Thread(target=_worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert backend.get_booking(bid)["results"][0]["count"] == 40
+
+    def test_stats_follow_writes(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        backend.update_booking_results(bid, [{}, {}, {}])
+        backend.update_booking_status(bid, "completed")
+        stats = backend.get_user_stats("alice")
+        assert (stats["total_bookings"], stats["completed"], stats["processing"], stats["total_calls"]) == (1, 1, 0, 3)
+        assert stats["recent_booking_ids"] == [bid]
+
+    def test_list_bookings_pages(self, backend):
+        ids = [new_id() for _ in range(5)]
+        for bid in ids:
+            backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        seen, cursor = [], None
+        while True:
+            page, cursor = backend.list_bookings("alice", limit=2, cursor=cursor)
+            seen.extend(b["booking_id"] for b in page)
+            if cursor is None:
+                break
+        assert sorted(seen) == sorted(ids)
+        assert len(seen) == len(set(seen))
+        assert backend.get_bookings_by_ids([ids[3], "missing", ids[0]])[0]["booking_id"] == ids[3]
+
+    def test_task_messages(self, backend):
+        tid = new_id()
+        backend.create_task(tid, user_id="alice")
+        assert backend.append_task_messages(tid, [{"role": "user", "content": "a"}, {"role": "assistant", "content": "b"}],
+                                            status="ready_to_call", user_id="alice")
+        assert not backend.append_task_messages(tid, [{"role": "user", "content": "x"}], user_id="bob")
+        task = backend.get_task(tid, conversation_limit=1)
+        assert task["conversation"] == [{"role": "assistant", "content": "b"}]
+        assert task["message_count"] == 2
+        assert task["status"] == "ready_to_call"
+        page, _ = backend.list_tasks("alice")
+        assert [t["task_id"] for t in page] == [tid]
+        assert "conversation" not in page[0]
+
+    def test_waitlist_and_allowed_emails(self, backend):
+        backend.add_to_waitlist("a@example.com", "A")
+        backend.set_confirmation_sent("a@example.com")
+        assert backend.get_waitlist()[0]["confirmation_sent_at"] is not None
+        assert not backend.is_email_allowed("a@example.com")
+        backend.add_allowed_email("a@example.com")
+        assert backend.is_email_allowed("a@example.com")
+        assert [e["email"] for e in backend.get_allowed_emails()] == ["a@example.com"]
+
+    def test_clean_db(self, backend):
+        bid, tid = new_id(), new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        backend.create_task(tid, user_id="alice")
+        backend.clean_db()
+        assert backend.get_booking(bid) is None
+        assert backend.get_task(tid) is None
+
+
+    def test_create_bookings_many(self, backend):
+        existing = new_id()
+        backend.create_booking(existing, "dentist", "Boston", "today", {}, user_id="alice")
+        ids = [new_id(), new_id()]
+        created = backend.create_bookings_many([
+            {"booking_id": ids[0], "service_type": "dentist", "location": "Boston", "timeframe": "today",
+             "user_id": "alice", "status": "completed",
+             "results": [{"call_status": "completed", "conversation_id": "conv-bulk"}]},
+            {"booking_id": ids[1], "service_type": "vet", "location": "Boston", "timeframe": "today", "user_id": "alice"},
+        ])
+        assert [b["booking_id"] for b in created] == ids
+        assert backend.get_booking(ids[0])["results"] == [{"call_status": "completed", "conversation_id": "conv-bulk"}]
+        assert backend.get_booking(ids[1])["status"] == "processing"
+        assert backend.lookup_call("conv-bulk") == (ids[0], 0)
+        stats = backend.get_user_stats("alice")
+        assert (stats["total_bookings"], stats["completed"], stats["processing"], stats["total_calls"]) == (3, 1, 2, 1)
+        # Same created_at within a batch: order among the new ids is by booking_id, all ahead of older bookings
+        assert sorted(stats["recent_booking_ids"][:2]) == sorted(ids)
+        assert stats["recent_booking_ids"][2] == existing
+
+    def test_update_results_many(self, backend):
+        ids = [new_id(), new_id()]
+        for bid in ids:
+            backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        backend.update_results_many({ids[0]: [{}, {}], ids[1]: [{"call_status": "pending"}]})
+        assert len(backend.get_booking(ids[0])["results"]) == 2
+        assert backend.get_booking(ids[1])["results"] == [{"call_status": "pending"}]
+        assert backend.get_user_stats("alice")["total_calls"] == 3
+
+    def test_delete_collection(self, backend):
+        backend.add_to_waitlist("a@example.com", "A")
+        backend.add_to_waitlist("b@example.com", "B")
+        assert backend.delete_collection("waitlist") == 2
+        assert backend.get_waitlist() == []
+        with pytest.raises(ValueError):
+            backend.delete_collection("sqlite_master")
+
+
+    def test_summary_reads(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {"notes": "x"}, user_id="alice")
+        backend.update_booking_results(bid, [{"provider_name": "A", "call_status": "pending"},
+                                             {"provider_name": "B", "call_status": "pending"}])
+        backend.merge_booking_results(bid, {1: {"provider_name": "B", "call_status": "completed", "score": 90,
+                                                "availability_date": "Monday", "phone": "+1"}})
+        expected = {
+            "booking_id": bid, "user_id": "alice", "service_type": "dentist", "location": "Boston",
+            "timeframe": "today", "status": "processing", "result_count": 2, "completed_count": 1,
+            "best_result": {"provider_name": "B", "call_status": "completed", "score": 90, "availability_date": "Monday"},
+        }
+        (summary,) = backend.get_bookings_by_ids([bid], summary=True)
+        assert {k: v for k, v in summary.items() if k != "created_at"} == expected
+        page, _ = backend.list_bookings("alice", summary=True)
+        assert page == [summary]
+        assert backend.get_all_bookings("alice", summary=True) == [summary]
+        assert "results" in backend.get_bookings_by_ids([bid])[0]
+
+    def test_summary_follows_result_writes(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+
+        def digest():
+            (summary,) = backend.get_bookings_by_ids([bid], summary=True)
+            return summary["result_count"], summary["completed_count"], (summary["best_result"] or {}).get("provider_name")
+
+        backend.merge_booking_results(bid, {0: {"provider_name": "A", "call_status": "completed", "score": 70}})
+        backend.merge_booking_results(bid, {1: {"provider_name": "B", "call_status": "completed", "score": 90}})
+        assert digest() == (2, 2, "B")
+        # The best result getting worse falls back to the next best
+        backend.merge_booking_results(bid, {1: {"provider_name": "B", "call_status": "failed"}})
+        assert digest() == (2, 1, "A")
+        version = backend.get_booking(bid)["version"]
+        assert backend.compare_and_set_booking(bid, version, "completed",
+                                               {2: {"provider_name": "C", "call_status": "completed", "score": 80}})
+        assert digest() == (3, 2, "C")
+
+    def test_summary_of_booking_without_results(self, backend):
+        bid = new_id()
+        backend.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+        (summary,) = backend.get_bookings_by_ids([bid], summary=True)
+        assert (summary["result_count"], summary["completed_count"], summary["best_result"]) == (0, 0, None)
+
+    def test_archive_bookings(self, backend):
+        old, recent = new_id(), new_id()
+        backend.create_bookings_many([
+            {"booking_id": old, "service_type": "dentist", "location": "Boston", "timeframe": "today",
+             "user_id": "alice", "status": "completed", "created_at": time.time() - 100 * 86400,
+             "results": [{"call_status": "completed", "conversation_id": "conv-old"}]},
+            {"booking_id": recent, "service_type": "dentist", "location": "Boston", "timeframe": "today",
+             "user_id": "alice", "status": "completed"},
+        ])
+        assert backend.archive_bookings(time.time() - 90 * 86400, limit=10) == 1
+        assert backend.get_booking(old) is None
+        assert backend.lookup_call("conv-old") is None
+        archived = backend.get_archived_booking(old)
+        assert archived["results"] == [{"call_status": "completed", "conversation_id": "conv-old"}]
+        assert archived["archived_at"] is not None
+        assert backend.get_archived_booking(old, user_id="bob") is None
+        # Archived bookings still count towards the user's stats, now and when they are rebuilt
+        stats = backend.get_user_stats("alice")
+        assert (stats["total_bookings"], stats["completed"], stats["total_calls"]) == (2, 2, 1)
+        assert stats["recent_booking_ids"] == [recent]
+        rebuilt = backend.rebuild_user_stats("alice")
+        assert (rebuilt["total_bookings"], rebuilt["completed"], rebuilt["total_calls"]) == (2, 2, 1)
+        assert rebuilt["recent_booking_ids"] == [recent]
+        assert backend.archive_bookings(time.time() - 90 * 86400, limit=10) == 0
+
+    def test_archive_skips_processing_and_respects_limit(self, backend):
+        long_ago = time.time() - 100 * 86400
+        backend.create_bookings_many([
+            {"booking_id": new_id(), "service_type": "dentist", "location": "Boston", "timeframe": "today",
+             "status": status, "created_at": long_ago}
+            for status in ("processing", "completed", "completed", "completed")
+        ])
+        assert backend.archive_bookings(time.time(), limit=2) == 2
+        assert backend.archive_bookings(time.time(), limit=2) == 1
+        assert [b["status"] for b in backend.get_all_bookings()] == ["processing"]
+
+    def test_expire_tasks(self, backend):
+        stale, ready = new_id(), new_id()
+        backend.create_task(stale, user_id="alice")
+        backend.create_task(ready, user_id="alice")
+        backend.append_task_messages(stale, [{"role": "user", "content": "hi"}])
+        backend.update_task(ready, status="ready_to_call")
+        assert backend.expire_tasks(time.time() + 1, limit=10) == 1
+        assert backend.get_task(stale) is None
+        assert backend.get_task_messages(stale) == []
+        assert backend.get_task(ready) is not None
+        assert backend.expire_tasks(time.time() - 86400, limit=10) == 0
+
+    def test_job_claim_lease_and_complete(self, backend):
+        first, second = new_id(), new_id()
+        backend.enqueue_job(first, "booking_calls", {"booking_id": "b1"}, run_at=time.time() - 10)
+        backend.enqueue_job(second, "booking_calls", {"booking_id": "b2"}, run_at=time.time() - 5)
+        backend.enqueue_job(new_id(), "booking_calls", {}, run_at=time.time() + 3600)
+        backend.enqueue_job(new_id(), "other", {}, run_at=time.time() - 20)
+
+        job = backend.claim_job("w1", 60, kinds=["booking_calls"])
+        assert (job["job_id"], job["payload"], job["attempts"]) == (first, {"booking_id": "b1"}, 1)
+        assert job["status"] == "running" and job["lease_owner"] == "w1"
+        assert backend.claim_job("w2", 60, kinds=["booking_calls"])["job_id"] == second
+        assert backend.claim_job("w2", 60, kinds=["booking_calls"]) is None
+
+        assert not backend.renew_job_lease(first, "w2", 60)
+        assert not backend.complete_job(first, "w2")
+        assert backend.renew_job_lease(first, "w1", 60)
+        assert backend.complete_job(first, "w1")
+        assert backend.get_job(first)["status"] == "done"
+        assert backend.get_job(new_id()) is None
+
+    def test_expired_lease_is_reclaimed(self, backend):
+        job_id = new_id()
+        backend.enqueue_job(job_id, "booking_calls", {})
+        backend.claim_job("dead", 0.01)
+        time.sleep(0.05)
+        job = backend.claim_job("w2", 60)
+        assert (job["job_id"], job["attempts"], job["lease_owner"]) == (job_id, 2, "w2")
+        # The first worker lost its lease and can no longer finish the job
+        assert not backend.complete_job(job_id, "dead")
+        assert backend.complete_job(job_id, "w2")
+
+    def test_failed_job_retries_then_fails(self, backend):
+        job_id = new_id()
+        backend.enqueue_job(job_id, "booking_calls", {}, max_attempts=2)
+        backend.claim_job("w1", 60)
+        assert backend.fail_job(job_id, "w1", "boom", retry_at=time.time() + 0.05)
+        job = backend.get_job(job_id)
+        assert (job["status"], job["last_error"], job["lease_owner"]) == ("queued", "boom", None)
+        assert backend.claim_job("w1", 60) is None
+        assert not backend.fail_job(job_id, "w1", "boom")  # no longer leased to w1
+
+        time.sleep(0.1)
+        assert backend.claim_job("w1", 60)["attempts"] == 2
+        assert backend.fail_job(job_id, "w1", "boom again")
+        job = backend.get_job(job_id)
+        assert (job["status"], job["last_error"]) == ("failed", "boom again")
+        assert backend.claim_job("w1", 60) is None
+
+
+# ---------------------------------------------------------------------------
+# Retention order, including Firestore (skipped unless FIRESTORE_EMULATOR_HOST is set)
+# ---------------------------------------------------------------------------
+
+@pytest.fixture(params=["sqlite", "memory", "firestore"])
+def any_backend(request, tmp_path):
+    if request.param == "firestore":
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            pytest.skip("needs the Firestore emulator (FIRESTORE_EMULATOR_HOST)")
+        firestore = pytest.importorskip("google.cloud.firestore")
+        from storage.firestore import FirestoreBackend
+        store = FirestoreBackend(firestore.Client(project="callpilot-test"))
+        store.clear_all_bookings()
+        store.delete_collection("tasks")
+    else:
+        store = create_backend(request.param, sqlite_path=str(tmp_path / "retention.db"))
+    store.init_db()
+    yield store
+    store.close()
+
+
+class TestRetentionOrder:
+    def test_archives_oldest_bookings_first(self, any_backend):
+        now = time.time()
+        ids = [new_id() for _ in range(3)]
+        any_backend.create_bookings_many([
+            {"booking_id": bid, "service_type": "dentist", "location": "Boston", "timeframe": "today",
+             "user_id": "alice", "status": "completed", "created_at": now - (100 + age) * 86400}
+            for bid, age in zip(ids, (1, 3, 2))
+        ])
+        assert any_backend.archive_bookings(now - 90 * 86400, limit=1) == 1
+        assert any_backend.get_booking(ids[1]) is None
+        assert any_backend.archive_bookings(now - 90 * 86400, limit=1) == 1
+        assert any_backend.get_booking(ids[2]) is None
+        assert any_backend.get_booking(ids[0]) is not None
+        assert any_backend.get_user_stats("alice")["total_bookings"] == 3
+
+    def test_expires_oldest_tasks_first(self, any_backend):
+        old, older = new_id(), new_id()
+        any_backend.create_task(older, user_id="alice")
+        time.sleep(0.01)
+        any_backend.create_task(old, user_id="alice")
+        assert any_backend.expire_tasks(time.time(), limit=1) == 1
+        assert any_backend.get_task(older) is None
+        assert any_backend.get_task(old) is not None
+
+
+# ---------------------------------------------------------------------------
+# In-memory engine
+# ---------------------------------------------------------------------------
+
+class TestMemoryBackend:
+    def test_returned_records_are_copies(self):
+        store = MemoryBackend()
+        bid = new_id()
+        store.create_booking(bid, "dentist", "Boston", "today", {})
+        store.update_booking_results(bid, [{"call_status": "pending"}])
+        store.get_booking(bid)["results"][0]["call_status"] = "mutated"
+        assert store.get_booking(bid)["results"][0]["call_status"] == "pending"
+
+    def test_concurrent_result_writes(self):
+        store = MemoryBackend(stripes=4)
+        ids = [new_id() for _ in range(8)]
+        for bid in ids:
+            store.create_booking(bid, "dentist", "Boston", "today", {}, user_id="alice")
+
+        def _write(bid):
+            for i in range(50):
+                store.update_booking_result(bid, i, {"i": i})
+
+        threads = [threading.Thread(target=_write, args=(bid,)) for bid in ids]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(len(store.get_booking(bid)["results"]) == 50 for bid in ids)
+        assert store.get_user_stats("alice")["total_calls"] == 8 * 50
@@ -0,0 +1,61 @@
+"""
+Tests for backend/services/twilio_service.py (outbound calls).
+
+The Twilio client is a mock, so no credentials or network are needed.
+
+Covers:
+  - Calls with a status callback hold their number until /api/twilio/status reports the end
+  - Inline TwiML calls (no status callback) give their number's pool slot and turn back once placed
+"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+import call_limiter
+import number_pool
+from services.twilio_service import TwilioService
+
+NUMBER = "+15550000001"
+
+
+@pytest.fixture
+def service(monkeypatch, mocker):
+    monkeypatch.setattr(number_pool, "_pools", {})
+    monkeypatch.setattr(call_limiter, "_limiters", {})
+    monkeypatch.setitem(call_limiter._limiters, NUMBER,
+                        call_limiter.NumberLimiter(NUMBER, max_concurrent=2, calls_per_second=0))
+    monkeypatch.setenv("TWILIO_ACCOUNT_SID", "AC-test")
+    monkeypatch.setenv("TWILIO_AUTH_TOKEN", "token")
+    monkeypatch.setenv("TWILIO_PHONE_NUMBER", NUMBER)
+    monkeypatch.delenv("TWILIO_PHONE_NUMBERS", raising=False)
+    monkeypatch.setenv("USE_TEST_NUMBER", "false")
+    client = mocker.patch("services.twilio_service.Client").return_value
+    sids = iter(range(100))
+    client.calls.create.side_effect = lambda **kwargs: MagicMock(sid=f"CA{next(sids)}", status="queued")
+    return TwilioService()
+
+
+def _call(service):
+    return service.make_call("+15551230000", "", {"service_type": "dentist"}, "Provider")
+
+
+class TestMakeCall:
+    def test_status_callback_calls_hold_number(self, service, monkeypatch):
+        monkeypatch.setenv("TWILIO_WEBHOOK_BASE_URL", "https://example.test")
+        info = _call(service)
+        assert info["status"] == "queued"
+        assert service.client.calls.create.call_args.kwargs["status_callback"] == "https://example.test/api/twilio/status"
+        assert call_limiter.limiter_for(NUMBER).stats()["live"] == 1
+        assert service.number_pool.stats()[NUMBER]["active"] == 1
+        assert call_limiter.release_call(info["call_sid"])
+        assert number_pool.release_call(info["call_sid"])
+
+    def test_inline_twiml_calls_free_the_turn(self, service, monkeypatch):
+        monkeypatch.delenv("TWILIO_WEBHOOK_BASE_URL", raising=False)
+        # Nothing reports these calls' end, so a third call must not wait on the first two
+        results = [_call(service) for _ in range(3)]
+        assert [r["status"] for r in results] == ["queued"] * 3
+        stats = call_limiter.limiter_for(NUMBER).stats()
+        assert (stats["in_flight"], stats["live"], stats["timed_out"]) == (0, 0, 0)
+        assert service.number_pool.stats()[NUMBER]["active"] == 0
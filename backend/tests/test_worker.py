@@ -0,0 +1,240 @@
+"""
+Tests for backend/worker.py (runs durable jobs from the job queue).
+
+Covers:
+  - A claimed job runs and is marked done
+  - Failed attempts are retried after a backoff, then given up on
+  - A job whose worker died during its last attempt is given up on without running again
+  - Booking call jobs complete their booking, and a retried run doesn't dial placed calls again
+  - Numbers held by the worker's calls are freed once the webhooks record the calls' end
+"""
+
+import time
+import uuid
+
+import pytest
+
+import call_limiter
+import database as db
+import number_pool
+
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+
+@pytest.fixture(autouse=True)
+def _quiet_tracebacks(mocker):
+    # worker imports app, so it is imported once conftest has set the test environment
+    mocker.patch("worker.traceback.print_exc")
+
+
+class _Recorder:
+    """Handler pair that records calls and raises while fail_times > 0."""
+
+    def __init__(self, fail_times: int = 0):
+        self.fail_times = fail_times
+        self.runs, self.given_up = [], []
+
+    def run(self, job):
+        self.runs.append(job["attempts"])
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("provider down")
+
+    def give_up(self, job, error):
+        self.given_up.append((job["job_id"], error))
+
+
+def _worker(recorder, **kwargs):
+    from worker import Worker
+    return Worker({"test": (recorder.run, recorder.give_up)}, worker_id="w-test", retry_backoff_seconds=0, **kwargs)
+
+
+class TestWorker:
+    def test_returns_false_when_nothing_due(self):
+        assert _worker(_Recorder()).run_once() is False
+
+    def test_runs_job_and_marks_done(self):
+        recorder = _Recorder()
+        job_id = new_id()
+        db.enqueue_job(job_id, "test", {"x": 1})
+        assert _worker(recorder).run_once() is True
+        assert recorder.runs == [1]
+        job = db.get_job(job_id)
+        assert (job["status"], job["lease_owner"]) == ("done", None)
+
+    def test_retries_then_gives_up(self):
+        recorder = _Recorder(fail_times=5)
+        job_id = new_id()
+        db.enqueue_job(job_id, "test", {}, max_attempts=2)
+        worker = _worker(recorder)
+        assert worker.run_once()
+        assert db.get_job(job_id)["status"] == "queued"
+        assert worker.run_once()
+        assert recorder.runs == [1, 2]
+        job = db.get_job(job_id)
+        assert (job["status"], job["last_error"]) == ("failed", "RuntimeError: provider down")
+        assert recorder.given_up == [(job_id, "RuntimeError: provider down")]
+        assert worker.run_once() is False
+
+    def test_retry_after_failure_succeeds(self):
+        recorder = _Recorder(fail_times=1)
+        job_id = new_id()
+        db.enqueue_job(job_id, "test", {})
+        worker = _worker(recorder)
+        worker.run_once()
+        worker.run_once()
+        assert recorder.runs == [1, 2]
+        assert db.get_job(job_id)["status"] == "done"
+
+    def test_gives_up_when_last_attempt_was_lost(self):
+        recorder = _Recorder()
+        job_id = new_id()
+        db.enqueue_job(job_id, "test", {}, max_attempts=1)
+        db.claim_job("crashed-worker", 0.01)
+        time.sleep(0.05)
+        assert _worker(recorder).run_once()
+        assert recorder.runs == []
+        assert [j for j, _ in recorder.given_up] == [job_id]
+        assert db.get_job(job_id)["status"] == "failed"
+
+    def test_renews_lease_while_running(self):
+        job_id = new_id()
+        db.enqueue_job(job_id, "test", {})
+        leases = []
+
+        def _slow(job):
+            time.sleep(0.2)
+            leases.append(db.get_job(job_id)["lease_expires_at"])
+
+        from worker import Worker
+        worker = Worker({"test": (_slow, lambda job, error: None)}, worker_id="w-test", lease_seconds=0.15)
+        assert worker.run_once()
+        # Without renewal the lease would have expired before the job finished
+        assert leases[0] > time.time() - 0.01
+        assert db.get_job(job_id)["status"] == "done"
+
+
+class TestBookingCallsJob:
+    def _worker(self):
+        from worker import Worker
+        return Worker(worker_id="w-test")
+
+    def _enqueue(self, booking_id, use_real_calls=False):
+        db.create_booking(booking_id, "dentist", "Boston", "this week", {}, "user-test")
+        db.enqueue_job(booking_id, "booking_calls", {
+            "booking_id": booking_id, "service_type": "dentist", "location": "Boston",
+            "timeframe": "this week", "preferences": {}, "use_real_calls": use_real_calls,
+        })
+
+    def test_completes_booking(self, mocker):
+        mocker.patch("app.time.sleep")
+        booking_id = new_id()
+        self._enqueue(booking_id)
+        assert self._worker().run_once()
+        booking = db.get_booking(booking_id)
+        assert booking["status"] == "completed"
+        assert booking["results"]
+        assert db.get_job(booking_id)["status"] == "done"
+
+    def test_resumed_run_does_not_redial(self, mocker):
+        booking_id = new_id()
+        self._enqueue(booking_id, use_real_calls=True)
+        db.update_booking_status(booking_id, "processing", [
+            {"provider_name": "A", "call_status": "completed"},
+            {"provider_name": "B", "call_status": "initiating"},
+        ])
+        db.claim_job("crashed-worker", 0.01)
+        time.sleep(0.05)
+        dial = mocker.patch("app.make_real_calls")
+
+        assert self._worker().run_once()
+        dial.assert_not_called()
+        booking = db.get_booking(booking_id)
+        assert [r["call_status"] for r in booking["results"]] == ["completed", "failed"]
+        assert booking["status"] == "completed"
+
+    def test_real_calls_are_watched_for_their_end(self, mocker):
+        watch = mocker.patch("worker.call_ends.watch")
+        mocker.patch("app.make_real_calls", return_value=[{"conversation_id": "conv-a", "call_status": "in_progress"}])
+        booking_id = new_id()
+        self._enqueue(booking_id, use_real_calls=True)
+        assert self._worker().run_once()
+        assert db.get_booking(booking_id)["status"] == "processing"
+        watch.assert_called_once_with(booking_id)
+
+    def test_final_failure_completes_booking_without_results(self, mocker):
+        mocker.patch("app.generate_mock_results", side_effect=RuntimeError("places API down"))
+        booking_id = new_id()
+        db.create_booking(booking_id, "dentist", "Boston", "this week", {}, "user-test")
+        db.enqueue_job(booking_id, "booking_calls", {
+            "booking_id": booking_id, "service_type": "dentist", "location": "Boston", "timeframe": "this week",
+        }, max_attempts=1)
+        assert self._worker().run_once()
+        booking = db.get_booking(booking_id)
+        assert (booking["status"], booking["results"]) == ("completed", [])
+        assert db.get_job(booking_id)["status"] == "failed"
+
+
+
+class TestCallEnds:
+    @pytest.fixture
+    def held(self, monkeypatch):
+        """A pool number and its limiter, each holding calls conv-a and conv-b."""
+        monkeypatch.setattr(number_pool, "_pools", {})
+        monkeypatch.setattr(call_limiter, "_limiters", {})
+        pool = number_pool.pool_for("elevenlabs", ["phone-1"])
+        limiter = call_limiter.limiter_for("phone-1")
+        for conv_id in ("conv-a", "conv-b"):
+            pool.placed(pool.assign(), conv_id)
+            limiter.acquire(timeout=5)
+            limiter.hold(conv_id)
+        return pool, limiter
+
+    def _booking(self, statuses):
+        booking_id = new_id()
+        db.create_booking(booking_id, "dentist", "Boston", "this week", {}, "user-test")
+        db.update_booking_status(booking_id, "processing", [
+            {"conversation_id": f"conv-{k}", "call_status": s} for k, s in zip("ab", statuses)
+        ])
+        return booking_id
+
+    def test_frees_numbers_of_ended_calls(self, held):
+        from worker import CallEnds
+        pool, limiter = held
+        booking_id = self._booking(["in_progress", "in_progress"])
+        call_ends = CallEnds()
+        call_ends.watch(booking_id)
+        call_ends.poll()
+        assert pool.stats()["phone-1"]["active"] == 2
+
+        # The web tier's webhook records the first call's end
+        db.update_booking_status(booking_id, "processing", [
+            {"conversation_id": "conv-a", "call_status": "completed"},
+            {"conversation_id": "conv-b", "call_status": "in_progress"},
+        ])
+        call_ends.poll()
+        assert pool.stats()["phone-1"]["active"] == 1
+        assert limiter.stats()["live"] == 1
+        assert call_ends.watching() == 1
+
+        db.update_booking_status(booking_id, "completed", [
+            {"conversation_id": "conv-a", "call_status": "completed"},
+            {"conversation_id": "conv-b", "call_status": "failed"},
+        ])
+        call_ends.poll()
+        assert pool.stats()["phone-1"] == {"active": 0, "in_rotation": True, "consecutive_failures": 1}
+        assert (limiter.stats()["live"], limiter.stats()["in_flight"]) == (0, 0)
+        assert call_ends.watching() == 0
+
+    def test_stops_watching_after_holds_expire(self, held):
+        from worker import CallEnds
+        pool, _ = held
+        booking_id = self._booking(["in_progress", "in_progress"])
+        call_ends = CallEnds(max_age_seconds=0)
+        call_ends.watch(booking_id)
+        time.sleep(0.01)
+        call_ends.poll()
+        assert call_ends.watching() == 0
+        assert pool.stats()["phone-1"]["active"] == 0
@@ -0,0 +1,203 @@
+"""
+Worker process for durable background jobs (BOOKING_JOBS=queue on the web tier).
+Run from the backend directory, with the same environment as the web app:
+
+    python -m worker [--concurrency N] [--drain]
+
+Each loop claims the oldest due job from the jobs table/collection under a lease
+(JOB_LEASE_SECONDS), renews the lease while the job runs and marks it done or failed.
+A job whose worker died (deploy, scale-down, crash) is claimed again once its lease
+runs out, up to its max_attempts; booking call runs resume without re-dialing calls that
+were already placed. SIGTERM / SIGINT stop claiming and let running jobs finish.
+
+The calls' webhooks reach the web tier, not the worker that placed them, so the worker checks the
+bookings it placed calls for every CALL_END_POLL_SECONDS and frees the outbound number (number_pool,
+call_limiter) of each call whose end the webhooks have recorded.
+"""
+
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+
+import app as web
+import call_limiter
+import database as db
+import number_pool
+from result_buffer import TERMINAL_CALL_STATUSES
+from storage.base import call_keys
+
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', '2'))
+# A failed attempt is retried after this many seconds, doubling with each attempt
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv('JOB_RETRY_BACKOFF_SECONDS', '15'))
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '4'))
+CALL_END_POLL_SECONDS = float(os.getenv('CALL_END_POLL_SECONDS', '10'))
+
+
+class CallEnds:
+    """Bookings with calls placed by this process, checked for calls whose end was recorded by a webhook."""
+
+    def __init__(self, max_age_seconds: float = max(number_pool.NUMBER_POOL_CALL_TTL_SECONDS,
+                                                    call_limiter.CALL_LIVE_TTL_SECONDS)):
+        # Past this age every hold has expired on its own
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._watched: Dict[str, float] = {}
+
+    def watch(self, booking_id: str):
+        with self._lock:
+            self._watched.setdefault(booking_id, time.monotonic())
+
+    def watching(self) -> int:
+        with self._lock:
+            return len(self._watched)
+
+    def poll(self):
+        """Free the numbers of ended calls; stop watching bookings that are no longer processing."""
+        now = time.monotonic()
+        with self._lock:
+            watched = list(self._watched.items())
+        for booking_id, since in watched:
+            try:
+                booking = db.get_booking(booking_id)
+            except Exception as e:
+                print(f"⚠️  Could not check calls of booking {booking_id}: {e}")
+                continue
+            done = booking is None or booking['status'] != 'processing' or now - since > self.max_age_seconds
+            for result in (booking or {}).get('results') or []:
+                status = result.get('call_status') or ''
+                if status in TERMINAL_CALL_STATUSES or done:
+                    for key in call_keys(result):
+                        number_pool.release_call(key, ok=status != 'failed')
+                        call_limiter.release_call(key)
+            if done:
+                with self._lock:
+                    self._watched.pop(booking_id, None)
+
+    def run(self, stop: threading.Event, poll_seconds: float = CALL_END_POLL_SECONDS):
+        while not stop.wait(poll_seconds):
+            self.poll()
+
+
+call_ends = CallEnds()
+
+
+def _run_booking_calls(job: dict):
+    p = job['payload']
+    try:
+        web.run_booking_calls(p['booking_id'], p['service_type'], p['location'], p['timeframe'],
+                              p.get('preferences') or {}, p.get('use_real_calls', False), resume=job['attempts'] > 1)
+    finally:
+        if p.get('use_real_calls', False):
+            call_ends.watch(p['booking_id'])
+
+
+def _give_up_booking_calls(job: dict, error: str):
+    web.fail_booking_calls(job['payload']['booking_id'], error)
+
+
+# kind -> (run(job), give_up(job, error) once the last attempt failed)
+HANDLERS: Dict[str, Tuple[Callable[[dict], None], Callable[[dict, str], None]]] = {
+    web.BOOKING_CALLS_JOB: (_run_booking_calls, _give_up_booking_calls),
+}
+
+
+class Worker:
+    """Claims and runs jobs of the kinds in handlers, one at a time per run() loop."""
+
+    def __init__(self, handlers=None, worker_id: Optional[str] = None, lease_seconds: float = JOB_LEASE_SECONDS,
+                 poll_seconds: float = JOB_POLL_SECONDS, retry_backoff_seconds: float = JOB_RETRY_BACKOFF_SECONDS):
+        self.handlers = HANDLERS if handlers is None else handlers
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"❌ Worker {self.worker_id} could not claim a job: {e}")
+            stop.wait(self.poll_seconds)
+
+    def run_once(self) -> bool:
+        """Claim and run one due job; False when there was none."""
+        job = db.claim_job(self.worker_id, self.lease_seconds, list(self.handlers))
+        if job is None:
+            return False
+        run, give_up = self.handlers[job['kind']]
+        if job['attempts'] > job['max_attempts']:
+            # The previous worker died during the last attempt
+            self._give_up(job, give_up, job.get('last_error') or 'worker lost during the last attempt')
+            return True
+
+        print(f"▶️  Job {job['job_id']} ({job['kind']}) attempt {job['attempts']}/{job['max_attempts']}")
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._keep_lease, args=(job['job_id'], done), daemon=True)
+        heartbeat.start()
+        try:
+            run(job)
+        except Exception as e:
+            traceback.print_exc()
+            error = f'{type(e).__name__}: {e}'
+            if job['attempts'] >= job['max_attempts']:
+                self._give_up(job, give_up, error)
+            else:
+                retry_at = datetime.now().timestamp() + self.retry_backoff_seconds * 2 ** (job['attempts'] - 1)
+                db.fail_job(job['job_id'], self.worker_id, error, retry_at)
+                print(f"🔁 Job {job['job_id']} failed ({error}), retrying")
+        else:
+            db.complete_job(job['job_id'], self.worker_id)
+            print(f"✅ Job {job['job_id']} done")
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _give_up(self, job: dict, give_up, error: str):
+        if db.fail_job(job['job_id'], self.worker_id, error):
+            print(f"❌ Job {job['job_id']} failed after {job['max_attempts']} attempts: {error}")
+            give_up(job, error)
+
+    def _keep_lease(self, job_id: str, done: threading.Event):
+        while not done.wait(self.lease_seconds / 3):
+            if not db.renew_job_lease(job_id, self.worker_id, self.lease_seconds):
+                print(f"⚠️  Lost the lease on job {job_id}; another worker may run it again")
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run durable background jobs (booking call runs).')
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY, help='jobs run at the same time')
+    parser.add_argument('--drain', action='store_true', help='exit once no job is due instead of polling')
+    args = parser.parse_args()
+
+    worker = Worker()
+    if args.drain:
+        while worker.run_once():
+            pass
+        return
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    print(f"👷 Worker {worker.worker_id} running {args.concurrency} job loops")
+    loops = [threading.Thread(target=worker.run, args=(stop,), name=f'worker-{i}') for i in range(max(1, args.concurrency))]
+    loops.append(threading.Thread(target=call_ends.run, args=(stop,), name='call-ends'))
+    for t in loops:
+        t.start()
+    for t in loops:
+        t.join()
+    print("👋 Worker stopped")
+
+
+if __name__ == '__main__':
+    main()
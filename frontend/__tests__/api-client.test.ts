@@ -10,6 +10,7 @@ import ApiClient, {
   UnauthorizedError,
   getAuthToken,
   apiClient,
+  withOlderBookings,
 } from '../lib/api-client';
 
 // ---------------------------------------------------------------------------
@@ -222,6 +223,63 @@ describe('ApiClient.getBookingStatus', () => {
   });
 });
 
+// ---------------------------------------------------------------------------
+// streamBookingStatus
+// ---------------------------------------------------------------------------
+
+describe('ApiClient.streamBookingStatus', () => {
+  const client = new ApiClient('http://localhost:8080');
+
+  beforeAll(() => {
+    // jsdom does not provide the encoding globals the stream reader needs
+    // eslint-disable-next-line @typescript-eslint/no-var-requires
+    const { TextDecoder, TextEncoder } = require('util');
+    Object.assign(globalThis, { TextDecoder, TextEncoder });
+  });
+
+  /** Response whose body yields the given chunks of an event stream. */
+  function mockStreamResponse(chunks: string[]): object {
+    const encoded = chunks.map((c) => new TextEncoder().encode(c));
+    return {
+      ok: true,
+      status: 200,
+      body: {
+        getReader: () => ({
+          read: () =>
+            Promise.resolve(
+              encoded.length ? { value: encoded.shift(), done: false } : { value: undefined, done: true }
+            ),
+        }),
+      },
+    };
+  }
+
+  it('calls GET /api/booking/:id/events', async () => {
+    fetchMock.mockResolvedValueOnce(mockStreamResponse([]));
+    await client.streamBookingStatus('bid-1', () => {});
+    const [url] = fetchMock.mock.calls[0] as [string];
+    expect(url).toBe('http://localhost:8080/api/booking/bid-1/events');
+  });
+
+  it('reports each event and resolves with the last one', async () => {
+    fetchMock.mockResolvedValueOnce(
+      mockStreamResponse([
+        'retry: 1000\n\ndata: {"booking_id":"bid-1","status":"processing","results":[]}\n\n: keep-alive\n\nda',
+        'ta: {"booking_id":"bid-1","status":"completed","results":[]}\n\n',
+      ])
+    );
+    const onUpdate = jest.fn();
+    const last = await client.streamBookingStatus('bid-1', onUpdate);
+    expect(onUpdate.mock.calls.map(([s]) => s.status)).toEqual(['processing', 'completed']);
+    expect(last?.status).toBe('completed');
+  });
+
+  it('throws on 404', async () => {
+    fetchMock.mockResolvedValueOnce(mockResponse({ error: 'Booking not found' }, 404));
+    await expect(client.streamBookingStatus('nonexistent', () => {})).rejects.toThrow('Booking not found');
+  });
+});
+
 // ---------------------------------------------------------------------------
 // pollBookingStatus
 // ---------------------------------------------------------------------------
@@ -369,6 +427,39 @@ describe('ApiClient.getDashboardBookings', () => {
     const result = await client.getDashboardBookings();
     expect(result.bookings).toHaveLength(1);
   });
+
+  it('passes limit and cursor as query params', async () => {
+    fetchMock.mockResolvedValueOnce(mockResponse({ bookings: [], next_cursor: null }));
+    await client.getDashboardBookings({ limit: 20, cursor: 'abc' });
+    expect(fetchMock.mock.calls[fetchMock.mock.calls.length - 1][0]).toBe(
+      'http://localhost:8080/api/dashboard/bookings?limit=20&cursor=abc'
+    );
+  });
+
+  it('asks for full results only when expand is set', async () => {
+    fetchMock.mockResolvedValueOnce(mockResponse({ bookings: [], next_cursor: null }));
+    await client.getDashboardBookings({ expand: true });
+    expect(fetchMock.mock.calls[fetchMock.mock.calls.length - 1][0]).toBe(
+      'http://localhost:8080/api/dashboard/bookings?expand=results'
+    );
+  });
+});
+
+describe('withOlderBookings', () => {
+  it('keeps loaded older pages behind a refreshed first page', () => {
+    const loaded = [{ booking_id: '3', status: 'processing' }, { booking_id: '2' }, { booking_id: '1' }];
+    const first = [{ booking_id: '4' }, { booking_id: '3', status: 'completed' }];
+    expect(withOlderBookings(first, loaded)).toEqual([
+      { booking_id: '4' },
+      { booking_id: '3', status: 'completed' },
+      { booking_id: '2' },
+      { booking_id: '1' },
+    ]);
+  });
+
+  it('is the first page when nothing older is loaded', () => {
+    expect(withOlderBookings([{ booking_id: '1' }], [])).toEqual([{ booking_id: '1' }]);
+  });
 });
 
 // ---------------------------------------------------------------------------
@@ -15,7 +15,7 @@ import {
   Activity
 } from 'lucide-react';
 import Link from 'next/link';
-import { apiClient } from '@/lib/api-client';
+import { apiClient, type BookingStatus } from '@/lib/api-client';
 
 interface CallProgress {
   provider_name: string;
@@ -36,32 +36,53 @@ export default function ProgressClient({ id }: { id: string }) {
   const [currentProvider, setCurrentProvider] = useState<string>('');
 
   useEffect(() => {
+    let cancelled = false;
+    const controller = new AbortController();
+    let interval: ReturnType<typeof setInterval> | null = null;
+
+    const handleStatus = (response: BookingStatus) => {
+      if (response.status === 'completed') {
+        setStatus('completed');
+        // Wait 2 seconds to show completion, then redirect
+        setTimeout(() => {
+          router.push(`/booking/${bookingId}`);
+        }, 2000);
+      } else if (response.status === 'processing') {
+        // Simulate progress (in production this would come from backend)
+        updateProgress();
+      }
+    };
+
     const checkProgress = async () => {
       try {
-        const response = await apiClient.getBookingStatus(bookingId);
-
-        if (response.status === 'completed') {
-          setStatus('completed');
-          // Wait 2 seconds to show completion, then redirect
-          setTimeout(() => {
-            router.push(`/booking/${bookingId}`);
-          }, 2000);
-        } else if (response.status === 'processing') {
-          // Simulate progress (in production this would come from backend)
-          updateProgress();
-        }
+        handleStatus(await apiClient.getBookingStatus(bookingId));
       } catch (error) {
         console.error('Error checking progress:', error);
       }
     };
 
-    // Initial check
-    checkProgress();
+    // Changes are pushed over a server-sent event stream; poll every 500ms only if streaming fails
+    const streamProgress = async () => {
+      try {
+        let last: BookingStatus | null;
+        do {
+          last = await apiClient.streamBookingStatus(bookingId, handleStatus, controller.signal);
+        } while (!cancelled && last?.status === 'processing');
+      } catch (error) {
+        if (cancelled) return;
+        console.error('Progress stream failed, polling instead:', error);
+        checkProgress();
+        interval = setInterval(checkProgress, 500);
+      }
+    };
 
-    // Poll every 500ms for smoother updates
-    const interval = setInterval(checkProgress, 500);
+    streamProgress();
 
-    return () => clearInterval(interval);
+    return () => {
+      cancelled = true;
+      controller.abort();
+      if (interval) clearInterval(interval);
+    };
   }, [bookingId, router]);
 
   const updateProgress = () => {
@@ -16,7 +16,7 @@ import {
 } from 'lucide-react';
 import Link from 'next/link';
 import { signOut } from 'next-auth/react';
-import { apiClient, WaitlistError, UnauthorizedError } from '@/lib/api-client';
+import { apiClient, WaitlistError, UnauthorizedError, withOlderBookings } from '@/lib/api-client';
 
 interface DashboardStats {
   total_bookings: number;
@@ -32,27 +32,33 @@ interface Booking {
   service_type: string;
   location: string;
   created_at: number;
-  results: any[];
+  result_count: number;
 }
 
 export default function DashboardPage() {
   const [stats, setStats] = useState<DashboardStats | null>(null);
   const [bookings, setBookings] = useState<Booking[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [lastUpdate, setLastUpdate] = useState<Date>(new Date());
   const [unauthorized, setUnauthorized] = useState(false);
   const [backendAuthConfigured, setBackendAuthConfigured] = useState<boolean | null>(null);
   const retryCount = useRef(0);
+  // Set once "Load more" has fetched older pages: refreshes then keep its cursor
+  const loadedOlder = useRef(false);
   const router = useRouter();
 
   const fetchDashboardData = async () => {
     try {
-      const [statsData, bookingsData] = await Promise.all([
+      // Only the newest page is refreshed; older pages are fetched on demand with "Load more"
+      const [statsData, page] = await Promise.all([
         apiClient.getDashboardStats(),
         apiClient.getDashboardBookings(),
       ]);
       setStats(statsData.stats);
-      setBookings((bookingsData.bookings || []) as unknown as Booking[]);
+      setBookings((loaded) => withOlderBookings(page.bookings as unknown as Booking[], loaded));
+      if (!loadedOlder.current) setNextCursor(page.next_cursor);
       setUnauthorized(false);
       retryCount.current = 0;
       setLastUpdate(new Date());
@@ -77,6 +83,21 @@ export default function DashboardPage() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await apiClient.getDashboardBookings({ cursor: nextCursor });
+      loadedOlder.current = true;
+      setBookings((loaded) => withOlderBookings(loaded, page.bookings as unknown as Booking[]));
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error loading more bookings:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchDashboardData();
 
@@ -295,10 +316,10 @@ export default function DashboardPage() {
                             <Clock className="h-4 w-4 mr-1" />
                             {formatDate(booking.created_at)}
                           </span>
-                          {booking.results && booking.results.length > 0 && (
+                          {booking.result_count > 0 && (
                             <span className="flex items-center">
                               <Phone className="h-4 w-4 mr-1" />
-                              {booking.results.length} calls made
+                              {booking.result_count} calls made
                             </span>
                           )}
                         </div>
@@ -313,6 +334,14 @@ export default function DashboardPage() {
                     </div>
                   </div>
                 ))}
+                {nextCursor && (
+                  <div className="text-center pt-2">
+                    <Button variant="outline" size="sm" onClick={loadMore} disabled={loadingMore} className="border-black/10">
+                      {loadingMore && <RefreshCw className="h-4 w-4 mr-2 animate-spin" />}
+                      Load more
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
           </CardContent>
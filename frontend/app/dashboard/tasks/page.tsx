@@ -20,7 +20,7 @@ import {
 } from 'lucide-react';
 import Link from 'next/link';
 import { signOut } from 'next-auth/react';
-import { apiClient, WaitlistError, UnauthorizedError } from '@/lib/api-client';
+import { apiClient, WaitlistError, UnauthorizedError, withOlderBookings } from '@/lib/api-client';
 
 interface Booking {
   booking_id: string;
@@ -29,7 +29,7 @@ interface Booking {
   location: string;
   timeframe: string;
   created_at: number;
-  results: any[];
+  result_count: number;
 }
 
 interface Result {
@@ -50,34 +50,75 @@ interface Result {
 export default function TasksPage() {
   const [allBookings, setAllBookings] = useState<Booking[]>([]);
   const [expandedTasks, setExpandedTasks] = useState<Set<string>>(new Set());
+  // Full results of expanded tasks (the list itself only carries summaries)
+  const [callResults, setCallResults] = useState<Record<string, Result[]>>({});
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
-  const [hasAutoExpanded, setHasAutoExpanded] = useState(false);
   const [fetchError, setFetchError] = useState<string | null>(null);
   const [unauthorized, setUnauthorized] = useState(false);
   const retryCount = useRef(0);
+  // The polling interval keeps the first render's closure, so what it reads lives in refs
+  const bookingsRef = useRef<Booking[]>([]);
+  const expandedRef = useRef<Set<string>>(new Set());
+  const hasAutoExpanded = useRef(false);
+  // Bookings whose loaded results were fetched while they were still processing
+  const stillCalling = useRef<Set<string>>(new Set());
+  const loadedOlder = useRef(false);
   const router = useRouter();
 
-  const fetchAllBookings = async () => {
-    try {
-      setFetchError(null);
-      const data = await apiClient.getDashboardBookings();
+  const showBookings = (bookings: Booking[]) => {
+    // Sort: processing first, then completed, newest first within each group
+    const sorted = [...bookings].sort((a, b) => {
+      if (a.status === 'processing' && b.status !== 'processing') return -1;
+      if (a.status !== 'processing' && b.status === 'processing') return 1;
+      return b.created_at - a.created_at;
+    });
+    bookingsRef.current = sorted;
+    setAllBookings(sorted);
+  };
 
-      // Sort: processing first, then completed, newest first within each group
-      const rawBookings = (data.bookings || []) as unknown as Booking[];
-      const bookings = rawBookings.sort((a, b) => {
-        if (a.status === 'processing' && b.status !== 'processing') return -1;
-        if (a.status !== 'processing' && b.status === 'processing') return 1;
-        return b.created_at - a.created_at;
+  const expand = (expanded: Set<string>) => {
+    expandedRef.current = expanded;
+    setExpandedTasks(expanded);
+  };
+
+  const fetchCallResults = async (bookingIds: string[]) => {
+    const statuses = await Promise.all(
+      bookingIds.map((id) => apiClient.getBookingStatus(id).catch(() => null))
+    );
+    setCallResults((current) => {
+      const next = { ...current };
+      statuses.forEach((status) => {
+        if (!status) return;
+        next[status.booking_id] = status.results as unknown as Result[];
+        if (status.status === 'processing') stillCalling.current.add(status.booking_id);
+        else stillCalling.current.delete(status.booking_id);
       });
+      return next;
+    });
+  };
 
-      setAllBookings(bookings);
+  const fetchAllBookings = async () => {
+    try {
+      setFetchError(null);
+      // Only the newest page is refreshed; older pages are fetched on demand with "Load more"
+      const page = await apiClient.getDashboardBookings();
+      showBookings(withOlderBookings(page.bookings as unknown as Booking[], bookingsRef.current));
+      if (!loadedOlder.current) setNextCursor(page.next_cursor);
       retryCount.current = 0;
 
-      if (!hasAutoExpanded) {
-        const processing = bookings.filter((b) => b.status === 'processing');
-        setExpandedTasks(new Set(processing.map((b) => b.booking_id)));
-        setHasAutoExpanded(true);
+      if (!hasAutoExpanded.current) {
+        const processing = bookingsRef.current.filter((b) => b.status === 'processing');
+        expand(new Set(processing.map((b) => b.booking_id)));
+        hasAutoExpanded.current = true;
       }
+      // Expanded tasks still calling (or that were when their results loaded) get their latest results
+      const refresh = bookingsRef.current.filter(
+        (b) => expandedRef.current.has(b.booking_id)
+          && (b.status === 'processing' || stillCalling.current.has(b.booking_id))
+      );
+      if (refresh.length) fetchCallResults(refresh.map((b) => b.booking_id));
 
       setLoading(false);
     } catch (error) {
@@ -96,11 +137,27 @@ export default function TasksPage() {
       } else {
         setFetchError(error instanceof Error ? error.message : 'Failed to fetch');
       }
-      setAllBookings([]);
+      showBookings([]);
+      loadedOlder.current = false;
       setLoading(false);
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await apiClient.getDashboardBookings({ cursor: nextCursor });
+      loadedOlder.current = true;
+      showBookings(withOlderBookings(bookingsRef.current, page.bookings as unknown as Booking[]));
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error loading more bookings:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchAllBookings();
 
@@ -115,8 +172,9 @@ export default function TasksPage() {
       newExpanded.delete(bookingId);
     } else {
       newExpanded.add(bookingId);
+      if (!callResults[bookingId]) fetchCallResults([bookingId]);
     }
-    setExpandedTasks(newExpanded);
+    expand(newExpanded);
   };
 
   const getStatusBadge = (status: string) => {
@@ -234,7 +292,7 @@ export default function TasksPage() {
           <div className="space-y-4">
             {allBookings.map((task) => {
               const isExpanded = expandedTasks.has(task.booking_id);
-              const progress = task.results || [];
+              const progress = callResults[task.booking_id] || [];
               const completedCalls = progress.filter((p: Result) => p.call_status === 'completed').length;
               const inProgressCalls = progress.filter((p: Result) => p.call_status === 'in_progress').length;
               const totalCalls = progress.length;
@@ -380,9 +438,9 @@ export default function TasksPage() {
                             Booking Results
                           </h3>
 
-                          {task.results && task.results.filter((r: Result) => r.call_status === 'completed' && r.availability_date && r.availability_date !== '—').length > 0 ? (
+                          {progress.filter((r: Result) => r.call_status === 'completed' && r.availability_date && r.availability_date !== '—').length > 0 ? (
                             <div className="space-y-3">
-                              {task.results.filter((r: Result) => r.call_status === 'completed' && r.availability_date && r.availability_date !== '—').slice(0, 5).map((result: any, idx: number) => (
+                              {progress.filter((r: Result) => r.call_status === 'completed' && r.availability_date && r.availability_date !== '—').slice(0, 5).map((result: any, idx: number) => (
                                 <div
                                   key={idx}
                                   className="p-4 rounded-lg border-2 border-black/10 bg-white"
@@ -420,7 +478,9 @@ export default function TasksPage() {
                             </div>
                           ) : (
                             <div className="text-center py-8 text-black/50">
-                              {task.results?.some((r: Result) => r.call_status === 'in_progress') ? (
+                              {!callResults[task.booking_id] && task.result_count > 0 ? (
+                                <p>Loading results...</p>
+                              ) : progress.some((r: Result) => r.call_status === 'in_progress') ? (
                                 <p>Calls in progress — availability will appear here when calls finish.</p>
                               ) : (
                                 <p>No providers had availability for this request</p>
@@ -434,6 +494,14 @@ export default function TasksPage() {
                 </Card>
               );
             })}
+            {nextCursor && (
+              <div className="text-center pt-2">
+                <Button variant="outline" size="sm" onClick={loadMore} disabled={loadingMore} className="border-black/10">
+                  {loadingMore && <RefreshCw className="h-4 w-4 mr-2 animate-spin" />}
+                  Load more
+                </Button>
+              </div>
+            )}
           </div>
         ) : null}
         </div>
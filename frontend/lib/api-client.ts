@@ -35,6 +35,15 @@ export async function getAuthToken(): Promise<string | null> {
   }
 }
 
+/**
+ * A refreshed first page of dashboard bookings followed by the older bookings already loaded
+ * with "Load more" (each booking once), so polling the first page keeps the pages shown.
+ */
+export function withOlderBookings<T extends { booking_id: string }>(firstPage: T[], loaded: T[]): T[] {
+  const seen = new Set(firstPage.map((b) => b.booking_id));
+  return [...firstPage, ...loaded.filter((b) => !seen.has(b.booking_id))];
+}
+
 export interface BookingRequest {
   service_type: string;
   timeframe: string;
@@ -148,6 +157,52 @@ class ApiClient {
     return response.json();
   }
 
+  /**
+   * Stream booking status from GET /api/booking/:id/events (server-sent events): onUpdate gets the
+   * current status, then each change. Resolves with the last status when the server ends the stream
+   * (the booking finished, or the stream hit its time limit while still processing - call again).
+   * Uses fetch rather than EventSource so the Authorization header can be sent.
+   */
+  async streamBookingStatus(
+    bookingId: string,
+    onUpdate: (status: BookingStatus) => void,
+    signal?: AbortSignal
+  ): Promise<BookingStatus | null> {
+    const response = await fetch(`${this.baseUrl}/api/booking/${bookingId}/events`, {
+      headers: await this.authHeaders(),
+      signal,
+    });
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({}));
+      throw new Error((error as { error?: string }).error || 'Failed to stream booking status');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let last: BookingStatus | null = null;
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) return last;
+      buffer += decoder.decode(value, { stream: true });
+      let end: number;
+      while ((end = buffer.indexOf('\n\n')) >= 0) {
+        const data = buffer
+          .slice(0, end)
+          .split('\n')
+          .filter((line) => line.startsWith('data: '))
+          .map((line) => line.slice('data: '.length))
+          .join('\n');
+        buffer = buffer.slice(end + 2);
+        if (data) {
+          last = JSON.parse(data) as BookingStatus;
+          onUpdate(last);
+        }
+      }
+    }
+  }
+
   /**
    * Confirm a booking with a specific provider
    */
@@ -198,8 +253,8 @@ class ApiClient {
     throw new Error('Booking request timed out');
   }
 
-  /** Dashboard stats (protected) */
-  async getDashboardStats(): Promise<{
+  /** Dashboard stats (protected). Recent bookings are summaries unless expand is set (then they carry results). */
+  async getDashboardStats(params: { expand?: boolean } = {}): Promise<{
     stats: {
       total_bookings: number;
       completed: number;
@@ -209,7 +264,7 @@ class ApiClient {
     };
     recent_bookings: Array<Record<string, unknown>>;
   }> {
-    const response = await fetch(`${this.baseUrl}/api/dashboard/stats`, {
+    const response = await fetch(`${this.baseUrl}/api/dashboard/stats${params.expand ? '?expand=results' : ''}`, {
       headers: await this.authHeaders(),
     });
     if (!response.ok) {
@@ -221,9 +276,20 @@ class ApiClient {
     return response.json();
   }
 
-  /** All bookings for dashboard (protected) */
-  async getDashboardBookings(): Promise<{ bookings: Array<Record<string, unknown>> }> {
-    const response = await fetch(`${this.baseUrl}/api/dashboard/bookings`, {
+  /**
+   * One page of bookings for dashboard, newest first (protected). Pass next_cursor back to get the next page.
+   * Bookings are summaries (result_count, completed_count, best_result); set expand to get full results.
+   */
+  async getDashboardBookings(params: { limit?: number; cursor?: string; expand?: boolean } = {}): Promise<{
+    bookings: Array<Record<string, unknown>>;
+    next_cursor: string | null;
+  }> {
+    const query = new URLSearchParams();
+    if (params.limit) query.set('limit', String(params.limit));
+    if (params.cursor) query.set('cursor', params.cursor);
+    if (params.expand) query.set('expand', 'results');
+    const qs = query.toString();
+    const response = await fetch(`${this.baseUrl}/api/dashboard/bookings${qs ? `?${qs}` : ''}`, {
       headers: await this.authHeaders(),
     });
     if (!response.ok) {
@@ -4,6 +4,8 @@
 #
 # Usage: ./scripts/create-firestore-indexes.sh [PROJECT_ID]
 # If PROJECT_ID is omitted, uses: gcloud config get-value project
+# With FIRESTORE_LAYOUT=per_user, also creates the indexes for users/{uid}/bookings and users/{uid}/tasks
+# (collection-scope indexes apply to every collection with that id, so 1-9 keep working for the flat layout).
 
 set -e
 
@@ -18,7 +20,7 @@ echo "Creating Firestore composite indexes for project: $PROJECT_ID"
 echo ""
 
 # 1) Bookings: filter by user_id, order by created_at (Active tasks / dashboard)
-echo "1/3  bookings: user_id + created_at"
+echo "1/9  bookings: user_id + created_at"
 gcloud firestore indexes composite create \
   --project="$PROJECT_ID" \
   --database="(default)" \
@@ -27,18 +29,18 @@ gcloud firestore indexes composite create \
   --field-config=field-path=created_at,order=descending \
   --quiet || true
 
-# 2) Bookings: filter by status, order by created_at (webhook lookup)
-echo "2/3  bookings: status + created_at"
+# 2) Bookings: filter by status, order by created_at (retention: archiving completed bookings, oldest first)
+echo "2/9  bookings: status + created_at"
 gcloud firestore indexes composite create \
   --project="$PROJECT_ID" \
   --database="(default)" \
   --collection-group=bookings \
   --field-config=field-path=status,order=ascending \
-  --field-config=field-path=created_at,order=descending \
+  --field-config=field-path=created_at,order=ascending \
   --quiet || true
 
 # 3) Tasks: filter by user_id, order by updated_at (dashboard tasks list)
-echo "3/3  tasks: user_id + updated_at"
+echo "3/9  tasks: user_id + updated_at"
 gcloud firestore indexes composite create \
   --project="$PROJECT_ID" \
   --database="(default)" \
@@ -47,6 +49,156 @@ gcloud firestore indexes composite create \
   --field-config=field-path=updated_at,order=descending \
   --quiet || true
 
+# 4) Per-provider call results (bookings/{id}/results): collection-group lookup by booking_id (dashboard lists)
+echo "4/9  results (collection group): booking_id"
+gcloud firestore indexes fields update booking_id \
+  --project="$PROJECT_ID" \
+  --database="(default)" \
+  --collection-group=results \
+  --index=order=ascending,query-scope=collection-group \
+  --quiet || true
+
+# 5) Bookings: keyset pagination on (created_at, booking_id) per user (dashboard bookings pages)
+echo "5/9  bookings: user_id + created_at + booking_id"
+gcloud firestore indexes composite create \
+  --project="$PROJECT_ID" \
+  --database="(default)" \
+  --collection-group=bookings \
+  --field-config=field-path=user_id,order=ascending \
+  --field-config=field-path=created_at,order=descending \
+  --field-config=field-path=booking_id,order=descending \
+  --quiet || true
+
+# 6) Tasks: keyset pagination on (updated_at, task_id) per user (tasks list pages)
+echo "6/9  tasks: user_id + updated_at + task_id"
+gcloud firestore indexes composite create \
+  --project="$PROJECT_ID" \
+  --database="(default)" \
+  --collection-group=tasks \
+  --field-config=field-path=user_id,order=ascending \
+  --field-config=field-path=updated_at,order=descending \
+  --field-config=field-path=task_id,order=descending \
+  --quiet || true
+
+# 7) Tasks: filter by status, order by updated_at (retention: expiring abandoned tasks, oldest first)
+echo "7/9  tasks: status + updated_at"
+gcloud firestore indexes composite create \
+  --project="$PROJECT_ID" \
+  --database="(default)" \
+  --collection-group=tasks \
+  --field-config=field-path=status,order=ascending \
+  --field-config=field-path=updated_at,order=ascending \
+  --quiet || true
+
+# 8) Jobs: queued jobs that are due, oldest first (worker claims)
+echo "8/9  jobs: status + run_at"
+gcloud firestore indexes composite create \
+  --project="$PROJECT_ID" \
+  --database="(default)" \
+  --collection-group=jobs \
+  --field-config=field-path=status,order=ascending \
+  --field-config=field-path=run_at,order=ascending \
+  --quiet || true
+
+# 9) Jobs: running jobs whose lease expired (reclaimed from a worker that died)
+echo "9/9  jobs: status + lease_expires_at"
+gcloud firestore indexes composite create \
+  --project="$PROJECT_ID" \
+  --database="(default)" \
+  --collection-group=jobs \
+  --field-config=field-path=status,order=ascending \
+  --field-config=field-path=lease_expires_at,order=ascending \
+  --quiet || true
+
+if [ "${FIRESTORE_LAYOUT:-flat}" = "per_user" ]; then
+  echo ""
+  echo "Per-user layout indexes"
+
+  # P1) A user's bookings pages: order by (created_at, booking_id) within users/{uid}/bookings
+  echo "P1/8  bookings: created_at + booking_id"
+  gcloud firestore indexes composite create \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=bookings \
+    --field-config=field-path=created_at,order=descending \
+    --field-config=field-path=booking_id,order=descending \
+    --quiet || true
+
+  # P2) A user's tasks pages: order by (updated_at, task_id) within users/{uid}/tasks
+  echo "P2/8  tasks: updated_at + task_id"
+  gcloud firestore indexes composite create \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=tasks \
+    --field-config=field-path=updated_at,order=descending \
+    --field-config=field-path=task_id,order=descending \
+    --quiet || true
+
+  # P3) Find a booking's owner by id (webhooks, result writes) across users (collection group)
+  echo "P3/8  bookings (collection group): booking_id"
+  gcloud firestore indexes fields update booking_id \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=bookings \
+    --index=order=ascending,query-scope=collection \
+    --index=order=ascending,query-scope=collection-group \
+    --quiet || true
+
+  # P4) Find a task's owner by id across users (collection group)
+  echo "P4/8  tasks (collection group): task_id"
+  gcloud firestore indexes fields update task_id \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=tasks \
+    --index=order=ascending,query-scope=collection \
+    --index=order=ascending,query-scope=collection-group \
+    --quiet || true
+
+  # P5) Retention across users: completed bookings by created_at, oldest first (collection group)
+  echo "P5/8  bookings (collection group): status + created_at"
+  gcloud firestore indexes composite create \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=bookings \
+    --query-scope=collection-group \
+    --field-config=field-path=status,order=ascending \
+    --field-config=field-path=created_at,order=ascending \
+    --quiet || true
+
+  # P6) Retention across users: abandoned tasks by updated_at, oldest first (collection group)
+  echo "P6/8  tasks (collection group): status + updated_at"
+  gcloud firestore indexes composite create \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=tasks \
+    --query-scope=collection-group \
+    --field-config=field-path=status,order=ascending \
+    --field-config=field-path=updated_at,order=ascending \
+    --quiet || true
+
+  # P7) Admin listings of every user's bookings, paged (collection group)
+  echo "P7/8  bookings (collection group): created_at + booking_id"
+  gcloud firestore indexes composite create \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=bookings \
+    --query-scope=collection-group \
+    --field-config=field-path=created_at,order=descending \
+    --field-config=field-path=booking_id,order=descending \
+    --quiet || true
+
+  # P8) Admin listings of every user's tasks, paged (collection group)
+  echo "P8/8  tasks (collection group): updated_at + task_id"
+  gcloud firestore indexes composite create \
+    --project="$PROJECT_ID" \
+    --database="(default)" \
+    --collection-group=tasks \
+    --query-scope=collection-group \
+    --field-config=field-path=updated_at,order=descending \
+    --field-config=field-path=task_id,order=descending \
+    --quiet || true
+fi
+
 echo ""
 echo "Done. Indexes may take a few minutes to finish building."
 echo "Check status: https://console.cloud.google.com/firestore/indexes?project=$PROJECT_ID"